@@ -0,0 +1,457 @@
+from aiohttp import web
+import aiohttp
+import asyncio
+from benchmarks.guild_generator import SyntheticGuildGenerator
+from bot.models.tree_node import TreeNode
+from bot.services.discord.api_discord_events_service import GatewayOpcode
+from datetime import datetime, timedelta, timezone
+import itertools
+import json
+import logging
+import random
+import time
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A single dispatch: (event type, event data).
+Dispatch = Tuple[str, Dict[str, Any]]
+
+class GatewayScenario:
+	"""
+	Generates the dispatches sent by the fake gateway.
+	Each synthetic guild is created, after which its members join in the order
+	  produced by `SyntheticGuildGenerator`. Before each member joins, an invite
+	  is created by the member's inviter so that the bot can attribute the
+	  join, except for members that join before the guild's first invite
+	  exists, whom the bot must add under the owner. Nickname changes and
+	  departures are interleaved with the joins.
+	  Only members that never invite anyone leave, so every inviter is still
+	  in the guild when its invitees join. Dispatches for different guilds are
+	  interleaved round-robin.
+	"""
+	# First ID assigned to generated guilds.
+	BASE_SERVER_ID = 200_000_000_000_000_000
+
+	# Time that the first generated event occurred at.
+	START_TIME = datetime(2023, 8, 20, tzinfo=timezone.utc)
+
+	# Number of seconds that invites remain valid for.
+	INVITE_MAX_AGE = 86400
+
+	def __init__(self,
+		generator: SyntheticGuildGenerator,
+		seed: int = 0):
+		"""
+		Initializes a new instance of the class.
+		@param generator The generator used to create each guild's members.
+		@param seed The seed used to decide which members change nicknames or
+		  leave.
+		"""
+		self._generator = generator
+		self._seed = seed
+
+
+	def build(self,
+		shape: str,
+		guild_count: int,
+		members_per_guild: int,
+		update_ratio: float,
+		leave_ratio: float,
+		uninvited_joins: int = 0) -> List[Dispatch]:
+		"""
+		Builds the dispatches for a scenario.
+		@param shape The shape of each guild's invite tree. Must be one of the
+		  values defined by `GuildShape`.
+		@param guild_count The number of guilds to create.
+		@param members_per_guild The number of members that join each guild,
+		  including the owner.
+		@param update_ratio The expected number of nickname changes per join.
+		@param leave_ratio The expected number of departures per join.
+		@param uninvited_joins The number of members of each guild that join
+		  before any invite is created, so no invite matches their join.
+		@returns The dispatches, in the order they should be sent.
+		"""
+		rng = random.Random(f"{self._seed}:gateway")
+		nodes = self._generator.generate_nodes(shape, members_per_guild)
+		guilds = [
+			self._build_guild(
+				GatewayScenario.BASE_SERVER_ID + i,
+				nodes,
+				update_ratio,
+				leave_ratio,
+				uninvited_joins,
+				rng
+			)
+			for i in range(guild_count)
+		]
+
+		return [
+			dispatch
+			for batch in itertools.zip_longest(*guilds)
+			for dispatch in batch
+			if dispatch is not None
+		]
+
+
+	def _build_guild(self,
+		server_id: int,
+		nodes: List[TreeNode],
+		update_ratio: float,
+		leave_ratio: float,
+		uninvited_joins: int,
+		rng: random.Random) -> List[Dispatch]:
+		"""
+		Builds the dispatches for a single guild.
+		@param server_id The ID of the guild.
+		@param nodes The guild's members in the order they join. The first node
+		  must be the owner.
+		@param update_ratio The expected number of nickname changes per join.
+		@param leave_ratio The expected number of departures per join.
+		@param uninvited_joins The number of members that join before any
+		  invite is created.
+		@param rng The random number generator to use.
+		@returns The guild's dispatches, in the order they should be sent.
+		"""
+		owner = nodes[0]
+		dispatches: List[Dispatch] = [("GUILD_CREATE", {
+			"id": str(server_id),
+			"name": f"Synthetic guild {server_id}",
+			"owner_id": str(owner.discord_id),
+			"member_count": 1,
+			"members": [GatewayScenario._make_member(owner, None)]
+		})]
+
+		inviters: Set[int] = {n.inviter.discord_id for n in nodes if n.inviter}
+		members: List[TreeNode] = []
+		leavers: List[TreeNode] = []
+
+		# Index of each member in `members`, used to remove departing members
+		#   in constant time.
+		member_indices: Dict[int, int] = {}
+		last_inviter: Optional[int] = None
+		for i, node in enumerate(nodes[1:]):
+			assert node.inviter
+			timestamp = GatewayScenario._get_timestamp(i)
+			if i >= uninvited_joins and node.inviter.discord_id != last_inviter:
+				last_inviter = node.inviter.discord_id
+				dispatches.append(("INVITE_CREATE", {
+					"guild_id": str(server_id),
+					"code": f"{server_id:x}{i:x}",
+					"created_at": timestamp,
+					"max_age": GatewayScenario.INVITE_MAX_AGE,
+					"inviter": GatewayScenario._make_user(node.inviter)
+				}))
+
+			dispatches.append(("GUILD_MEMBER_ADD", {
+				"guild_id": str(server_id),
+				**GatewayScenario._make_member(node, timestamp)
+			}))
+			member_indices[node.discord_id] = len(members)
+			members.append(node)
+			if node.discord_id not in inviters:
+				leavers.append(node)
+
+			if members and rng.random() < update_ratio:
+				member = rng.choice(members)
+				dispatches.append(("GUILD_MEMBER_UPDATE", {
+					"guild_id": str(server_id),
+					**GatewayScenario._make_member(member, None),
+					"nick": f"{member.discord_username} {i}"
+				}))
+
+			if leavers and rng.random() < leave_ratio:
+				leaver = leavers.pop(rng.randrange(len(leavers)))
+				index = member_indices.pop(leaver.discord_id)
+				last = members.pop()
+				if last is not leaver:
+					members[index] = last
+					member_indices[last.discord_id] = index
+				dispatches.append(("GUILD_MEMBER_REMOVE", {
+					"guild_id": str(server_id),
+					"user": GatewayScenario._make_user(leaver)
+				}))
+
+		return dispatches
+
+
+	@staticmethod
+	def _get_timestamp(index: int) -> str:
+		"""
+		Gets the time that a generated event occurred at.
+		@param index The index of the event within its guild.
+		@returns The time of the event, in ISO 8601 format.
+		"""
+		return (GatewayScenario.START_TIME + timedelta(seconds=index)).isoformat()
+
+
+	@staticmethod
+	def _make_user(node: TreeNode) -> Dict[str, Any]:
+		"""
+		Creates a gateway user object.
+		@param node The node of the user.
+		@returns The user object.
+		"""
+		return {
+			"id": str(node.discord_id),
+			"username": node.discord_username,
+			"discriminator": str(node.discord_discriminator),
+			"global_name": None
+		}
+
+
+	@staticmethod
+	def _make_member(node: TreeNode, joined_at: Optional[str]) -> Dict[str, Any]:
+		"""
+		Creates a gateway guild member object.
+		@param node The node of the member.
+		@param joined_at The time the member joined, in ISO 8601 format.
+		@returns The guild member object.
+		"""
+		return {
+			"user": GatewayScenario._make_user(node),
+			"nick": None,
+			"roles": [],
+			"joined_at": joined_at or GatewayScenario.START_TIME.isoformat()
+		}
+
+
+class GatewayRunResult:
+	"""
+	Stores the outcome of sending a scenario to a client.
+	"""
+	def __init__(self,
+		dispatch_count: int,
+		send_seconds: float,
+		ack_seconds: float,
+		total_seconds: float):
+		"""
+		Initializes a new instance of the class.
+		@param dispatch_count The number of dispatches sent.
+		@param send_seconds The number of seconds taken to send all dispatches.
+		@param ack_seconds The number of seconds from sending the first
+		  dispatch until the client acknowledged that it had received the last
+		  dispatch.
+		@param total_seconds The number of seconds from sending the first
+		  dispatch until the client finished handling every dispatch.
+		"""
+		self.dispatch_count = dispatch_count
+		self.send_seconds = send_seconds
+		self.ack_seconds = ack_seconds
+		self.total_seconds = total_seconds
+
+
+	@property
+	def events_per_second(self) -> float:
+		"""
+		The number of dispatches processed by the client per second.
+		"""
+		return self.dispatch_count / self.total_seconds if self.total_seconds \
+			else 0.0
+
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Converts the result to a JSON-compatible dictionary.
+		"""
+		return {
+			"dispatch_count": self.dispatch_count,
+			"send_seconds": self.send_seconds,
+			"ack_seconds": self.ack_seconds,
+			"total_seconds": self.total_seconds,
+			"events_per_second": self.events_per_second
+		}
+
+
+class FakeGateway:
+	"""
+	Local stand-in for Discord's gateway.
+	Implements enough of the gateway protocol for `ApiDiscordEventsService` to
+	  connect: HELLO, IDENTIFY, READY, and heartbeats. Once the client has
+	  identified, the scenario's dispatches are sent at the configured rate.
+	  After the last dispatch, the gateway requests a heartbeat from the
+	  client. The client reads messages in order, so its reply marks the
+	  point at which every dispatch has been received. The gateway then
+	  closes the connection. Clients that buffer dispatches (e.g. in queues
+	  or in other processes) may not have handled them yet, so the run only
+	  finishes once the client reports that it has finished handling them,
+	  e.g. by exiting.
+	Only a single client connection is served.
+	"""
+	# Heartbeat interval sent to the client, in milliseconds. Matches the
+	#   interval used by Discord.
+	HEARTBEAT_INTERVAL_MS = 41250
+
+	# Number of times per second that paced dispatches are sent.
+	TICKS_PER_SECOND = 100
+
+	def __init__(self,
+		dispatches: List[Dispatch],
+		rate: float,
+		host: str = "127.0.0.1",
+		port: int = 0):
+		"""
+		Initializes a new instance of the class.
+		@param dispatches The dispatches to send to the client.
+		@param rate The number of dispatches to send per second. If 0,
+		  dispatches are sent as fast as the client accepts them.
+		@param host The host to listen on.
+		@param port The port to listen on. If 0, an unused port is chosen.
+		"""
+		# Payloads are encoded up front so that encoding is not measured
+		self._payloads = [
+			json.dumps({"op": GatewayOpcode.DISPATCH, "s": i + 1, "t": t, "d": d})
+			for i, (t, d) in enumerate(dispatches)
+		]
+		self._rate = rate
+		self._host = host
+		self._port = port
+		self._runner: Optional[web.AppRunner] = None
+
+		# Time at which the first dispatch was sent, the time taken to send
+		#   every dispatch, and the time taken until the client acknowledged
+		#   the last dispatch. Set once the client has acknowledged it.
+		self._timings: Optional[asyncio.Future[Tuple[float, float, float]]] = \
+			None
+
+
+	@property
+	def url(self) -> str:
+		"""
+		The URL that clients should connect to.
+		@throws RuntimeError If the gateway has not been started.
+		"""
+		if not self._runner:
+			raise RuntimeError("The gateway has not been started.")
+		host, port = self._runner.addresses[0][:2]
+		return f"ws://{host}:{port}/?v=10&encoding=json"
+
+
+	async def start(self) -> None:
+		"""
+		Starts listening for a client connection.
+		"""
+		self._timings = asyncio.get_running_loop().create_future()
+		app = web.Application()
+		app.router.add_get("/", self._handle)
+		self._runner = web.AppRunner(app, access_log=None)
+		await self._runner.setup()
+		await web.TCPSite(self._runner, self._host, self._port).start()
+		logger.info(f"Fake gateway listening on {self.url}")
+
+
+	async def wait(self,
+		client_finished: Optional[Awaitable[Any]] = None) -> GatewayRunResult:
+		"""
+		Waits until a client has handled every dispatch.
+		@param client_finished Awaitable that completes once the client has
+		  handled every dispatch it received, e.g. the client's process
+		  exiting. If not given, the client is assumed to have handled every
+		  dispatch once it acknowledges the last one.
+		@throws RuntimeError If the gateway has not been started.
+		@returns The outcome of the run.
+		"""
+		if not self._timings:
+			raise RuntimeError("The gateway has not been started.")
+		start, send_seconds, ack_seconds = await self._timings
+		total_seconds = ack_seconds
+		if client_finished is not None:
+			await client_finished
+			total_seconds = time.perf_counter() - start
+		return GatewayRunResult(
+			len(self._payloads),
+			send_seconds,
+			ack_seconds,
+			total_seconds
+		)
+
+
+	async def stop(self) -> None:
+		"""
+		Stops the gateway.
+		"""
+		if self._runner:
+			await self._runner.cleanup()
+			self._runner = None
+
+
+	async def _handle(self, request: web.Request) -> web.WebSocketResponse:
+		"""
+		Serves a single client connection.
+		@param request The connection request.
+		@returns The websocket response.
+		"""
+		ws = web.WebSocketResponse(max_msg_size=0)
+		await ws.prepare(request)
+		await ws.send_json({
+			"op": GatewayOpcode.HELLO,
+			"d": {"heartbeat_interval": FakeGateway.HEARTBEAT_INTERVAL_MS}
+		})
+
+		# Events that are set once the client has identified and once the
+		#   client has received the final dispatch
+		identified = asyncio.Event()
+		finished = asyncio.Event()
+		final_sequence = len(self._payloads)
+
+		async def receive() -> None:
+			async for message in ws:
+				if message.type != aiohttp.WSMsgType.TEXT:
+					continue
+				payload = json.loads(message.data)
+				if payload["op"] == GatewayOpcode.IDENTIFY:
+					identified.set()
+				elif payload["op"] == GatewayOpcode.HEARTBEAT:
+					await ws.send_json({"op": GatewayOpcode.HEARTBEAT_ACK})
+					if payload["d"] == final_sequence:
+						finished.set()
+
+		receiver = asyncio.create_task(receive())
+		try:
+			await identified.wait()
+			await ws.send_json({
+				"op": GatewayOpcode.DISPATCH,
+				"s": None,
+				"t": "READY",
+				"d": {"v": 10, "session_id": "fake", "guilds": []}
+			})
+
+			start = time.perf_counter()
+			await self._send_dispatches(ws)
+			send_seconds = time.perf_counter() - start
+
+			await ws.send_json({"op": GatewayOpcode.HEARTBEAT, "d": None})
+			await finished.wait()
+			ack_seconds = time.perf_counter() - start
+
+			assert self._timings
+			self._timings.set_result((start, send_seconds, ack_seconds))
+			await ws.close()
+		finally:
+			receiver.cancel()
+		return ws
+
+
+	async def _send_dispatches(self, ws: web.WebSocketResponse) -> None:
+		"""
+		Sends every dispatch to the client at the configured rate.
+		@param ws The client connection.
+		"""
+		if not self._rate:
+			for payload in self._payloads:
+				await ws.send_str(payload)
+			return
+
+		# Dispatches are sent in small batches at a fixed tick rate since
+		#   sleeping between individual dispatches is too imprecise
+		start = time.perf_counter()
+		sent = 0
+		while sent < len(self._payloads):
+			due = min(
+				len(self._payloads),
+				int((time.perf_counter() - start) * self._rate) + 1
+			)
+			for payload in self._payloads[sent:due]:
+				await ws.send_str(payload)
+			sent = max(sent, due)
+			await asyncio.sleep(1 / FakeGateway.TICKS_PER_SECOND)
@@ -0,0 +1,231 @@
+from bot.models.dict_family_tree import DictFamilyTree
+from bot.models.tree_node import TreeNode
+import random
+from typing import Callable, Dict, List, Optional
+
+class GuildShape:
+	"""
+	Defines the shapes of invite trees that can be generated.
+	"""
+	# Organic growth where members that have invited many users are more likely
+	#   to invite more users. This results in a power-law inviter fan-out.
+	POWER_LAW = "power_law"
+
+	# Growth dominated by a handful of invite farms, each of which produces a
+	#   long chain of members that each invited the next member.
+	DEEP_CHAIN = "deep_chain"
+
+	# Organic growth that is periodically interrupted by raids, during which a
+	#   single inviter brings in hundreds of accounts in a row.
+	RAID_BURST = "raid_burst"
+
+	# All shapes that may be generated.
+	ALL = (POWER_LAW, DEEP_CHAIN, RAID_BURST)
+
+
+class SyntheticGuildGenerator:
+	"""
+	Generates synthetic guild invite trees for benchmarking purposes.
+	All generated data is deterministic for a given seed so that benchmark runs
+	  may be compared against each other.
+	"""
+	# First user ID assigned to generated users.
+	# Discord user IDs are snowflakes, which are 64-bit integers that increase
+	#   over time. Generated IDs mimic this by increasing for each new user.
+	BASE_USER_ID = 100_000_000_000_000_000
+
+	# Background color assigned to all generated nodes.
+	BACKGROUND_COLOR = "#FFFFFF"
+
+	# Number of invite farms used by the deep chain shape.
+	CHAIN_COUNT = 4
+
+	# Probability that a new member in the deep chain shape extends a chain.
+	CHAIN_PROBABILITY = 0.9
+
+	# Probability that a new member in the raid burst shape starts a raid.
+	RAID_PROBABILITY = 0.002
+
+	# Minimum and maximum number of accounts that join during a single raid.
+	RAID_MIN_SIZE = 50
+	RAID_MAX_SIZE = 500
+
+	# Syllables used to generate usernames.
+	SYLLABLES = (
+		"ka", "zu", "mi", "ro", "te", "la", "shi", "no", "ven", "dor",
+		"el", "ix", "qua", "py", "tor", "bel", "fin", "gal", "ho", "jun"
+	)
+
+	def __init__(self, seed: int = 0):
+		"""
+		Initializes a new instance of the class.
+		@param seed The seed used for the random number generator.
+		"""
+		self._seed = seed
+		self._shapes: Dict[str, Callable[[random.Random, int], List[TreeNode]]] = {
+			GuildShape.POWER_LAW: self._generate_power_law,
+			GuildShape.DEEP_CHAIN: self._generate_deep_chain,
+			GuildShape.RAID_BURST: self._generate_raid_burst
+		}
+
+
+	def generate_nodes(self, shape: str, size: int) -> List[TreeNode]:
+		"""
+		Generates the nodes for a synthetic guild.
+		@param shape The shape of the invite tree to generate. Must be one of
+		  the values defined by `GuildShape`.
+		@param size The total number of nodes to generate, including the root.
+		@throws ValueError If the shape is not recognized or the size is less
+		  than 1.
+		@returns The generated nodes in the order they joined the guild. The
+		  first node is always the root node and every node's inviter always
+		  appears before the node itself.
+		"""
+		if shape not in self._shapes:
+			raise ValueError(f"Unknown guild shape '{shape}'.")
+		if size < 1:
+			raise ValueError("Generated guilds must contain at least one node.")
+
+		rng = random.Random(f"{self._seed}:{shape}:{size}")
+		return self._shapes[shape](rng, size)
+
+
+	def generate_tree(self, shape: str, size: int) -> DictFamilyTree:
+		"""
+		Generates a family tree for a synthetic guild.
+		@param shape The shape of the invite tree to generate. Must be one of
+		  the values defined by `GuildShape`.
+		@param size The total number of nodes to generate, including the root.
+		@returns The generated family tree.
+		"""
+		nodes = self.generate_nodes(shape, size)
+		tree = DictFamilyTree(nodes[0])
+		for node in nodes[1:]:
+			tree.add_node(node)
+		return tree
+
+
+	def _generate_power_law(self, rng: random.Random, size: int) -> List[TreeNode]:
+		"""
+		Generates a guild using preferential attachment.
+		@param rng The random number generator to use.
+		@param size The total number of nodes to generate.
+		@returns The generated nodes in join order.
+		"""
+		nodes = [self._make_node(rng, 0, None)]
+
+		# Each node appears in the pool once when it joins and once more for
+		#   each user it invites. Picking uniformly from the pool therefore
+		#   picks inviters proportionally to (1 + invite count).
+		pool = [nodes[0]]
+		for i in range(1, size):
+			inviter = rng.choice(pool)
+			node = self._make_node(rng, i, inviter)
+			nodes.append(node)
+			pool.append(node)
+			pool.append(inviter)
+		return nodes
+
+
+	def _generate_deep_chain(self, rng: random.Random, size: int) -> List[TreeNode]:
+		"""
+		Generates a guild dominated by a few very deep invite chains.
+		@param rng The random number generator to use.
+		@param size The total number of nodes to generate.
+		@returns The generated nodes in join order.
+		"""
+		nodes = [self._make_node(rng, 0, None)]
+		chain_tails = [nodes[0]] * SyntheticGuildGenerator.CHAIN_COUNT
+		for i in range(1, size):
+			if rng.random() < SyntheticGuildGenerator.CHAIN_PROBABILITY:
+				chain = rng.randrange(len(chain_tails))
+				node = self._make_node(rng, i, chain_tails[chain])
+				chain_tails[chain] = node
+			else:
+				node = self._make_node(rng, i, rng.choice(nodes))
+			nodes.append(node)
+		return nodes
+
+
+	def _generate_raid_burst(self, rng: random.Random, size: int) -> List[TreeNode]:
+		"""
+		Generates a guild with organic growth interrupted by raids.
+		@param rng The random number generator to use.
+		@param size The total number of nodes to generate.
+		@returns The generated nodes in join order.
+		"""
+		nodes = [self._make_node(rng, 0, None)]
+		pool = [nodes[0]]
+		i = 1
+		while i < size:
+			if rng.random() < SyntheticGuildGenerator.RAID_PROBABILITY:
+				# All raid accounts are brought in by a single inviter and share
+				#   a common username prefix
+				inviter = rng.choice(nodes)
+				raid_size = min(
+					rng.randint(
+						SyntheticGuildGenerator.RAID_MIN_SIZE,
+						SyntheticGuildGenerator.RAID_MAX_SIZE
+					),
+					size - i
+				)
+				prefix = self._make_username(rng)
+				for j in range(raid_size):
+					nodes.append(self._make_node(
+						rng,
+						i,
+						inviter,
+						f"{prefix}_{j}"
+					))
+					i += 1
+				continue
+
+			inviter = rng.choice(pool)
+			node = self._make_node(rng, i, inviter)
+			nodes.append(node)
+			pool.append(node)
+			pool.append(inviter)
+			i += 1
+		return nodes
+
+
+	def _make_node(self,
+		rng: random.Random,
+		index: int,
+		inviter: Optional[TreeNode],
+		username: Optional[str] = None) -> TreeNode:
+		"""
+		Creates a node for a generated user.
+		@param rng The random number generator to use.
+		@param index The index of the user within the guild's join order.
+		@param inviter The node of the user that invited the new user.
+		@param username The username to use. If not provided, a random username
+		  will be generated.
+		@returns The created node.
+		"""
+		if username is None:
+			username = f"{self._make_username(rng)}{index}"
+
+		# Most accounts have migrated to unique usernames and therefore have a
+		#   discriminator of 0
+		discriminator = 0 if rng.random() < 0.9 else rng.randint(1, 9999)
+		return TreeNode(
+			SyntheticGuildGenerator.BASE_USER_ID + index,
+			username,
+			discriminator,
+			username.capitalize(),
+			SyntheticGuildGenerator.BACKGROUND_COLOR,
+			inviter
+		)
+
+
+	def _make_username(self, rng: random.Random) -> str:
+		"""
+		Generates a random username.
+		@param rng The random number generator to use.
+		@returns A random username without a numeric suffix.
+		"""
+		return "".join(
+			rng.choice(SyntheticGuildGenerator.SYLLABLES)
+			for _ in range(rng.randint(2, 4))
+		)
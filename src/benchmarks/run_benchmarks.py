@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# Entry point for running family tree benchmarks against synthetic guilds.
+import argparse
+from benchmarks.guild_generator import GuildShape, SyntheticGuildGenerator
+from benchmarks.tree_benchmarks import BenchmarkResult, TreeBenchmarks
+import json
+import logging
+from pathlib import Path
+import platform
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Version of the results file format.
+RESULTS_FORMAT_VERSION = 1
+
+class CliArgs(argparse.Namespace):
+	"""
+	Defines the command line arguments for the benchmark runner.
+	"""
+	# Number of nodes in each generated guild.
+	sizes: List[int]
+
+	# Shapes of the generated guilds.
+	shapes: List[str]
+
+	# Names of the benchmarks to run. If empty, all benchmarks are run.
+	benchmarks: List[str]
+
+	# Number of times to repeat each timed step.
+	repeat: int
+
+	# Number of queries to time for per-query benchmarks.
+	samples: int
+
+	# Seed used to generate synthetic guilds.
+	seed: int
+
+	# Path to write the machine-readable results to. If not set, results are
+	#   written to stdout.
+	output: Optional[str]
+
+	# Path to a previous results file to compare against.
+	baseline: Optional[str]
+
+	# Relative slowdown per operation that is reported as a regression.
+	threshold: float
+
+
+def make_parser(benchmark_names: List[str]) -> argparse.ArgumentParser:
+	"""
+	Creates the argument parser for the benchmark runner.
+	@param benchmark_names The names of all benchmarks that may be run.
+	@returns The argument parser for the benchmark runner.
+	"""
+	parser = argparse.ArgumentParser(
+		description="Runs family tree benchmarks against synthetic guilds."
+	)
+	parser.add_argument(
+		"--sizes",
+		nargs="+",
+		default=[1_000, 10_000, 100_000],
+		type=int,
+		help="The number of nodes in each generated guild."
+	)
+	parser.add_argument(
+		"--shapes",
+		nargs="+",
+		default=list(GuildShape.ALL),
+		choices=list(GuildShape.ALL),
+		help="The shapes of the generated guilds."
+	)
+	parser.add_argument(
+		"--benchmarks",
+		nargs="+",
+		default=[],
+		choices=benchmark_names,
+		help="The benchmarks to run. Runs all benchmarks if not specified."
+	)
+	parser.add_argument(
+		"--repeat",
+		default=3,
+		type=int,
+		help="The number of times to repeat each timed step."
+	)
+	parser.add_argument(
+		"--samples",
+		default=100,
+		type=int,
+		help="The number of queries to time for per-query benchmarks."
+	)
+	parser.add_argument(
+		"--seed",
+		default=0,
+		type=int,
+		help="The seed used to generate synthetic guilds."
+	)
+	parser.add_argument(
+		"--output",
+		"-o",
+		default=None,
+		type=str,
+		help="The path to write results to. Results are written to stdout if "
+			"not specified."
+	)
+	parser.add_argument(
+		"--baseline",
+		default=None,
+		type=str,
+		help="The path to a previous results file to compare against."
+	)
+	parser.add_argument(
+		"--threshold",
+		default=0.25,
+		type=float,
+		help="The relative slowdown per operation that is reported as a "
+			"regression."
+	)
+	return parser
+
+
+def find_regressions(
+	results: List[BenchmarkResult],
+	baseline: List[BenchmarkResult],
+	threshold: float) -> List[str]:
+	"""
+	Compares benchmark results against baseline results.
+	@param results The results of the current run.
+	@param baseline The results to compare against. Results that do not have a
+	  matching baseline result are ignored.
+	@param threshold The relative slowdown per operation that is reported as a
+	  regression.
+	@returns A description of each regression that was found.
+	"""
+	baseline_results = {r.key: r for r in baseline}
+	regressions: List[str] = []
+	for result in results:
+		if result.key not in baseline_results:
+			continue
+
+		expected = baseline_results[result.key].seconds_per_op
+		if expected <= 0:
+			continue
+
+		ratio = result.seconds_per_op / expected
+		if ratio > 1 + threshold:
+			regressions.append(
+				f"{result.name} ({result.shape}, {result.size} nodes): "
+				f"{result.seconds_per_op:.3e}s/op vs {expected:.3e}s/op "
+				f"baseline ({ratio:.2f}x)"
+			)
+	return regressions
+
+
+def load_results(path: Path) -> List[BenchmarkResult]:
+	"""
+	Loads the results stored in a results file.
+	@param path The path to the results file.
+	@returns The results stored in the file.
+	"""
+	with path.open("r") as f:
+		data = json.load(f)
+	return [BenchmarkResult.from_dict(r) for r in data["results"]]
+
+
+def make_results_document(
+	args: CliArgs,
+	results: List[BenchmarkResult]) -> Dict[str, Any]:
+	"""
+	Creates the machine-readable document describing a benchmark run.
+	@param args The command line arguments used for the run.
+	@param results The results of the run.
+	@returns A JSON-compatible dictionary.
+	"""
+	return {
+		"version": RESULTS_FORMAT_VERSION,
+		"metadata": {
+			"python": platform.python_version(),
+			"implementation": platform.python_implementation(),
+			"platform": platform.platform(),
+			"repeat": args.repeat,
+			"samples": args.samples,
+			"seed": args.seed
+		},
+		"results": [r.to_dict() for r in results]
+	}
+
+
+def main(*cli_args: str) -> int:
+	"""
+	Entry point for the benchmark runner.
+	@param cli_args The command line arguments to parse. Should not include the
+	  script name.
+	@returns 0 if no regressions were found, 1 otherwise.
+	"""
+	parser = make_parser(list(TreeBenchmarks.NAMES))
+	args = parser.parse_args(cli_args, namespace=CliArgs())
+	logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+	# Services log every save, which would drown out the benchmark output
+	logging.getLogger("bot").setLevel(logging.WARNING)
+
+	names: List[str] = []
+	for name in args.benchmarks or TreeBenchmarks.NAMES:
+		if TreeBenchmarks.is_available(name):
+			names.append(name)
+		else:
+			logger.warning(
+				f"Skipping {name} since the modules it requires are not installed."
+			)
+
+	with tempfile.TemporaryDirectory() as work_dir:
+		benchmarks = TreeBenchmarks(
+			SyntheticGuildGenerator(args.seed),
+			Path(work_dir),
+			args.repeat,
+			args.samples
+		)
+
+		results: List[BenchmarkResult] = []
+		for size in args.sizes:
+			for shape in args.shapes:
+				for name in names:
+					result = benchmarks.run(name, shape, size)
+					file_size = f", {result.file_size} bytes" \
+						if result.file_size is not None else ""
+					logger.info(
+						f"{name:<30} {shape:<12} {size:>9} nodes: "
+						f"{result.seconds_per_op:.3e}s/op{file_size}"
+					)
+					results.append(result)
+
+	document = make_results_document(args, results)
+	if args.output:
+		with Path(args.output).open("w") as f:
+			json.dump(document, f, indent=2)
+	else:
+		json.dump(document, sys.stdout, indent=2)
+		print()
+
+	if not args.baseline:
+		return 0
+
+	regressions = find_regressions(
+		results,
+		load_results(Path(args.baseline)),
+		args.threshold
+	)
+	for regression in regressions:
+		logger.error(f"Regression: {regression}")
+	return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(*sys.argv[1:]))
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# Entry point for measuring end-to-end event throughput against a fake gateway.
+import argparse
+import asyncio
+from benchmarks.fake_gateway import FakeGateway, GatewayRunResult, GatewayScenario
+from benchmarks.guild_generator import GuildShape, SyntheticGuildGenerator
+from bot.models.family_tree import IFamilyTree
+from bot.services.history.json_lines_history_service import JsonLinesHistoryService
+from bot.services.serialization.json_serialization_service import JsonSerializationService
+from collections import Counter
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Version of the results file format.
+RESULTS_FORMAT_VERSION = 2
+
+class CliArgs(argparse.Namespace):
+	"""
+	Defines the command line arguments for the gateway benchmark.
+	"""
+	# Number of guilds to create.
+	guilds: int
+
+	# Number of members that join each guild, including the owner.
+	members: int
+
+	# Shape of each guild's invite tree.
+	shape: str
+
+	# Number of dispatches to send per second. If 0, dispatches are sent as
+	#   fast as the bot accepts them.
+	rate: float
+
+	# Expected number of nickname changes per join.
+	update_ratio: float
+
+	# Expected number of departures per join.
+	leave_ratio: float
+
+	# Number of members per guild that join before any invite is created.
+	uninvited_joins: int
+
+	# Seed used to generate the scenario.
+	seed: int
+
+	# Whether to record each guild's history and check that replaying it
+	#   reproduces the guild's saved tree.
+	verify_history: bool
+
+	# Path to write the machine-readable results to. If not set, results are
+	#   written to stdout.
+	output: Optional[str]
+
+	# Additional arguments passed to the bot.
+	bot_args: List[str]
+
+
+def make_parser() -> argparse.ArgumentParser:
+	"""
+	Creates the argument parser for the gateway benchmark.
+	@returns The argument parser for the gateway benchmark.
+	"""
+	parser = argparse.ArgumentParser(
+		description="Runs the bot against a local fake Discord gateway and "
+			"measures end-to-end event throughput."
+	)
+	parser.add_argument(
+		"--guilds",
+		default=10,
+		type=int,
+		help="The number of guilds to create."
+	)
+	parser.add_argument(
+		"--members",
+		default=1_000,
+		type=int,
+		help="The number of members that join each guild, including the "
+			"owner."
+	)
+	parser.add_argument(
+		"--shape",
+		default=GuildShape.POWER_LAW,
+		choices=list(GuildShape.ALL),
+		help="The shape of each guild's invite tree."
+	)
+	parser.add_argument(
+		"--rate",
+		default=0,
+		type=float,
+		help="The number of dispatches to send per second. Dispatches are "
+			"sent as fast as the bot accepts them if 0."
+	)
+	parser.add_argument(
+		"--update-ratio",
+		default=0.5,
+		type=float,
+		help="The expected number of nickname changes per join."
+	)
+	parser.add_argument(
+		"--leave-ratio",
+		default=0.1,
+		type=float,
+		help="The expected number of departures per join."
+	)
+	parser.add_argument(
+		"--uninvited-joins",
+		default=0,
+		type=int,
+		help="The number of members per guild that join before any invite "
+			"is created. The bot cannot attribute these joins and must add "
+			"the members under the guild's owner."
+	)
+	parser.add_argument(
+		"--seed",
+		default=0,
+		type=int,
+		help="The seed used to generate the scenario."
+	)
+	parser.add_argument(
+		"--verify-history",
+		action="store_true",
+		help="Records each guild's history and checks that replaying it "
+			"reproduces the guild's saved tree once the run finishes."
+	)
+	parser.add_argument(
+		"--output",
+		"-o",
+		default=None,
+		type=str,
+		help="The path to write results to. Results are written to stdout if "
+			"not specified."
+	)
+	parser.add_argument(
+		"bot_args",
+		nargs=argparse.REMAINDER,
+		help="Additional arguments to pass to the bot, e.g. '--shards 4'."
+	)
+	return parser
+
+
+async def run_benchmark(
+	gateway: FakeGateway,
+	save_path: Path,
+	bot_args: List[str]) -> GatewayRunResult:
+	"""
+	Runs the bot against the fake gateway.
+	@param gateway The gateway to run the bot against.
+	@param save_path The path the bot should save family trees to.
+	@param bot_args Additional arguments to pass to the bot.
+	@returns The outcome of the run.
+	"""
+	await gateway.start()
+
+	# The bot is run in a separate process so that the gateway and the bot do
+	#   not compete for the same interpreter
+	env = dict(os.environ)
+	src_dir = str(Path(__file__).resolve().parent.parent)
+	env["PYTHONPATH"] = os.pathsep.join(
+		p for p in (src_dir, env.get("PYTHONPATH")) if p
+	)
+	bot = await asyncio.create_subprocess_exec(
+		sys.executable,
+		"-m",
+		"bot.family_tree_bot",
+		"--gateway-url",
+		gateway.url,
+		"--save-path",
+		str(save_path),
+		"--log-level",
+		"warning",
+		*bot_args,
+		env=env
+	)
+
+	try:
+		# The bot only exits once it has handled every dispatch, including
+		#   dispatches that were still buffered (e.g. in an event queue or by
+		#   shard workers) when it acknowledged the last one
+		return await gateway.wait(bot.wait())
+	finally:
+		if bot.returncode is None:
+			bot.kill()
+		await gateway.stop()
+
+
+def verify_history(save_path: Path, history_dir: Path) -> List[str]:
+	"""
+	Checks that replaying each guild's history reproduces the guild's tree.
+	@param save_path The path the bot saved family trees to. Trees saved by
+	  shards are checked too.
+	@param history_dir The directory the bot recorded history to.
+	@returns A description of each guild whose history could not be replayed
+	  or did not reproduce the guild's saved tree.
+	"""
+	saved: Dict[int, IFamilyTree] = {}
+	shard_paths = save_path.parent.glob(
+		f"{save_path.stem}.shard-*{save_path.suffix}"
+	)
+	for path in (save_path, *shard_paths):
+		if path.exists():
+			saved.update(JsonSerializationService(path).load_trees())
+
+	history_service = JsonLinesHistoryService(history_dir)
+	timestamp = time.time()
+	failures: List[str] = []
+	for server_id, tree in sorted(saved.items()):
+		try:
+			replayed = history_service.tree_at(server_id, timestamp)
+		except Exception as e:
+			failures.append(f"Guild {server_id}: replay failed: {e!r}")
+			continue
+
+		expected = describe_nodes(tree)
+		actual = describe_nodes(replayed)
+		differing = sum(
+			1 for user_id in expected.keys() | actual.keys()
+			if expected.get(user_id) != actual.get(user_id)
+		)
+		if differing:
+			failures.append(
+				f"Guild {server_id}: {differing} nodes differ after replay."
+			)
+	logger.info(
+		f"Replayed the history of {len(saved)} guilds; "
+		f"{len(failures)} did not match."
+	)
+	return failures
+
+
+def describe_nodes(
+	tree: IFamilyTree) -> Dict[int, Tuple[Optional[int], str, str]]:
+	"""
+	Gets the state of each node in a tree that its history must reproduce.
+	@param tree The tree to describe.
+	@returns The inviter's user ID, nickname, and background color of each
+	  node, indexed by user ID.
+	"""
+	return {
+		node.discord_id: (
+			node.inviter.discord_id if node.inviter else None,
+			node.user_nickname,
+			node.background_color
+		)
+		for node in tree.get_view()
+	}
+
+
+def main(*cli_args: str) -> int:
+	"""
+	Entry point for the gateway benchmark.
+	@param cli_args The command line arguments to parse. Should not include the
+	  script name.
+	@returns 0 on success.
+	"""
+	parser = make_parser()
+	args = parser.parse_args(cli_args, namespace=CliArgs())
+	logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+	scenario = GatewayScenario(SyntheticGuildGenerator(args.seed), args.seed)
+	dispatches = scenario.build(
+		args.shape,
+		args.guilds,
+		args.members,
+		args.update_ratio,
+		args.leave_ratio,
+		args.uninvited_joins
+	)
+	counts = Counter(event_type for event_type, _ in dispatches)
+	logger.info(
+		f"Generated {len(dispatches)} dispatches: " +
+		", ".join(f"{count} {t}" for t, count in sorted(counts.items()))
+	)
+
+	history_failures: List[str] = []
+	with tempfile.TemporaryDirectory() as work_dir:
+		save_path = Path(work_dir) / "trees.json"
+		history_dir = Path(work_dir) / "history"
+		# Bot arguments that look like options must follow a `--` separator,
+		#   which argparse keeps
+		bot_args = args.bot_args[1:] if args.bot_args[:1] == ["--"] \
+			else list(args.bot_args)
+		if args.verify_history:
+			bot_args += ["--history-dir", str(history_dir)]
+		result = asyncio.run(run_benchmark(
+			FakeGateway(dispatches, args.rate),
+			save_path,
+			bot_args
+		))
+		if args.verify_history:
+			history_failures = verify_history(save_path, history_dir)
+			for failure in history_failures:
+				logger.error(failure)
+
+	logger.info(
+		f"Processed {result.dispatch_count} dispatches in "
+		f"{result.total_seconds:.3f}s ({result.events_per_second:,.0f} "
+		f"events/s); sending took {result.send_seconds:.3f}s and the last "
+		f"dispatch was acknowledged after {result.ack_seconds:.3f}s."
+	)
+
+	document: Dict[str, Any] = {
+		"version": RESULTS_FORMAT_VERSION,
+		"metadata": {
+			"python": platform.python_version(),
+			"implementation": platform.python_implementation(),
+			"platform": platform.platform(),
+			"guilds": args.guilds,
+			"members": args.members,
+			"shape": args.shape,
+			"rate": args.rate,
+			"update_ratio": args.update_ratio,
+			"leave_ratio": args.leave_ratio,
+			"uninvited_joins": args.uninvited_joins,
+			"seed": args.seed,
+			"verify_history": args.verify_history,
+			"bot_args": args.bot_args
+		},
+		"dispatch_counts": dict(counts),
+		"result": result.to_dict()
+	}
+	if args.verify_history:
+		document["history_failures"] = history_failures
+	if args.output:
+		with Path(args.output).open("w") as f:
+			json.dump(document, f, indent=2)
+	else:
+		json.dump(document, sys.stdout, indent=2)
+		print()
+	return 1 if history_failures else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(*sys.argv[1:]))
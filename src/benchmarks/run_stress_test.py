@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Entry point for stress testing concurrent access to family trees.
+import argparse
+from benchmarks.guild_generator import SyntheticGuildGenerator
+from benchmarks.tree_stress_test import TreeStressTest
+from bot.services.family_tree.dict_family_tree_service import DictFamilyTreeService
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+class CliArgs(argparse.Namespace):
+	"""
+	Defines the command line arguments for the stress test.
+	"""
+	# Number of guilds to create.
+	guilds: int
+
+	# Number of members each guild starts with, including the owner.
+	members: int
+
+	# Number of worker threads.
+	threads: int
+
+	# Total number of operations to perform.
+	operations: int
+
+	# Seed used to generate guilds and pick operations.
+	seed: int
+
+	# If enabled, trees are not guarded by locks. Used to check that the
+	#   stress test detects races.
+	unsafe: bool
+
+
+def make_parser() -> argparse.ArgumentParser:
+	"""
+	Creates the argument parser for the stress test.
+	@returns The argument parser for the stress test.
+	"""
+	parser = argparse.ArgumentParser(
+		description="Hammers many family trees from a pool of threads and "
+			"checks that every tree is still consistent afterwards."
+	)
+	parser.add_argument(
+		"--guilds",
+		default=16,
+		type=int,
+		help="The number of guilds to create."
+	)
+	parser.add_argument(
+		"--members",
+		default=500,
+		type=int,
+		help="The number of members each guild starts with, including the "
+			"owner."
+	)
+	parser.add_argument(
+		"--threads",
+		default=8,
+		type=int,
+		help="The number of worker threads."
+	)
+	parser.add_argument(
+		"--operations",
+		default=100_000,
+		type=int,
+		help="The total number of operations to perform."
+	)
+	parser.add_argument(
+		"--seed",
+		default=0,
+		type=int,
+		help="The seed used to generate guilds and pick operations."
+	)
+	parser.add_argument(
+		"--unsafe",
+		action="store_true",
+		help="If enabled, trees are not guarded by locks. Used to check that "
+			"the stress test detects races."
+	)
+	return parser
+
+
+def main(*cli_args: str) -> int:
+	"""
+	Entry point for the stress test.
+	@param cli_args The command line arguments to parse. Should not include the
+	  script name.
+	@returns 0 if no failures were detected, 1 otherwise.
+	"""
+	parser = make_parser()
+	args = parser.parse_args(cli_args, namespace=CliArgs())
+	logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+	stress_test = TreeStressTest(
+		DictFamilyTreeService(thread_safe=not args.unsafe),
+		SyntheticGuildGenerator(args.seed),
+		args.guilds,
+		args.members,
+		args.seed
+	)
+	seconds = stress_test.run(args.threads, args.operations)
+	logger.info(
+		f"Performed {args.operations} operations on {args.threads} threads "
+		f"in {seconds:.3f}s ({args.operations / seconds:,.0f} ops/s)."
+	)
+
+	stress_test.check_invariants()
+	if stress_test.failures:
+		logger.error(f"Detected {len(stress_test.failures)} failures.")
+		return 1
+	logger.info("All invariants hold.")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main(*sys.argv[1:]))
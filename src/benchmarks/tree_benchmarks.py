@@ -0,0 +1,915 @@
+from __future__ import annotations
+from benchmarks.guild_generator import SyntheticGuildGenerator
+from bot.models.dict_family_tree import DictFamilyTree
+from bot.models.family_tree_diff import FamilyTreeDiff
+from bot.models.local_user import LocalUser
+from bot.models.membership_reconciler import MembershipReconciler
+from bot.models.tree_layout import TreeLayout
+from bot.models.tree_node import TreeNode
+from bot.services.serialization.json_serialization_service import JsonSerializationService
+from bot.services.serialization.mapped_serialization_service import MappedSerializationService
+from bot.util.file_compression import FileCompression
+import os
+from pathlib import Path
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class BenchmarkResult:
+	"""
+	Stores the timing data for a single benchmark.
+	"""
+	def __init__(self,
+		name: str,
+		shape: str,
+		size: int,
+		operations: int,
+		seconds: float,
+		file_size: Optional[int] = None):
+		"""
+		Initializes a new instance of the class.
+		@param name The name of the benchmark.
+		@param shape The shape of the guild the benchmark was run against.
+		@param size The number of nodes in the guild.
+		@param operations The number of operations performed in the timed
+		  section of the benchmark.
+		@param seconds The fastest time taken to perform all operations.
+		@param file_size The number of bytes written to disk, for benchmarks
+		  that write files.
+		"""
+		self._name = name
+		self._shape = shape
+		self._size = size
+		self._operations = operations
+		self._seconds = seconds
+		self._file_size = file_size
+
+
+	@property
+	def key(self) -> Tuple[str, str, int]:
+		"""
+		Gets the key used to match the result against baseline results.
+		"""
+		return (self._name, self._shape, self._size)
+
+
+	@property
+	def name(self) -> str:
+		"""
+		Gets the name of the benchmark.
+		"""
+		return self._name
+
+
+	@property
+	def shape(self) -> str:
+		"""
+		Gets the shape of the guild the benchmark was run against.
+		"""
+		return self._shape
+
+
+	@property
+	def size(self) -> int:
+		"""
+		Gets the number of nodes in the guild.
+		"""
+		return self._size
+
+
+	@property
+	def operations(self) -> int:
+		"""
+		Gets the number of operations performed in the timed section.
+		"""
+		return self._operations
+
+
+	@property
+	def seconds(self) -> float:
+		"""
+		Gets the fastest time taken to perform all operations.
+		"""
+		return self._seconds
+
+
+	@property
+	def file_size(self) -> Optional[int]:
+		"""
+		Gets the number of bytes written to disk, or None if the benchmark
+		  does not write files.
+		"""
+		return self._file_size
+
+
+	@property
+	def seconds_per_op(self) -> float:
+		"""
+		Gets the average time taken to perform a single operation.
+		"""
+		return self._seconds / max(self._operations, 1)
+
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""
+		Converts the result to a JSON-compatible dictionary.
+		"""
+		data: Dict[str, Any] = {
+			"name": self._name,
+			"shape": self._shape,
+			"size": self._size,
+			"operations": self._operations,
+			"seconds": self._seconds,
+			"seconds_per_op": self.seconds_per_op
+		}
+		if self._file_size is not None:
+			data["file_size"] = self._file_size
+		return data
+
+
+	@staticmethod
+	def from_dict(data: Dict[str, Any]) -> BenchmarkResult:
+		"""
+		Creates a result from a dictionary created by `to_dict()`.
+		@param data The dictionary to convert.
+		@returns The result stored in the dictionary.
+		"""
+		return BenchmarkResult(
+			str(data["name"]),
+			str(data["shape"]),
+			int(data["size"]),
+			int(data["operations"]),
+			float(data["seconds"]),
+			int(data["file_size"]) if "file_size" in data else None
+		)
+
+
+class TreeBenchmarks:
+	"""
+	Times family tree operations against synthetic guilds.
+	Each benchmark is split into an untimed setup step and a timed step. The
+	  timed step is repeated several times and the fastest run is reported to
+	  reduce noise from other processes.
+	"""
+	# Number of trees that the guild is split into by the parallel load
+	#   benchmark.
+	PARALLEL_LOAD_GUILDS = 16
+
+	# Fraction of the guild's nodes removed by the bulk removal benchmarks,
+	#   e.g. accounts purged after a raid.
+	PURGE_FRACTION = 0.1
+
+	# Names of all benchmarks that may be run.
+	NAMES = (
+		"add_node",
+		"find_node_by_user_id",
+		"find_node_by_username",
+		"remove_node",
+		"remove_nodes",
+		"remove_nodes_one_by_one",
+		"view_filter_by_nickname",
+		"view_filter_by_discriminator",
+		"view_filter_to_child_nodes",
+		"get_distance",
+		"is_descendant",
+		"get_top_inviters",
+		"search",
+		"snapshot",
+		"diff",
+		"reconcile",
+		"layout",
+		"relayout",
+		"json_save_tree",
+		"json_load_trees",
+		"gzip_save_tree",
+		"gzip_load_trees",
+		"zstd_save_tree",
+		"zstd_load_trees",
+		"parallel_load_trees",
+		"mapped_load_trees"
+	)
+
+	def __init__(self,
+		generator: SyntheticGuildGenerator,
+		work_dir: Path,
+		repeat: int = 3,
+		samples: int = 100):
+		"""
+		Initializes a new instance of the class.
+		@param generator The generator used to create synthetic guilds.
+		@param work_dir Directory that serialization benchmarks may write to.
+		@param repeat The number of times to repeat each timed step.
+		@param samples The number of lookups, removals, or filters to perform
+		  for benchmarks that time individual queries.
+		"""
+		self._generator = generator
+		self._work_dir = work_dir
+		self._repeat = repeat
+		self._samples = samples
+
+		# Maps benchmark names to the functions that run them.
+		self._benchmarks: Dict[str, Callable[[str, int], BenchmarkResult]] = {
+			name: getattr(self, f"_bench_{name}")
+			for name in TreeBenchmarks.NAMES
+		}
+
+
+	@staticmethod
+	def is_available(name: str) -> bool:
+		"""
+		Checks whether the modules required by a benchmark are installed.
+		@param name The name of the benchmark.
+		@returns True if the benchmark can be run.
+		"""
+		if name.startswith(f"{FileCompression.ZSTD}_"):
+			return FileCompression.is_available(FileCompression.ZSTD)
+		return True
+
+
+	def run(self, name: str, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Runs a single benchmark.
+		@param name The name of the benchmark to run.
+		@param shape The shape of the guild to run the benchmark against.
+		@param size The number of nodes in the guild.
+		@throws KeyError If the benchmark does not exist.
+		@returns The timing data for the benchmark.
+		"""
+		return self._benchmarks[name](shape, size)
+
+
+	def _time(self,
+		setup: Callable[[], Any],
+		timed: Callable[[Any], int]) -> Tuple[int, float]:
+		"""
+		Times a benchmark step.
+		@param setup Function called before each timed run. The value returned
+		  by this function is passed to the timed function.
+		@param timed Function to time. Must return the number of operations
+		  that were performed.
+		@returns The number of operations performed and the fastest time taken
+		  by the timed function.
+		"""
+		best = float("inf")
+		operations = 0
+		for _ in range(self._repeat):
+			state = setup()
+			start = time.perf_counter()
+			operations = timed(state)
+			best = min(best, time.perf_counter() - start)
+		return operations, best
+
+
+	def _sample_nodes(self, nodes: List[TreeNode], include_root: bool) -> List[TreeNode]:
+		"""
+		Picks a deterministic sample of nodes to run queries against.
+		@param nodes The nodes to sample from. The first node must be the root.
+		@param include_root Whether the root node may be included in the sample.
+		@returns The sampled nodes.
+		"""
+		candidates = nodes if include_root else nodes[1:]
+		count = min(self._samples, len(candidates))
+		return random.Random(len(nodes)).sample(candidates, count)
+
+
+	def _make_tree(self, nodes: List[TreeNode]) -> DictFamilyTree:
+		"""
+		Builds a tree from generated nodes.
+		@param nodes The nodes to add to the tree, in join order.
+		@returns The tree containing all nodes.
+		"""
+		tree = DictFamilyTree(nodes[0])
+		for node in nodes[1:]:
+			tree.add_node(node)
+		return tree
+
+
+	def _bench_add_node(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times adding every node of a guild to an empty tree.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+
+		def timed(_: Any) -> int:
+			self._make_tree(nodes)
+			return len(nodes) - 1
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult("add_node", shape, size, operations, seconds)
+
+
+	def _bench_find_node_by_user_id(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times looking up a sample of nodes by user ID.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		tree = self._make_tree(nodes)
+		user_ids = [n.discord_id for n in self._sample_nodes(nodes, True)]
+
+		def timed(_: Any) -> int:
+			for user_id in user_ids:
+				tree.find_node_by_user_id(user_id)
+			return len(user_ids)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult(
+			"find_node_by_user_id",
+			shape,
+			size,
+			operations,
+			seconds
+		)
+
+
+	def _bench_find_node_by_username(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times looking up a sample of nodes by username.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		tree = self._make_tree(nodes)
+		usernames = [
+			(n.discord_username, n.discord_discriminator)
+			for n in self._sample_nodes(nodes, True)
+		]
+
+		def timed(_: Any) -> int:
+			for username, discriminator in usernames:
+				tree.find_node_by_username(username, discriminator)
+			return len(usernames)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult(
+			"find_node_by_username",
+			shape,
+			size,
+			operations,
+			seconds
+		)
+
+
+	def _bench_remove_node(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times removing a sample of nodes from the tree.
+		"""
+		def setup() -> Tuple[DictFamilyTree, List[TreeNode]]:
+			# Removing nodes re-parents their children, so each run needs a
+			#   freshly generated set of nodes
+			nodes = self._generator.generate_nodes(shape, size)
+			return self._make_tree(nodes), self._sample_nodes(nodes, False)
+
+		def timed(state: Tuple[DictFamilyTree, List[TreeNode]]) -> int:
+			tree, removed = state
+			for node in removed:
+				tree.remove_node(node)
+			return len(removed)
+
+		operations, seconds = self._time(setup, timed)
+		return BenchmarkResult("remove_node", shape, size, operations, seconds)
+
+
+	def _bench_remove_nodes(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times purging a fraction of the guild's nodes with a single call.
+		"""
+		return self._bench_purge("remove_nodes", shape, size, True)
+
+
+	def _bench_remove_nodes_one_by_one(self,
+		shape: str,
+		size: int) -> BenchmarkResult:
+		"""
+		Times purging the same nodes as `remove_nodes` one node at a time.
+		"""
+		return self._bench_purge("remove_nodes_one_by_one", shape, size, False)
+
+
+	def _bench_purge(self,
+		name: str,
+		shape: str,
+		size: int,
+		bulk: bool) -> BenchmarkResult:
+		"""
+		Times removing `PURGE_FRACTION` of a guild's nodes in a batch.
+		The tree's indices are built before timing starts since a guild being
+		  purged has usually been searched and displayed.
+		@param name The name of the benchmark.
+		@param shape The shape of the guild.
+		@param size The number of nodes in the guild.
+		@param bulk Whether to remove the nodes with `remove_nodes()` instead of
+		  calling `remove_node()` for each node.
+		"""
+		def setup() -> Tuple[DictFamilyTree, List[TreeNode]]:
+			nodes = self._generator.generate_nodes(shape, size)
+			tree = DictFamilyTree.from_nodes(nodes)
+			tree.search(nodes[0].user_nickname, 1)
+			tree.snapshot()
+			tree.get_descendant_count(nodes[0])
+			count = int((len(nodes) - 1) * TreeBenchmarks.PURGE_FRACTION)
+			return tree, random.Random(len(nodes)).sample(nodes[1:], count)
+
+		def timed(state: Tuple[DictFamilyTree, List[TreeNode]]) -> int:
+			tree, removed = state
+			if bulk:
+				tree.remove_nodes(removed)
+			else:
+				with tree.batch() as batch:
+					for node in removed:
+						batch.remove_node(node)
+			return len(removed)
+
+		operations, seconds = self._time(setup, timed)
+		return BenchmarkResult(name, shape, size, operations, seconds)
+
+
+	def _bench_view_filter_by_nickname(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times filtering the tree's view by a sample of nicknames.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		view = self._make_tree(nodes).get_view()
+		nicknames = [n.user_nickname for n in self._sample_nodes(nodes, True)]
+
+		def timed(_: Any) -> int:
+			for nickname in nicknames:
+				len(view.filter_by_nickname(nickname))
+			return len(nicknames)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult(
+			"view_filter_by_nickname",
+			shape,
+			size,
+			operations,
+			seconds
+		)
+
+
+	def _bench_view_filter_by_discriminator(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times filtering the tree's view by a sample of discriminators.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		view = self._make_tree(nodes).get_view()
+		discriminators = [
+			n.discord_discriminator for n in self._sample_nodes(nodes, True)
+		]
+
+		def timed(_: Any) -> int:
+			for discriminator in discriminators:
+				len(view.filter_by_discriminator(discriminator))
+			return len(discriminators)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult(
+			"view_filter_by_discriminator",
+			shape,
+			size,
+			operations,
+			seconds
+		)
+
+
+	def _bench_view_filter_to_child_nodes(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times filtering the tree's view to the children of a sample of nodes.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		view = self._make_tree(nodes).get_view()
+		parents = self._sample_nodes(nodes, True)
+
+		def timed(_: Any) -> int:
+			for parent in parents:
+				len(view.filter_to_child_nodes(parent))
+			return len(parents)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult(
+			"view_filter_to_child_nodes",
+			shape,
+			size,
+			operations,
+			seconds
+		)
+
+
+	def _bench_get_distance(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times finding the distance between a sample of pairs of nodes.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		tree = self._make_tree(nodes)
+		pairs = list(zip(
+			self._sample_nodes(nodes, True),
+			reversed(self._sample_nodes(nodes, True))
+		))
+
+		# Build the tree's indices before timing so that only queries are timed
+		tree.get_distance(nodes[0], nodes[-1])
+
+		def timed(_: Any) -> int:
+			for node_a, node_b in pairs:
+				tree.get_distance(node_a, node_b)
+			return len(pairs)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult("get_distance", shape, size, operations, seconds)
+
+
+	def _bench_is_descendant(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times checking whether nodes in a sample of pairs are descendants.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		tree = self._make_tree(nodes)
+		pairs = list(zip(
+			self._sample_nodes(nodes, True),
+			reversed(self._sample_nodes(nodes, True))
+		))
+
+		# Build the subtree index before timing so that only queries are timed
+		tree.is_descendant(nodes[-1], nodes[0])
+
+		def timed(_: Any) -> int:
+			for node, ancestor in pairs:
+				tree.is_descendant(node, ancestor)
+			return len(pairs)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult("is_descendant", shape, size, operations, seconds)
+
+
+	def _bench_get_top_inviters(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times getting the top 25 users by direct and by transitive invites.
+		"""
+		tree = self._make_tree(self._generator.generate_nodes(shape, size))
+
+		def timed(_: Any) -> int:
+			for _ in range(self._samples):
+				tree.get_top_inviters(25)
+				tree.get_top_inviters(25, True)
+			return 2 * self._samples
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult(
+			"get_top_inviters",
+			shape,
+			size,
+			operations,
+			seconds
+		)
+
+
+	def _bench_search(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times searching for a sample of nicknames by prefix and with a typo.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		tree = self._make_tree(nodes)
+		queries: List[str] = []
+		for node in self._sample_nodes(nodes, True):
+			nickname = node.user_nickname
+			queries.append(nickname[:3])
+			queries.append(nickname[:1] + "x" + nickname[2:])
+
+		# Build the search index before timing
+		tree.search("", 1)
+
+		def timed(_: Any) -> int:
+			for query in queries:
+				tree.search(query, 25)
+			return len(queries)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult("search", shape, size, operations, seconds)
+
+
+	def _bench_snapshot(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times changing a sample of nicknames and taking a snapshot after each
+		  change.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		tree = self._make_tree(nodes)
+		sample = self._sample_nodes(nodes, True)
+
+		# The first snapshot builds the persistent map, which is not timed
+		tree.snapshot()
+
+		def timed(_: Any) -> int:
+			for i, node in enumerate(sample):
+				tree.update_nickname(node, f"Snapshot{i}")
+				tree.snapshot()
+			return len(sample)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult("snapshot", shape, size, operations, seconds)
+
+
+	def _bench_diff(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times finding the changes between two snapshots of a tree after
+		  changing a sample of nicknames.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		tree = self._make_tree(nodes)
+		sample = self._sample_nodes(nodes, True)
+		old = tree.snapshot()
+		for i, node in enumerate(sample):
+			tree.update_nickname(node, f"Diff{i}")
+		new = tree.snapshot()
+
+		def timed(_: Any) -> int:
+			diff = FamilyTreeDiff.between(old, new)
+			assert len(diff.renamed) == len(sample)
+			return len(sample)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult("diff", shape, size, operations, seconds)
+
+
+	def _bench_reconcile(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times reconciling a tree against a member list in which 1% of the
+		  tree's users left, 1% changed their nickname, and 1% more users
+		  joined.
+		"""
+		changes = max(1, size // 100)
+		reconciler = MembershipReconciler("#FFFFFF")
+
+		def setup() -> Tuple[DictFamilyTree, List[LocalUser]]:
+			# Reconciling modifies the tree's nodes, so each run needs a freshly
+			#   generated set of nodes
+			nodes = self._generator.generate_nodes(shape, size)
+			users = [
+				LocalUser(
+					node.discord_id,
+					node.discord_username,
+					node.discord_discriminator,
+					node.user_nickname
+				)
+				for node in nodes[changes + 1:]
+			]
+			users.append(LocalUser(
+				nodes[0].discord_id,
+				nodes[0].discord_username,
+				nodes[0].discord_discriminator,
+				nodes[0].user_nickname
+			))
+			for i in range(changes):
+				user = users[i]
+				users[i] = LocalUser(
+					user.user_id,
+					user.username,
+					user.discriminator,
+					f"Renamed{i}"
+				)
+			next_id = max(node.discord_id for node in nodes) + 1
+			users.extend(
+				LocalUser(next_id + i, f"joined{i}", 0, f"Joined{i}")
+				for i in range(changes)
+			)
+			return self._make_tree(nodes), users
+
+		def timed(state: Tuple[DictFamilyTree, List[LocalUser]]) -> int:
+			tree, users = state
+			result = reconciler.reconcile(tree, users)
+			assert len(result.added) == changes
+			return len(users)
+
+		operations, seconds = self._time(setup, timed)
+		return BenchmarkResult("reconcile", shape, size, operations, seconds)
+
+
+	def _bench_layout(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times laying out an entire tree.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		tree = DictFamilyTree.from_nodes(nodes)
+
+		def timed(_: Any) -> int:
+			TreeLayout(tree).update()
+			return len(nodes)
+
+		operations, seconds = self._time(lambda: None, timed)
+		return BenchmarkResult("layout", shape, size, operations, seconds)
+
+
+	def _bench_relayout(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times adding a sample of users to a laid out tree and updating the
+		  layout after each join. Compare against `layout` to see the cost of
+		  laying out the whole tree again after each change.
+		"""
+		nodes = self._generator.generate_nodes(shape, size)
+		inviters = self._sample_nodes(nodes, True)
+		next_id = max(node.discord_id for node in nodes) + 1
+
+		def setup() -> Tuple[DictFamilyTree, TreeLayout]:
+			# Joining modifies the tree, so each run needs a fresh tree
+			tree = DictFamilyTree.from_nodes(nodes)
+			layout = TreeLayout(tree)
+			layout.update()
+			return tree, layout
+
+		def timed(state: Tuple[DictFamilyTree, TreeLayout]) -> int:
+			tree, layout = state
+			for i, inviter in enumerate(inviters):
+				tree.add_node(TreeNode(
+					next_id + i,
+					f"joined{i}",
+					0,
+					f"Joined{i}",
+					"#FFFFFF",
+					inviter
+				))
+				layout.update()
+			return len(inviters)
+
+		operations, seconds = self._time(setup, timed)
+		return BenchmarkResult("relayout", shape, size, operations, seconds)
+
+
+	def _bench_json_save_tree(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times saving a tree to an empty save file.
+		"""
+		return self._bench_save_tree("json_save_tree", FileCompression.NONE,
+			shape, size)
+
+
+	def _bench_json_load_trees(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times loading a save file containing a single tree.
+		"""
+		return self._bench_load_trees("json_load_trees", FileCompression.NONE,
+			shape, size)
+
+
+	def _bench_gzip_save_tree(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times saving a tree to an empty gzip compressed save file.
+		"""
+		return self._bench_save_tree("gzip_save_tree", FileCompression.GZIP,
+			shape, size)
+
+
+	def _bench_gzip_load_trees(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times loading a gzip compressed save file containing a single tree.
+		"""
+		return self._bench_load_trees("gzip_load_trees", FileCompression.GZIP,
+			shape, size)
+
+
+	def _bench_zstd_save_tree(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times saving a tree to an empty zstd compressed save file.
+		"""
+		return self._bench_save_tree("zstd_save_tree", FileCompression.ZSTD,
+			shape, size)
+
+
+	def _bench_zstd_load_trees(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times loading a zstd compressed save file containing a single tree.
+		"""
+		return self._bench_load_trees("zstd_load_trees", FileCompression.ZSTD,
+			shape, size)
+
+
+	def _bench_save_tree(self,
+		name: str,
+		compression: str,
+		shape: str,
+		size: int) -> BenchmarkResult:
+		"""
+		Times saving a tree to an empty save file.
+		@param name The name of the benchmark.
+		@param compression The format to write the save file in.
+		@param shape The shape of the guild to save.
+		@param size The number of nodes in the guild.
+		@returns The timing data and size of the save file.
+		"""
+		tree = self._generator.generate_tree(shape, size)
+		save_path = self._work_dir / f"save-{shape}-{size}.json"
+
+		def setup() -> JsonSerializationService:
+			save_path.unlink(missing_ok=True)
+			return JsonSerializationService(save_path, compression=compression)
+
+		def timed(service: JsonSerializationService) -> int:
+			service.save_tree(0, tree)
+			return 1
+
+		operations, seconds = self._time(setup, timed)
+		file_size = save_path.stat().st_size
+		save_path.unlink(missing_ok=True)
+		return BenchmarkResult(name, shape, size, operations, seconds, file_size)
+
+
+	def _bench_load_trees(self,
+		name: str,
+		compression: str,
+		shape: str,
+		size: int) -> BenchmarkResult:
+		"""
+		Times loading a save file containing a single tree.
+		@param name The name of the benchmark.
+		@param compression The format to write the save file in.
+		@param shape The shape of the guild to load.
+		@param size The number of nodes in the guild.
+		@returns The timing data and size of the save file.
+		"""
+		save_path = self._work_dir / f"load-{shape}-{size}.json"
+		save_path.unlink(missing_ok=True)
+		service = JsonSerializationService(save_path, compression=compression)
+		service.save_tree(0, self._generator.generate_tree(shape, size))
+
+		def timed(_: Any) -> int:
+			service.load_trees()
+			return 1
+
+		operations, seconds = self._time(lambda: None, timed)
+		file_size = save_path.stat().st_size
+		save_path.unlink(missing_ok=True)
+		return BenchmarkResult(name, shape, size, operations, seconds, file_size)
+
+
+	def _bench_parallel_load_trees(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times loading a save file containing the guild split into 16 trees
+		  using one worker process per core.
+		"""
+		save_path = self._work_dir / f"parallel-load-{shape}-{size}.json"
+		save_path.unlink(missing_ok=True)
+		guilds = TreeBenchmarks.PARALLEL_LOAD_GUILDS
+		JsonSerializationService._write(save_path, {
+			server_id: JsonSerializationService._tree_to_list(
+				self._generator.generate_tree(shape, max(1, size // guilds))
+			)
+			for server_id in range(guilds)
+		})
+		service = JsonSerializationService(save_path, max(2, os.cpu_count() or 1))
+
+		def timed(_: Any) -> int:
+			assert len(service.load_trees()) == guilds
+			return 1
+
+		operations, seconds = self._time(lambda: None, timed)
+		save_path.unlink(missing_ok=True)
+		return BenchmarkResult(
+			"parallel_load_trees",
+			shape,
+			size,
+			operations,
+			seconds
+		)
+
+
+	def _bench_mapped_load_trees(self, shape: str, size: int) -> BenchmarkResult:
+		"""
+		Times loading the same save file as `parallel_load_trees` from an up to
+		  date memory-mapped snapshot and looking up the root of each tree.
+		"""
+		save_path = self._work_dir / f"mapped-load-{shape}-{size}.json"
+		snapshot_path = self._work_dir / f"mapped-load-{shape}-{size}.snap"
+		save_path.unlink(missing_ok=True)
+		snapshot_path.unlink(missing_ok=True)
+		guilds = TreeBenchmarks.PARALLEL_LOAD_GUILDS
+		roots: Dict[int, int] = {}
+		trees: Dict[int, List[Dict[str, Any]]] = {}
+		for server_id in range(guilds):
+			tree = self._generator.generate_tree(shape, max(1, size // guilds))
+			roots[server_id] = next(iter(tree.get_view())).discord_id
+			trees[server_id] = JsonSerializationService._tree_to_list(tree)
+		JsonSerializationService._write(save_path, trees)
+		del trees
+
+		def make_service() -> MappedSerializationService:
+			return MappedSerializationService(
+				JsonSerializationService(save_path),
+				save_path,
+				snapshot_path
+			)
+
+		# The first load writes the snapshot
+		make_service().load_trees()
+
+		def timed(_: Any) -> int:
+			loaded = make_service().load_trees()
+			for server_id, root_id in roots.items():
+				loaded[server_id].find_node_by_user_id(root_id)
+			return 1
+
+		operations, seconds = self._time(lambda: None, timed)
+		save_path.unlink(missing_ok=True)
+		snapshot_path.unlink(missing_ok=True)
+		return BenchmarkResult(
+			"mapped_load_trees",
+			shape,
+			size,
+			operations,
+			seconds
+		)
@@ -0,0 +1,413 @@
+from benchmarks.guild_generator import SyntheticGuildGenerator
+from bot.models.family_tree import IFamilyTree
+from bot.models.tree_node import TreeNode
+from bot.services.family_tree.dict_family_tree_service import DictFamilyTreeService
+from collections import Counter
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class GuildState:
+	"""
+	Tracks the members that the stress test expects a guild's tree to contain.
+	Worker threads reserve members before operating on them so that two
+	  threads never operate on the same member at once (e.g. one thread
+	  removing a member while another thread uses it as an inviter). Any
+	  failure is therefore caused by the tree rather than by the test.
+	"""
+	def __init__(self, server_id: int, nodes: List[TreeNode]):
+		"""
+		Initializes a new instance of the class.
+		@param server_id The ID of the guild.
+		@param nodes The nodes initially in the guild's tree. The first node
+		  must be the root node.
+		"""
+		self.server_id = server_id
+		self.root_node = nodes[0]
+		self._lock = threading.Lock()
+
+		# Every member expected to be in the tree, indexed by discord ID.
+		self._members: Dict[int, TreeNode] = {n.discord_id: n for n in nodes}
+
+		# IDs of non-root members that are not currently reserved, and the
+		#   position of each ID in the list.
+		self._available: List[int] = [n.discord_id for n in nodes[1:]]
+		self._positions: Dict[int, int] = {
+			user_id: i for i, user_id in enumerate(self._available)
+		}
+
+
+	@property
+	def members(self) -> Dict[int, TreeNode]:
+		"""
+		Gets every member expected to be in the tree.
+		Must only be used once all worker threads have finished.
+		"""
+		return self._members
+
+
+	def reserve(self, rng: random.Random) -> Optional[TreeNode]:
+		"""
+		Reserves a random non-root member.
+		@param rng The random number generator to use.
+		@returns The reserved member, or None if every member is reserved.
+		"""
+		with self._lock:
+			if not self._available:
+				return None
+			user_id = self._available[rng.randrange(len(self._available))]
+			self._take(user_id)
+			return self._members[user_id]
+
+
+	def release(self, node: TreeNode) -> None:
+		"""
+		Releases a reserved member.
+		@param node The member to release.
+		"""
+		with self._lock:
+			self._positions[node.discord_id] = len(self._available)
+			self._available.append(node.discord_id)
+
+
+	def add(self, node: TreeNode) -> None:
+		"""
+		Records that a member was added to the tree.
+		@param node The new member.
+		"""
+		with self._lock:
+			self._members[node.discord_id] = node
+			self._positions[node.discord_id] = len(self._available)
+			self._available.append(node.discord_id)
+
+
+	def remove(self, node: TreeNode) -> None:
+		"""
+		Records that a reserved member was removed from the tree.
+		@param node The removed member.
+		"""
+		with self._lock:
+			del self._members[node.discord_id]
+
+
+	def _take(self, user_id: int) -> None:
+		"""
+		Removes an ID from the list of available members in O(1).
+		@param user_id The ID to remove.
+		"""
+		i = self._positions.pop(user_id)
+		last = self._available.pop()
+		if last != user_id:
+			self._available[i] = last
+			self._positions[last] = i
+
+
+class TreeStressTest:
+	"""
+	Hammers many family trees from a pool of threads and checks that every
+	  tree is still consistent afterwards.
+	Each worker repeatedly picks a random guild and performs a random join,
+	  leave, nickname change, query, or snapshot. Snapshots are checked for
+	  internal consistency as they are taken, since they must never observe a
+	  partially applied change.
+	"""
+	# Relative weight of each operation.
+	OPERATION_WEIGHTS = {
+		"join": 30,
+		"leave": 15,
+		"rename": 20,
+		"query": 30,
+		"snapshot": 5
+	}
+
+	# Maximum number of failures that are logged in full.
+	MAX_LOGGED_FAILURES = 10
+
+	def __init__(self,
+		service: DictFamilyTreeService,
+		generator: SyntheticGuildGenerator,
+		guild_count: int,
+		members_per_guild: int,
+		seed: int):
+		"""
+		Initializes a new instance of the class.
+		@param service The service to create the guilds' trees in.
+		@param generator The generator used to create each guild's initial
+		  members.
+		@param guild_count The number of guilds to create.
+		@param members_per_guild The number of members each guild starts with,
+		  including the owner.
+		@param seed The seed used to pick operations.
+		"""
+		self._service = service
+		self._seed = seed
+		self._guilds: List[GuildState] = []
+		for server_id in range(1, guild_count + 1):
+			nodes = generator.generate_nodes("power_law", members_per_guild)
+			service.register_discord_server(server_id, nodes[0])
+			tree = service.get_family_tree(server_id)
+			for node in nodes[1:]:
+				tree.add_node(node)
+			self._guilds.append(GuildState(server_id, nodes))
+
+		# Source of unique IDs and nicknames for new members. `next()` on an
+		#   itertools counter is atomic, so it may be shared by all workers.
+		self._ids = itertools.count(1 << 60)
+
+		# Guards the failure list.
+		self._failures_lock = threading.Lock()
+
+		# Description of each failed operation or invariant.
+		self._failures: List[str] = []
+
+
+	@property
+	def failures(self) -> List[str]:
+		"""
+		Gets a description of each failed operation or invariant.
+		"""
+		return self._failures
+
+
+	def run(self, thread_count: int, operations: int) -> float:
+		"""
+		Runs the stress test.
+		@param thread_count The number of worker threads to use.
+		@param operations The total number of operations to perform.
+		@returns The number of seconds that the workers took.
+		"""
+		per_thread = operations // thread_count
+		threads = [
+			threading.Thread(
+				target=self._work,
+				args=(random.Random(f"{self._seed}:{i}"), per_thread),
+				name=f"stress-worker-{i}"
+			)
+			for i in range(thread_count)
+		]
+		start = time.perf_counter()
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		return time.perf_counter() - start
+
+
+	def check_invariants(self) -> None:
+		"""
+		Checks that every tree matches the members the test expects.
+		Must only be called once all worker threads have finished.
+		"""
+		for guild in self._guilds:
+			tree = self._service.get_family_tree(guild.server_id)
+			try:
+				self._check_tree(guild, tree)
+			except Exception as e:
+				self._fail(f"Guild {guild.server_id}: {e!r}")
+
+
+	def _work(self, rng: random.Random, operations: int) -> None:
+		"""
+		Performs random operations against random guilds.
+		@param rng The random number generator for this worker.
+		@param operations The number of operations to perform.
+		"""
+		names = list(TreeStressTest.OPERATION_WEIGHTS)
+		weights = list(TreeStressTest.OPERATION_WEIGHTS.values())
+		for operation in rng.choices(names, weights, k=operations):
+			guild = rng.choice(self._guilds)
+			try:
+				tree = self._service.get_family_tree(guild.server_id)
+				getattr(self, f"_{operation}")(rng, guild, tree)
+			except Exception as e:
+				self._fail(f"{operation} in guild {guild.server_id}: {e!r}")
+
+
+	def _join(self,
+		rng: random.Random,
+		guild: GuildState,
+		tree: IFamilyTree) -> None:
+		"""
+		Adds a new member invited by a random existing member.
+		"""
+		inviter = guild.reserve(rng)
+		try:
+			user_id = next(self._ids)
+			node = TreeNode(
+				user_id,
+				f"stress{user_id}",
+				0,
+				f"Stress{user_id}",
+				"#FFFFFF",
+				inviter or guild.root_node
+			)
+			tree.add_node(node)
+			guild.add(node)
+		finally:
+			if inviter:
+				guild.release(inviter)
+
+
+	def _leave(self,
+		rng: random.Random,
+		guild: GuildState,
+		tree: IFamilyTree) -> None:
+		"""
+		Removes a random member.
+		The member's children are re-assigned by the tree itself, so they do
+		  not need to be reserved.
+		"""
+		node = guild.reserve(rng)
+		if node is None:
+			return
+		try:
+			tree.remove_node(node)
+		except Exception:
+			guild.release(node)
+			raise
+		guild.remove(node)
+
+
+	def _rename(self,
+		rng: random.Random,
+		guild: GuildState,
+		tree: IFamilyTree) -> None:
+		"""
+		Changes the nickname of a random member to a new unique nickname.
+		"""
+		node = guild.reserve(rng)
+		if node is None:
+			return
+		try:
+			tree.update_nickname(node, f"Renamed{next(self._ids)}")
+		finally:
+			guild.release(node)
+
+
+	def _query(self,
+		rng: random.Random,
+		guild: GuildState,
+		tree: IFamilyTree) -> None:
+		"""
+		Runs read-only queries involving a random member.
+		"""
+		node = guild.reserve(rng)
+		if node is None:
+			return
+		try:
+			if tree.find_node_by_user_id(node.discord_id) is not node:
+				raise AssertionError(f"Lookup returned the wrong node.")
+			if not tree.is_descendant(node, guild.root_node):
+				raise AssertionError(f"Node is not a descendant of the root.")
+			if node not in tree.search(node.user_nickname, 5):
+				raise AssertionError(f"Search did not find the node.")
+			tree.get_distance(node, guild.root_node)
+			tree.get_top_inviters(10, rng.random() < 0.5)
+		finally:
+			guild.release(node)
+
+
+	def _snapshot(self,
+		rng: random.Random,
+		guild: GuildState,
+		tree: IFamilyTree) -> None:
+		"""
+		Takes a snapshot and checks that it is internally consistent.
+		"""
+		snapshot = tree.snapshot()
+		seen = set()
+		for node in snapshot:
+			if node.inviter_id is None:
+				if seen:
+					raise AssertionError("Root node is not first.")
+			elif node.inviter_id not in seen:
+				raise AssertionError(
+					f"Inviter of {node.discord_id} is missing or out of order."
+				)
+			seen.add(node.discord_id)
+		if len(seen) != len(snapshot):
+			raise AssertionError("Snapshot length does not match its nodes.")
+
+
+	def _check_tree(self, guild: GuildState, tree: IFamilyTree) -> None:
+		"""
+		Checks that a tree matches the members the test expects.
+		@param guild The expected state of the guild.
+		@param tree The guild's tree.
+		@throws AssertionError If an invariant does not hold.
+		"""
+		nodes = list(tree.get_view())
+		ids = {node.discord_id for node in nodes}
+		if ids != set(guild.members):
+			raise AssertionError(
+				f"Tree has {len(ids - set(guild.members))} unexpected and "
+				f"{len(set(guild.members) - ids)} missing members."
+			)
+		if len(tree) != len(nodes):
+			raise AssertionError("Tree length does not match its nodes.")
+
+		# Every member must be reachable from the root through its inviters
+		for node in nodes:
+			current: Optional[TreeNode] = node
+			for _ in range(len(nodes)):
+				if current is None or current is guild.root_node:
+					break
+				if current.discord_id not in ids:
+					raise AssertionError(
+						f"Inviter {current.discord_id} is not in the tree."
+					)
+				current = current.inviter
+			if current is not guild.root_node:
+				raise AssertionError(
+					f"Member {node.discord_id} is not reachable from the root."
+				)
+
+		if tree.get_descendant_count(guild.root_node) != len(nodes) - 1:
+			raise AssertionError("Root descendant count is wrong.")
+
+		invites = Counter(
+			node.inviter.discord_id for node in nodes if node.inviter
+		)
+		expected = sorted(invites.items(), key=lambda item: (-item[1], item[0]))
+		actual = [
+			(node.discord_id, count) for node, count in tree.get_top_inviters(25)
+		]
+		if actual != expected[:25]:
+			raise AssertionError("Top inviters do not match invite counts.")
+
+		for node in nodes:
+			if node not in tree.search(node.user_nickname, 5):
+				raise AssertionError(
+					f"Search did not find member {node.discord_id}."
+				)
+
+		snapshot = [
+			(node.discord_id, node.user_nickname, node.inviter_id)
+			for node in tree.snapshot()
+		]
+		view = [
+			(
+				node.discord_id,
+				node.user_nickname,
+				node.inviter.discord_id if node.inviter else None
+			)
+			for node in nodes
+		]
+		if snapshot != view:
+			raise AssertionError("Snapshot does not match the tree.")
+
+
+	def _fail(self, message: str) -> None:
+		"""
+		Records a failure.
+		@param message Description of the failure.
+		"""
+		with self._failures_lock:
+			self._failures.append(message)
+			if len(self._failures) <= TreeStressTest.MAX_LOGGED_FAILURES:
+				logger.error(message)
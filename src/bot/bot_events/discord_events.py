@@ -8,7 +8,9 @@ class DiscordEvents(Events):
 	  reactions, etc) are not included in this class.
 	"""
 	__events__ = (
-		# Event emitted when the bot is added to a new server.
+		# Event emitted when the bot is added to a new server. Also emitted for
+		#   each server the bot is in when a gateway session starts, since the
+		#   bot may have been added to the server while it was offline.
 		# Args: (
 		#   server_id: int,
 		#   owner_id: int,
@@ -34,7 +36,7 @@ class DiscordEvents(Events):
 
 		# Event emitted when a user joins a server.
 		# Args: (server_id: int, user_id: int, username: str, discriminator: int)
-		"on_user_joined"
+		"on_user_joined",
 
 		# Event emitted when a user leaves a server.
 		# Args: (server_id: int, user_id: int)
@@ -42,5 +44,18 @@ class DiscordEvents(Events):
 
 		# Event emitted when a user changes their nickname.
 		# Args: (server_id: int, user_id: int, new_nickname: str)
-		"on_user_nickname_changed"
+		"on_user_nickname_changed",
+
+		# Event emitted when several users of a server changed their nicknames.
+		# Only emitted by services that coalesce `on_user_nickname_changed`
+		#   events; contains the latest nickname of each user.
+		# Args: (server_id: int, nicknames: Dict[int, str])
+		"on_user_nicknames_changed",
+
+		# Event emitted when the full list of a server's members is received.
+		# Emitted when the bot reconnects to a server it was already in, since
+		#   members may have joined, left, or changed their nickname while the
+		#   bot was offline.
+		# Args: (server_id: int, users: List[IUser])
+		"on_server_members_listed"
 	)
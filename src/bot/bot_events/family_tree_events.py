@@ -3,8 +3,30 @@ from events import Events # pyright: ignore[reportMissingTypeStubs]
 class FamilyTreeEvents(Events):
 	"""
 	Defines the events that can be triggered by family tree instances.
+	Each change to a tree emits one of the fine-grained events followed by
+	  `on_modified`. All events are emitted after the change has been applied.
 	"""
 	__events__ = (
+		# Event emitted when a node is added to a family tree.
+		# Args: (family_tree: IFamilyTree, node: TreeNode)
+		"on_node_added",
+
+		# Event emitted when a node is removed from a family tree. The node's
+		#   children have already been re-assigned to the node's inviter, or
+		#   to the nearest ancestor that was not removed if several nodes were
+		#   removed at once.
+		# Args: (family_tree: IFamilyTree, node: TreeNode)
+		"on_node_removed",
+
+		# Event emitted when the nickname of a node in a family tree changes.
+		# Args: (family_tree: IFamilyTree, node: TreeNode)
+		"on_nickname_changed",
+
+		# Event emitted when the background color of a node in a family tree
+		#   changes.
+		# Args: (family_tree: IFamilyTree, node: TreeNode)
+		"on_background_color_changed",
+
 		# Event emitted when a family tree is modified.
 		# Args: (family_tree: IFamilyTree)
 		"on_modified"
@@ -9,6 +9,12 @@ class FamilyTreeServiceEvents(Events):
 		# Args: (server_id: int, family_tree: IFamilyTree)
 		"on_family_tree_created",
 
+		# Event emitted when a previously saved family tree is loaded. Emitted
+		#   on the thread that loads the trees, before the tree can be
+		#   accessed through the service. Handlers must not call the service.
+		# Args: (server_id: int, family_tree: IFamilyTree)
+		"on_family_tree_loaded",
+
 		# Event emitted when a family tree is modified.
 		# Args: (server_id: int, family_tree: IFamilyTree)
 		"on_family_tree_modified",
@@ -1,20 +1,48 @@
 #!/usr/bin/env python3
 # Entry point for the Family Tree Discord bot.
+# Captured before any other imports so that `--startup-profile` includes the
+#   time taken to import the bot's modules.
+import time
+STARTUP_BEGIN = time.perf_counter()
+
 import argparse
+from bot.models.family_tree import IFamilyTree
+from bot.models.membership_reconciler import MembershipReconciler
 from bot.models.tree_node import TreeNode
-from bot.services.cli_service import CliService
-from bot.services.discord.api_discord_events_service import ApiDiscordService
-from bot.services.discord.cli_discord_events_service import CliDiscordService
+from bot.models.user import IUser
+from bot.services.discord.discord_events_service import IDiscordEventsService
+from bot.services.discord.guild_event_queue import CosmeticShedPolicy
+from bot.services.discord.queue_discord_events_service import EventQueue, QueueDiscordEventsService
 from bot.services.family_tree.dict_family_tree_service import DictFamilyTreeService
+from bot.services.history.history_service import IHistoryService
 from bot.services.invite.most_recent_invite_service import MostRecentInviteService
+from bot.services.metrics.event_instrumentation import EventInstrumentation
+from bot.services.metrics.in_memory_metrics_service import InMemoryMetricsService
+from bot.services.profiling.profiling_service import IProfilingService
 from bot.services.serialization.json_serialization_service import JsonSerializationService
+from bot.services.serialization.metrics_serialization_service import MetricsSerializationService
+from bot.services.serialization.serialization_service import ISerializationService
 from bot.services.service_collection import IServiceCollection
 from bot.services.struct_service_collection import StructServiceCollection
+from bot.util.file_compression import FileCompression
+from bot.util.startup_timer import StartupTimer
+import copy
 import logging
+import os
 from pathlib import Path
-from typing import Dict
+import signal
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
 import sys
 
+# Services that are only used by some modes or options are imported where
+#   they are created so that startup only pays for the modules that are used.
+if TYPE_CHECKING:
+	from bot.models.branch_color_engine import BranchColorEngine
+	from bot.services.cli_service import CliService
+	from bot.services.discord.coalescing_discord_events_service import CoalescingDiscordEventsService
+	from bot.services.discord.queued_discord_events_service import QueuedDiscordEventsService
+
 # Log levels that may be specified on the command line
 LOG_LEVELS: Dict[str, int] = {
 	"critical": logging.CRITICAL,
@@ -27,6 +55,9 @@ LOG_LEVELS: Dict[str, int] = {
 # Background color used by default for nodes in generated diagrams
 DEFAULT_NODE_BACKGROUND_COLOR = "#FFFFFF"
 
+# Environment variable that the bot token is read from
+TOKEN_ENV_VAR = "DISCORD_BOT_TOKEN"
+
 class BotFormatter(logging.Formatter):
 	"""
 	Formatter used for logging bot messages.
@@ -73,6 +104,59 @@ class CliArgs(argparse.Namespace):
 	# The level of logging to use.
 	log_level: str
 
+	# Port to serve Prometheus metrics on. Metrics are not served over HTTP if
+	#   this is 0.
+	metrics_port: int
+
+	# Directory that profiling data is written to.
+	profile_dir: str
+
+	# If enabled, prints how long each phase of startup took.
+	startup_profile: bool
+
+	# Number of worker processes to distribute Discord servers across. If this
+	#   is 1, all servers are handled by the main process.
+	shards: int
+
+	# URL of the Discord gateway to connect to when not running in local mode.
+	gateway_url: str
+
+	# If enabled, each family tree is guarded by its own read/write lock so
+	#   that trees may be accessed from multiple threads.
+	thread_safe: bool
+
+	# Directory that the history of each family tree is written to. History is
+	#   not recorded if this is empty.
+	history_dir: str
+
+	# Number of worker processes used to load saved family trees. Trees are
+	#   loaded by a single thread if this is less than 2.
+	load_workers: int
+
+	# Path to the memory-mapped snapshot of the saved family trees. Snapshots
+	#   are not used if this is empty.
+	snapshot_path: str
+
+	# Format that the save file is compressed with. Must be one of
+	#   `FileCompression.ALL`.
+	compression: str
+
+	# Maximum number of structural events queued for each server. Events are
+	#   handled as they are received if this is 0.
+	event_queue_capacity: int
+
+	# Nickname change dropped when a server's queue of nickname changes is
+	#   full. Must be one of `CosmeticShedPolicy.ALL`.
+	shed_policy: str
+
+	# Number of seconds that nickname changes are held for so that each
+	#   user's latest nickname is applied in a single batch per server.
+	#   Nickname changes are applied as they are received if this is 0.
+	nickname_window: float
+
+	# If enabled, gives each branch of each tree its own background color.
+	branch_colors: bool
+
 
 def make_parser() -> argparse.ArgumentParser:
 	"""
@@ -107,25 +191,344 @@ def make_parser() -> argparse.ArgumentParser:
 		type=str,
 		help="The level of logging to use."
 	)
+	parser.add_argument(
+		"--metrics-port",
+		default=0,
+		type=int,
+		help="The local port to serve Prometheus metrics on. Metrics are not "
+			"served over HTTP if this is 0."
+	)
+	parser.add_argument(
+		"--profile-dir",
+		default="profiles",
+		type=str,
+		help="The directory that profiling data is written to. Profiling is "
+			"controlled by the 'profile' command in local mode and by SIGUSR1 "
+			"(start/stop) and SIGUSR2 (dump) otherwise."
+	)
+	parser.add_argument(
+		"--startup-profile",
+		action="store_true",
+		help="If enabled, prints how long each phase of startup took."
+	)
+	parser.add_argument(
+		"--gateway-url",
+		default="wss://gateway.discord.gg/?v=10&encoding=json",
+		type=str,
+		help="The URL of the Discord gateway to connect to when not running "
+			f"in local mode. The bot token is read from ${TOKEN_ENV_VAR}."
+	)
+	parser.add_argument(
+		"--shards",
+		default=1,
+		type=int,
+		help="The number of worker processes to distribute Discord servers "
+			"across. Each worker owns the servers whose ID modulo the shard "
+			"count equals the worker's shard ID and saves them to its own "
+			"file. If a metrics port is given, each worker serves metrics on "
+			"the metrics port plus its shard ID. Profiling signals must be "
+			"sent to the worker processes."
+	)
+	parser.add_argument(
+		"--thread-safe",
+		action="store_true",
+		help="If enabled, guards each family tree with its own read/write "
+			"lock so that trees may be accessed from multiple threads."
+	)
+	parser.add_argument(
+		"--history-dir",
+		default="",
+		type=str,
+		help="The directory that the history of each family tree is written "
+			"to. Each server's history is stored in its own subdirectory, so "
+			"shards share the same directory. History is not recorded if this "
+			"is empty."
+	)
+	parser.add_argument(
+		"--load-workers",
+		default=0,
+		type=int,
+		help="The number of worker processes used to decode saved family "
+			"trees at startup. Trees are loaded by a single thread if this is "
+			"less than 2. When sharding is enabled, each shard starts its own "
+			"workers."
+	)
+	parser.add_argument(
+		"--snapshot-path",
+		default="",
+		type=str,
+		help="The path to a memory-mapped snapshot of the saved family trees. "
+			"If the snapshot is up to date, trees are read from it at startup "
+			"instead of parsing the save file. Each tree is parsed the first "
+			"time it is modified. Snapshots are not used if this is empty."
+	)
+	parser.add_argument(
+		"--compression",
+		default=FileCompression.NONE,
+		choices=list(FileCompression.ALL),
+		type=str,
+		help="The format to compress the save file with. Existing save files "
+			"are read in whichever format they were written in. Compressed "
+			"save files are always loaded by a single thread. zstd requires "
+			"Python 3.14 or the 'zstandard' package."
+	)
+	parser.add_argument(
+		"--event-queue-capacity",
+		default=0,
+		type=int,
+		help="The maximum number of joins, leaves, and other structural events "
+			"queued for each server. If this is greater than 0, events are "
+			"queued and handled by a background thread, and the source of "
+			"events is blocked while a server's queue is full. Events are "
+			"handled as they are received if this is 0."
+	)
+	parser.add_argument(
+		"--shed-policy",
+		default=CosmeticShedPolicy.DROP_OLDEST,
+		choices=list(CosmeticShedPolicy.ALL),
+		type=str,
+		help="The nickname change dropped when a server's queue of nickname "
+			"changes is full. Only used if --event-queue-capacity is given."
+	)
+	parser.add_argument(
+		"--nickname-window",
+		default=0,
+		type=float,
+		help="The number of seconds that nickname changes are held for. Only "
+			"the latest nickname of each user is kept, and each server's held "
+			"changes are applied to its tree as a single update. Nickname "
+			"changes are applied as they are received if this is 0."
+	)
+	parser.add_argument(
+		"--branch-colors",
+		action="store_true",
+		help="If enabled, gives each user invited by a server's owner a "
+			"distinct background color, which is shared by every user that "
+			"joined through them. Otherwise every node is white."
+	)
 	return parser
 
 
-def make_services(args: CliArgs) -> IServiceCollection:
+def configure_logging(log_level: str, prefix: str = "") -> None:
 	"""
-	Creates the service collection for the bot.
+	Configures the root logger.
+	@param log_level The level of logging to use. Must be a key of
+	  `LOG_LEVELS`.
+	@param prefix Text to add to the start of every log message, used to
+	  distinguish messages logged by different processes.
+	"""
+	logger = logging.getLogger()
+	logger.setLevel(LOG_LEVELS[log_level])
+
+	# Configure the format used for logging
+	handler = logging.StreamHandler()
+	handler.setLevel(logging.DEBUG)
+	formatter = BotFormatter(
+		"(%(levelname)s)[%(asctime)s.%(msecs)03d] " + prefix +
+			"%(filename)s:%(lineno)d: %(message)s",
+		datefmt = "%Y-%m-%d %H:%M:%S"
+	)
+	handler.setFormatter(formatter)
+	logger.addHandler(handler)
+
+
+def make_discord_service(
+	args: CliArgs,
+	metrics_service: InMemoryMetricsService,
+	profiling_service: IProfilingService
+	) -> Tuple[IDiscordEventsService, Optional["CliService"]]:
+	"""
+	Creates the service that emits Discord events.
 	@param args The command line arguments for the bot.
-	@returns The service collection for the bot.
+	@param metrics_service The service read by the CLI's stats command.
+	@param profiling_service The service controlled by the CLI's profile
+	  command.
+	@returns The Discord events service and, in local mode, the CLI service
+	  that drives it.
 	"""
+	# Mode-specific services are imported here instead of at the top of the
+	#   file so that startup only pays for the modules of the selected mode.
 	if args.local:
-		discord_service = CliDiscordService()
-		cli_service = CliService(discord_service)
+		from bot.services.cli_service import CliService
+		from bot.services.discord.cli_discord_events_service import CliDiscordEventsService
+		discord_service = CliDiscordEventsService()
+		cli_service = CliService(
+			discord_service,
+			metrics_service,
+			profiling_service,
+			Path(args.profile_dir)
+		)
+		return discord_service, cli_service
 	else:
-		discord_service = ApiDiscordService()
+		from bot.services.discord.api_discord_events_service import ApiDiscordEventsService
+		return ApiDiscordEventsService(
+			args.gateway_url,
+			os.environ.get(TOKEN_ENV_VAR, "")
+		), None
+
+
+def run_discord_service(
+	discord_service: IDiscordEventsService,
+	cli_service: Optional["CliService"]) -> None:
+	"""
+	Emits Discord events until the bot should exit.
+	@param discord_service The service that emits Discord events.
+	@param cli_service The CLI service that drives the Discord events service
+	  in local mode, or `None` if Discord's API is used.
+	"""
+	if cli_service:
+		cli_service.run()
+	else:
+		from bot.services.discord.api_discord_events_service import ApiDiscordEventsService
+		assert isinstance(discord_service, ApiDiscordEventsService)
+		discord_service.run()
+
+
+def make_services(
+	args: CliArgs,
+	event_queue: Optional[EventQueue] = None) -> IServiceCollection:
+	"""
+	Creates the service collection for the bot.
+	@param args The command line arguments for the bot.
+	@param event_queue If given, Discord events are received from this queue
+	  instead of from the CLI or Discord's API. Used by shard workers.
+	@returns The service collection for the bot.
+	"""
+	from bot.services.discord.dedup_discord_events_service import DedupDiscordEventsService
+	from bot.services.profiling.cprofile_profiling_service import CProfileProfilingService
+	metrics_service = InMemoryMetricsService()
+	profiling_service = CProfileProfilingService()
+
+	discord_service: IDiscordEventsService
+	cli_service: Optional["CliService"]
+	if event_queue is not None:
+		discord_service = QueueDiscordEventsService(event_queue)
 		cli_service = None
+	else:
+		discord_service, cli_service = make_discord_service(
+			args,
+			metrics_service,
+			profiling_service
+		)
 
-	family_tree_service = DictFamilyTreeService()
+	family_tree_service = DictFamilyTreeService(args.thread_safe)
 	invite_service = MostRecentInviteService()
-	serialization_service = JsonSerializationService(Path(args.save_path))
+	save_path = Path(args.save_path)
+	serialization_service: ISerializationService = JsonSerializationService(
+		save_path,
+		args.load_workers,
+		args.compression
+	)
+	if args.snapshot_path:
+		from bot.services.serialization.mapped_serialization_service import MappedSerializationService
+		serialization_service = MappedSerializationService(
+			serialization_service,
+			save_path,
+			Path(args.snapshot_path)
+		)
+	serialization_service = MetricsSerializationService(
+		serialization_service,
+		metrics_service
+	)
+	instrumentation = EventInstrumentation(metrics_service, family_tree_service)
+
+	# Events are optionally buffered so that slow handlers do not stall the
+	#   source of events
+	event_queue_service: Optional["QueuedDiscordEventsService"] = None
+	if args.event_queue_capacity > 0:
+		from bot.services.discord.queued_discord_events_service import QueuedDiscordEventsService
+		event_queue_service = QueuedDiscordEventsService(
+			discord_service,
+			metrics_service,
+			args.event_queue_capacity,
+			shed_policy=args.shed_policy
+		)
+		event_queue_service.start()
+
+	# Handlers are bound to the deduplicated events so that events replayed
+	#   by Discord do not reach the family trees
+	dedup_service = DedupDiscordEventsService(
+		event_queue_service or discord_service,
+		metrics_service
+	)
+
+	# Nickname changes are optionally held and applied in batches so that
+	#   users who change their nickname repeatedly do not cause a save for
+	#   every change
+	nickname_service: Optional["CoalescingDiscordEventsService"] = None
+	handler_service: IDiscordEventsService = dedup_service
+	if args.nickname_window > 0:
+		from bot.services.discord.coalescing_discord_events_service import CoalescingDiscordEventsService
+		nickname_service = CoalescingDiscordEventsService(
+			dedup_service,
+			metrics_service,
+			args.nickname_window
+		)
+		nickname_service.start()
+		handler_service = nickname_service
+
+	def wrap(
+		source: str,
+		event_name: str,
+		handler: Callable[..., Any]) -> Callable[..., None]:
+		"""
+		Helper method for wrapping an event handler with metrics and profiling.
+		"""
+		return instrumentation.wrap(
+			source,
+			event_name,
+			profiling_service.wrap(handler)
+		)
+
+	# Trees must be tracked before color engines are added to them. Engines
+	#   recolor nodes from their `on_node_added` handlers, and the history
+	#   must record each node's addition before the changes it causes.
+	history_service: Optional[IHistoryService] = None
+	if args.history_dir:
+		from bot.services.history.json_lines_history_service import JsonLinesHistoryService
+		history_service = JsonLinesHistoryService(Path(args.history_dir))
+		family_tree_service.events.on_family_tree_created += wrap( # type: ignore
+			"family_tree_service",
+			"on_family_tree_created",
+			history_service.track_tree
+		)
+		# Not instrumented since instrumentation looks up each tree through
+		#   the service, which is not allowed while trees are being loaded
+		family_tree_service.events.on_family_tree_loaded += \
+			history_service.track_tree # type: ignore
+
+	# Engine that colors each server's tree, indexed by server ID. Only used
+	#   if branch colors are enabled.
+	color_engines: Dict[int, "BranchColorEngine"] = {}
+
+	def get_background_color(server_id: int, inviter: TreeNode) -> str:
+		"""
+		Helper method for getting the background color of a new node.
+		"""
+		engine = color_engines.get(server_id)
+		if engine is None:
+			return DEFAULT_NODE_BACKGROUND_COLOR
+		return engine.get_color(inviter)
+
+	if args.branch_colors:
+		from bot.models.branch_color_engine import BranchColorEngine
+
+		def add_color_engine(server_id: int, tree: IFamilyTree) -> None:
+			# Engines are started before any handler can lock the tree, since
+			#   starting reads the tree through the given instance and colors
+			#   may be requested while the tree is locked (e.g. by reconciling)
+			engine = BranchColorEngine(tree)
+			engine.start()
+			color_engines[server_id] = engine
+
+		# Not instrumented since instrumentation looks up each tree through
+		#   the service, which is not allowed while trees are being loaded
+		family_tree_service.events.on_family_tree_created += \
+			add_color_engine # type: ignore
+		family_tree_service.events.on_family_tree_loaded += \
+			add_color_engine # type: ignore
+		family_tree_service.events.on_family_tree_removed += \
+			lambda server_id: color_engines.pop(server_id, None) # type: ignore
 
 	# Bind to events
 	def on_server_added(
@@ -136,7 +539,15 @@ def make_services(args: CliArgs) -> IServiceCollection:
 		owner_nickname: str) -> None:
 		"""
 		Helper method for converting the event data to a tree node.
+		Servers that already have a tree are ignored, since servers are
+		  announced again each time a gateway session starts.
 		"""
+		try:
+			family_tree_service.get_family_tree(server_id)
+			return
+		except KeyError:
+			pass
+
 		root_node = TreeNode(
 			owner_id,
 			owner_username,
@@ -147,54 +558,382 @@ def make_services(args: CliArgs) -> IServiceCollection:
 		)
 		family_tree_service.register_discord_server(server_id, root_node)
 
-	discord_service.events.on_server_added += on_server_added # type: ignore
-	discord_service.events.on_server_removed += family_tree_service.remove_discord_server # type: ignore
+	handler_service.events.on_server_added += wrap( # type: ignore
+		"discord",
+		"on_server_added",
+		on_server_added
+	)
+	handler_service.events.on_server_removed += wrap( # type: ignore
+		"discord",
+		"on_server_removed",
+		family_tree_service.remove_discord_server
+	)
+	handler_service.events.on_invite_created += wrap( # type: ignore
+		"discord",
+		"on_invite_created",
+		invite_service.on_invite_created
+	)
+
+	def get_inviter_id(server_id: int, user_id: int) -> Optional[int]:
+		"""
+		Helper method for finding who invited a user, or None if unknown.
+		"""
+		try:
+			return invite_service.get_inviter(server_id, user_id)
+		except RuntimeError:
+			return None
+
+	def on_user_joined(
+		server_id: int,
+		user_id: int,
+		username: str,
+		discriminator: int) -> None:
+		"""
+		Helper method for adding a node for the new user to the server's tree.
+		Users whose inviter is unknown or has left the server are added as
+		  children of the root node, like members added by reconciling.
+		"""
+		tree = family_tree_service.get_family_tree(server_id)
+		inviter: Optional[TreeNode] = None
+		inviter_id = get_inviter_id(server_id, user_id)
+		if inviter_id is not None:
+			try:
+				inviter = tree.find_node_by_user_id(inviter_id)
+			except KeyError:
+				pass
+		if inviter is None:
+			logging.warning(
+				f"Inviter of user {user_id} in server {server_id} is unknown or "
+				"no longer in the server. Adding the user under the root node."
+			)
+			inviter = tree.root_node
+		tree.add_node(TreeNode(
+			user_id,
+			username,
+			discriminator,
+			username,
+			get_background_color(server_id, inviter),
+			inviter
+		))
 
-	family_tree_service.events.on_family_tree_created += serialization_service.save_tree # type: ignore
-	family_tree_service.events.on_family_tree_modified += serialization_service.save_tree # type: ignore
-	family_tree_service.events.on_family_tree_removed += serialization_service.remove_tree # type: ignore
+	def on_user_left(server_id: int, user_id: int) -> None:
+		"""
+		Helper method for removing the user's node from the server's tree.
+		"""
+		tree = family_tree_service.get_family_tree(server_id)
+		tree.remove_node(tree.find_node_by_user_id(user_id))
+
+	def on_user_nickname_changed(
+		server_id: int,
+		user_id: int,
+		new_nickname: str) -> None:
+		"""
+		Helper method for updating the nickname of the user's node.
+		"""
+		tree = family_tree_service.get_family_tree(server_id)
+		tree.update_nickname(tree.find_node_by_user_id(user_id), new_nickname)
+
+	def on_user_nicknames_changed(
+		server_id: int,
+		nicknames: Dict[int, str]) -> None:
+		"""
+		Helper method for updating the nicknames of several users' nodes.
+		"""
+		tree = family_tree_service.get_family_tree(server_id)
+
+		# Users may have left the server before their changes were applied
+		updates: List[Tuple[TreeNode, str]] = []
+		for user_id, nickname in nicknames.items():
+			try:
+				updates.append((tree.find_node_by_user_id(user_id), nickname))
+			except KeyError:
+				pass
+		tree.update_nicknames(updates)
+
+	reconciler = MembershipReconciler(DEFAULT_NODE_BACKGROUND_COLOR)
+
+	def on_server_members_listed(server_id: int, users: List[IUser]) -> None:
+		"""
+		Helper method for bringing the server's tree in sync with its members.
+		"""
+		result = reconciler.reconcile(
+			family_tree_service.get_family_tree(server_id),
+			users,
+			lambda user_id: get_inviter_id(server_id, user_id),
+			lambda inviter: get_background_color(server_id, inviter)
+		)
+		if not result.is_empty:
+			logging.info(
+				f"Reconciled server {server_id}: {len(result.added)} added, "
+				f"{len(result.removed)} removed, {len(result.renamed)} renamed."
+			)
+
+	handler_service.events.on_user_joined += wrap( # type: ignore
+		"discord",
+		"on_user_joined",
+		on_user_joined
+	)
+	handler_service.events.on_user_left += wrap( # type: ignore
+		"discord",
+		"on_user_left",
+		on_user_left
+	)
+	handler_service.events.on_user_nickname_changed += wrap( # type: ignore
+		"discord",
+		"on_user_nickname_changed",
+		on_user_nickname_changed
+	)
+	handler_service.events.on_user_nicknames_changed += wrap( # type: ignore
+		"discord",
+		"on_user_nicknames_changed",
+		on_user_nicknames_changed
+	)
+	handler_service.events.on_server_members_listed += wrap( # type: ignore
+		"discord",
+		"on_server_members_listed",
+		on_server_members_listed
+	)
+
+	family_tree_service.events.on_family_tree_created += wrap( # type: ignore
+		"family_tree_service",
+		"on_family_tree_created",
+		serialization_service.save_tree
+	)
+	family_tree_service.events.on_family_tree_modified += wrap( # type: ignore
+		"family_tree_service",
+		"on_family_tree_modified",
+		serialization_service.save_tree
+	)
+	family_tree_service.events.on_family_tree_removed += wrap( # type: ignore
+		"family_tree_service",
+		"on_family_tree_removed",
+		serialization_service.remove_tree
+	)
 
 	return StructServiceCollection(
 		cli_service,
 		discord_service,
+		event_queue_service,
+		nickname_service,
 		family_tree_service,
+		history_service,
 		invite_service,
+		metrics_service,
+		profiling_service,
 		serialization_service
 	)
 
 
+def install_profiling_signal_handlers(
+	profiling_service: IProfilingService,
+	profile_dir: Path) -> None:
+	"""
+	Allows profiling to be controlled using signals.
+	SIGUSR1 starts profiling if it is stopped and stops it otherwise. SIGUSR2
+	  writes all collected profiling data to disk. Signals are not available on
+	  all platforms, in which case this method does nothing.
+	@param profiling_service The service to control.
+	@param profile_dir The directory to write profiling data to.
+	"""
+	if not hasattr(signal, "SIGUSR1") or not hasattr(signal, "SIGUSR2"):
+		return
+
+	def toggle(signum: int, frame: Optional[FrameType]) -> None:
+		if profiling_service.is_running:
+			profiling_service.stop()
+		else:
+			profiling_service.start()
+
+	def dump(signum: int, frame: Optional[FrameType]) -> None:
+		try:
+			profiling_service.dump(profile_dir)
+		except RuntimeError as e:
+			logging.getLogger(__name__).error(e)
+
+	signal.signal(signal.SIGUSR1, toggle)
+	signal.signal(signal.SIGUSR2, dump)
+
+
+def run_shard_worker(
+	shard_id: int,
+	shard_count: int,
+	event_queue: EventQueue,
+	args: CliArgs) -> None:
+	"""
+	Entry point of each worker process when sharding is enabled.
+	Handles the events routed to the worker by the shard supervisor until the
+	  supervisor stops the worker.
+	@param shard_id The ID of the worker's shard.
+	@param shard_count The total number of shards.
+	@param event_queue The queue that events are received from.
+	@param args The command line arguments of the supervisor.
+	"""
+	# Interrupts are handled by the supervisor, which stops each worker once
+	#   the worker has handled all events routed to it
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	configure_logging(args.log_level, f"shard {shard_id} ")
+	from bot.services.sharding.shard_supervisor import ShardSupervisor
+
+	save_path = Path(args.save_path)
+	shard_save_path = ShardSupervisor.get_shard_save_path(
+		save_path,
+		shard_id,
+		shard_count
+	)
+	shard_args = copy.copy(args)
+	shard_args.save_path = str(shard_save_path)
+	if args.snapshot_path:
+		shard_args.snapshot_path = str(ShardSupervisor.get_shard_save_path(
+			Path(args.snapshot_path),
+			shard_id,
+			shard_count
+		))
+	shard_args.local = False
+	shard_args.profile_dir = str(Path(args.profile_dir) / f"shard-{shard_id}")
+	if args.metrics_port:
+		shard_args.metrics_port = args.metrics_port + shard_id
+
+	services = make_services(shard_args, event_queue)
+
+	def load_trees() -> Dict[int, IFamilyTree]:
+		# The first time the bot runs with this shard count, the shard's
+		#   trees are copied out of the unsharded save file
+		if not shard_save_path.exists() and save_path.exists():
+			count = JsonSerializationService.copy_trees(
+				save_path,
+				shard_save_path,
+				lambda server_id: ShardSupervisor.get_shard_id(
+					server_id,
+					shard_count
+				) == shard_id,
+				args.compression
+			)
+			logging.getLogger(__name__).info(
+				f"Copied {count} family trees from '{save_path}' to "
+				f"'{shard_save_path}'."
+			)
+		return services.serialization_service.load_trees()
+
+	services.family_tree_service.load_family_trees(load_trees)
+
+	if shard_args.metrics_port:
+		from bot.services.metrics.metrics_http_server import MetricsHttpServer
+		MetricsHttpServer(
+			services.metrics_service,
+			shard_args.metrics_port
+		).start()
+
+	install_profiling_signal_handlers(
+		services.profiling_service,
+		Path(shard_args.profile_dir)
+	)
+
+	discord_service = services.discord_service
+	assert isinstance(discord_service, QueueDiscordEventsService)
+	discord_service.run()
+	if services.event_queue_service:
+		services.event_queue_service.stop()
+	if services.nickname_service:
+		services.nickname_service.stop()
+
+	# Trees are loaded on a daemon thread, so the worker must not exit before
+	#   loading has finished or the shard's save file may be left incomplete
+	services.family_tree_service.wait_for_family_trees()
+
+
+def run_shard_supervisor(args: CliArgs, timer: StartupTimer) -> None:
+	"""
+	Runs the bot with Discord servers distributed across worker processes.
+	@param args The command line arguments for the bot.
+	@param timer The timer used to record startup phases.
+	"""
+	from bot.services.profiling.cprofile_profiling_service import CProfileProfilingService
+	from bot.services.sharding.shard_supervisor import ShardSupervisor
+	metrics_service = InMemoryMetricsService()
+	profiling_service = CProfileProfilingService()
+	discord_service, cli_service = make_discord_service(
+		args,
+		metrics_service,
+		profiling_service
+	)
+	supervisor = ShardSupervisor(
+		discord_service,
+		args.shards,
+		run_shard_worker,
+		args
+	)
+	supervisor.start()
+	timer.mark("start shard workers")
+
+	if args.startup_profile:
+		print(timer.format_report(), file=sys.stderr)
+
+	try:
+		run_discord_service(discord_service, cli_service)
+	finally:
+		supervisor.stop()
+
+
 def main(*cli_args: str) -> int:
 	"""
 	Entry point for the Family Tree Discord bot.
 	@param cli_args The command line arguments to parse. Should not include the
 	  script name.
 	"""
+	timer = StartupTimer(STARTUP_BEGIN)
+	timer.mark("imports")
+
 	# Process command line arguments
 	parser = make_parser()
 	args = parser.parse_args(cli_args, namespace=CliArgs())
+	if not FileCompression.is_available(args.compression):
+		parser.error(
+			f"Compression format '{args.compression}' is not available. zstd "
+			"requires Python 3.14 or the 'zstandard' package."
+		)
+	timer.mark("parse arguments")
 
 	# Configure logging
-	logger = logging.getLogger()
-	logger.setLevel(LOG_LEVELS[args.log_level])
+	configure_logging(args.log_level)
+	timer.mark("configure logging")
 
-	# Configure the format used for logging
-	handler = logging.StreamHandler()
-	handler.setLevel(logging.DEBUG)
-	formatter = BotFormatter(
-		"(%(levelname)s)[%(asctime)s.%(msecs)03d] %(filename)s:%(lineno)d: %(message)s",
-		datefmt = "%Y-%m-%d %H:%M:%S"
-	)
-	handler.setFormatter(formatter)
-	logger.addHandler(handler)
+	if args.shards > 1:
+		run_shard_supervisor(args, timer)
+		return 0
 
 	# Create the service collection
 	services = make_services(args)
+	timer.mark("create services")
 
-	# Run the bot
-	if args.local:
-		assert services.cli_service is not None
-		services.cli_service.run()
+	# Saved trees are loaded in the background so that the bot can start
+	#   handling events immediately. Events that need a family tree will wait
+	#   for loading to finish.
+	services.family_tree_service.load_family_trees(
+		services.serialization_service.load_trees
+	)
+	timer.mark("start loading trees")
+
+	if args.metrics_port:
+		# Only imported when needed as `http.server` is slow to import
+		from bot.services.metrics.metrics_http_server import MetricsHttpServer
+		MetricsHttpServer(services.metrics_service, args.metrics_port).start()
+		timer.mark("start metrics server")
+
+	if not args.local:
+		install_profiling_signal_handlers(
+			services.profiling_service,
+			Path(args.profile_dir)
+		)
+
+	if args.startup_profile:
+		print(timer.format_report(), file=sys.stderr)
 
+	# Run the bot
+	run_discord_service(services.discord_service, services.cli_service)
+	if services.event_queue_service:
+		services.event_queue_service.stop()
+	if services.nickname_service:
+		services.nickname_service.stop()
 	return 0
 
 
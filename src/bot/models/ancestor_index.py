@@ -0,0 +1,166 @@
+from bot.models.tree_node import TreeNode
+from typing import Dict, List
+
+class AncestorIndex:
+	"""
+	Answers ancestry queries about the nodes of a family tree.
+	Uses binary lifting: each node stores its ancestors at distances of 1, 2,
+	  4, ... up to its depth, which allows any ancestor of a node to be found in
+	  O(log depth) steps. Nodes may be added incrementally, but the index does
+	  not support removing nodes and must be rebuilt if a node is removed.
+	"""
+	def __init__(self, root_node: TreeNode):
+		"""
+		Initializes a new instance of the class.
+		@param root_node The root node of the tree.
+		"""
+		# Index assigned to each node, indexed by the user's discord account ID.
+		# Nodes are assigned consecutive indices in the order they are added.
+		self._indices: Dict[int, int] = {root_node.discord_id: 0}
+
+		# Node at each index.
+		self._nodes: List[TreeNode] = [root_node]
+
+		# Number of invites between the root node and the node at each index.
+		self._depths: List[int] = [0]
+
+		# Indices of the ancestors of the node at each index. The k-th entry of
+		#   a node's list is the index of its ancestor 2^k invites up the tree.
+		#   Each list contains every ancestor whose distance is a power of two.
+		self._jumps: List[List[int]] = [[]]
+
+
+	def __contains__(self, node: TreeNode) -> bool:
+		"""
+		Checks whether a node has been added to the index.
+		"""
+		return node.discord_id in self._indices
+
+
+	def add_node(self, node: TreeNode) -> None:
+		"""
+		Adds a node to the index.
+		@param node The node to add. The node's inviter must already have been
+		  added to the index.
+		@throws ValueError If the node has already been added or if the node's
+		  inviter has not been added.
+		"""
+		if node.discord_id in self._indices:
+			raise ValueError(f"Node for user {node.discord_id} already exists.")
+		if not node.inviter or node.inviter.discord_id not in self._indices:
+			raise ValueError(
+				f"Inviter for user {node.discord_id} does not exist."
+			)
+
+		parent = self._indices[node.inviter.discord_id]
+		jumps = [parent]
+		while True:
+			# The ancestor 2^k invites up is 2^(k-1) invites up from the
+			#   ancestor 2^(k-1) invites up
+			k = len(jumps)
+			ancestor_jumps = self._jumps[jumps[k - 1]]
+			if len(ancestor_jumps) < k:
+				break
+			jumps.append(ancestor_jumps[k - 1])
+
+		index = len(self._nodes)
+		self._indices[node.discord_id] = index
+		self._nodes.append(node)
+		self._depths.append(self._depths[parent] + 1)
+		self._jumps.append(jumps)
+
+
+	def get_depth(self, node: TreeNode) -> int:
+		"""
+		Gets the number of invites between the root node and a node.
+		@param node The node to get the depth of.
+		@throws KeyError If the node has not been added to the index.
+		@returns The depth of the node. The root node has a depth of 0.
+		"""
+		return self._depths[self._get_index(node)]
+
+
+	def find_lowest_common_ancestor(self,
+		node_a: TreeNode,
+		node_b: TreeNode) -> TreeNode:
+		"""
+		Finds the deepest node that is an ancestor of both nodes.
+		Each node is considered to be an ancestor of itself.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws KeyError If either node has not been added to the index.
+		@returns The lowest common ancestor of the two nodes.
+		"""
+		return self._nodes[self._find_lowest_common_ancestor(
+			self._get_index(node_a),
+			self._get_index(node_b)
+		)]
+
+
+	def get_distance(self, node_a: TreeNode, node_b: TreeNode) -> int:
+		"""
+		Gets the number of invites on the path between two nodes.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws KeyError If either node has not been added to the index.
+		@returns The number of edges on the path between the two nodes.
+		"""
+		a = self._get_index(node_a)
+		b = self._get_index(node_b)
+		ancestor = self._find_lowest_common_ancestor(a, b)
+		return self._depths[a] + self._depths[b] - 2 * self._depths[ancestor]
+
+
+	def _get_index(self, node: TreeNode) -> int:
+		"""
+		Gets the index assigned to a node.
+		@param node The node to get the index of.
+		@throws KeyError If the node has not been added to the index.
+		@returns The index of the node.
+		"""
+		index = self._indices.get(node.discord_id)
+		if index is None:
+			raise KeyError(f"Node for user {node.discord_id} does not exist.")
+		return index
+
+
+	def _lift(self, index: int, distance: int) -> int:
+		"""
+		Finds the ancestor of a node.
+		@param index The index of the node.
+		@param distance The number of invites up the tree to move. Must not be
+		  greater than the node's depth.
+		@returns The index of the ancestor.
+		"""
+		k = 0
+		while distance:
+			if distance & 1:
+				index = self._jumps[index][k]
+			distance >>= 1
+			k += 1
+		return index
+
+
+	def _find_lowest_common_ancestor(self, a: int, b: int) -> int:
+		"""
+		Finds the deepest node that is an ancestor of both nodes.
+		@param a The index of the first node.
+		@param b The index of the second node.
+		@returns The index of the lowest common ancestor.
+		"""
+		# Move the deeper node up until both nodes are at the same depth
+		if self._depths[a] < self._depths[b]:
+			a, b = b, a
+		a = self._lift(a, self._depths[a] - self._depths[b])
+		if a == b:
+			return a
+
+		# Move both nodes up by the largest distance that keeps them apart.
+		#   Both nodes are at the same depth, so they have the same number of
+		#   jumps.
+		for k in range(len(self._jumps[a]) - 1, -1, -1):
+			jumps_a = self._jumps[a]
+			if k < len(jumps_a) and jumps_a[k] != self._jumps[b][k]:
+				a = jumps_a[k]
+				b = self._jumps[b][k]
+		return self._jumps[a][0]
@@ -0,0 +1,252 @@
+from bot.models.family_tree import IFamilyTree
+from bot.models.tree_node import TreeNode
+import colorsys
+from typing import Dict, List, Optional, Tuple
+
+class BranchColorEngine:
+	"""
+	Gives each branch of a family tree its own background color.
+	A branch is made up of a child of the root node (the branch's head) and
+	  all of the head's descendants, and every node in a branch has the head's
+	  color. New heads are given the palette color used by the fewest other
+	  heads, so branches have distinct colors until there are more branches
+	  than colors, and all other new nodes are given their inviter's color.
+	  Adding a node therefore never recolors existing nodes.
+	The only change that moves nodes between branches is removing a head,
+	  which makes each of the head's children the head of a new branch. Only
+	  the nodes in those branches are recolored. Heads are tracked by
+	  listening to the tree's events and are found when the engine is
+	  started, at which point heads without a palette color are given one and
+	  nodes that do not match their head (e.g. nodes of a loaded tree) are
+	  recolored. Once started, the engine only accesses the tree from its
+	  event handlers, so `get_color()` may be called while a thread safe
+	  tree is locked (e.g. from inside a batch).
+	Nodes added with the wrong color are recolored from the engine's
+	  `on_node_added` handler, so handlers that record changes to the tree
+	  (e.g. history logs) must be subscribed before the engine is created.
+	Not thread safe, but may be used with a thread safe tree as long as all
+	  changes to the tree are made from the same thread.
+	"""
+	# Number of colors in the palette.
+	PALETTE_SIZE = 16
+
+	# Fraction of the color wheel between consecutive palette colors. Stepping
+	#   by the golden ratio keeps each prefix of the palette spread evenly
+	#   around the wheel, so the first few branches are the most distinct.
+	HUE_STEP = 0.6180339887498949
+
+	# Lightness of palette colors. Colors are light so that node text stays
+	#   readable.
+	LIGHTNESS = 0.8
+
+	# Saturation of palette colors.
+	SATURATION = 0.65
+
+	def __init__(self, tree: IFamilyTree):
+		"""
+		Initializes a new instance of the class.
+		@param tree The tree to color. The tree is not changed until the engine
+		  is started.
+		"""
+		self._tree = tree
+
+		# Colors that are given to branches, in the order they are given out
+		#   when several colors are used equally often.
+		self._palette: Tuple[str, ...] = tuple(
+			BranchColorEngine._get_palette_color(i)
+			for i in range(BranchColorEngine.PALETTE_SIZE)
+		)
+
+		# Root node of the tree. None until the engine is started.
+		self._root: Optional[TreeNode] = None
+
+		# Color of each branch's head, indexed by the head's user ID.
+		self._heads: Dict[int, str] = {}
+
+		# Number of heads with each palette color.
+		self._counts: Dict[str, int] = {color: 0 for color in self._palette}
+
+		tree.events.on_node_added += self._on_node_added # type: ignore
+		tree.events.on_node_removed += self._on_node_removed # type: ignore
+
+
+	@property
+	def palette(self) -> Tuple[str, ...]:
+		"""
+		Gets the colors that are given to branches.
+		"""
+		return self._palette
+
+
+	def start(self) -> None:
+		"""
+		Finds the tree's heads, gives heads without a palette color the least
+		  used color, and then recolors every node that does not match its
+		  head. Does nothing if the engine has already started.
+		Must not be called while the tree is locked or being changed, since
+		  the tree is read and updated through the instance the engine was
+		  created with.
+		"""
+		if self._root is not None:
+			return
+
+		tree = self._tree
+		root = tree.root_node
+		self._root = root
+
+		new_heads: List[TreeNode] = []
+		for head in tree.get_child_nodes(root):
+			if head.background_color in self._counts:
+				self._add_head(head, head.background_color)
+			else:
+				new_heads.append(head)
+		for head in new_heads:
+			self._add_head(head, self._get_least_used_color())
+
+		# Every node is checked, so the color of each node's branch is found by
+		#   walking up to the first node whose branch is known instead of
+		#   traversing each branch
+		branch_colors: Dict[int, Optional[str]] = {root.discord_id: None}
+		colors: List[Tuple[TreeNode, str]] = []
+		for tree_node in tree.get_view():
+			path: List[TreeNode] = []
+			current = tree_node
+			while current.discord_id not in branch_colors:
+				path.append(current)
+				assert current.inviter
+				current = current.inviter
+
+			color = branch_colors[current.discord_id]
+			for path_node in reversed(path):
+				if color is None:
+					color = self._heads[path_node.discord_id]
+				branch_colors[path_node.discord_id] = color
+				if path_node.background_color != color:
+					colors.append((path_node, color))
+
+		if colors:
+			tree.update_background_colors(colors)
+
+
+	def get_color(self, inviter: TreeNode) -> str:
+		"""
+		Gets the background color of a node that is about to be added.
+		@param inviter The node of the user that invited the new user. Must be
+		  in the tree.
+		@throws RuntimeError If the engine has not been started.
+		@returns The color of the new node's branch. If the new node will be
+		  the head of a new branch, this is the least used palette color.
+		"""
+		if self._root is None:
+			raise RuntimeError("The engine has not been started.")
+		if inviter.inviter is None:
+			return self._get_least_used_color()
+		return inviter.background_color
+
+
+	def _on_node_added(self, tree: IFamilyTree, node: TreeNode) -> None:
+		"""
+		Adds new heads and corrects the color of nodes that were added without
+		  using `get_color()`.
+		"""
+		if self._root is None:
+			return
+
+		assert node.inviter
+		if node.inviter.inviter is None:
+			if node.background_color in self._counts:
+				self._add_head(node, node.background_color)
+			else:
+				self._color_branches(tree, [node])
+		elif node.background_color != node.inviter.background_color:
+			tree.update_background_colors(
+				[(node, node.inviter.background_color)]
+			)
+
+
+	def _on_node_removed(self, tree: IFamilyTree, node: TreeNode) -> None:
+		"""
+		Recolors the branches of the children of a removed head.
+		"""
+		if self._root is None:
+			return
+
+		color = self._heads.pop(node.discord_id, None)
+		if color is None:
+			return
+		if color in self._counts:
+			self._counts[color] -= 1
+
+		# When several nodes are removed at once, the new heads may have been
+		#   children of any removed node, so all heads are checked
+		self._color_branches(
+			tree,
+			[
+				head for head in tree.get_child_nodes(self._root)
+				if head.discord_id not in self._heads
+			]
+		)
+
+
+	def _color_branches(self,
+		tree: IFamilyTree,
+		heads: List[TreeNode]) -> None:
+		"""
+		Gives each of the given heads the least used palette color and
+		  recolors the head's branch to match.
+		@param tree The tree to update.
+		@param heads The heads of the branches to recolor.
+		"""
+		colors: List[Tuple[TreeNode, str]] = []
+		for head in heads:
+			color = self._get_least_used_color()
+			self._add_head(head, color)
+
+			stack = [head]
+			while stack:
+				branch_node = stack.pop()
+				if branch_node.background_color != color:
+					colors.append((branch_node, color))
+				stack.extend(tree.get_child_nodes(branch_node))
+
+		if colors:
+			tree.update_background_colors(colors)
+
+
+	def _add_head(self, head: TreeNode, color: str) -> None:
+		"""
+		Records the color of a head.
+		@param head The head to record.
+		@param color The color of the head's branch.
+		"""
+		self._heads[head.discord_id] = color
+		if color in self._counts:
+			self._counts[color] += 1
+
+
+	def _get_least_used_color(self) -> str:
+		"""
+		Gets the palette color used by the fewest heads.
+		@returns The color. Ties are broken by palette order.
+		"""
+		return min(self._palette, key=self._counts.__getitem__)
+
+
+	@staticmethod
+	def _get_palette_color(index: int) -> str:
+		"""
+		Gets a color of the palette.
+		@param index The index of the color in the palette.
+		@returns The color as a hex string, e.g. `#FFC0CB`.
+		"""
+		hue = (index * BranchColorEngine.HUE_STEP) % 1.0
+		red, green, blue = colorsys.hls_to_rgb(
+			hue,
+			BranchColorEngine.LIGHTNESS,
+			BranchColorEngine.SATURATION
+		)
+		return "#{:02X}{:02X}{:02X}".format(
+			round(red * 255),
+			round(green * 255),
+			round(blue * 255)
+		)
@@ -1,10 +1,18 @@
 from bot.bot_events.family_tree_events import FamilyTreeEvents
+from bot.models.ancestor_index import AncestorIndex
+from bot.models.family_tree_snapshot import FamilyTreeSnapshot
+from bot.models.leaderboard import Leaderboard
+from bot.models.persistent_map import PersistentMap
+from bot.models.search_index import SearchIndex
 from bot.models.tree_node import TreeNode
 from bot.models.family_tree import IFamilyTree
+from bot.models.subtree_index import SubtreeIndex
+from bot.models.tree_node_snapshot import TreeNodeSnapshot
 from bot.util.discord_statics import DiscordStatics
 from bot.views.tree_view import ITreeView
 from bot.views.list_tree_view import ListTreeView
-from typing import Dict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 class DictFamilyTree(IFamilyTree):
 	"""
@@ -24,6 +32,98 @@ class DictFamilyTree(IFamilyTree):
 			root_node.discord_id: root_node
 		}
 
+		# Index used to answer relationship queries.
+		# The index is updated as nodes are added but cannot be updated when a
+		#   node is removed. Instead, it is discarded and rebuilt the next time
+		#   it is needed.
+		self._ancestor_index: Optional[AncestorIndex] = AncestorIndex(root_node)
+
+		# Index used to answer descendant queries and find child nodes.
+		# Keeping the index up to date takes O(depth) time per node, so the
+		#   index is only created once it is first needed. This keeps building
+		#   large trees (e.g. when loading saved trees) fast.
+		self._subtree_index: Optional[SubtreeIndex] = None
+
+		# Number of users directly invited by each user.
+		# Adding or removing a node changes at most two users' counts, so the
+		#   leaderboard is always kept up to date.
+		self._inviters = Leaderboard()
+
+		# Index used to search for nodes by name.
+		# Like the subtree index, the search index is only created once it is
+		#   first needed since most trees are never searched.
+		self._search_index: Optional[SearchIndex] = None
+
+		# Number of nodes that have ever been added to the tree, including the
+		#   root node. Used to assign join indices to node snapshots.
+		self._join_count = 1
+
+		# Snapshot of each node, indexed by the user's discord account ID.
+		# The map is immutable, so every change to the tree replaces it with a
+		#   new version that shares most of its structure with the previous
+		#   version. Like the other indices, it is only created once the first
+		#   snapshot is taken.
+		self._snapshot_nodes: Optional[
+			PersistentMap[int, TreeNodeSnapshot]
+		] = None
+
+		# Object identifying snapshots whose maps of nodes were derived from
+		#   the same map, which allows them to be compared efficiently.
+		self._snapshot_lineage = object()
+
+		# Number of batches that are currently open. Batches may be nested.
+		self._batch_depth = 0
+
+		# Whether the tree was modified during the current batch.
+		self._batch_modified = False
+
+
+	@staticmethod
+	def from_nodes(nodes: Sequence[TreeNode]) -> "DictFamilyTree":
+		"""
+		Creates a tree containing the given nodes.
+		This is much faster than adding each node with `add_node()` since no
+		  events are emitted and the tree's indices are built all at once when
+		  they are first needed. Used to load saved trees.
+		@param nodes The nodes of the tree in the order they joined. The first
+		  node must be the root node, and each node's inviter must come before
+		  the node.
+		@throws ValueError If no nodes are given.
+		@throws ValueError If a user has more than one node.
+		@throws ValueError If a node's inviter does not come before the node.
+		@throws RuntimeError If any node except the first has no inviter.
+		@returns The new tree.
+		"""
+		if not nodes:
+			raise ValueError("Cannot create a tree without a root node.")
+		if nodes[0].inviter:
+			raise ValueError("The first node must be the root node.")
+
+		tree = DictFamilyTree(nodes[0])
+		tree_nodes = tree._nodes
+		invite_counts: Dict[int, int] = {}
+		for node in nodes[1:]:
+			if node.discord_id in tree_nodes:
+				raise ValueError(
+					f"Node for user {node.discord_full_username} already exists."
+				)
+			if not node.inviter:
+				raise RuntimeError(
+					"Cannot add a second root node to the tree."
+				)
+			inviter_id = node.inviter.discord_id
+			if inviter_id not in tree_nodes:
+				raise ValueError(
+					f"Inviter for user {node.discord_full_username} does not exist."
+				)
+			tree_nodes[node.discord_id] = node
+			invite_counts[inviter_id] = invite_counts.get(inviter_id, 0) + 1
+
+		tree._inviters = Leaderboard.from_scores(invite_counts)
+		tree._ancestor_index = None
+		tree._join_count = len(nodes)
+		return tree
+
 
 	def __len__(self) -> int:
 		"""
@@ -40,6 +140,14 @@ class DictFamilyTree(IFamilyTree):
 		return self._events
 
 
+	@property
+	def root_node(self) -> TreeNode:
+		"""
+		Gets the root node of the tree.
+		"""
+		return self._root_node
+
+
 	def add_node(self, node: TreeNode) -> None:
 		"""
 		Adds a new node to the tree.
@@ -68,6 +176,25 @@ class DictFamilyTree(IFamilyTree):
 
 		# Add the node to the tree
 		self._nodes[node.discord_id] = node
+		self._inviters.add(node.inviter.discord_id, 1)
+		if self._snapshot_nodes is not None:
+			self._snapshot_nodes = self._snapshot_nodes.set(
+				node.discord_id,
+				TreeNodeSnapshot.from_node(node, self._join_count)
+			)
+		self._join_count += 1
+		if self._subtree_index is not None:
+			self._subtree_index.add_node(node)
+		if self._ancestor_index is not None:
+			self._ancestor_index.add_node(node)
+		if self._search_index is not None:
+			self._search_index.add_node(node)
+
+		# Handlers may make further changes (e.g. recoloring the new node),
+		#   which are saved along with the change that emitted the event
+		with self.batch():
+			self._events.on_node_added(self, node)
+			self._notify_modified()
 
 
 	def find_node_by_user_id(self, user_id: int) -> TreeNode:
@@ -77,14 +204,12 @@ class DictFamilyTree(IFamilyTree):
 		@throws KeyError If a node for the given user does not exist in the tree.
 		@returns The node for the given username.
 		"""
-		view = self.get_view().filter_by_user_id(user_id)
-		if len(view) == 0:
+		node = self._nodes.get(user_id)
+		if node is None:
 			raise KeyError(
 				f"Node for user {user_id} does not exist."
 			)
-
-		assert len(view) == 1
-		return next(iter(view))
+		return node
 
 
 	def find_node_by_username(self,
@@ -100,7 +225,7 @@ class DictFamilyTree(IFamilyTree):
 		@returns The node for the given username.
 		"""
 		full_username = DiscordStatics.get_full_username(username, discriminator)
-		view = self.get_view().filter_by_username(full_username)\
+		view = self.get_view().filter_by_username(username)\
 			.filter_by_discriminator(discriminator)
 		if len(view) == 0:
 			raise KeyError(
@@ -111,6 +236,238 @@ class DictFamilyTree(IFamilyTree):
 		return next(iter(view))
 
 
+	def find_lowest_common_ancestor(self,
+		node_a: TreeNode,
+		node_b: TreeNode) -> TreeNode:
+		"""
+		Finds the deepest node that both nodes are descended from.
+		Each node is considered to be descended from itself, so if one node is
+		  an ancestor of the other, that node is returned.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws ValueError If either node does not exist in the tree.
+		@returns The lowest common ancestor of the two nodes.
+		"""
+		self._check_contains(node_a)
+		self._check_contains(node_b)
+		return self._get_ancestor_index().find_lowest_common_ancestor(
+			node_a,
+			node_b
+		)
+
+
+	def get_distance(self, node_a: TreeNode, node_b: TreeNode) -> int:
+		"""
+		Gets the number of invites on the path between two nodes.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws ValueError If either node does not exist in the tree.
+		@returns The number of invites between the two nodes. This is 0 if
+		  both nodes are the same node.
+		"""
+		self._check_contains(node_a)
+		self._check_contains(node_b)
+		return self._get_ancestor_index().get_distance(node_a, node_b)
+
+
+	def is_descendant(self, node: TreeNode, ancestor: TreeNode) -> bool:
+		"""
+		Checks whether a node was directly or indirectly invited by another.
+		@param node The node that may be a descendant.
+		@param ancestor The node that may be an ancestor.
+		@throws ValueError If either node does not exist in the tree.
+		@returns True if `ancestor` is an ancestor of `node`. A node is not a
+		  descendant of itself.
+		"""
+		self._check_contains(node)
+		self._check_contains(ancestor)
+		return self._get_subtree_index().is_descendant(node, ancestor)
+
+
+	def get_descendant_count(self, node: TreeNode) -> int:
+		"""
+		Gets the number of users that a user directly or indirectly invited.
+		@param node The node of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@returns The number of descendants of the node, not including the node
+		  itself.
+		"""
+		self._check_contains(node)
+		return self._get_subtree_index().get_subtree_size(node) - 1
+
+
+	def get_child_nodes(self, node: TreeNode) -> List[TreeNode]:
+		"""
+		Gets the nodes of the users that a user directly invited.
+		@param node The node of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@returns The child nodes of the node, ordered by when each child was
+		  assigned to the node.
+		"""
+		self._check_contains(node)
+		return self._get_subtree_index().get_child_nodes(node)
+
+
+	def get_top_inviters(self,
+		count: int,
+		transitive: bool = False) -> List[Tuple[TreeNode, int]]:
+		"""
+		Gets the users that invited the most users.
+		@param count The maximum number of users to return.
+		@param transitive Whether to count users that were indirectly invited
+		  by each user. If False, only direct invites are counted.
+		@returns Each user's node and invite count, ordered from most to fewest
+		  invites. Users with the same number of invites are ordered by
+		  ascending user ID. Users that have not invited anyone are excluded.
+		"""
+		if transitive:
+			return self._get_subtree_index().get_largest_subtrees(count)
+		return [
+			(self._nodes[user_id], invites)
+			for user_id, invites in self._inviters.get_top(count)
+		]
+
+
+	def search(self, query: str, limit: int) -> List[TreeNode]:
+		"""
+		Finds the nodes whose nickname or username best match a query.
+		Names that start with the query are returned first, followed by names
+		  containing a word that starts with the query and then by names that
+		  are similar to the query.
+		@param query The text to search for. Case is ignored.
+		@param limit The maximum number of nodes to return.
+		@returns The matching nodes, ordered from best to worst match.
+		"""
+		return self._get_search_index().search(query, limit)
+
+
+	def update_nickname(self, node: TreeNode, nickname: str) -> None:
+		"""
+		Changes the nickname of a node in the tree.
+		Nicknames of nodes in a tree should always be changed using this
+		  method so that the tree's indices stay up to date.
+		@param node The node to update.
+		@param nickname The new nickname of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@throws ValueError If the nickname is empty.
+		"""
+		self._check_contains(node)
+		node = self._nodes[node.discord_id]
+		if self._search_index is None:
+			node.user_nickname = nickname
+		else:
+			# Make sure the nickname is valid before removing the node's entries
+			if not nickname:
+				raise ValueError(
+					"Cannot set a user's nickname to the empty string."
+				)
+			self._search_index.remove_node(node)
+			node.user_nickname = nickname
+			self._search_index.add_node(node)
+		self._update_snapshot_node(node)
+		self._events.on_nickname_changed(self, node)
+		self._notify_modified()
+
+
+	def update_nicknames(self, nicknames: Iterable[Tuple[TreeNode, str]]) -> None:
+		"""
+		Changes the nicknames of several nodes in the tree at once.
+		Equivalent to calling `update_nickname()` for each node in a batch, but
+		  the search index is updated once for all nodes. `on_nickname_changed`
+		  is emitted for each node whose nickname changed and `on_modified` is
+		  emitted once. If a node appears more than once, its last nickname is
+		  used. Every update is checked before any nickname is changed, so no
+		  nicknames are changed if an exception is raised.
+		@param nicknames Each node to update and its new nickname.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError If a nickname is empty.
+		"""
+		updates: Dict[int, str] = {}
+		for node, nickname in nicknames:
+			self._check_contains(node)
+			if not nickname:
+				raise ValueError(
+					"Cannot set a user's nickname to the empty string."
+				)
+			updates[node.discord_id] = nickname
+
+		changed: List[TreeNode] = []
+		for user_id, nickname in updates.items():
+			node = self._nodes[user_id]
+			if node.user_nickname != nickname:
+				node.user_nickname = nickname
+				self._update_snapshot_node(node)
+				changed.append(node)
+		if not changed:
+			return
+
+		if self._search_index is not None:
+			self._search_index.update_nodes(changed)
+		for node in changed:
+			self._events.on_nickname_changed(self, node)
+		self._notify_modified()
+
+
+	def update_background_colors(self,
+		colors: Iterable[Tuple[TreeNode, str]]) -> None:
+		"""
+		Changes the background colors of several nodes in the tree at once.
+		`on_background_color_changed` is emitted for each node whose color
+		  changed and `on_modified` is emitted once. If a node appears more
+		  than once, its last color is used. Every update is checked before
+		  any color is changed, so no colors are changed if an exception is
+		  raised.
+		@param colors Each node to update and its new background color.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError If a color is empty.
+		"""
+		updates: Dict[int, str] = {}
+		for node, color in colors:
+			self._check_contains(node)
+			if not color:
+				raise ValueError(
+					"Cannot set a user's background color to the empty string."
+				)
+			updates[node.discord_id] = color
+
+		changed: List[TreeNode] = []
+		for user_id, color in updates.items():
+			node = self._nodes[user_id]
+			if node.background_color != color:
+				node.background_color = color
+				self._update_snapshot_node(node)
+				changed.append(node)
+		if not changed:
+			return
+
+		for node in changed:
+			self._events.on_background_color_changed(self, node)
+		self._notify_modified()
+
+
+	def snapshot(self) -> FamilyTreeSnapshot:
+		"""
+		Gets an immutable view of the tree's current state.
+		This method must be called from the thread that modifies the tree, but
+		  the returned snapshot may be read from any thread. The first snapshot
+		  of a tree takes O(n) time to create; after that, snapshots are O(1).
+		@returns The snapshot of the tree.
+		"""
+		if self._snapshot_nodes is None:
+			# Insertion order is a valid join order for the same reason it is
+			#   used by `_get_ancestor_index()`, and every node added later will
+			#   be assigned a higher join index
+			self._snapshot_nodes = PersistentMap.from_items(
+				(node.discord_id, TreeNodeSnapshot.from_node(node, i))
+				for i, node in enumerate(self._nodes.values())
+			)
+		return FamilyTreeSnapshot(
+			self._root_node.discord_id,
+			self._snapshot_nodes,
+			self._snapshot_lineage
+		)
+
+
 	def get_view(self) -> ITreeView:
 		"""
 		Gets a view of the entire tree.
@@ -128,19 +485,187 @@ class DictFamilyTree(IFamilyTree):
 		@throws ValueError Thrown if the node is the root node.
 		"""
 		# Get the node to remove
-		node = self.find_node_by_username(
-			node.discord_username,
-			node.discord_discriminator
-		)
+		self._check_contains(node)
+		node = self._nodes[node.discord_id]
 
 		# Make sure the node is not the root node
 		if node == self._root_node:
 			raise ValueError("Cannot remove the root node.")
 
-		# Update all child nodes to point to the parent node
-		child_nodes = self.get_view().filter_to_child_nodes(node)
+		# Remove the node from the tree and update all child nodes to point
+		#   to the parent node
+		child_nodes = self._get_subtree_index().remove_node(node)
 		for child_node in child_nodes:
 			child_node.inviter = node.inviter
-
-		# Remove the node from the tree
+			self._update_snapshot_node(child_node)
 		del self._nodes[node.discord_id]
+		if self._snapshot_nodes is not None:
+			self._snapshot_nodes = self._snapshot_nodes.remove(node.discord_id)
+
+		# The inviter loses the removed node but gains all of its children
+		assert node.inviter
+		self._inviters.add(node.inviter.discord_id, len(child_nodes) - 1)
+		self._inviters.remove(node.discord_id)
+		if self._search_index is not None:
+			self._search_index.remove_node(node)
+		self._ancestor_index = None
+
+		# See `add_node()`
+		with self.batch():
+			self._events.on_node_removed(self, node)
+			self._notify_modified()
+
+
+	def remove_nodes(self, nodes: Iterable[TreeNode]) -> None:
+		"""
+		Removes several nodes from the tree at once.
+		Each child of a removed node that is not removed itself is re-assigned
+		  to its nearest ancestor that is not removed. Equivalent to calling
+		  `remove_node()` for each node in a batch, but the tree's indices are
+		  only updated once. `on_node_removed` is emitted for each node once
+		  all nodes have been removed, and `on_modified` is emitted once. Every
+		  node is checked before any node is removed, so no nodes are removed
+		  if an exception is raised.
+		@param nodes The nodes to remove. Duplicates are ignored.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError Thrown if a node is the root node.
+		"""
+		# Check every node before changing anything
+		removed: Dict[int, TreeNode] = {}
+		for node in nodes:
+			self._check_contains(node)
+			node = self._nodes[node.discord_id]
+			if node == self._root_node:
+				raise ValueError("Cannot remove the root node.")
+			removed[node.discord_id] = node
+		if not removed:
+			return
+
+		# Each surviving inviter loses its removed invitees but gains their
+		#   surviving children
+		invite_changes: Dict[int, int] = {}
+		for node in removed.values():
+			assert node.inviter
+			inviter_id = node.inviter.discord_id
+			if inviter_id not in removed:
+				invite_changes[inviter_id] = invite_changes.get(inviter_id, 0) - 1
+		moved = self._get_subtree_index().remove_nodes(removed.values())
+		for child_node, parent_node in moved:
+			child_node.inviter = parent_node
+			parent_id = parent_node.discord_id
+			invite_changes[parent_id] = invite_changes.get(parent_id, 0) + 1
+			self._update_snapshot_node(child_node)
+		for user_id, change in invite_changes.items():
+			self._inviters.add(user_id, change)
+
+		for user_id in removed:
+			del self._nodes[user_id]
+			self._inviters.remove(user_id)
+			if self._snapshot_nodes is not None:
+				self._snapshot_nodes = self._snapshot_nodes.remove(user_id)
+		if self._search_index is not None:
+			self._search_index.remove_nodes(removed.values())
+		self._ancestor_index = None
+
+		# See `add_node()`
+		with self.batch():
+			for node in removed.values():
+				self._events.on_node_removed(self, node)
+			self._notify_modified()
+
+
+	@contextmanager
+	def batch(self) -> Iterator[IFamilyTree]:
+		"""
+		Groups several changes to the tree so that `on_modified` is only
+		  emitted once, after the last change.
+		Batches may be nested, in which case `on_modified` is emitted when the
+		  outermost batch ends. If an exception is raised in the batch, changes
+		  made before the exception are kept and `on_modified` is still
+		  emitted.
+		@returns A context manager that returns this tree.
+		"""
+		self._batch_depth += 1
+		try:
+			yield self
+		finally:
+			self._batch_depth -= 1
+			if not self._batch_depth and self._batch_modified:
+				self._batch_modified = False
+				self._events.on_modified(self)
+
+
+	def _check_contains(self, node: TreeNode) -> None:
+		"""
+		Makes sure that a node exists in the tree.
+		@param node The node to check.
+		@throws ValueError If the node does not exist in the tree.
+		"""
+		if node.discord_id not in self._nodes:
+			raise ValueError(
+				f"Node for user {node.discord_full_username} does not exist."
+			)
+
+
+	def _notify_modified(self) -> None:
+		"""
+		Emits `on_modified`, or defers it until the current batch ends.
+		"""
+		if self._batch_depth:
+			self._batch_modified = True
+		else:
+			self._events.on_modified(self)
+
+
+	def _get_ancestor_index(self) -> AncestorIndex:
+		"""
+		Gets the ancestor index, rebuilding it if it was discarded.
+		@returns The ancestor index for the tree.
+		"""
+		if self._ancestor_index is None:
+			# Nodes are stored in the order they were added. Every node's
+			#   inviter was added before the node itself, and removing a node
+			#   only re-assigns its children to an earlier node, so each
+			#   inviter is indexed before its invitees.
+			nodes = iter(self._nodes.values())
+			index = AncestorIndex(next(nodes))
+			for node in nodes:
+				index.add_node(node)
+			self._ancestor_index = index
+		return self._ancestor_index
+
+
+	def _get_subtree_index(self) -> SubtreeIndex:
+		"""
+		Gets the subtree index, creating it if it does not exist yet.
+		@returns The subtree index for the tree.
+		"""
+		if self._subtree_index is None:
+			# See `_get_ancestor_index()` for why insertion order can be used
+			self._subtree_index = SubtreeIndex.build(self._nodes.values())
+		return self._subtree_index
+
+
+	def _get_search_index(self) -> SearchIndex:
+		"""
+		Gets the search index, creating it if it does not exist yet.
+		@returns The search index for the tree.
+		"""
+		if self._search_index is None:
+			self._search_index = SearchIndex.build(self._nodes.values())
+		return self._search_index
+
+
+	def _update_snapshot_node(self, node: TreeNode) -> None:
+		"""
+		Replaces the snapshot of a node after the node's data has changed.
+		Does nothing if no snapshot has been taken yet.
+		@param node The node that changed.
+		"""
+		if self._snapshot_nodes is None:
+			return
+		join_index = self._snapshot_nodes[node.discord_id].join_index
+		self._snapshot_nodes = self._snapshot_nodes.set(
+			node.discord_id,
+			TreeNodeSnapshot.from_node(node, join_index)
+		)
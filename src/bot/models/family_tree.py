@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
 from bot.bot_events.family_tree_events import FamilyTreeEvents
+from bot.models.family_tree_snapshot import FamilyTreeSnapshot
 from bot.models.tree_node import TreeNode
 from bot.views.tree_view import ITreeView
+from typing import ContextManager, Iterable, List, Tuple
 
 class IFamilyTree(ABC):
 	"""
@@ -24,6 +26,15 @@ class IFamilyTree(ABC):
 		raise NotImplementedError()
 
 
+	@property
+	@abstractmethod
+	def root_node(self) -> TreeNode:
+		"""
+		Gets the root node of the tree.
+		"""
+		raise NotImplementedError()
+
+
 	@abstractmethod
 	def add_node(self, node: TreeNode) -> None:
 		"""
@@ -64,6 +75,161 @@ class IFamilyTree(ABC):
 		raise NotImplementedError()
 
 
+	@abstractmethod
+	def find_lowest_common_ancestor(self,
+		node_a: TreeNode,
+		node_b: TreeNode) -> TreeNode:
+		"""
+		Finds the deepest node that both nodes are descended from.
+		Each node is considered to be descended from itself, so if one node is
+		  an ancestor of the other, that node is returned.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws ValueError If either node does not exist in the tree.
+		@returns The lowest common ancestor of the two nodes.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def get_distance(self, node_a: TreeNode, node_b: TreeNode) -> int:
+		"""
+		Gets the number of invites on the path between two nodes.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws ValueError If either node does not exist in the tree.
+		@returns The number of invites between the two nodes. This is 0 if
+		  both nodes are the same node.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def is_descendant(self, node: TreeNode, ancestor: TreeNode) -> bool:
+		"""
+		Checks whether a node was directly or indirectly invited by another.
+		@param node The node that may be a descendant.
+		@param ancestor The node that may be an ancestor.
+		@throws ValueError If either node does not exist in the tree.
+		@returns True if `ancestor` is an ancestor of `node`. A node is not a
+		  descendant of itself.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def get_descendant_count(self, node: TreeNode) -> int:
+		"""
+		Gets the number of users that a user directly or indirectly invited.
+		@param node The node of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@returns The number of descendants of the node, not including the node
+		  itself.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def get_child_nodes(self, node: TreeNode) -> List[TreeNode]:
+		"""
+		Gets the nodes of the users that a user directly invited.
+		@param node The node of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@returns The child nodes of the node, ordered by when each child was
+		  assigned to the node.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def get_top_inviters(self,
+		count: int,
+		transitive: bool = False) -> List[Tuple[TreeNode, int]]:
+		"""
+		Gets the users that invited the most users.
+		@param count The maximum number of users to return.
+		@param transitive Whether to count users that were indirectly invited
+		  by each user. If False, only direct invites are counted.
+		@returns Each user's node and invite count, ordered from most to fewest
+		  invites. Users with the same number of invites are ordered by
+		  ascending user ID. Users that have not invited anyone are excluded.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def search(self, query: str, limit: int) -> List[TreeNode]:
+		"""
+		Finds the nodes whose nickname or username best match a query.
+		Names that start with the query are returned first, followed by names
+		  containing a word that starts with the query and then by names that
+		  are similar to the query.
+		@param query The text to search for. Case is ignored.
+		@param limit The maximum number of nodes to return.
+		@returns The matching nodes, ordered from best to worst match.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def update_nickname(self, node: TreeNode, nickname: str) -> None:
+		"""
+		Changes the nickname of a node in the tree.
+		Nicknames of nodes in a tree should always be changed using this
+		  method so that the tree's indices stay up to date.
+		@param node The node to update.
+		@param nickname The new nickname of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@throws ValueError If the nickname is empty.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def update_nicknames(self, nicknames: Iterable[Tuple[TreeNode, str]]) -> None:
+		"""
+		Changes the nicknames of several nodes in the tree at once.
+		Equivalent to calling `update_nickname()` for each node in a batch, but
+		  the tree's indices are only updated once. `on_nickname_changed` is
+		  emitted for each node whose nickname changed and `on_modified` is
+		  emitted once. If a node appears more than once, its last nickname is
+		  used. Every update is checked before any nickname is changed, so no
+		  nicknames are changed if an exception is raised.
+		@param nicknames Each node to update and its new nickname.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError If a nickname is empty.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def update_background_colors(self,
+		colors: Iterable[Tuple[TreeNode, str]]) -> None:
+		"""
+		Changes the background colors of several nodes in the tree at once.
+		`on_background_color_changed` is emitted for each node whose color
+		  changed and `on_modified` is emitted once. If a node appears more
+		  than once, its last color is used. Every update is checked before
+		  any color is changed, so no colors are changed if an exception is
+		  raised.
+		@param colors Each node to update and its new background color.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError If a color is empty.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def snapshot(self) -> FamilyTreeSnapshot:
+		"""
+		Gets an immutable view of the tree's current state.
+		This method must be called from the thread that modifies the tree, but
+		  the returned snapshot may be read from any thread.
+		@returns The snapshot of the tree.
+		"""
+		raise NotImplementedError()
+
+
 	@abstractmethod
 	def get_view(self) -> ITreeView:
 		"""
@@ -83,3 +249,36 @@ class IFamilyTree(ABC):
 		@throws ValueError Thrown if the node is the root node.
 		"""
 		raise NotImplementedError()
+
+
+	@abstractmethod
+	def remove_nodes(self, nodes: Iterable[TreeNode]) -> None:
+		"""
+		Removes several nodes from the tree at once.
+		Each child of a removed node that is not removed itself is re-assigned
+		  to its nearest ancestor that is not removed. Equivalent to calling
+		  `remove_node()` for each node in a batch, but the tree's indices are
+		  only updated once. `on_node_removed` is emitted for each node once
+		  all nodes have been removed, and `on_modified` is emitted once. Every
+		  node is checked before any node is removed, so no nodes are removed
+		  if an exception is raised.
+		@param nodes The nodes to remove. Duplicates are ignored.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError Thrown if a node is the root node.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def batch(self) -> ContextManager["IFamilyTree"]:
+		"""
+		Groups several changes to the tree so that `on_modified` is only
+		  emitted once, after the last change.
+		Changes made in the batch must be made through the tree returned by
+		  the context manager, which may be a different object than this tree.
+		  Events for individual changes are still emitted as each change is
+		  made. If an exception is raised in the batch, changes made before
+		  the exception are kept.
+		@returns A context manager that returns the tree to modify.
+		"""
+		raise NotImplementedError()
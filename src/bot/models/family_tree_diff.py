@@ -0,0 +1,117 @@
+from __future__ import annotations
+from bot.models.family_tree import IFamilyTree
+from bot.models.family_tree_snapshot import FamilyTreeSnapshot
+from bot.models.tree_node_snapshot import TreeNodeSnapshot
+from typing import List, Tuple
+
+class FamilyTreeDiff:
+	"""
+	Describes the changes between two versions of a family tree.
+	Diffs between two snapshots of the same tree take time proportional to
+	  the number of changes. Diffs between unrelated trees (e.g. a tree and a
+	  copy of it loaded from disk) compare every node and take O(n) time.
+	"""
+	def __init__(self,
+		added: List[TreeNodeSnapshot],
+		removed: List[TreeNodeSnapshot],
+		reparented: List[Tuple[TreeNodeSnapshot, TreeNodeSnapshot]],
+		renamed: List[Tuple[TreeNodeSnapshot, TreeNodeSnapshot]]):
+		"""
+		Initializes a new instance of the class.
+		Diffs should be created using `between()` or `between_trees()`.
+		@param added Nodes that are only in the new version.
+		@param removed Nodes that are only in the old version.
+		@param reparented Old and new versions of nodes whose inviter changed.
+		@param renamed Old and new versions of nodes whose nickname changed.
+		"""
+		self._added = added
+		self._removed = removed
+		self._reparented = reparented
+		self._renamed = renamed
+
+
+	@staticmethod
+	def between(old: FamilyTreeSnapshot, new: FamilyTreeSnapshot) -> FamilyTreeDiff:
+		"""
+		Finds the changes between two snapshots.
+		@param old The snapshot of the old version of the tree.
+		@param new The snapshot of the new version of the tree.
+		@returns The changes needed to turn the old version into the new version.
+		"""
+		added: List[TreeNodeSnapshot] = []
+		removed: List[TreeNodeSnapshot] = []
+		reparented: List[Tuple[TreeNodeSnapshot, TreeNodeSnapshot]] = []
+		renamed: List[Tuple[TreeNodeSnapshot, TreeNodeSnapshot]] = []
+		for _, old_node, new_node in old.get_changed_nodes(new):
+			if old_node is None:
+				assert new_node
+				added.append(new_node)
+			elif new_node is None:
+				removed.append(old_node)
+			else:
+				if old_node.inviter_id != new_node.inviter_id:
+					reparented.append((old_node, new_node))
+				if old_node.user_nickname != new_node.user_nickname:
+					renamed.append((old_node, new_node))
+
+		# Nodes are sorted so that inviters are listed before their invitees,
+		#   which lets the changes be applied in order
+		added.sort(key=lambda node: node.join_index)
+		removed.sort(key=lambda node: node.join_index)
+		reparented.sort(key=lambda nodes: nodes[1].join_index)
+		renamed.sort(key=lambda nodes: nodes[1].join_index)
+		return FamilyTreeDiff(added, removed, reparented, renamed)
+
+
+	@staticmethod
+	def between_trees(old: IFamilyTree, new: IFamilyTree) -> FamilyTreeDiff:
+		"""
+		Finds the changes between the current states of two trees.
+		@param old The old version of the tree.
+		@param new The new version of the tree.
+		@returns The changes needed to turn the old version into the new version.
+		"""
+		return FamilyTreeDiff.between(old.snapshot(), new.snapshot())
+
+
+	@property
+	def added(self) -> List[TreeNodeSnapshot]:
+		"""
+		Gets the nodes that are only in the new version, in join order.
+		"""
+		return self._added
+
+
+	@property
+	def removed(self) -> List[TreeNodeSnapshot]:
+		"""
+		Gets the nodes that are only in the old version, in join order.
+		"""
+		return self._removed
+
+
+	@property
+	def reparented(self) -> List[Tuple[TreeNodeSnapshot, TreeNodeSnapshot]]:
+		"""
+		Gets the old and new versions of each node whose inviter changed.
+		Inviters change when a node's inviter is removed from the tree.
+		"""
+		return self._reparented
+
+
+	@property
+	def renamed(self) -> List[Tuple[TreeNodeSnapshot, TreeNodeSnapshot]]:
+		"""
+		Gets the old and new versions of each node whose nickname changed.
+		"""
+		return self._renamed
+
+
+	@property
+	def is_empty(self) -> bool:
+		"""
+		Whether the two versions have the same nodes, inviters, and nicknames.
+		"""
+		return not (
+			self._added or self._removed or self._reparented or self._renamed
+		)
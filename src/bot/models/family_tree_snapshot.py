@@ -0,0 +1,138 @@
+from __future__ import annotations
+from bot.models.persistent_map import PersistentMap
+from bot.models.tree_node_snapshot import TreeNodeSnapshot
+from typing import Dict, Iterator, List, Optional, Tuple
+
+class FamilyTreeSnapshot:
+	"""
+	Immutable view of a family tree at a point in time.
+	Snapshots share their data with the tree they were taken from and with
+	  other snapshots of the same tree, so taking a snapshot is O(1). Since a
+	  snapshot never changes, it may be read from any thread without locking,
+	  even while the tree it was taken from is being modified.
+	"""
+	def __init__(self,
+		root_id: int,
+		nodes: PersistentMap[int, TreeNodeSnapshot],
+		lineage: object):
+		"""
+		Initializes a new instance of the class.
+		@param root_id The discord ID of the root node's user.
+		@param nodes Snapshot of each node in the tree, indexed by the user's
+		  discord account ID.
+		@param lineage Object shared by every snapshot whose map of nodes was
+		  derived from the same original map. Such snapshots share most of
+		  their structure, which makes comparing them much faster.
+		"""
+		self._root_id = root_id
+		self._nodes = nodes
+		self._lineage = lineage
+
+
+	def __len__(self) -> int:
+		"""
+		Gets the number of nodes in the snapshot.
+		"""
+		return len(self._nodes)
+
+
+	def __iter__(self) -> Iterator[TreeNodeSnapshot]:
+		"""
+		Iterates over the nodes in the order they were added to the tree.
+		The root node is always first and every node's inviter appears before
+		  the node itself. Sorting the nodes takes O(n log n) time.
+		"""
+		nodes: List[TreeNodeSnapshot] = list(self._nodes.values())
+		nodes.sort(key=lambda node: node.join_index)
+		return iter(nodes)
+
+
+	@property
+	def root_node(self) -> TreeNodeSnapshot:
+		"""
+		Gets the root node of the snapshot.
+		"""
+		return self._nodes[self._root_id]
+
+
+	def find_node_by_user_id(self, user_id: int) -> TreeNodeSnapshot:
+		"""
+		Finds a node in the snapshot by the user's discord ID.
+		@param user_id The unique ID associated with the user's discord account.
+		@throws KeyError If a node for the given user does not exist in the
+		  snapshot.
+		@returns The node for the given user.
+		"""
+		node = self._nodes.get(user_id)
+		if node is None:
+			raise KeyError(f"Node for user {user_id} does not exist.")
+		return node
+
+
+	def get_inviter(self, node: TreeNodeSnapshot) -> Optional[TreeNodeSnapshot]:
+		"""
+		Gets the node of the user that invited a user.
+		@param node The node of the user.
+		@returns The inviter's node, or None if the node is the root node.
+		"""
+		if node.inviter_id is None:
+			return None
+		return self._nodes[node.inviter_id]
+
+
+	def get_changed_nodes(self,
+		other: FamilyTreeSnapshot) -> Iterator[Tuple[
+			int,
+			Optional[TreeNodeSnapshot],
+			Optional[TreeNodeSnapshot]
+		]]:
+		"""
+		Iterates over the nodes that differ between two snapshots.
+		If both snapshots were taken from the same tree, nodes that did not
+		  change between the snapshots are skipped without being visited, so
+		  this takes time proportional to the number of changes. Otherwise,
+		  every node in both snapshots is compared.
+		@param other The snapshot to compare against.
+		@returns The user ID, node in this snapshot, and node in the other
+		  snapshot for each user whose node differs. The node is None if the
+		  user is not in the snapshot. Nodes are returned in no particular
+		  order.
+		"""
+		changes: Iterator[Tuple[
+			int,
+			Optional[TreeNodeSnapshot],
+			Optional[TreeNodeSnapshot]
+		]]
+		if self._lineage is other._lineage:
+			changes = self._nodes.diff(other._nodes)
+		else:
+			changes = FamilyTreeSnapshot._join(self._nodes, other._nodes)
+
+		# Nodes may be replaced without their data changing, e.g. when a
+		#   user's nickname is set to its current value
+		for user_id, node, other_node in changes:
+			if node is None or other_node is None \
+				or not node.is_equivalent(other_node):
+				yield user_id, node, other_node
+
+
+	@staticmethod
+	def _join(
+		nodes: PersistentMap[int, TreeNodeSnapshot],
+		other_nodes: PersistentMap[int, TreeNodeSnapshot]) -> Iterator[Tuple[
+			int,
+			Optional[TreeNodeSnapshot],
+			Optional[TreeNodeSnapshot]
+		]]:
+		"""
+		Pairs up the nodes of two unrelated snapshots using a hash join.
+		@param nodes The nodes of the first snapshot.
+		@param other_nodes The nodes of the second snapshot.
+		@returns The user ID and node in each snapshot for every user in
+		  either snapshot. The node is None if the user is not in the snapshot.
+		"""
+		remaining: Dict[int, TreeNodeSnapshot] = dict(nodes.items())
+		for user_id, other_node in other_nodes.items():
+			yield user_id, remaining.pop(user_id, None), other_node
+		for user_id, node in remaining.items():
+			yield user_id, node, None
@@ -0,0 +1,157 @@
+from __future__ import annotations
+import bisect
+from typing import Dict, List, Tuple
+
+class Leaderboard:
+	"""
+	Ranks users by a non-negative score.
+	Users are grouped into buckets by score, and a sorted list of the scores
+	  that have at least one user is kept alongside the buckets. Changing a
+	  user's score moves the user between buckets in O(log n) time, and the top
+	  k users can be read in O(k) time by walking the buckets from the highest
+	  score down. Users with a score of 0 are not stored.
+	Ties are broken by user ID so that the ranking only depends on the scores
+	  and not on the order in which scores were changed.
+	"""
+	def __init__(self):
+		"""
+		Initializes a new instance of the class.
+		"""
+		# Score of each user, indexed by the user's discord account ID.
+		self._scores: Dict[int, int] = {}
+
+		# Sorted IDs of the users with each score, indexed by score.
+		self._buckets: Dict[int, List[int]] = {}
+
+		# Scores that have at least one user, in ascending order.
+		self._ranked_scores: List[int] = []
+
+
+	@staticmethod
+	def from_scores(scores: Dict[int, int]) -> Leaderboard:
+		"""
+		Creates a leaderboard that ranks users by the given scores.
+		This takes O(n log n) time, while adding each user with `add()` can
+		  take O(n) time per user since many users usually share a score.
+		@param scores The score of each user, indexed by the user's discord
+		  account ID.
+		@throws ValueError If any score is negative.
+		@returns The new leaderboard.
+		"""
+		leaderboard = Leaderboard()
+		for user_id, score in sorted(scores.items()):
+			if score < 0:
+				raise ValueError(
+					f"Score of user {user_id} cannot be negative ({score})."
+				)
+			if not score:
+				continue
+
+			# Users are visited in ascending order, so each bucket stays sorted
+			bucket = leaderboard._buckets.get(score)
+			if bucket is None:
+				leaderboard._buckets[score] = [user_id]
+			else:
+				bucket.append(user_id)
+			leaderboard._scores[user_id] = score
+		leaderboard._ranked_scores = sorted(leaderboard._buckets)
+		return leaderboard
+
+
+	def __len__(self) -> int:
+		"""
+		Gets the number of users with a non-zero score.
+		"""
+		return len(self._scores)
+
+
+	def get_score(self, user_id: int) -> int:
+		"""
+		Gets the score of a user.
+		@param user_id The unique ID of the user's discord account.
+		@returns The user's score, or 0 if the user is not ranked.
+		"""
+		return self._scores.get(user_id, 0)
+
+
+	def add(self, user_id: int, amount: int) -> None:
+		"""
+		Changes the score of a user.
+		@param user_id The unique ID of the user's discord account.
+		@param amount The amount to add to the user's score. May be negative.
+		@throws ValueError If the user's score would become negative.
+		"""
+		if amount == 0:
+			return
+
+		score = self._scores.get(user_id, 0)
+		new_score = score + amount
+		if new_score < 0:
+			raise ValueError(
+				f"Score of user {user_id} cannot be negative ({new_score})."
+			)
+
+		if score:
+			self._remove_from_bucket(user_id, score)
+		if new_score:
+			self._add_to_bucket(user_id, new_score)
+			self._scores[user_id] = new_score
+		else:
+			del self._scores[user_id]
+
+
+	def remove(self, user_id: int) -> None:
+		"""
+		Removes a user from the leaderboard.
+		Does nothing if the user is not ranked.
+		@param user_id The unique ID of the user's discord account.
+		"""
+		score = self._scores.pop(user_id, 0)
+		if score:
+			self._remove_from_bucket(user_id, score)
+
+
+	def get_top(self, count: int) -> List[Tuple[int, int]]:
+		"""
+		Gets the users with the highest scores.
+		@param count The maximum number of users to return.
+		@returns The ID and score of each user, ordered from highest to lowest
+		  score. Users with the same score are ordered by ascending user ID.
+		"""
+		top: List[Tuple[int, int]] = []
+		for i in range(len(self._ranked_scores) - 1, -1, -1):
+			if len(top) >= count:
+				break
+
+			score = self._ranked_scores[i]
+			for user_id in self._buckets[score][:count - len(top)]:
+				top.append((user_id, score))
+		return top
+
+
+	def _add_to_bucket(self, user_id: int, score: int) -> None:
+		"""
+		Adds a user to the bucket for a score, creating the bucket if needed.
+		@param user_id The unique ID of the user's discord account.
+		@param score The score of the bucket.
+		"""
+		bucket = self._buckets.get(score)
+		if bucket is None:
+			self._buckets[score] = [user_id]
+			bisect.insort(self._ranked_scores, score)
+		else:
+			bisect.insort(bucket, user_id)
+
+
+	def _remove_from_bucket(self, user_id: int, score: int) -> None:
+		"""
+		Removes a user from the bucket for a score, deleting the bucket if it
+		  becomes empty.
+		@param user_id The unique ID of the user's discord account.
+		@param score The score of the bucket.
+		"""
+		bucket = self._buckets[score]
+		del bucket[bisect.bisect_left(bucket, user_id)]
+		if not bucket:
+			del self._buckets[score]
+			del self._ranked_scores[bisect.bisect_left(self._ranked_scores, score)]
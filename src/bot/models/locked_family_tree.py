@@ -0,0 +1,351 @@
+from bot.bot_events.family_tree_events import FamilyTreeEvents
+from bot.models.family_tree import IFamilyTree
+from bot.models.family_tree_snapshot import FamilyTreeSnapshot
+from bot.models.tree_node import TreeNode
+from bot.util.read_write_lock import ReadWriteLock
+from bot.views.tree_view import ITreeView
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Tuple
+
+class LockedFamilyTree(IFamilyTree):
+	"""
+	Family tree decorator that makes another family tree thread safe.
+	Each tree has its own read/write lock. Methods that modify the tree hold
+	  the lock for writing, and all other methods hold it for reading, so any
+	  number of threads may query the tree at the same time.
+	Queries may build the wrapped tree's indices the first time they are
+	  used. Since every index is built from the tree's nodes and writers are
+	  excluded while the lock is held for reading, threads that build the
+	  same index at the same time produce equivalent indices.
+	Nodes returned by the tree are still shared with the tree and may be
+	  modified by later writes. Threads that need a consistent view of the
+	  tree after the lock is released should use `snapshot()`.
+	Events describing individual changes (e.g. `on_node_added`) are emitted
+	  while the lock is held for writing so that handlers see changes in the
+	  order they were made. These events receive the wrapped tree rather than
+	  this instance; handlers may use that tree until they return but must not
+	  access the tree through this instance since the lock is not reentrant.
+	  `on_modified` is emitted after the lock has been released and receives
+	  this instance.
+	"""
+	def __init__(self, tree: IFamilyTree):
+		"""
+		Initializes a new instance of the class.
+		@param tree The tree to make thread safe. The tree must not be accessed
+		  except through this instance.
+		"""
+		self._tree = tree
+		self._lock = ReadWriteLock()
+		self._events = FamilyTreeEvents()
+
+		# Whether the wrapped tree emitted `on_modified` during the current
+		#   write. Only accessed while the lock is held for writing.
+		self._modified = False
+
+		# Events for individual changes are forwarded as soon as they are
+		#   emitted, but `on_modified` is deferred until the lock is released
+		tree.events.on_node_added += self._events.on_node_added # type: ignore
+		tree.events.on_node_removed += self._events.on_node_removed # type: ignore
+		tree.events.on_nickname_changed += self._events.on_nickname_changed # type: ignore
+		tree.events.on_background_color_changed += \
+			self._events.on_background_color_changed # type: ignore
+		tree.events.on_modified += self._on_tree_modified # type: ignore
+
+
+	def __len__(self) -> int:
+		"""
+		Gets the number of nodes in the tree.
+		"""
+		with self._lock.read():
+			return len(self._tree)
+
+
+	@property
+	def events(self) -> FamilyTreeEvents:
+		"""
+		Event emitter for all family tree events.
+		"""
+		return self._events
+
+
+	@property
+	def root_node(self) -> TreeNode:
+		"""
+		Gets the root node of the tree.
+		"""
+		with self._lock.read():
+			return self._tree.root_node
+
+
+	@property
+	def lock(self) -> ReadWriteLock:
+		"""
+		Gets the lock that guards the tree.
+		Callers may hold the lock for reading to perform several queries
+		  against the same version of the tree. The lock is not reentrant, so
+		  the tree must not be accessed through this instance while the lock is
+		  held; use `unlocked_tree` instead.
+		"""
+		return self._lock
+
+
+	@property
+	def unlocked_tree(self) -> IFamilyTree:
+		"""
+		Gets the wrapped tree.
+		The wrapped tree must only be accessed while holding `lock`.
+		"""
+		return self._tree
+
+
+	def add_node(self, node: TreeNode) -> None:
+		"""
+		Adds a new node to the tree.
+		@param node The node to add.
+		@throws ValueError If a node for the given user already exists in the
+		  tree.
+		@throws ValueError If the inviter for the given node does not exist in
+		  the tree.
+		"""
+		with self._write():
+			self._tree.add_node(node)
+
+
+	def find_node_by_user_id(self, user_id: int) -> TreeNode:
+		"""
+		Finds a node in the tree by the user's discord ID.
+		@param user_id The unique ID associated with the user's discord account.
+		@throws KeyError If a node for the given user does not exist in the tree.
+		@returns The node for the given username.
+		"""
+		with self._lock.read():
+			return self._tree.find_node_by_user_id(user_id)
+
+
+	def find_node_by_username(self,
+		username: str,
+		discriminator: int) -> TreeNode:
+		"""
+		Finds a node in the tree by the user's discord username.
+		@param username The discord username to search for.
+		@param discriminator The discriminator associated with the user's
+		  discord account.
+		@throws KeyError If a node for the given username does not exist in
+		  the tree.
+		@returns The node for the given username.
+		"""
+		with self._lock.read():
+			return self._tree.find_node_by_username(username, discriminator)
+
+
+	def find_lowest_common_ancestor(self,
+		node_a: TreeNode,
+		node_b: TreeNode) -> TreeNode:
+		"""
+		Finds the deepest node that both nodes are descended from.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws ValueError If either node does not exist in the tree.
+		@returns The lowest common ancestor of the two nodes.
+		"""
+		with self._lock.read():
+			return self._tree.find_lowest_common_ancestor(node_a, node_b)
+
+
+	def get_distance(self, node_a: TreeNode, node_b: TreeNode) -> int:
+		"""
+		Gets the number of invites on the path between two nodes.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws ValueError If either node does not exist in the tree.
+		@returns The number of invites between the two nodes.
+		"""
+		with self._lock.read():
+			return self._tree.get_distance(node_a, node_b)
+
+
+	def is_descendant(self, node: TreeNode, ancestor: TreeNode) -> bool:
+		"""
+		Checks whether a node was directly or indirectly invited by another.
+		@param node The node that may be a descendant.
+		@param ancestor The node that may be an ancestor.
+		@throws ValueError If either node does not exist in the tree.
+		@returns True if `ancestor` is an ancestor of `node`.
+		"""
+		with self._lock.read():
+			return self._tree.is_descendant(node, ancestor)
+
+
+	def get_descendant_count(self, node: TreeNode) -> int:
+		"""
+		Gets the number of users that a user directly or indirectly invited.
+		@param node The node of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@returns The number of descendants of the node.
+		"""
+		with self._lock.read():
+			return self._tree.get_descendant_count(node)
+
+
+	def get_child_nodes(self, node: TreeNode) -> List[TreeNode]:
+		"""
+		Gets the nodes of the users that a user directly invited.
+		@param node The node of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@returns The child nodes of the node, ordered by when each child was
+		  assigned to the node.
+		"""
+		with self._lock.read():
+			return self._tree.get_child_nodes(node)
+
+
+	def get_top_inviters(self,
+		count: int,
+		transitive: bool = False) -> List[Tuple[TreeNode, int]]:
+		"""
+		Gets the users that invited the most users.
+		@param count The maximum number of users to return.
+		@param transitive Whether to count users that were indirectly invited
+		  by each user.
+		@returns Each user's node and invite count, ordered from most to fewest
+		  invites.
+		"""
+		with self._lock.read():
+			return self._tree.get_top_inviters(count, transitive)
+
+
+	def search(self, query: str, limit: int) -> List[TreeNode]:
+		"""
+		Finds the nodes whose nickname or username best match a query.
+		@param query The text to search for. Case is ignored.
+		@param limit The maximum number of nodes to return.
+		@returns The matching nodes, ordered from best to worst match.
+		"""
+		with self._lock.read():
+			return self._tree.search(query, limit)
+
+
+	def update_nickname(self, node: TreeNode, nickname: str) -> None:
+		"""
+		Changes the nickname of a node in the tree.
+		@param node The node to update.
+		@param nickname The new nickname of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@throws ValueError If the nickname is empty.
+		"""
+		with self._write():
+			self._tree.update_nickname(node, nickname)
+
+
+	def update_nicknames(self, nicknames: Iterable[Tuple[TreeNode, str]]) -> None:
+		"""
+		Changes the nicknames of several nodes in the tree at once.
+		The lock is held for writing while all nicknames are changed.
+		@param nicknames Each node to update and its new nickname.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError If a nickname is empty.
+		"""
+		with self._write():
+			self._tree.update_nicknames(nicknames)
+
+
+	def update_background_colors(self,
+		colors: Iterable[Tuple[TreeNode, str]]) -> None:
+		"""
+		Changes the background colors of several nodes in the tree at once.
+		The lock is held for writing while all colors are changed.
+		@param colors Each node to update and its new background color.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError If a color is empty.
+		"""
+		with self._write():
+			self._tree.update_background_colors(colors)
+
+
+	def snapshot(self) -> FamilyTreeSnapshot:
+		"""
+		Gets an immutable view of the tree's current state.
+		Unlike unlocked trees, this may be called from any thread.
+		@returns The snapshot of the tree.
+		"""
+		with self._lock.read():
+			return self._tree.snapshot()
+
+
+	def get_view(self) -> ITreeView:
+		"""
+		Gets a view of the entire tree.
+		The view contains the nodes that were in the tree when this method was
+		  called.
+		"""
+		with self._lock.read():
+			return self._tree.get_view()
+
+
+	def remove_node(self, node: TreeNode) -> None:
+		"""
+		Removes a node from the tree.
+		All child nodes of the given node will be re-assigned to the parent
+		  node of the given node.
+		@param node The node to remove.
+		@throws ValueError If the given node does not exist in the tree.
+		@throws ValueError Thrown if the node is the root node.
+		"""
+		with self._write():
+			self._tree.remove_node(node)
+
+
+	def remove_nodes(self, nodes: Iterable[TreeNode]) -> None:
+		"""
+		Removes several nodes from the tree at once.
+		The lock is held for writing while all nodes are removed.
+		@param nodes The nodes to remove. Duplicates are ignored.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError Thrown if a node is the root node.
+		"""
+		with self._write():
+			self._tree.remove_nodes(nodes)
+
+
+	@contextmanager
+	def batch(self) -> Iterator[IFamilyTree]:
+		"""
+		Groups several changes to the tree so that `on_modified` is only
+		  emitted once, after the last change.
+		The lock is held for writing for the whole batch, so other threads
+		  see either none or all of the batch's changes. Changes must be made
+		  through the returned tree rather than through this instance since the
+		  lock is not reentrant.
+		@returns A context manager that returns the wrapped tree.
+		"""
+		with self._write():
+			with self._tree.batch() as tree:
+				yield tree
+
+
+	@contextmanager
+	def _write(self) -> Iterator[None]:
+		"""
+		Holds the lock for writing while the context is active.
+		If the wrapped tree was modified, `on_modified` is emitted once the
+		  lock has been released, even if an exception was raised.
+		"""
+		modified = False
+		try:
+			with self._lock.write():
+				self._modified = False
+				try:
+					yield
+				finally:
+					modified = self._modified
+		finally:
+			if modified:
+				self._events.on_modified(self)
+
+
+	def _on_tree_modified(self, tree: IFamilyTree) -> None:
+		"""
+		Records that the wrapped tree was modified during the current write.
+		@param tree The wrapped tree.
+		"""
+		self._modified = True
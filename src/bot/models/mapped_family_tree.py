@@ -0,0 +1,796 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from bot.bot_events.family_tree_events import FamilyTreeEvents
+from bot.models.dict_family_tree import DictFamilyTree
+from bot.models.family_tree import IFamilyTree
+from bot.models.family_tree_snapshot import FamilyTreeSnapshot
+from bot.models.persistent_map import PersistentMap
+from bot.models.search_index import SearchIndex
+from bot.models.tree_node import TreeNode
+from bot.models.tree_node_snapshot import TreeNodeSnapshot
+from bot.views.list_tree_view import ListTreeView
+from bot.views.tree_view import ITreeView
+from contextlib import contextmanager
+import struct
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+class MappedFamilyTree(IFamilyTree):
+	"""
+	Read-only family tree that is queried directly from an encoded buffer.
+	The buffer (usually a memory-mapped file) stores the tree as a set of
+	  fixed-width columns, so creating the tree does not parse anything: nodes
+	  are only created when they are returned by a query, and each node is
+	  created at most once so that the same user always has the same node.
+	The columns include each node's parent, depth, jump pointer, preorder
+	  position, number of invites, and number of descendants, along with both
+	  invite rankings, so most queries take O(1) or O(log depth) time without
+	  building any index.
+	  Searching builds a search index over every node and `snapshot()` creates
+	  every node's snapshot, like the first call to either on any other tree.
+	The first change made to the tree promotes it: every node is created and
+	  added to a `DictFamilyTree`, which all later calls are forwarded to.
+	Block layout, using the platform's native byte order:
+	  - Header: node count, number of users with direct invites, number of
+	    users with descendants, and size of the string pool (4 bytes each).
+	  - Columns, each padded to a multiple of 8 bytes: `COLUMNS`.
+	  - String pool: the UTF-8 username, nickname, and background color of
+	    each node, located using the string offsets column.
+	"""
+	# Format of the header at the start of each encoded tree.
+	HEADER = struct.Struct("=IIII")
+
+	# Alignment of the header, each column, and the end of the string pool.
+	ALIGNMENT = 8
+
+	# Name and type code of each column, in the order they are stored.
+	# Columns are indexed by each node's position in join order unless noted.
+	#   - `ids`: Discord ID of each node.
+	#   - `sorted_ids`: Discord IDs in ascending order.
+	#   - `sorted_positions`: Position of the node for each sorted ID.
+	#   - `parents`: Position of each node's inviter, or -1 for the root.
+	#   - `depths`: Number of invites between the root and each node.
+	#   - `jumps`: Position of an ancestor of each node that is used to skip
+	#     up the tree. See `_find_ancestor()`.
+	#   - `preorder`: Position of each node in a depth-first traversal.
+	#   - `discriminators`: Discriminator of each node.
+	#   - `invite_counts`: Number of users each node directly invited.
+	#   - `descendant_counts`: Number of descendants of each node.
+	#   - `direct_ranking`: Positions of the nodes with direct invites, ordered
+	#     by descending invite count and then ascending ID.
+	#   - `transitive_ranking`: Like `direct_ranking` but for descendants.
+	#   - `string_offsets`: Offsets of each node's strings in the string pool.
+	#     Contains 3 offsets per node plus the end of the pool.
+	COLUMNS = (
+		("ids", "q"),
+		("sorted_ids", "q"),
+		("sorted_positions", "i"),
+		("parents", "i"),
+		("depths", "i"),
+		("jumps", "i"),
+		("preorder", "i"),
+		("discriminators", "i"),
+		("invite_counts", "i"),
+		("descendant_counts", "i"),
+		("direct_ranking", "i"),
+		("transitive_ranking", "i"),
+		("string_offsets", "I")
+	)
+
+	# Number of strings stored for each node.
+	STRINGS_PER_NODE = 3
+
+	def __init__(self, buffer: Any, offset: int = 0):
+		"""
+		Initializes a new instance of the class.
+		@param buffer The buffer containing the encoded tree, e.g. an `mmap`
+		  or `bytes` object. Must not be modified or closed while the tree is
+		  in use.
+		@param offset The position of the encoded tree in the buffer. Must be
+		  a multiple of `ALIGNMENT`.
+		"""
+		self._buffer = buffer
+		self._events = FamilyTreeEvents()
+
+		view = memoryview(buffer)
+		count, direct_count, transitive_count, pool_size = \
+			MappedFamilyTree.HEADER.unpack_from(view, offset)
+		lengths = MappedFamilyTree._get_column_lengths(
+			count,
+			direct_count,
+			transitive_count
+		)
+		position = offset + MappedFamilyTree.HEADER.size
+		columns: Dict[str, memoryview] = {}
+		for (name, type_code), length in zip(MappedFamilyTree.COLUMNS, lengths):
+			size = length * array(type_code).itemsize
+			columns[name] = view[position:position + size].cast(type_code)
+			position += MappedFamilyTree._pad(size)
+
+		# Number of nodes in the tree.
+		self._count = count
+
+		# Columns of the encoded tree. See `COLUMNS`.
+		self._ids = columns["ids"]
+		self._sorted_ids = columns["sorted_ids"]
+		self._sorted_positions = columns["sorted_positions"]
+		self._parents = columns["parents"]
+		self._depths = columns["depths"]
+		self._jumps = columns["jumps"]
+		self._preorder = columns["preorder"]
+		self._discriminators = columns["discriminators"]
+		self._invite_counts = columns["invite_counts"]
+		self._descendant_counts = columns["descendant_counts"]
+		self._direct_ranking = columns["direct_ranking"]
+		self._transitive_ranking = columns["transitive_ranking"]
+		self._string_offsets = columns["string_offsets"]
+
+		# Position of the string pool in the buffer.
+		self._pool_start = position
+		self._pool = view[position:position + pool_size]
+
+		# Guards the creation of nodes, since queries may be made from several
+		#   threads at once (e.g. by `LockedFamilyTree`).
+		self._lock = threading.Lock()
+
+		# Nodes that have been created so far, indexed by position.
+		self._nodes: Dict[int, TreeNode] = {}
+
+		# Search index over every node. Created the first time the tree is
+		#   searched.
+		self._search_index: Optional[SearchIndex] = None
+
+		# Snapshot of the tree. Created the first time a snapshot is taken.
+		self._snapshot: Optional[FamilyTreeSnapshot] = None
+
+		# Mutable tree that all calls are forwarded to once the tree has been
+		#   promoted.
+		self._tree: Optional[DictFamilyTree] = None
+
+
+	@staticmethod
+	def encode(nodes: Sequence[TreeNode]) -> bytes:
+		"""
+		Encodes a tree in the layout read by this class.
+		@param nodes Every node of the tree in join order, e.g. as returned by
+		  the tree's view. The root node must be first and each node's inviter
+		  must come before the node.
+		@throws ValueError If no nodes are given.
+		@returns The encoded tree. Its length is a multiple of `ALIGNMENT`.
+		"""
+		if not nodes:
+			raise ValueError("Cannot encode a tree without a root node.")
+
+		count = len(nodes)
+		positions = {node.discord_id: i for i, node in enumerate(nodes)}
+		ids = array("q", (node.discord_id for node in nodes))
+		parents = array("i", [-1]) * count
+		depths = array("i", [0]) * count
+		jumps = array("i", [0]) * count
+		invite_counts = array("i", [0]) * count
+		children: Dict[int, List[int]] = {}
+		for i in range(1, count):
+			inviter = nodes[i].inviter
+			assert inviter
+			parent = positions[inviter.discord_id]
+			parents[i] = parent
+			depths[i] = depths[parent] + 1
+			invite_counts[parent] += 1
+			children.setdefault(parent, []).append(i)
+
+			# Jump pointers skip by the sizes of a skew binary number: if the
+			#   parent's jump and the jump after it cover the same distance,
+			#   the node's jump covers both, and otherwise it is the parent
+			jump = jumps[parent]
+			if depths[parent] - depths[jump] == depths[jump] - depths[jumps[jump]]:
+				jumps[i] = jumps[jump]
+			else:
+				jumps[i] = parent
+
+		# Nodes are visited after their inviter, so visiting them in reverse
+		#   adds each subtree's size to its parent after it is complete
+		sizes = [1] * count
+		for i in range(count - 1, 0, -1):
+			sizes[parents[i]] += sizes[i]
+		descendant_counts = array("i", (size - 1 for size in sizes))
+
+		preorder = array("i", [0]) * count
+		stack = [0]
+		visited = 0
+		while stack:
+			i = stack.pop()
+			preorder[i] = visited
+			visited += 1
+			stack.extend(reversed(children.get(i, [])))
+
+		sorted_positions = array("i", sorted(range(count), key=ids.__getitem__))
+		sorted_ids = array("q", (ids[i] for i in sorted_positions))
+		direct_ranking = array("i", sorted(
+			(i for i in range(count) if invite_counts[i]),
+			key=lambda i: (-invite_counts[i], ids[i])
+		))
+		transitive_ranking = array("i", sorted(
+			(i for i in range(count) if descendant_counts[i]),
+			key=lambda i: (-descendant_counts[i], ids[i])
+		))
+
+		pool = bytearray()
+		string_offsets = array("I", [0])
+		for node in nodes:
+			for value in (
+				node.discord_username,
+				node.user_nickname,
+				node.background_color):
+				pool += value.encode("utf-8")
+				string_offsets.append(len(pool))
+
+		encoded = bytearray(MappedFamilyTree.HEADER.pack(
+			count,
+			len(direct_ranking),
+			len(transitive_ranking),
+			len(pool)
+		))
+		for column in (
+			ids,
+			sorted_ids,
+			sorted_positions,
+			parents,
+			depths,
+			jumps,
+			preorder,
+			array("i", (node.discord_discriminator for node in nodes)),
+			invite_counts,
+			descendant_counts,
+			direct_ranking,
+			transitive_ranking,
+			string_offsets):
+			data = column.tobytes()
+			encoded += data
+			encoded += bytes(MappedFamilyTree._pad(len(data)) - len(data))
+		encoded += pool
+		encoded += bytes(MappedFamilyTree._pad(len(pool)) - len(pool))
+		return bytes(encoded)
+
+
+	def __len__(self) -> int:
+		"""
+		Gets the number of nodes in the tree.
+		"""
+		if self._tree is not None:
+			return len(self._tree)
+		return self._count
+
+
+	@property
+	def events(self) -> FamilyTreeEvents:
+		"""
+		Event emitter for all family tree events.
+		Events emitted by the tree that the tree is promoted to are re-emitted
+		  by this tree.
+		"""
+		return self._events
+
+
+	@property
+	def root_node(self) -> TreeNode:
+		"""
+		Gets the root node of the tree.
+		"""
+		if self._tree is not None:
+			return self._tree.root_node
+		return self._get_node(0)
+
+
+	@property
+	def is_promoted(self) -> bool:
+		"""
+		Whether the tree has been modified and now forwards all calls to a
+		  `DictFamilyTree`.
+		"""
+		return self._tree is not None
+
+
+	def add_node(self, node: TreeNode) -> None:
+		"""
+		Adds a new node to the tree.
+		@param node The node to add.
+		@throws ValueError If a node for the given user already exists in the
+		  tree.
+		@throws ValueError If the inviter for the given node does not exist in
+		  the tree.
+		"""
+		self._promote().add_node(node)
+
+
+	def find_node_by_user_id(self, user_id: int) -> TreeNode:
+		"""
+		Finds a node in the tree by the user's discord ID.
+		@param user_id The unique ID associated with the user's discord account.
+		@throws KeyError If a node for the given user does not exist in the tree.
+		@returns The node for the given username.
+		"""
+		if self._tree is not None:
+			return self._tree.find_node_by_user_id(user_id)
+
+		position = self._find_position(user_id)
+		if position is None:
+			raise KeyError(f"Node for user {user_id} does not exist.")
+		return self._get_node(position)
+
+
+	def find_node_by_username(self,
+		username: str,
+		discriminator: int) -> TreeNode:
+		"""
+		Finds a node in the tree by the user's discord username.
+		@param username The discord username to search for.
+		@param discriminator The discriminator associated with the user's
+		  discord account.
+		@throws KeyError If a node for the given username does not exist in
+		  the tree.
+		@returns The node for the given username.
+		"""
+		if self._tree is not None:
+			return self._tree.find_node_by_username(username, discriminator)
+
+		# The string pool is searched for the username directly, and each
+		#   match is mapped back to the string that contains it
+		encoded = username.encode("utf-8")
+		offsets = self._string_offsets
+		end = self._pool_start + len(self._pool)
+		start = self._buffer.find(encoded, self._pool_start, end)
+		while start >= 0:
+			pool_offset = start - self._pool_start
+			string = bisect_right(offsets, pool_offset) - 1
+			position = string // MappedFamilyTree.STRINGS_PER_NODE
+			if string % MappedFamilyTree.STRINGS_PER_NODE == 0 \
+				and offsets[string] == pool_offset \
+				and offsets[string + 1] == pool_offset + len(encoded) \
+				and self._discriminators[position] == discriminator \
+				and position < self._count:
+				return self._get_node(position)
+			start = self._buffer.find(encoded, start + 1, end)
+
+		raise KeyError(f"Node for user {username}#{discriminator} does not exist.")
+
+
+	def find_lowest_common_ancestor(self,
+		node_a: TreeNode,
+		node_b: TreeNode) -> TreeNode:
+		"""
+		Finds the deepest node that both nodes are descended from.
+		Each node is considered to be descended from itself, so if one node is
+		  an ancestor of the other, that node is returned. Takes O(log depth)
+		  time.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws ValueError If either node does not exist in the tree.
+		@returns The lowest common ancestor of the two nodes.
+		"""
+		if self._tree is not None:
+			return self._tree.find_lowest_common_ancestor(node_a, node_b)
+		return self._get_node(self._find_ancestor(
+			self._get_position(node_a),
+			self._get_position(node_b)
+		))
+
+
+	def get_distance(self, node_a: TreeNode, node_b: TreeNode) -> int:
+		"""
+		Gets the number of invites on the path between two nodes.
+		Takes O(log depth) time.
+		@param node_a The first node.
+		@param node_b The second node.
+		@throws ValueError If either node does not exist in the tree.
+		@returns The number of invites between the two nodes. This is 0 if
+		  both nodes are the same node.
+		"""
+		if self._tree is not None:
+			return self._tree.get_distance(node_a, node_b)
+
+		a = self._get_position(node_a)
+		b = self._get_position(node_b)
+		depths = self._depths
+		return depths[a] + depths[b] - 2 * depths[self._find_ancestor(a, b)]
+
+
+	def is_descendant(self, node: TreeNode, ancestor: TreeNode) -> bool:
+		"""
+		Checks whether a node was directly or indirectly invited by another.
+		@param node The node that may be a descendant.
+		@param ancestor The node that may be an ancestor.
+		@throws ValueError If either node does not exist in the tree.
+		@returns True if `ancestor` is an ancestor of `node`. A node is not a
+		  descendant of itself.
+		"""
+		if self._tree is not None:
+			return self._tree.is_descendant(node, ancestor)
+
+		# Descendants are visited right after their ancestor in a depth-first
+		#   traversal, so they occupy the range after the ancestor's position
+		position = self._preorder[self._get_position(node)]
+		ancestor_position = self._get_position(ancestor)
+		start = self._preorder[ancestor_position]
+		return start < position <= \
+			start + self._descendant_counts[ancestor_position]
+
+
+	def get_descendant_count(self, node: TreeNode) -> int:
+		"""
+		Gets the number of users that a user directly or indirectly invited.
+		@param node The node of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@returns The number of descendants of the node, not including the node
+		  itself.
+		"""
+		if self._tree is not None:
+			return self._tree.get_descendant_count(node)
+		return self._descendant_counts[self._get_position(node)]
+
+
+	def get_child_nodes(self, node: TreeNode) -> List[TreeNode]:
+		"""
+		Gets the nodes of the users that a user directly invited.
+		Children always join after their inviter, so only the positions after
+		  the node's position are scanned, stopping once every child has been
+		  found.
+		@param node The node of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@returns The child nodes of the node, ordered by when each child joined.
+		"""
+		if self._tree is not None:
+			return self._tree.get_child_nodes(node)
+
+		position = self._get_position(node)
+		remaining = self._invite_counts[position]
+		parents = self._parents
+		child_nodes: List[TreeNode] = []
+		i = position + 1
+		while remaining:
+			if parents[i] == position:
+				child_nodes.append(self._get_node(i))
+				remaining -= 1
+			i += 1
+		return child_nodes
+
+
+	def get_top_inviters(self,
+		count: int,
+		transitive: bool = False) -> List[Tuple[TreeNode, int]]:
+		"""
+		Gets the users that invited the most users.
+		@param count The maximum number of users to return.
+		@param transitive Whether to count users that were indirectly invited
+		  by each user. If False, only direct invites are counted.
+		@returns Each user's node and invite count, ordered from most to fewest
+		  invites. Users with the same number of invites are ordered by
+		  ascending user ID. Users that have not invited anyone are excluded.
+		"""
+		if self._tree is not None:
+			return self._tree.get_top_inviters(count, transitive)
+
+		ranking = self._transitive_ranking if transitive \
+			else self._direct_ranking
+		counts = self._descendant_counts if transitive else self._invite_counts
+		return [
+			(self._get_node(position), counts[position])
+			for position in ranking[:max(count, 0)]
+		]
+
+
+	def search(self, query: str, limit: int) -> List[TreeNode]:
+		"""
+		Finds the nodes whose nickname or username best match a query.
+		Names that start with the query are returned first, followed by names
+		  containing a word that starts with the query and then by names that
+		  are similar to the query.
+		@param query The text to search for. Case is ignored.
+		@param limit The maximum number of nodes to return.
+		@returns The matching nodes, ordered from best to worst match.
+		"""
+		if self._tree is not None:
+			return self._tree.search(query, limit)
+
+		if self._search_index is None:
+			self._search_index = SearchIndex.build(self._get_all_nodes())
+		return self._search_index.search(query, limit)
+
+
+	def update_nickname(self, node: TreeNode, nickname: str) -> None:
+		"""
+		Changes the nickname of a node in the tree.
+		@param node The node to update.
+		@param nickname The new nickname of the user.
+		@throws ValueError If the node does not exist in the tree.
+		@throws ValueError If the nickname is empty.
+		"""
+		self._promote().update_nickname(node, nickname)
+
+
+	def update_nicknames(self, nicknames: Iterable[Tuple[TreeNode, str]]) -> None:
+		"""
+		Changes the nicknames of several nodes in the tree at once.
+		@param nicknames Each node to update and its new nickname.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError If a nickname is empty.
+		"""
+		self._promote().update_nicknames(nicknames)
+
+
+	def update_background_colors(self,
+		colors: Iterable[Tuple[TreeNode, str]]) -> None:
+		"""
+		Changes the background colors of several nodes in the tree at once.
+		@param colors Each node to update and its new background color.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError If a color is empty.
+		"""
+		self._promote().update_background_colors(colors)
+
+
+	def snapshot(self) -> FamilyTreeSnapshot:
+		"""
+		Gets an immutable view of the tree's current state.
+		The first snapshot takes O(n) time to create; after that, snapshots
+		  are O(1) until the tree is promoted.
+		@returns The snapshot of the tree.
+		"""
+		if self._tree is not None:
+			return self._tree.snapshot()
+
+		if self._snapshot is None:
+			self._snapshot = FamilyTreeSnapshot(
+				self._ids[0],
+				PersistentMap.from_items(
+					(node.discord_id, TreeNodeSnapshot.from_node(node, i))
+					for i, node in enumerate(self._get_all_nodes())
+				),
+				object()
+			)
+		return self._snapshot
+
+
+	def get_view(self) -> ITreeView:
+		"""
+		Gets a view of the entire tree.
+		The first view creates every node of the tree.
+		"""
+		if self._tree is not None:
+			return self._tree.get_view()
+		return ListTreeView(self._get_all_nodes())
+
+
+	def remove_node(self, node: TreeNode) -> None:
+		"""
+		Removes a node from the tree.
+		All child nodes of the given node will be re-assigned to the parent
+		  node of the given node.
+		@param node The node to remove.
+		@throws ValueError If the given node does not exist in the tree.
+		@throws ValueError Thrown if the node is the root node.
+		"""
+		self._promote().remove_node(node)
+
+
+	def remove_nodes(self, nodes: Iterable[TreeNode]) -> None:
+		"""
+		Removes several nodes from the tree at once.
+		@param nodes The nodes to remove. Duplicates are ignored.
+		@throws ValueError If a node does not exist in the tree.
+		@throws ValueError Thrown if a node is the root node.
+		"""
+		self._promote().remove_nodes(nodes)
+
+
+	@contextmanager
+	def batch(self) -> Iterator[IFamilyTree]:
+		"""
+		Groups several changes to the tree so that `on_modified` is only
+		  emitted once, after the last change.
+		@returns A context manager that returns the tree that the tree was
+		  promoted to.
+		"""
+		with self._promote().batch() as tree:
+			yield tree
+
+
+	def _promote(self) -> DictFamilyTree:
+		"""
+		Gets the tree that all calls are forwarded to, creating it if needed.
+		Nodes that were already returned by queries are reused so that callers
+		  may keep using them.
+		@returns The promoted tree.
+		"""
+		if self._tree is None:
+			tree = DictFamilyTree.from_nodes(self._get_all_nodes())
+			tree.events.on_node_added += lambda _, node: \
+				self._events.on_node_added(self, node) # type: ignore
+			tree.events.on_node_removed += lambda _, node: \
+				self._events.on_node_removed(self, node) # type: ignore
+			tree.events.on_nickname_changed += lambda _, node: \
+				self._events.on_nickname_changed(self, node) # type: ignore
+			tree.events.on_background_color_changed += lambda _, node: \
+				self._events.on_background_color_changed( # type: ignore
+					self,
+					node
+				)
+			tree.events.on_modified += lambda _: \
+				self._events.on_modified(self) # type: ignore
+			self._tree = tree
+			self._nodes = {}
+			self._search_index = None
+			self._snapshot = None
+		return self._tree
+
+
+	def _find_position(self, user_id: int) -> Optional[int]:
+		"""
+		Finds the position of a user's node.
+		@param user_id The unique ID of the user's discord account.
+		@returns The position of the node, or None if the user has no node.
+		"""
+		i = bisect_left(self._sorted_ids, user_id)
+		if i < self._count and self._sorted_ids[i] == user_id:
+			return self._sorted_positions[i]
+		return None
+
+
+	def _get_position(self, node: TreeNode) -> int:
+		"""
+		Gets the position of a node that must exist in the tree.
+		@param node The node to find.
+		@throws ValueError If the node does not exist in the tree.
+		@returns The position of the node.
+		"""
+		position = self._find_position(node.discord_id)
+		if position is None:
+			raise ValueError(
+				f"Node for user {node.discord_full_username} does not exist."
+			)
+		return position
+
+
+	def _find_ancestor(self, a: int, b: int) -> int:
+		"""
+		Finds the lowest common ancestor of two nodes.
+		Each node stores a single jump pointer (Myers' skew binary jump
+		  pointers), which lets the walk up the tree skip over any ancestor
+		  that is known to be too deep, so the ancestor is found in O(log
+		  depth) steps instead of one step per invite.
+		@param a The position of the first node.
+		@param b The position of the second node.
+		@returns The position of the lowest common ancestor.
+		"""
+		depths = self._depths
+		if depths[a] < depths[b]:
+			a, b = b, a
+		a = self._lift(a, depths[b])
+
+		# The depth of a node's jump only depends on the node's depth, so both
+		#   nodes stay at the same depth. Jumping is safe whenever both jumps
+		#   are still different nodes, since the ancestor is above them.
+		parents = self._parents
+		jumps = self._jumps
+		while a != b:
+			if jumps[a] != jumps[b]:
+				a = jumps[a]
+				b = jumps[b]
+			else:
+				a = parents[a]
+				b = parents[b]
+		return a
+
+
+	def _lift(self, position: int, depth: int) -> int:
+		"""
+		Finds the ancestor of a node at a given depth.
+		@param position The position of the node.
+		@param depth The depth of the ancestor. Must not be greater than the
+		  node's depth.
+		@returns The position of the ancestor.
+		"""
+		depths = self._depths
+		jumps = self._jumps
+		while depths[position] > depth:
+			jump = jumps[position]
+			position = jump if depths[jump] >= depth \
+				else self._parents[position]
+		return position
+
+
+	def _get_node(self, position: int) -> TreeNode:
+		"""
+		Gets the node at a position, creating it and its ancestors if needed.
+		@param position The position of the node.
+		@returns The node.
+		"""
+		node = self._nodes.get(position)
+		if node is not None:
+			return node
+
+		with self._lock:
+			# Find the closest ancestor that was already created
+			missing: List[int] = []
+			parent: Optional[TreeNode] = None
+			while position >= 0:
+				parent = self._nodes.get(position)
+				if parent is not None:
+					break
+				missing.append(position)
+				position = self._parents[position]
+
+			for position in reversed(missing):
+				parent = self._create_node(position, parent)
+				self._nodes[position] = parent
+		assert parent
+		return parent
+
+
+	def _get_all_nodes(self) -> List[TreeNode]:
+		"""
+		Gets every node of the tree in join order, creating them if needed.
+		@returns The nodes of the tree.
+		"""
+		with self._lock:
+			nodes: List[TreeNode] = []
+			for position in range(self._count):
+				node = self._nodes.get(position)
+				if node is None:
+					parent = self._parents[position]
+					node = self._create_node(
+						position,
+						nodes[parent] if parent >= 0 else None
+					)
+					self._nodes[position] = node
+				nodes.append(node)
+			return nodes
+
+
+	def _create_node(self, position: int, inviter: Optional[TreeNode]) -> TreeNode:
+		"""
+		Creates the node at a position.
+		@param position The position of the node.
+		@param inviter The node's inviter, which must already exist.
+		@returns The new node.
+		"""
+		offsets = self._string_offsets
+		pool = self._pool
+		string = position * MappedFamilyTree.STRINGS_PER_NODE
+		return TreeNode(
+			self._ids[position],
+			str(pool[offsets[string]:offsets[string + 1]], "utf-8"),
+			self._discriminators[position],
+			str(pool[offsets[string + 1]:offsets[string + 2]], "utf-8"),
+			str(pool[offsets[string + 2]:offsets[string + 3]], "utf-8"),
+			inviter
+		)
+
+
+	@staticmethod
+	def _get_column_lengths(
+		count: int,
+		direct_count: int,
+		transitive_count: int) -> List[int]:
+		"""
+		Gets the number of values stored in each column.
+		@param count The number of nodes in the tree.
+		@param direct_count The number of users with direct invites.
+		@param transitive_count The number of users with descendants.
+		@returns The length of each column, in the order of `COLUMNS`.
+		"""
+		lengths = [count] * len(MappedFamilyTree.COLUMNS)
+		lengths[-3] = direct_count
+		lengths[-2] = transitive_count
+		lengths[-1] = count * MappedFamilyTree.STRINGS_PER_NODE + 1
+		return lengths
+
+
+	@staticmethod
+	def _pad(size: int) -> int:
+		"""
+		Rounds a size up to a multiple of `ALIGNMENT`.
+		@param size The size to round.
+		@returns The rounded size.
+		"""
+		alignment = MappedFamilyTree.ALIGNMENT
+		return (size + alignment - 1) // alignment * alignment
@@ -0,0 +1,100 @@
+from bot.models.family_tree import IFamilyTree
+from bot.models.reconciliation_result import ReconciliationResult
+from bot.models.tree_node import TreeNode
+from bot.models.user import IUser
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+class MembershipReconciler:
+	"""
+	Brings a family tree back in sync with a server's current member list.
+	Trees drift from the member list if the bot misses join, leave, or
+	  nickname events (e.g. while it is offline). Reconciling compares the
+	  tree's nodes with the member list by user ID and applies only the changes
+	  needed to make the tree match, all in a single batch so that the tree is
+	  only saved once.
+	Reconciling takes O(n) time for a tree with n nodes plus the cost of each
+	  change, which keeps it practical for servers with hundreds of thousands
+	  of members.
+	"""
+	def __init__(self, background_color: str):
+		"""
+		Initializes a new instance of the class.
+		@param background_color The background color to use for added nodes.
+		"""
+		self._background_color = background_color
+
+
+	def reconcile(self,
+		tree: IFamilyTree,
+		users: Iterable[IUser],
+		get_inviter_id: Optional[Callable[[int], Optional[int]]] = None,
+		get_background_color: Optional[Callable[[TreeNode], str]] = None
+		) -> ReconciliationResult:
+		"""
+		Updates a tree to match a server's member list.
+		Nodes for users that are no longer members are removed, nodes whose
+		  nickname differs from the member's nickname are renamed, and nodes are
+		  added for members that are missing from the tree. The root node is
+		  never removed since it belongs to the server's owner.
+		@param tree The tree to update.
+		@param users Every member of the server.
+		@param get_inviter_id Function that returns the ID of the user that
+		  invited a missing member, or None if the inviter is unknown. Members
+		  whose inviter is unknown or not in the tree are added as children of
+		  the root node. If not given, all missing members are added as
+		  children of the root node.
+		@param get_background_color Function that returns the background color
+		  of a missing member's node given the node of the member's inviter. If
+		  not given, added nodes use the reconciler's background color.
+		@returns The changes made to the tree.
+		"""
+		members: Dict[int, IUser] = {user.user_id: user for user in users}
+		added: List[TreeNode] = []
+		removed: List[TreeNode] = []
+		renamed: List[TreeNode] = []
+
+		with tree.batch() as batch:
+			# Every node must be visited to find the nodes of users that are no
+			#   longer members
+			root = batch.root_node
+			removed.extend(
+				node for node in batch.get_view()
+				if node is not root and node.discord_id not in members
+			)
+			batch.remove_nodes(removed)
+
+			nicknames: List[Tuple[TreeNode, str]] = []
+			missing: List[IUser] = []
+			for user_id, user in members.items():
+				try:
+					node = batch.find_node_by_user_id(user_id)
+				except KeyError:
+					missing.append(user)
+					continue
+				if user.nickname and node.user_nickname != user.nickname:
+					nicknames.append((node, user.nickname))
+					renamed.append(node)
+			batch.update_nicknames(nicknames)
+
+			for user in missing:
+				inviter = root
+				inviter_id = get_inviter_id(user.user_id) if get_inviter_id \
+					else None
+				if inviter_id is not None:
+					try:
+						inviter = batch.find_node_by_user_id(inviter_id)
+					except KeyError:
+						pass
+				node = TreeNode(
+					user.user_id,
+					user.username,
+					user.discriminator,
+					user.nickname or user.username,
+					get_background_color(inviter) if get_background_color \
+						else self._background_color,
+					inviter
+				)
+				batch.add_node(node)
+				added.append(node)
+
+		return ReconciliationResult(added, removed, renamed)
@@ -0,0 +1,561 @@
+from __future__ import annotations
+from typing import Any, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+class _BitmapNode:
+	"""
+	Interior node of a persistent map.
+	Each node has up to `PersistentMap.WIDTH` slots, one for each possible
+	  value of the next `PersistentMap.BITS` bits of a key's hash. Only slots
+	  that are in use are stored.
+	"""
+	__slots__ = ("bitmap", "entries")
+
+	def __init__(self, bitmap: int, entries: Tuple[Any, ...]):
+		"""
+		Initializes a new instance of the class.
+		@param bitmap Bitmap of the slots that are in use.
+		@param entries Entry for each slot that is in use, ordered by slot.
+		  Each entry is either a (key, value) tuple or a child node.
+		"""
+		# Bitmap of the slots that are in use.
+		self.bitmap = bitmap
+
+		# Entry for each slot that is in use, ordered by slot.
+		self.entries = entries
+
+
+class _CollisionNode:
+	"""
+	Leaf node that stores keys whose hashes are identical.
+	"""
+	__slots__ = ("key_hash", "pairs")
+
+	def __init__(self, key_hash: int, pairs: Tuple[Tuple[Any, Any], ...]):
+		"""
+		Initializes a new instance of the class.
+		@param key_hash The hash shared by every key in the node.
+		@param pairs The (key, value) pairs stored in the node.
+		"""
+		# The hash shared by every key in the node.
+		self.key_hash = key_hash
+
+		# The (key, value) pairs stored in the node.
+		self.pairs = pairs
+
+
+_Node = Union[_BitmapNode, _CollisionNode]
+
+class PersistentMap(Generic[K, V]):
+	"""
+	Immutable map that shares structure between versions.
+	Implemented as a hash array mapped trie (Bagwell, "Ideal Hash Trees").
+	  Adding or removing a key creates a new map by copying only the nodes on
+	  the path to the key, which takes O(log n) time, while every other node is
+	  shared with the original map. Since maps are never modified after they
+	  are created, a map may be read from any thread while newer versions are
+	  being created on another thread.
+	"""
+	# Number of hash bits consumed at each level of the trie.
+	BITS = 5
+
+	# Number of slots in each interior node.
+	WIDTH = 1 << BITS
+
+	# Number of hash bits used. Keys whose hashes are identical in these bits
+	#   are stored in collision nodes.
+	HASH_BITS = 64
+
+	def __init__(self,
+		root: Optional[_BitmapNode] = None,
+		count: int = 0):
+		"""
+		Initializes a new instance of the class.
+		Maps should be created empty or using `from_items()`; the parameters
+		  are only used internally.
+		@param root The root node of the trie.
+		@param count The number of keys in the map.
+		"""
+		# The root node of the trie. Empty maps do not have a root node.
+		self._root = root
+
+		# The number of keys in the map.
+		self._count = count
+
+
+	@staticmethod
+	def from_items(items: Iterable[Tuple[K, V]]) -> PersistentMap[K, V]:
+		"""
+		Creates a map containing the given items.
+		The trie is built using mutable nodes that are frozen once all items
+		  have been added, which avoids copying nodes for each item.
+		@param items The (key, value) pairs to add. If a key appears more than
+		  once, the last value is used.
+		@returns The map.
+		"""
+		root: List[Any] = [0, {}]
+		count = 0
+		for key, value in items:
+			key_hash = PersistentMap._hash(key)
+			if PersistentMap._build_set(root, key_hash, 0, key, value):
+				count += 1
+		if not count:
+			return PersistentMap()
+		return PersistentMap(PersistentMap._freeze(root), count)
+
+
+	def __len__(self) -> int:
+		"""
+		Gets the number of keys in the map.
+		"""
+		return self._count
+
+
+	def __contains__(self, key: object) -> bool:
+		"""
+		Checks whether a key is in the map.
+		"""
+		return self._find(key) is not None
+
+
+	def __getitem__(self, key: K) -> V:
+		"""
+		Gets the value associated with a key.
+		@throws KeyError If the key is not in the map.
+		"""
+		pair = self._find(key)
+		if pair is None:
+			raise KeyError(key)
+		return pair[1]
+
+
+	def __iter__(self) -> Iterator[K]:
+		"""
+		Iterates over the keys in the map, in no particular order.
+		"""
+		for key, _ in self.items():
+			yield key
+
+
+	def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+		"""
+		Gets the value associated with a key.
+		@param key The key to look up.
+		@param default The value to return if the key is not in the map.
+		@returns The value associated with the key, or `default`.
+		"""
+		pair = self._find(key)
+		return default if pair is None else pair[1]
+
+
+	def items(self) -> Iterator[Tuple[K, V]]:
+		"""
+		Iterates over the (key, value) pairs in the map, in no particular order.
+		"""
+		if self._root is None:
+			return
+		stack: List[_Node] = [self._root]
+		while stack:
+			node = stack.pop()
+			if isinstance(node, _CollisionNode):
+				yield from node.pairs
+				continue
+			for entry in node.entries:
+				if isinstance(entry, tuple):
+					yield entry
+				else:
+					stack.append(entry)
+
+
+	def values(self) -> Iterator[V]:
+		"""
+		Iterates over the values in the map, in no particular order.
+		"""
+		for _, value in self.items():
+			yield value
+
+
+	def diff(self,
+		other: PersistentMap[K, V]) -> Iterator[Tuple[K, Optional[V], Optional[V]]]:
+		"""
+		Iterates over the keys whose values differ between two maps.
+		Nodes that are shared by both maps are skipped without being visited,
+		  so comparing two versions of the same map takes O(k log n) time,
+		  where k is the number of keys that differ. Comparing unrelated maps
+		  takes O(n) time.
+		Values are compared using `!=`. None is used for keys that are missing
+		  from a map, so maps whose values may be None should not be compared.
+		@param other The map to compare against.
+		@returns A (key, value in this map, value in the other map) tuple for
+		  each key whose value differs, in no particular order.
+		"""
+		return PersistentMap._diff(self._root, other._root)
+
+
+	def set(self, key: K, value: V) -> PersistentMap[K, V]:
+		"""
+		Creates a copy of the map with a key set to a value.
+		@param key The key to set.
+		@param value The value to associate with the key.
+		@returns The new map. The original map is not modified.
+		"""
+		key_hash = PersistentMap._hash(key)
+		if self._root is None:
+			slot = key_hash & (PersistentMap.WIDTH - 1)
+			return PersistentMap(_BitmapNode(1 << slot, ((key, value),)), 1)
+
+		root, added = PersistentMap._set(self._root, key_hash, 0, key, value)
+		assert isinstance(root, _BitmapNode)
+		return PersistentMap(root, self._count + added)
+
+
+	def remove(self, key: K) -> PersistentMap[K, V]:
+		"""
+		Creates a copy of the map without a key.
+		@param key The key to remove.
+		@throws KeyError If the key is not in the map.
+		@returns The new map. The original map is not modified.
+		"""
+		if self._root is None:
+			raise KeyError(key)
+		root = PersistentMap._remove(
+			self._root,
+			PersistentMap._hash(key),
+			0,
+			key
+		)
+		assert root is None or isinstance(root, _BitmapNode)
+		return PersistentMap(root, self._count - 1)
+
+
+	def _find(self, key: object) -> Optional[Tuple[K, V]]:
+		"""
+		Finds the (key, value) pair for a key.
+		@param key The key to look up.
+		@returns The pair, or None if the key is not in the map.
+		"""
+		node: Any = self._root
+		key_hash = PersistentMap._hash(key)
+		shift = 0
+		while node is not None:
+			if isinstance(node, _CollisionNode):
+				for pair in node.pairs:
+					if pair[0] == key:
+						return pair
+				return None
+
+			bit = 1 << ((key_hash >> shift) & (PersistentMap.WIDTH - 1))
+			if not node.bitmap & bit:
+				return None
+			entry = node.entries[(node.bitmap & (bit - 1)).bit_count()]
+			if isinstance(entry, tuple):
+				return entry if entry[0] == key else None
+			node = entry
+			shift += PersistentMap.BITS
+		return None
+
+
+	@staticmethod
+	def _diff(entry_a: Any, entry_b: Any) -> Iterator[Tuple[Any, Any, Any]]:
+		"""
+		Iterates over the keys whose values differ between two entries found
+		  in the same slot of two maps.
+		@param entry_a The entry from the first map. May be a node, a
+		  (key, value) pair, or None if the slot is empty.
+		@param entry_b The entry from the second map.
+		@returns A (key, first value, second value) tuple for each key whose
+		  value differs.
+		"""
+		if entry_a is entry_b:
+			return
+		if isinstance(entry_a, _BitmapNode) and isinstance(entry_b, _BitmapNode):
+			bitmap = entry_a.bitmap | entry_b.bitmap
+			while bitmap:
+				bit = bitmap & -bitmap
+				bitmap ^= bit
+				yield from PersistentMap._diff(
+					PersistentMap._get_slot(entry_a, bit),
+					PersistentMap._get_slot(entry_b, bit)
+				)
+			return
+
+		# At least one entry is a pair, a collision node, or empty, so both
+		#   entries contain few keys unless the maps are unrelated
+		pairs_a = dict(PersistentMap._get_pairs(entry_a))
+		for key, value_b in PersistentMap._get_pairs(entry_b):
+			value_a = pairs_a.pop(key, None)
+			if value_a is not value_b and value_a != value_b:
+				yield key, value_a, value_b
+		for key, value_a in pairs_a.items():
+			yield key, value_a, None
+
+
+	@staticmethod
+	def _get_slot(node: _BitmapNode, bit: int) -> Any:
+		"""
+		Gets the entry stored in a slot of an interior node.
+		@param node The interior node.
+		@param bit The bit of the slot in the node's bitmap.
+		@returns The entry, or None if the slot is empty.
+		"""
+		if not node.bitmap & bit:
+			return None
+		return node.entries[(node.bitmap & (bit - 1)).bit_count()]
+
+
+	@staticmethod
+	def _get_pairs(entry: Any) -> Iterator[Tuple[Any, Any]]:
+		"""
+		Iterates over the (key, value) pairs stored in an entry.
+		@param entry A node, a (key, value) pair, or None.
+		"""
+		if entry is None:
+			return
+		if isinstance(entry, tuple):
+			yield entry
+		else:
+			yield from PersistentMap(entry, 0).items()
+
+
+	@staticmethod
+	def _hash(key: object) -> int:
+		"""
+		Gets the hash of a key as an unsigned integer.
+		@param key The key to hash.
+		@returns The lowest `HASH_BITS` bits of the key's hash.
+		"""
+		return hash(key) & ((1 << PersistentMap.HASH_BITS) - 1)
+
+
+	@staticmethod
+	def _make_node(
+		shift: int,
+		pair_a: Tuple[Any, Any],
+		hash_a: int,
+		pair_b: Tuple[Any, Any],
+		hash_b: int) -> _Node:
+		"""
+		Creates a node containing two pairs whose keys share the hash bits
+		  consumed so far.
+		@param shift The number of hash bits consumed by the node's ancestors.
+		@param pair_a The first (key, value) pair.
+		@param hash_a The hash of the first pair's key.
+		@param pair_b The second (key, value) pair.
+		@param hash_b The hash of the second pair's key.
+		@returns The new node.
+		"""
+		if shift >= PersistentMap.HASH_BITS:
+			return _CollisionNode(hash_a, (pair_a, pair_b))
+
+		mask = PersistentMap.WIDTH - 1
+		slot_a = (hash_a >> shift) & mask
+		slot_b = (hash_b >> shift) & mask
+		if slot_a == slot_b:
+			child = PersistentMap._make_node(
+				shift + PersistentMap.BITS,
+				pair_a,
+				hash_a,
+				pair_b,
+				hash_b
+			)
+			return _BitmapNode(1 << slot_a, (child,))
+		entries = (pair_a, pair_b) if slot_a < slot_b else (pair_b, pair_a)
+		return _BitmapNode((1 << slot_a) | (1 << slot_b), entries)
+
+
+	@staticmethod
+	def _set(
+		node: _Node,
+		key_hash: int,
+		shift: int,
+		key: Any,
+		value: Any) -> Tuple[_Node, bool]:
+		"""
+		Creates a copy of a node with a key set to a value.
+		@param node The node to copy.
+		@param key_hash The hash of the key.
+		@param shift The number of hash bits consumed by the node's ancestors.
+		@param key The key to set.
+		@param value The value to associate with the key.
+		@returns The new node and whether the key was not already present.
+		"""
+		if isinstance(node, _CollisionNode):
+			pairs = tuple(p for p in node.pairs if p[0] != key)
+			added = len(pairs) == len(node.pairs)
+			return _CollisionNode(key_hash, pairs + ((key, value),)), added
+
+		bit = 1 << ((key_hash >> shift) & (PersistentMap.WIDTH - 1))
+		index = (node.bitmap & (bit - 1)).bit_count()
+		entries = node.entries
+		if not node.bitmap & bit:
+			return _BitmapNode(
+				node.bitmap | bit,
+				entries[:index] + ((key, value),) + entries[index:]
+			), True
+
+		entry = entries[index]
+		added = False
+		if isinstance(entry, tuple):
+			if entry[0] == key:
+				new_entry: Any = (key, value)
+			else:
+				new_entry = PersistentMap._make_node(
+					shift + PersistentMap.BITS,
+					entry,
+					PersistentMap._hash(entry[0]),
+					(key, value),
+					key_hash
+				)
+				added = True
+		else:
+			new_entry, added = PersistentMap._set(
+				entry,
+				key_hash,
+				shift + PersistentMap.BITS,
+				key,
+				value
+			)
+		return _BitmapNode(
+			node.bitmap,
+			entries[:index] + (new_entry,) + entries[index + 1:]
+		), added
+
+
+	@staticmethod
+	def _remove(
+		node: _Node,
+		key_hash: int,
+		shift: int,
+		key: Any) -> Optional[Any]:
+		"""
+		Creates a copy of a node without a key.
+		@param node The node to copy.
+		@param key_hash The hash of the key.
+		@param shift The number of hash bits consumed by the node's ancestors.
+		@param key The key to remove.
+		@throws KeyError If the key is not in the node.
+		@returns The new node, a (key, value) pair if the new node would only
+		  contain that pair, or None if the new node would be empty. Pairs are
+		  only returned for nodes below the root so that they can be inlined
+		  into the parent node.
+		"""
+		if isinstance(node, _CollisionNode):
+			pairs = tuple(p for p in node.pairs if p[0] != key)
+			if len(pairs) == len(node.pairs):
+				raise KeyError(key)
+			if len(pairs) == 1:
+				return pairs[0]
+			return _CollisionNode(node.key_hash, pairs)
+
+		bit = 1 << ((key_hash >> shift) & (PersistentMap.WIDTH - 1))
+		if not node.bitmap & bit:
+			raise KeyError(key)
+		index = (node.bitmap & (bit - 1)).bit_count()
+		entries = node.entries
+		entry = entries[index]
+		if isinstance(entry, tuple):
+			if entry[0] != key:
+				raise KeyError(key)
+			new_entry = None
+		else:
+			new_entry = PersistentMap._remove(
+				entry,
+				key_hash,
+				shift + PersistentMap.BITS,
+				key
+			)
+
+		if new_entry is None:
+			bitmap = node.bitmap & ~bit
+			if not bitmap:
+				return None
+			entries = entries[:index] + entries[index + 1:]
+
+			# Inline nodes that only contain a single pair into their parent
+			if shift and len(entries) == 1 and isinstance(entries[0], tuple):
+				return entries[0]
+			return _BitmapNode(bitmap, entries)
+		return _BitmapNode(
+			node.bitmap,
+			entries[:index] + (new_entry,) + entries[index + 1:]
+		)
+
+
+	@staticmethod
+	def _build_set(
+		node: List[Any],
+		key_hash: int,
+		shift: int,
+		key: Any,
+		value: Any) -> bool:
+		"""
+		Sets a key in a mutable node used by `from_items()`.
+		Mutable interior nodes are [bitmap, {slot: entry}] lists and mutable
+		  collision nodes are {key: value} dictionaries.
+		@param node The mutable interior node.
+		@param key_hash The hash of the key.
+		@param shift The number of hash bits consumed by the node's ancestors.
+		@param key The key to set.
+		@param value The value to associate with the key.
+		@returns Whether the key was not already present.
+		"""
+		mask = PersistentMap.WIDTH - 1
+		while True:
+			slot = (key_hash >> shift) & mask
+			slots = node[1]
+			entry = slots.get(slot)
+			if entry is None:
+				node[0] |= 1 << slot
+				slots[slot] = (key, value)
+				return True
+			if isinstance(entry, list):
+				node = entry
+				shift += PersistentMap.BITS
+				continue
+			if isinstance(entry, dict):
+				added = key not in entry
+				entry[key] = value
+				return added
+			if entry[0] == key:
+				slots[slot] = (key, value)
+				return False
+
+			# Push the existing pair down into a new child node
+			shift += PersistentMap.BITS
+			if shift >= PersistentMap.HASH_BITS:
+				slots[slot] = {entry[0]: entry[1], key: value}
+				return True
+			child: List[Any] = [0, {}]
+			PersistentMap._build_set(
+				child,
+				PersistentMap._hash(entry[0]),
+				shift,
+				entry[0],
+				entry[1]
+			)
+			slots[slot] = child
+			node = child
+
+
+	@staticmethod
+	def _freeze(node: List[Any]) -> _BitmapNode:
+		"""
+		Converts a mutable node used by `from_items()` to an immutable node.
+		@param node The mutable interior node.
+		@returns The immutable node.
+		"""
+		entries: List[Any] = []
+		for slot in sorted(node[1]):
+			entry = node[1][slot]
+			if isinstance(entry, list):
+				entries.append(PersistentMap._freeze(entry))
+			elif isinstance(entry, dict):
+				pairs = tuple(entry.items())
+				entries.append(
+					_CollisionNode(PersistentMap._hash(pairs[0][0]), pairs)
+				)
+			else:
+				entries.append(entry)
+		return _BitmapNode(node[0], tuple(entries))
@@ -0,0 +1,54 @@
+from bot.models.tree_node import TreeNode
+from typing import List
+
+class ReconciliationResult:
+	"""
+	Describes the changes made to a family tree by reconciling it against a
+	  server's member list.
+	"""
+	def __init__(self,
+		added: List[TreeNode],
+		removed: List[TreeNode],
+		renamed: List[TreeNode]):
+		"""
+		Initializes a new instance of the class.
+		@param added Nodes that were added for members missing from the tree.
+		@param removed Nodes that were removed since their users are no longer
+		  members of the server.
+		@param renamed Nodes whose nickname was updated.
+		"""
+		self._added = added
+		self._removed = removed
+		self._renamed = renamed
+
+
+	@property
+	def added(self) -> List[TreeNode]:
+		"""
+		Gets the nodes that were added to the tree, in the order they were added.
+		"""
+		return self._added
+
+
+	@property
+	def removed(self) -> List[TreeNode]:
+		"""
+		Gets the nodes that were removed from the tree.
+		"""
+		return self._removed
+
+
+	@property
+	def renamed(self) -> List[TreeNode]:
+		"""
+		Gets the nodes whose nickname was updated.
+		"""
+		return self._renamed
+
+
+	@property
+	def is_empty(self) -> bool:
+		"""
+		Whether the tree already matched the member list.
+		"""
+		return not (self._added or self._removed or self._renamed)
@@ -0,0 +1,392 @@
+from __future__ import annotations
+import bisect
+from bot.models.tree_node import TreeNode
+from collections import Counter
+import math
+import re
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+class SearchIndex:
+	"""
+	Finds nodes by partial or misspelled nicknames and usernames.
+	Names are case folded before being indexed. Every name is stored in a
+	  sorted list, and every word after the first word of a name is stored in
+	  a second sorted list along with the rest of the name, so prefix matches
+	  can be found with a binary search. Names are also split into trigrams,
+	  which are used to find names that are similar to the query when there
+	  are not enough prefix matches.
+	Results are ranked in the following order:
+	  1. Names that start with the query, in alphabetical order. Names that
+	     are equal to the query always come first.
+	  2. Names containing a word that starts with the query, in alphabetical
+	     order.
+	  3. Names that share trigrams with the query, ordered by similarity.
+	"""
+	# Pattern that matches the start of each word after the first word of a
+	#   name.
+	WORD_START = re.compile(r"(?<=[\W_])(?=[^\W_])")
+
+	# Minimum similarity between the query's trigrams and a user's trigrams for
+	#   the user to be returned as a fuzzy match. Similarity is measured as the
+	#   number of shared trigrams divided by the number of distinct trigrams.
+	MIN_SIMILARITY = 0.3
+
+	# Minimum number of nodes updated or removed at once for the sorted key
+	#   lists to be rebuilt instead of updating them one node at a time. For
+	#   larger indices, the square root of the number of nodes is used instead
+	#   since shifting keys is much cheaper per key than rebuilding the lists.
+	BULK_UPDATE_SIZE = 64
+
+	def __init__(self):
+		"""
+		Initializes a new instance of the class.
+		"""
+		# Nodes in the index, indexed by the user's discord account ID.
+		self._nodes: Dict[int, TreeNode] = {}
+
+		# Case folded names that each user was indexed under, indexed by the
+		#   user's discord account ID. Used to remove the user's entries.
+		self._names: Dict[int, Tuple[str, ...]] = {}
+
+		# Sorted list of every indexed name and the ID of its user.
+		self._name_keys: List[Tuple[str, int]] = []
+
+		# Sorted list of the remainder of every indexed name starting at each
+		#   word after the first, and the ID of its user.
+		self._word_keys: List[Tuple[str, int]] = []
+
+		# IDs of the users whose names contain each trigram.
+		self._trigrams: Dict[str, Set[int]] = {}
+
+		# Number of distinct trigrams in each user's names, indexed by the
+		#   user's discord account ID.
+		self._trigram_counts: Dict[int, int] = {}
+
+
+	@staticmethod
+	def build(nodes: Iterable[TreeNode]) -> SearchIndex:
+		"""
+		Creates an index containing every node of a tree.
+		Adding nodes one at a time inserts into the middle of the sorted key
+		  lists, so indices for existing trees should be created using this
+		  method, which sorts each list once.
+		@param nodes The nodes to add.
+		@throws ValueError If a node appears more than once.
+		@returns The index.
+		"""
+		index = SearchIndex()
+		postings: Dict[str, List[int]] = {}
+		for node in nodes:
+			user_id = node.discord_id
+			if user_id in index._nodes:
+				raise ValueError(f"Node for user {user_id} already exists.")
+			for trigram in index._index_names(
+				node,
+				index._name_keys.append,
+				index._word_keys.append):
+				postings.setdefault(trigram, []).append(user_id)
+		index._name_keys.sort()
+		index._word_keys.sort()
+		index._trigrams = {
+			trigram: set(users) for trigram, users in postings.items()
+		}
+		return index
+
+
+	def __contains__(self, node: TreeNode) -> bool:
+		"""
+		Checks whether a node has been added to the index.
+		"""
+		return node.discord_id in self._nodes
+
+
+	def add_node(self, node: TreeNode) -> None:
+		"""
+		Indexes a node under its current nickname and username.
+		@param node The node to add.
+		@throws ValueError If the node has already been added.
+		"""
+		user_id = node.discord_id
+		if user_id in self._nodes:
+			raise ValueError(f"Node for user {user_id} already exists.")
+
+		for trigram in self._index_names(
+			node,
+			lambda key: bisect.insort(self._name_keys, key),
+			lambda key: bisect.insort(self._word_keys, key)):
+			self._trigrams.setdefault(trigram, set()).add(user_id)
+
+
+	def remove_node(self, node: TreeNode) -> None:
+		"""
+		Removes a node from the index.
+		The node is removed using the names it was indexed under, so this may be
+		  called after the node's nickname has been changed.
+		@param node The node to remove.
+		@throws KeyError If the node has not been added to the index.
+		"""
+		user_id = node.discord_id
+		if user_id not in self._nodes:
+			raise KeyError(f"Node for user {user_id} does not exist.")
+
+		for name in self._unindex_names(user_id):
+			SearchIndex._remove_key(self._name_keys, (name, user_id))
+			for word in SearchIndex._get_words(name):
+				SearchIndex._remove_key(self._word_keys, (word, user_id))
+
+
+	def update_nodes(self, nodes: Iterable[TreeNode]) -> None:
+		"""
+		Re-indexes nodes under their current nicknames and usernames.
+		Nodes are removed using the names they were indexed under, so this is
+		  called after the nodes' nicknames have been changed. Removing and
+		  adding each node shifts the rest of each sorted key list for every
+		  key, so when many nodes are updated, each list is instead filtered
+		  and merged with the new keys once.
+		@param nodes The nodes to re-index.
+		@throws KeyError If a node has not been added to the index.
+		"""
+		updated = self._get_indexed_nodes(nodes)
+		if len(updated) < self._get_bulk_size():
+			for node in updated.values():
+				self.remove_node(node)
+				self.add_node(node)
+			return
+
+		self._remove_all(updated)
+		added_name_keys: List[Tuple[str, int]] = []
+		added_word_keys: List[Tuple[str, int]] = []
+		for user_id, node in updated.items():
+			for trigram in self._index_names(
+				node,
+				added_name_keys.append,
+				added_word_keys.append):
+				self._trigrams.setdefault(trigram, set()).add(user_id)
+
+		# Each list is made of two sorted runs, which are merged in linear time
+		added_name_keys.sort()
+		added_word_keys.sort()
+		self._name_keys += added_name_keys
+		self._word_keys += added_word_keys
+		self._name_keys.sort()
+		self._word_keys.sort()
+
+
+	def remove_nodes(self, nodes: Iterable[TreeNode]) -> None:
+		"""
+		Removes several nodes from the index at once.
+		Like `update_nodes()`, each sorted key list is filtered once instead of
+		  removing each key when many nodes are removed.
+		@param nodes The nodes to remove.
+		@throws KeyError If a node has not been added to the index.
+		"""
+		removed = self._get_indexed_nodes(nodes)
+		if len(removed) < self._get_bulk_size():
+			for node in removed.values():
+				self.remove_node(node)
+		else:
+			self._remove_all(removed)
+
+
+	def search(self, query: str, limit: int) -> List[TreeNode]:
+		"""
+		Finds the nodes whose names best match a query.
+		@param query The text to search for. Case is ignored.
+		@param limit The maximum number of nodes to return.
+		@returns The matching nodes, ordered from best to worst match.
+		"""
+		query = SearchIndex._normalize(query)
+		if not query or limit <= 0:
+			return []
+
+		found: Dict[int, None] = {}
+		for keys in (self._name_keys, self._word_keys):
+			i = bisect.bisect_left(keys, (query,))
+			while i < len(keys) and len(found) < limit:
+				name, user_id = keys[i]
+				if not name.startswith(query):
+					break
+				found[user_id] = None
+				i += 1
+
+		if len(found) < limit:
+			for user_id in self._find_similar(query, found):
+				found[user_id] = None
+				if len(found) >= limit:
+					break
+		return [self._nodes[user_id] for user_id in found]
+
+
+	def _find_similar(self, query: str, exclude: Dict[int, None]) -> List[int]:
+		"""
+		Finds the users whose names share trigrams with a query.
+		@param query The case folded query.
+		@param exclude IDs of users to leave out of the results.
+		@returns The IDs of users whose similarity to the query is at least
+		  `MIN_SIMILARITY`, ordered by descending similarity and then by
+		  ascending user ID.
+		"""
+		query_trigrams = SearchIndex._get_trigrams(query)
+		query_count = len(query_trigrams)
+		postings = sorted(
+			(self._trigrams.get(trigram, set()) for trigram in query_trigrams),
+			key=len
+		)
+
+		# A user's similarity is at most the fraction of the query's trigrams
+		#   that the user shares, so similar users share at least `min_shared`
+		#   trigrams. Any such user must appear in at least one of the
+		#   `query_count - min_shared + 1` smallest postings, so candidates are
+		#   only taken from those postings. The remaining (usually much larger)
+		#   postings are only used to count trigrams shared by candidates.
+		min_shared = max(1, math.ceil(SearchIndex.MIN_SIMILARITY * query_count))
+		split = query_count - min_shared + 1
+		shared: Counter = Counter()
+		for users in postings[:split]:
+			shared.update(users)
+		candidates = shared.keys()
+		for users in postings[split:]:
+			shared.update(candidates & users)
+
+		trigram_counts = self._trigram_counts
+		scored: List[Tuple[float, int]] = []
+		for user_id, count in shared.items():
+			if count < min_shared or user_id in exclude:
+				continue
+			similarity = count / (query_count + trigram_counts[user_id] - count)
+			if similarity >= SearchIndex.MIN_SIMILARITY:
+				scored.append((-similarity, user_id))
+		scored.sort()
+		return [user_id for _, user_id in scored]
+
+
+	def _index_names(self,
+		node: TreeNode,
+		add_name_key: Callable[[Tuple[str, int]], None],
+		add_word_key: Callable[[Tuple[str, int]], None]) -> Set[str]:
+		"""
+		Adds a node's names to the index.
+		@param node The node to add. Must not already be in the index.
+		@param add_name_key Function used to add a key to the name key list.
+		@param add_word_key Function used to add a key to the word key list.
+		@returns The trigrams in the node's names. The caller is responsible
+		  for adding the node to the trigram postings.
+		"""
+		user_id = node.discord_id
+		names = tuple(dict.fromkeys((
+			SearchIndex._normalize(node.user_nickname),
+			SearchIndex._normalize(node.discord_username)
+		)))
+		self._nodes[user_id] = node
+		self._names[user_id] = names
+
+		trigrams: Set[str] = set()
+		for name in names:
+			add_name_key((name, user_id))
+			for word in SearchIndex._get_words(name):
+				add_word_key((word, user_id))
+			trigrams.update(SearchIndex._get_trigrams(name))
+		self._trigram_counts[user_id] = len(trigrams)
+		return trigrams
+
+
+	def _get_indexed_nodes(self,
+		nodes: Iterable[TreeNode]) -> Dict[int, TreeNode]:
+		"""
+		Makes sure that every node has been added to the index.
+		@param nodes The nodes to check.
+		@throws KeyError If a node has not been added to the index.
+		@returns The distinct nodes, indexed by the user's discord account ID.
+		"""
+		indexed: Dict[int, TreeNode] = {}
+		for node in nodes:
+			if node.discord_id not in self._nodes:
+				raise KeyError(f"Node for user {node.discord_id} does not exist.")
+			indexed[node.discord_id] = node
+		return indexed
+
+
+	def _get_bulk_size(self) -> int:
+		"""
+		Gets the number of nodes that must be updated or removed at once for
+		  the sorted key lists to be rebuilt instead of updated per node.
+		"""
+		return max(SearchIndex.BULK_UPDATE_SIZE, math.isqrt(len(self._nodes)))
+
+
+	def _remove_all(self, nodes: Dict[int, TreeNode]) -> None:
+		"""
+		Removes several nodes from the index by filtering each sorted key list.
+		@param nodes The nodes to remove, indexed by the user's discord account
+		  ID. Every node must be in the index.
+		"""
+		for user_id in nodes:
+			self._unindex_names(user_id)
+		self._name_keys = [key for key in self._name_keys if key[1] not in nodes]
+		self._word_keys = [key for key in self._word_keys if key[1] not in nodes]
+
+
+	def _unindex_names(self, user_id: int) -> Tuple[str, ...]:
+		"""
+		Removes a user from the index, except for the user's entries in the
+		  sorted key lists.
+		@param user_id The ID of the user to remove. Must be in the index.
+		@returns The case folded names that the user was indexed under. The
+		  caller is responsible for removing the user's keys.
+		"""
+		names = self._names.pop(user_id)
+		del self._nodes[user_id]
+		del self._trigram_counts[user_id]
+
+		trigrams: Set[str] = set()
+		for name in names:
+			trigrams.update(SearchIndex._get_trigrams(name))
+		for trigram in trigrams:
+			users = self._trigrams[trigram]
+			users.discard(user_id)
+			if not users:
+				del self._trigrams[trigram]
+		return names
+
+
+	@staticmethod
+	def _normalize(name: str) -> str:
+		"""
+		Converts a name to the form used for matching.
+		@param name The name to convert.
+		@returns The case folded name without surrounding whitespace.
+		"""
+		return name.strip().casefold()
+
+
+	@staticmethod
+	def _get_words(name: str) -> List[str]:
+		"""
+		Gets the suffixes of a name that start at each word after the first.
+		@param name The case folded name.
+		@returns The suffixes of the name.
+		"""
+		return [name[m.start():] for m in SearchIndex.WORD_START.finditer(name)]
+
+
+	@staticmethod
+	def _get_trigrams(name: str) -> Set[str]:
+		"""
+		Splits a name into trigrams.
+		The name is padded with spaces so that short names and the start and
+		  end of names produce trigrams.
+		@param name The case folded name.
+		@returns The distinct trigrams in the name.
+		"""
+		padded = f"  {name} "
+		return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+	@staticmethod
+	def _remove_key(keys: List[Tuple[str, int]], key: Tuple[str, int]) -> None:
+		"""
+		Removes a key from a sorted list of keys.
+		@param keys The sorted list of keys.
+		@param key The key to remove. Must be in the list.
+		"""
+		del keys[bisect.bisect_left(keys, key)]
@@ -0,0 +1,496 @@
+from __future__ import annotations
+from bot.models.tree_node import TreeNode
+import heapq
+from typing import Dict, Iterable, List, Set, Tuple
+
+class SubtreeIndex:
+	"""
+	Tracks the subtree of each node in a family tree.
+	Each node is labelled with the interval between the points where a
+	  depth-first traversal of the tree enters and exits the node. A node is a
+	  descendant of another node if and only if its interval is nested inside
+	  the other node's interval, which can be checked in O(1).
+	The traversal is stored as a linked list of enter/exit tokens with integer
+	  labels that increase along the list. New nodes are always leaves, so
+	  their tokens are inserted immediately before their inviter's exit token.
+	  When there is no free label between two tokens, the smallest surrounding
+	  range of labels that is sparse enough is relabelled evenly, which takes
+	  amortized O(log n) time (Bender et al., "Two Simplified Algorithms for
+	  Maintaining Order in a List").
+	When a node is removed, its tokens are unlinked. Its children's intervals
+	  are already nested inside its parent's interval, so re-assigning the
+	  children to the parent does not require any relabelling.
+	Subtree sizes are stored for each node and are updated along the path to
+	  the root whenever a node is added or removed. Since this takes O(depth)
+	  time, indices for existing trees should be created using `build()`,
+	  which takes O(n) time.
+	"""
+	# Number of distinct labels. Must be a power of two.
+	LABEL_SPACE = 1 << 62
+
+	# Controls how sparse a range of labels must be before it is relabelled.
+	#   A range of 2^i labels is relabelled once it contains fewer than
+	#   2^i / DENSITY_BASE^i tokens. Must be between 1 and 2.
+	DENSITY_BASE = 1.5
+
+	# Maximum distance between the label of a new token and the label of the
+	#   token before it. New nodes are usually added after the same token as
+	#   the previous node (e.g. the root's exit token), so always taking the
+	#   midpoint would halve the free space after that token on every insert.
+	MAX_INSERT_GAP = 1 << 32
+
+	# Value used in place of a token or node index when a token has no
+	#   neighbour or a node has no parent. Must be negative.
+	NONE = -1
+
+	def __init__(self, root_node: TreeNode):
+		"""
+		Initializes a new instance of the class.
+		@param root_node The root node of the tree.
+		"""
+		# Index assigned to each node, indexed by the user's discord account ID.
+		# The tokens of the node at index i are 2i (enter) and 2i + 1 (exit).
+		self._indices: Dict[int, int] = {root_node.discord_id: 0}
+
+		# Node at each index. Indices of removed nodes keep referring to the
+		#   removed node until the index is reused.
+		self._nodes: List[TreeNode] = [root_node]
+
+		# Index of each node's parent. The root node's parent is `NONE`.
+		self._parents: List[int] = [SubtreeIndex.NONE]
+
+		# Number of nodes in each node's subtree, including the node itself.
+		self._sizes: List[int] = [1]
+
+		# Indices of each node's children, indexed by the node's index. Nodes
+		#   without children do not have an entry. Dictionaries are used as
+		#   ordered sets.
+		self._children: Dict[int, Dict[int, None]] = {}
+
+		# Indices that were used by removed nodes and may be reused.
+		self._free_indices: List[int] = []
+
+		# Label, previous token, and next token of each token.
+		self._labels: List[int] = [0, SubtreeIndex.LABEL_SPACE // 2]
+		self._prev: List[int] = [SubtreeIndex.NONE, 0]
+		self._next: List[int] = [1, SubtreeIndex.NONE]
+
+
+	@staticmethod
+	def build(nodes: Iterable[TreeNode]) -> SubtreeIndex:
+		"""
+		Creates an index containing every node of a tree.
+		@param nodes The nodes of the tree. The first node must be the root
+		  node and every node's inviter must appear before the node itself.
+		@throws ValueError If the nodes are not in the required order.
+		@returns The index, with labels spread evenly across the label space.
+		"""
+		nodes_iter = iter(nodes)
+		index = SubtreeIndex(next(nodes_iter))
+		indices = index._indices
+		parents = index._parents
+		children = index._children
+		for node in nodes_iter:
+			if not node.inviter or node.inviter.discord_id not in indices:
+				raise ValueError(
+					f"Inviter for user {node.discord_id} does not exist."
+				)
+			if node.discord_id in indices:
+				raise ValueError(
+					f"Node for user {node.discord_id} already exists."
+				)
+			parent = indices[node.inviter.discord_id]
+			i = len(index._nodes)
+			indices[node.discord_id] = i
+			index._nodes.append(node)
+			parents.append(parent)
+			children.setdefault(parent, {})[i] = None
+
+		# Every node appears after its parent, so visiting nodes in reverse
+		#   accumulates each subtree before its size is added to the parent
+		count = len(index._nodes)
+		sizes = [1] * count
+		for i in range(count - 1, 0, -1):
+			sizes[parents[i]] += sizes[i]
+		index._sizes = sizes
+
+		# Walk the tree depth-first to link the tokens in traversal order
+		token_count = 2 * count
+		order: List[int] = []
+		stack = [0]
+		while stack:
+			token = stack.pop()
+			order.append(token)
+			if token & 1 == 0:
+				stack.append(token + 1)
+				stack.extend(
+					2 * child for child in reversed(children.get(token // 2, {}))
+				)
+
+		step = SubtreeIndex.LABEL_SPACE // (token_count + 1)
+		labels = [0] * token_count
+		prev_tokens = [SubtreeIndex.NONE] * token_count
+		next_tokens = [SubtreeIndex.NONE] * token_count
+		for position, token in enumerate(order):
+			labels[token] = position * step
+			if position:
+				prev_tokens[token] = order[position - 1]
+				next_tokens[order[position - 1]] = token
+		index._labels = labels
+		index._prev = prev_tokens
+		index._next = next_tokens
+		return index
+
+
+	def __contains__(self, node: TreeNode) -> bool:
+		"""
+		Checks whether a node has been added to the index.
+		"""
+		return node.discord_id in self._indices
+
+
+	def add_node(self, node: TreeNode) -> None:
+		"""
+		Adds a node to the index as the last child of its inviter.
+		@param node The node to add. The node's inviter must already have been
+		  added to the index.
+		@throws ValueError If the node has already been added or if the node's
+		  inviter has not been added.
+		"""
+		if node.discord_id in self._indices:
+			raise ValueError(f"Node for user {node.discord_id} already exists.")
+		if not node.inviter or node.inviter.discord_id not in self._indices:
+			raise ValueError(
+				f"Inviter for user {node.discord_id} does not exist."
+			)
+
+		parent = self._indices[node.inviter.discord_id]
+		if self._free_indices:
+			index = self._free_indices.pop()
+			self._nodes[index] = node
+			self._parents[index] = parent
+			self._sizes[index] = 1
+		else:
+			index = len(self._nodes)
+			self._nodes.append(node)
+			self._parents.append(parent)
+			self._sizes.append(1)
+			self._labels.extend((0, 0))
+			self._prev.extend((SubtreeIndex.NONE, SubtreeIndex.NONE))
+			self._next.extend((SubtreeIndex.NONE, SubtreeIndex.NONE))
+		self._indices[node.discord_id] = index
+		self._children.setdefault(parent, {})[index] = None
+
+		# Place the node after all of the parent's existing descendants
+		enter = 2 * index
+		self._insert_after(self._prev[2 * parent + 1], enter)
+		self._insert_after(enter, enter + 1)
+
+		# Invite farms create chains thousands of nodes deep, so this loop is
+		#   kept as tight as possible
+		sizes = self._sizes
+		parents = self._parents
+		ancestor = parent
+		while ancestor >= 0:
+			sizes[ancestor] += 1
+			ancestor = parents[ancestor]
+
+
+	def remove_node(self, node: TreeNode) -> List[TreeNode]:
+		"""
+		Removes a node from the index.
+		The node's children are re-assigned to the node's parent.
+		@param node The node to remove.
+		@throws KeyError If the node has not been added to the index.
+		@throws ValueError If the node is the root node.
+		@returns The children of the removed node. The caller is responsible
+		  for updating each child's inviter.
+		"""
+		index = self._get_index(node)
+		parent = self._parents[index]
+		if parent == SubtreeIndex.NONE:
+			raise ValueError("Cannot remove the root node.")
+
+		children = self._children.pop(index, {})
+		siblings = self._children[parent]
+		del siblings[index]
+		for child in children:
+			self._parents[child] = parent
+			siblings[child] = None
+
+		self._unlink(2 * index)
+		self._unlink(2 * index + 1)
+
+		sizes = self._sizes
+		parents = self._parents
+		ancestor = parent
+		while ancestor >= 0:
+			sizes[ancestor] -= 1
+			ancestor = parents[ancestor]
+
+		del self._indices[node.discord_id]
+		self._free_indices.append(index)
+		return [self._nodes[child] for child in children]
+
+
+	def remove_nodes(self,
+		nodes: Iterable[TreeNode]) -> List[Tuple[TreeNode, TreeNode]]:
+		"""
+		Removes several nodes from the index at once.
+		Each surviving child of a removed node is re-assigned to its nearest
+		  ancestor that is not removed. Rather than walking from each removed
+		  node to the root to update subtree sizes, the removed nodes are
+		  counted per surviving ancestor and every node on the paths from
+		  those ancestors to the root is updated once.
+		@param nodes The nodes to remove. Duplicates are ignored.
+		@throws KeyError If a node has not been added to the index.
+		@throws ValueError If a node is the root node.
+		@returns Each surviving node whose parent changed and its new parent.
+		  The caller is responsible for updating each node's inviter.
+		"""
+		removed: Dict[int, None] = {}
+		for node in nodes:
+			index = self._get_index(node)
+			if self._parents[index] == SubtreeIndex.NONE:
+				raise ValueError("Cannot remove the root node.")
+			removed[index] = None
+
+		# Nearest surviving ancestor of each removed node. Chains of removed
+		#   nodes are only walked once since every node on the chain is
+		#   assigned the same ancestor.
+		parents = self._parents
+		targets: Dict[int, int] = {}
+
+		# Number of removed nodes below each surviving ancestor
+		counts: Dict[int, int] = {}
+
+		# Each surviving child of a removed node and its new parent
+		moved: List[Tuple[int, int]] = []
+
+		for index in removed:
+			path: List[int] = []
+			ancestor = index
+			while ancestor in removed and ancestor not in targets:
+				path.append(ancestor)
+				ancestor = parents[ancestor]
+			target = targets.get(ancestor, ancestor)
+			for i in path:
+				targets[i] = target
+
+			counts[target] = counts.get(target, 0) + 1
+			parent = parents[index]
+			if parent not in removed:
+				del self._children[parent][index]
+			for child in self._children.pop(index, {}):
+				if child not in removed:
+					moved.append((child, target))
+			self._unlink(2 * index)
+			self._unlink(2 * index + 1)
+
+		for child, target in moved:
+			parents[child] = target
+			self._children.setdefault(target, {})[child] = None
+
+		# Subtract the removed nodes from the size of each surviving ancestor.
+		# Paths from nearby ancestors to the root mostly overlap, so each node
+		#   on the paths is visited once: the number of paths entering each
+		#   node from below is counted, and then counts are accumulated from
+		#   the bottom of the paths upwards.
+		entering: Dict[int, int] = {}
+		visited: Set[int] = set()
+		for ancestor in counts:
+			if ancestor in visited:
+				continue
+			visited.add(ancestor)
+			parent = parents[ancestor]
+			while parent >= 0:
+				entering[parent] = entering.get(parent, 0) + 1
+				if parent in visited:
+					break
+				visited.add(parent)
+				parent = parents[parent]
+
+		sizes = self._sizes
+		pending = [index for index in visited if index not in entering]
+		while pending:
+			index = pending.pop()
+			count = counts.get(index, 0)
+			sizes[index] -= count
+			parent = parents[index]
+			if parent >= 0:
+				counts[parent] = counts.get(parent, 0) + count
+				entering[parent] -= 1
+				if not entering[parent]:
+					pending.append(parent)
+
+		for index in removed:
+			del self._indices[self._nodes[index].discord_id]
+			self._free_indices.append(index)
+		return [
+			(self._nodes[child], self._nodes[target])
+			for child, target in moved
+		]
+
+
+	def is_descendant(self, node: TreeNode, ancestor: TreeNode) -> bool:
+		"""
+		Checks whether a node was directly or indirectly invited by another.
+		@param node The node that may be a descendant.
+		@param ancestor The node that may be an ancestor.
+		@throws KeyError If either node has not been added to the index.
+		@returns True if `ancestor` is an ancestor of `node`. A node is not a
+		  descendant of itself.
+		"""
+		a = self._get_index(node)
+		b = self._get_index(ancestor)
+		labels = self._labels
+		return labels[2 * b] < labels[2 * a] \
+			and labels[2 * a + 1] < labels[2 * b + 1]
+
+
+	def get_subtree_size(self, node: TreeNode) -> int:
+		"""
+		Gets the number of nodes in a node's subtree.
+		@param node The node to get the subtree size of.
+		@throws KeyError If the node has not been added to the index.
+		@returns The number of nodes in the subtree, including the node itself.
+		"""
+		return self._sizes[self._get_index(node)]
+
+
+	def get_largest_subtrees(self, count: int) -> List[Tuple[TreeNode, int]]:
+		"""
+		Finds the nodes with the most descendants.
+		A node always has more descendants than any of its children, so nodes
+		  are visited best-first starting from the root and only the children of
+		  returned nodes are considered. This takes O(k log k) time plus the time
+		  needed to visit the children of the returned nodes.
+		@param count The maximum number of nodes to return.
+		@returns Each node and its number of descendants, ordered from most to
+		  fewest descendants. Nodes with the same number of descendants are
+		  ordered by ascending user ID. Nodes without descendants are excluded.
+		"""
+		nodes = self._nodes
+		sizes = self._sizes
+		largest: List[Tuple[TreeNode, int]] = []
+		heap = [(-sizes[0], nodes[0].discord_id, 0)]
+		while heap and len(largest) < count:
+			negative_size, _, index = heapq.heappop(heap)
+			if negative_size == -1:
+				break
+			largest.append((nodes[index], -negative_size - 1))
+			for child in self._children.get(index, {}):
+				if sizes[child] > 1:
+					heapq.heappush(
+						heap,
+						(-sizes[child], nodes[child].discord_id, child)
+					)
+		return largest
+
+
+	def get_child_nodes(self, node: TreeNode) -> List[TreeNode]:
+		"""
+		Gets the nodes that were directly invited by a node.
+		@param node The node to get the children of.
+		@throws KeyError If the node has not been added to the index.
+		@returns The children of the node.
+		"""
+		return [
+			self._nodes[child]
+			for child in self._children.get(self._get_index(node), {})
+		]
+
+
+	def _get_index(self, node: TreeNode) -> int:
+		"""
+		Gets the index assigned to a node.
+		@param node The node to get the index of.
+		@throws KeyError If the node has not been added to the index.
+		@returns The index of the node.
+		"""
+		index = self._indices.get(node.discord_id)
+		if index is None:
+			raise KeyError(f"Node for user {node.discord_id} does not exist.")
+		return index
+
+
+	def _insert_after(self, token: int, new_token: int) -> None:
+		"""
+		Links a token into the list and assigns it a label.
+		@param token The token to insert after.
+		@param new_token The token to insert.
+		"""
+		following = self._next[token]
+		high = self._labels[following] if following != SubtreeIndex.NONE \
+			else SubtreeIndex.LABEL_SPACE
+		if high - self._labels[token] < 2:
+			self._relabel(token)
+			high = self._labels[following] if following != SubtreeIndex.NONE \
+				else SubtreeIndex.LABEL_SPACE
+
+		low = self._labels[token]
+		self._labels[new_token] = low + min(
+			(high - low) // 2,
+			SubtreeIndex.MAX_INSERT_GAP
+		)
+		self._prev[new_token] = token
+		self._next[new_token] = following
+		self._next[token] = new_token
+		if following != SubtreeIndex.NONE:
+			self._prev[following] = new_token
+
+
+	def _unlink(self, token: int) -> None:
+		"""
+		Removes a token from the list.
+		@param token The token to remove.
+		"""
+		before = self._prev[token]
+		after = self._next[token]
+		if before != SubtreeIndex.NONE:
+			self._next[before] = after
+		if after != SubtreeIndex.NONE:
+			self._prev[after] = before
+
+
+	def _relabel(self, token: int) -> None:
+		"""
+		Spreads out the labels around a token so that there is room to insert
+		  a new token after it.
+		@param token The token that a new token will be inserted after.
+		@throws RuntimeError If the list contains too many tokens.
+		"""
+		labels = self._labels
+		label = labels[token]
+		first = last = token
+		count = 1
+		size = 1
+		threshold = 1.0
+		while True:
+			size <<= 1
+			threshold /= SubtreeIndex.DENSITY_BASE
+			if size > SubtreeIndex.LABEL_SPACE:
+				raise RuntimeError("Too many nodes to label.")
+
+			# Count the tokens whose labels fall in the aligned range of
+			#   `size` labels that contains the token
+			low = label & ~(size - 1)
+			high = low + size
+			while self._prev[first] != SubtreeIndex.NONE \
+				and labels[self._prev[first]] >= low:
+				first = self._prev[first]
+				count += 1
+			while self._next[last] != SubtreeIndex.NONE \
+				and labels[self._next[last]] < high:
+				last = self._next[last]
+				count += 1
+
+			# Leave room for the token that is about to be inserted
+			if count + 1 <= threshold * size:
+				break
+
+		step = size // (count + 1)
+		current = first
+		for i in range(count):
+			labels[current] = low + i * step
+			current = self._next[current]
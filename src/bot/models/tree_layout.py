@@ -0,0 +1,349 @@
+from __future__ import annotations
+from bot.models.family_tree import IFamilyTree
+from bot.models.tree_node import TreeNode
+from typing import Dict, List, Optional, Tuple
+
+# Contour of a subtree: the x coordinate of its leftmost or rightmost node at
+#   each depth, stored as a linked list of (dx, rest) cells where dx is the
+#   change in x from the depth above. Lists are never modified, so subtrees
+#   may share the cells of their children's contours.
+Contour = Optional[Tuple[float, "Contour"]]
+
+class TreeLayout:
+	"""
+	Positions the nodes of a family tree for drawing as a diagram.
+	Nodes are placed using the Reingold-Tilford algorithm: each node's
+	  children are placed left to right as close together as their subtrees
+	  allow, and the node is centered above its first and last child. Each
+	  node is placed one unit below its inviter.
+	The layout caches the position of each node relative to its inviter along
+	  with the contours of the node's subtree, which only depend on the node's
+	  descendants. Adding or removing a node therefore only invalidates the
+	  subtrees of the node's ancestors, and only those subtrees are laid out
+	  again on the next query. Laying out a subtree merges the contours of its
+	  children, which takes time proportional to the number of children plus
+	  the depths at which neighbouring children overlap, so a change takes
+	  O(depth) time plus the cost of merging the changed ancestors' children
+	  instead of O(n) time.
+	The tree is laid out the first time the layout is queried. Not thread
+	  safe, but may be used with a thread safe tree as long as all changes to
+	  the tree are made from the same thread.
+	"""
+	# Minimum horizontal distance between two nodes at the same depth.
+	SEPARATION = 1.0
+
+	def __init__(self, tree: IFamilyTree):
+		"""
+		Initializes a new instance of the class.
+		@param tree The tree to lay out.
+		"""
+		self._tree = tree
+
+		# Root node of the tree. None until the tree is first laid out.
+		self._root: Optional[TreeNode] = None
+
+		# Children of each node with children, indexed by user ID and ordered
+		#   from left to right. Children moved to a node when their inviter is
+		#   removed are placed after the node's existing children.
+		self._children: Dict[int, List[TreeNode]] = {}
+
+		# Horizontal offset of each node from its inviter, indexed by user ID.
+		self._offsets: Dict[int, float] = {}
+
+		# Left contour, right contour, and height of each node's subtree,
+		#   indexed by user ID. Both contours start at the depth below the
+		#   node and are relative to the node's position.
+		self._contours: Dict[int, Tuple[Contour, Contour, int]] = {}
+
+		# Depth of each node whose subtree must be laid out again when it was
+		#   marked, indexed by user ID. If a node is in the dictionary, so are
+		#   all of its ancestors. Removing a node can leave its descendants'
+		#   depths too large, but each node's depth is still greater than its
+		#   inviter's, which is all that is needed to lay out subtrees after
+		#   their descendants.
+		self._dirty: Dict[int, int] = {}
+
+		# Nodes that were removed since the last update. Removals are applied
+		#   together since several nodes may be removed at once, and the
+		#   children of a removed node are only known to have been removed
+		#   too once all of the removed nodes are known.
+		self._removed: List[TreeNode] = []
+
+		tree.events.on_node_added += self._on_node_added # type: ignore
+		tree.events.on_node_removed += self._on_node_removed # type: ignore
+
+
+	def get_position(self, node: TreeNode) -> Tuple[float, int]:
+		"""
+		Gets the position of a node in the diagram.
+		@param node The node to get the position of. Must be in the tree.
+		@returns The x and y coordinates of the node. The root is at (0, 0)
+		  and y increases by one for each invite between the root and the node.
+		"""
+		self.update()
+		x = 0.0
+		y = 0
+		while node.inviter is not None:
+			x += self._offsets[node.discord_id]
+			y += 1
+			node = node.inviter
+		return x, y
+
+
+	def get_positions(self) -> Dict[int, Tuple[float, int]]:
+		"""
+		Gets the position of every node in the diagram.
+		@returns The x and y coordinates of each node, indexed by user ID. See
+		  `get_position()`.
+		"""
+		self.update()
+		assert self._root
+		positions = {self._root.discord_id: (0.0, 0)}
+		stack = [self._root]
+		while stack:
+			node = stack.pop()
+			x, y = positions[node.discord_id]
+			for child in self._children.get(node.discord_id, ()):
+				positions[child.discord_id] = (
+					x + self._offsets[child.discord_id],
+					y + 1
+				)
+				stack.append(child)
+		return positions
+
+
+	def update(self) -> None:
+		"""
+		Lays out every subtree that changed since the last update.
+		Called by each query, so it only needs to be called directly to choose
+		  when the work is done (e.g. right after a change).
+		"""
+		if self._root is None:
+			self._layout_tree()
+			return
+		if self._removed:
+			self._apply_removals()
+
+		# Subtrees are laid out after all of their descendants
+		for user_id, _ in sorted(
+			self._dirty.items(),
+			key=lambda item: item[1],
+			reverse=True):
+			self._layout_subtree(user_id)
+		self._dirty.clear()
+
+
+	def _layout_tree(self) -> None:
+		"""
+		Lays out the entire tree.
+		"""
+		nodes = list(self._tree.get_view())
+		for node in nodes:
+			if node.inviter is None:
+				self._root = node
+			else:
+				self._children.setdefault(
+					node.inviter.discord_id,
+					[]
+				).append(node)
+		assert self._root
+
+		# Visiting nodes in reverse breadth-first order lays out each subtree
+		#   after all of its descendants
+		order = [self._root]
+		for node in order:
+			order.extend(self._children.get(node.discord_id, ()))
+		for node in reversed(order):
+			self._layout_subtree(node.discord_id)
+
+
+	def _layout_subtree(self, user_id: int) -> None:
+		"""
+		Places a node's children and finds the contours of the node's subtree.
+		The subtrees of the node's children must already be laid out.
+		@param user_id The ID of the node's user.
+		"""
+		children = self._children.get(user_id)
+		if not children:
+			self._contours[user_id] = (None, None, 0)
+			return
+
+		# Contours of the children placed so far start at the depth of the
+		#   children, with the first child at x = 0
+		left, right, height = self._contours[children[0].discord_id]
+		forest_left: Tuple[float, Contour] = (0.0, left)
+		forest_right: Tuple[float, Contour] = (0.0, right)
+		forest_height = height
+		positions = [0.0]
+
+		for child in children[1:]:
+			left, right, height = self._contours[child.discord_id]
+
+			# Find the smallest shift that keeps the child's subtree at least
+			#   `SEPARATION` to the right of the placed subtrees at every depth
+			#   they share
+			shift = float("-inf")
+			forest_x = 0.0
+			child_x = 0.0
+			forest_cell: Contour = forest_right
+			child_cell: Contour = (0.0, left)
+			for _ in range(min(forest_height, height) + 1):
+				assert forest_cell and child_cell
+				forest_x += forest_cell[0]
+				child_x += child_cell[0]
+				shift = max(shift, forest_x - child_x)
+				forest_cell = forest_cell[1]
+				child_cell = child_cell[1]
+			shift += TreeLayout.SEPARATION
+			positions.append(shift)
+
+			# The child is now the rightmost subtree at its depths, and the
+			#   leftmost subtree at depths that no placed subtree reaches
+			if height >= forest_height:
+				forest_right = (shift, right)
+			else:
+				forest_right = TreeLayout._join(
+					(shift, right),
+					height,
+					forest_right,
+					0.0
+				)
+			if height > forest_height:
+				forest_left = TreeLayout._join(
+					forest_left,
+					forest_height,
+					(0.0, left),
+					shift
+				)
+				forest_height = height
+
+		middle = (positions[0] + positions[-1]) / 2
+		for child, position in zip(children, positions):
+			self._offsets[child.discord_id] = position - middle
+		self._contours[user_id] = (
+			(forest_left[0] - middle, forest_left[1]),
+			(forest_right[0] - middle, forest_right[1]),
+			forest_height + 1
+		)
+
+
+	def _on_node_added(self, tree: IFamilyTree, node: TreeNode) -> None:
+		"""
+		Adds the new node as the rightmost child of its inviter.
+		"""
+		if self._root is None:
+			return
+
+		assert node.inviter
+		self._children.setdefault(node.inviter.discord_id, []).append(node)
+		self._offsets[node.discord_id] = 0.0
+		self._contours[node.discord_id] = (None, None, 0)
+		self._invalidate(node.inviter)
+
+
+	def _on_node_removed(self, tree: IFamilyTree, node: TreeNode) -> None:
+		"""
+		Records the removed node so that it is removed on the next update.
+		"""
+		if self._root is not None:
+			self._removed.append(node)
+
+
+	def _apply_removals(self) -> None:
+		"""
+		Removes the nodes removed from the tree since the last update and moves
+		  their children to their new inviters.
+		"""
+		removed_ids = {node.discord_id for node in self._removed}
+		for node in self._removed:
+			# If the node's inviter was also removed, or the node was moved to
+			#   its inviter because its previous inviter was also removed, the
+			#   node is in a removed inviter's list, which is discarded when
+			#   that inviter is removed
+			assert node.inviter
+			siblings = self._children.get(node.inviter.discord_id, [])
+			if node.inviter.discord_id not in removed_ids and node in siblings:
+				siblings.remove(node)
+				if not siblings:
+					del self._children[node.inviter.discord_id]
+				self._invalidate(node.inviter)
+
+			for child in self._children.pop(node.discord_id, ()):
+				if child.discord_id not in removed_ids:
+					assert child.inviter
+					self._children.setdefault(
+						child.inviter.discord_id,
+						[]
+					).append(child)
+					self._invalidate(child.inviter)
+
+			del self._offsets[node.discord_id]
+			del self._contours[node.discord_id]
+			self._dirty.pop(node.discord_id, None)
+		self._removed.clear()
+
+
+	def _invalidate(self, node: TreeNode) -> None:
+		"""
+		Marks the subtrees of a node and its ancestors as changed.
+		@param node The node whose subtree changed.
+		"""
+		path: List[TreeNode] = []
+		current: Optional[TreeNode] = node
+		depth = 0
+		while current is not None:
+			depth = self._dirty.get(current.discord_id, -1)
+			if depth >= 0:
+				break
+			path.append(current)
+			current = current.inviter
+
+		# The depth of the first node that was already marked is known, so the
+		#   depths of the new nodes are counted down from it
+		if current is None:
+			depth = -1
+		for path_node in reversed(path):
+			depth += 1
+			self._dirty[path_node.discord_id] = depth
+
+
+	@staticmethod
+	def _join(
+		upper: Tuple[float, Contour],
+		upper_height: int,
+		lower: Tuple[float, Contour],
+		lower_shift: float) -> Tuple[float, Contour]:
+		"""
+		Creates a contour that follows one contour down to its last depth and
+		  then continues along a deeper contour.
+		Only the cells of the upper contour are copied, so this takes time
+		  proportional to the height of the upper contour.
+		@param upper The contour to follow first.
+		@param upper_height The number of depths in the upper contour minus one.
+		@param lower The contour to follow after the upper contour ends. Must
+		  be deeper than the upper contour.
+		@param lower_shift Amount added to every x coordinate of the lower
+		  contour.
+		@returns The joined contour.
+		"""
+		deltas: List[float] = []
+		upper_x = 0.0
+		lower_x = lower_shift
+		upper_cell: Contour = upper
+		lower_cell: Contour = lower
+		for _ in range(upper_height + 1):
+			assert upper_cell and lower_cell
+			deltas.append(upper_cell[0])
+			upper_x += upper_cell[0]
+			lower_x += lower_cell[0]
+			upper_cell = upper_cell[1]
+			lower_cell = lower_cell[1]
+
+		assert lower_cell
+		joined: Tuple[float, Contour] = (
+			lower_x + lower_cell[0] - upper_x,
+			lower_cell[1]
+		)
+		for delta in reversed(deltas):
+			joined = (delta, joined)
+		return joined
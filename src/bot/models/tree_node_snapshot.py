@@ -0,0 +1,159 @@
+from __future__ import annotations
+from bot.models.tree_node import TreeNode
+from bot.util.discord_statics import DiscordStatics
+from typing import Optional
+
+class TreeNodeSnapshot:
+	"""
+	Immutable copy of a tree node's data at a point in time.
+	Snapshots refer to their inviter by discord ID rather than by node so
+	  that a node's snapshot does not need to be recreated when its inviter's
+	  data changes.
+	"""
+	__slots__ = (
+		"_user_id",
+		"_username",
+		"_discriminator",
+		"_nickname",
+		"_background_color",
+		"_inviter_id",
+		"_join_index"
+	)
+
+	def __init__(self,
+		user_id: int,
+		username: str,
+		discriminator: int,
+		nickname: str,
+		background_color: str,
+		inviter_id: Optional[int],
+		join_index: int):
+		"""
+		Initializes a new instance of the class.
+		@param user_id The unique ID of the user's discord account.
+		@param username The username of the user's discord account.
+		@param discriminator The discriminator associated with the user's
+		  discord account.
+		@param nickname The nickname of the user in the server.
+		@param background_color The background color to use for the user's node
+		  in the generated diagram.
+		@param inviter_id The discord ID of the user that invited the user, or
+		  None for the root node.
+		@param join_index Position of the node in the order that nodes were
+		  added to the tree. Every node's inviter has a lower join index than
+		  the node itself.
+		"""
+		self._user_id = user_id
+		self._username = username
+		self._discriminator = discriminator
+		self._nickname = nickname
+		self._background_color = background_color
+		self._inviter_id = inviter_id
+		self._join_index = join_index
+
+
+	@staticmethod
+	def from_node(node: TreeNode, join_index: int) -> TreeNodeSnapshot:
+		"""
+		Copies the current data of a tree node.
+		@param node The node to copy.
+		@param join_index Position of the node in the order that nodes were
+		  added to the tree.
+		@returns The snapshot of the node.
+		"""
+		return TreeNodeSnapshot(
+			node.discord_id,
+			node.discord_username,
+			node.discord_discriminator,
+			node.user_nickname,
+			node.background_color,
+			node.inviter.discord_id if node.inviter else None,
+			join_index
+		)
+
+
+	def is_equivalent(self, other: TreeNodeSnapshot) -> bool:
+		"""
+		Checks whether two snapshots contain the same data.
+		Join indices are not compared since they depend on the tree that the
+		  snapshot was taken from.
+		@param other The snapshot to compare against.
+		@returns True if both snapshots contain the same user data and inviter.
+		"""
+		return self._user_id == other._user_id \
+			and self._username == other._username \
+			and self._discriminator == other._discriminator \
+			and self._nickname == other._nickname \
+			and self._background_color == other._background_color \
+			and self._inviter_id == other._inviter_id
+
+
+	@property
+	def discord_id(self) -> int:
+		"""
+		Gets the ID of the user's discord account.
+		"""
+		return self._user_id
+
+
+	@property
+	def discord_full_username(self) -> str:
+		"""
+		Gets the full username of the user's discord account.
+		This is the username and discriminator combined.
+		"""
+		return DiscordStatics.get_full_username(
+			self._username,
+			self._discriminator
+		)
+
+
+	@property
+	def discord_username(self) -> str:
+		"""
+		Gets the username of the user's discord account.
+		"""
+		return self._username
+
+
+	@property
+	def discord_discriminator(self) -> int:
+		"""
+		Gets the discriminator associated with the user's discord account.
+		"""
+		return self._discriminator
+
+
+	@property
+	def user_nickname(self) -> str:
+		"""
+		Gets the nickname of the user in the server.
+		"""
+		return self._nickname
+
+
+	@property
+	def background_color(self) -> str:
+		"""
+		Gets the background color to use for the user's node in the generated
+		diagram.
+		"""
+		return self._background_color
+
+
+	@property
+	def inviter_id(self) -> Optional[int]:
+		"""
+		Gets the discord ID of the user that invited the user to the server.
+		This is None for the root node.
+		"""
+		return self._inviter_id
+
+
+	@property
+	def join_index(self) -> int:
+		"""
+		Gets the position of the node in the order that nodes were added to
+		  the tree.
+		"""
+		return self._join_index
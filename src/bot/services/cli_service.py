@@ -1,5 +1,8 @@
 import argparse
 from bot.services.discord.cli_discord_events_service import CliDiscordEventsService
+from bot.services.metrics.metrics_service import IMetricsService
+from bot.services.profiling.profiling_service import IProfilingService
+from pathlib import Path
 from typing import Callable, Dict, List
 
 class CliArgs(argparse.Namespace):
@@ -9,6 +12,8 @@ class CliArgs(argparse.Namespace):
 	# The type of command to process.
 	# This may be one of the following:
 	#   - event
+	#   - stats
+	#   - profile
 	#   - command (to be implemented)
 	cmd_type: str
 
@@ -24,15 +29,28 @@ class CliService:
 	EXIT_CMD = "exit"
 
 	def __init__(self,
-		discord_service: CliDiscordEventsService):
+		discord_service: CliDiscordEventsService,
+		metrics_service: IMetricsService,
+		profiling_service: IProfilingService,
+		profile_dir: Path):
 		"""
 		Initializes the service.
 		@param discord_service The service to pass discord event commands to
 			for processing.
+		@param metrics_service The service to read metrics from for the stats
+			command.
+		@param profiling_service The service controlled by the profile command.
+		@param profile_dir The directory that profiling data is written to if
+			no directory is given to the profile command.
 		"""
 		self._discord_service = discord_service
+		self._metrics_service = metrics_service
+		self._profiling_service = profiling_service
+		self._profile_dir = profile_dir
 		self._cmd_handlers: Dict[str, Callable[[CliArgs], None]] = {
 			"event": self._process_discord_event,
+			"stats": self._process_stats_command,
+			"profile": self._process_profile_command,
 			CliService.EXIT_CMD: self._process_exit_command
 		}
 		self._parser = self._make_parser(list(self._cmd_handlers.keys()))
@@ -65,6 +83,47 @@ class CliService:
 		self._discord_service.process_cmd(args.args)
 
 
+	def _process_stats_command(self, args: CliArgs) -> None:
+		"""
+		Processes the stats command.
+		Prints a summary of all metrics recorded so far. If the `prometheus`
+		  argument is given, metrics are printed in the Prometheus text
+		  exposition format instead.
+		@param args The command line arguments to process.
+		"""
+		if args.args and args.args[0] == "prometheus":
+			print(self._metrics_service.render_prometheus(), end="")
+		else:
+			print(self._metrics_service.render_summary(), end="")
+
+
+	def _process_profile_command(self, args: CliArgs) -> None:
+		"""
+		Processes the profile command.
+		The first argument must be one of the following:
+		  - start: Starts profiling event handling.
+		  - stop: Stops profiling event handling.
+		  - dump: Writes collected profiling data to disk. May be followed by
+		    the directory to write to.
+		@param args The command line arguments to process.
+		"""
+		action = args.args[0] if args.args else ""
+		try:
+			if action == "start":
+				self._profiling_service.start()
+			elif action == "stop":
+				self._profiling_service.stop()
+			elif action == "dump":
+				directory = Path(args.args[1]) if len(args.args) > 1 \
+					else self._profile_dir
+				for path in self._profiling_service.dump(directory):
+					print(path)
+			else:
+				print("Usage: profile start|stop|dump [directory]")
+		except RuntimeError as e:
+			print(e)
+
+
 	def _process_exit_command(self, args: CliArgs) -> None:
 		"""
 		Processes the exit command.
@@ -1,15 +1,124 @@
+import aiohttp
+import asyncio
 from bot.bot_events.discord_events import DiscordEvents
+from bot.models.local_user import LocalUser
+from bot.models.user import IUser
 from bot.services.discord.discord_events_service import IDiscordEventsService
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class GatewayOpcode:
+	"""
+	Defines the gateway opcodes used by the service.
+	See https://discord.com/developers/docs/topics/opcodes-and-status-codes.
+	"""
+	# Sent by the gateway for each event.
+	DISPATCH = 0
+
+	# Sent by the client periodically to keep the connection alive. May also
+	#   be sent by the gateway to request an immediate heartbeat.
+	HEARTBEAT = 1
+
+	# Sent by the client to start a new session.
+	IDENTIFY = 2
+
+	# Sent by the gateway when the client should reconnect.
+	RECONNECT = 7
+
+	# Sent by the client to request the members of a server.
+	REQUEST_GUILD_MEMBERS = 8
+
+	# Sent by the gateway when the session is no longer valid.
+	INVALID_SESSION = 9
+
+	# Sent by the gateway immediately after connecting.
+	HELLO = 10
+
+	# Sent by the gateway in response to each heartbeat.
+	HEARTBEAT_ACK = 11
+
+
+class GatewayIntents:
+	"""
+	Defines the gateway intents required by the service.
+	"""
+	# Required for GUILD_CREATE and GUILD_DELETE events.
+	GUILDS = 1 << 0
+
+	# Required for GUILD_MEMBER_* events. Privileged intent.
+	GUILD_MEMBERS = 1 << 1
+
+	# Required for INVITE_CREATE events.
+	GUILD_INVITES = 1 << 6
+
+	# All intents required by the service.
+	REQUIRED = GUILDS | GUILD_MEMBERS | GUILD_INVITES
+
 
 class ApiDiscordEventsService(IDiscordEventsService):
 	"""
 	Service that emits events in response to Discord API events.
+	Events are received from Discord's gateway. Only the subset of the gateway
+	  protocol required by the bot is implemented: resuming sessions and
+	  reconnecting are not supported, so `run()` returns as soon as the
+	  connection is lost.
+	Dispatches are handled one at a time on a separate thread so that
+	  handlers that block (e.g. while waiting for space in a full event
+	  queue) do not stop the event loop from sending heartbeats. No messages
+	  are read while a dispatch is being handled, so a slow handler slows
+	  the gateway down instead of dropping the session.
 	"""
-	def __init__(self):
+	# URL of Discord's gateway.
+	DEFAULT_GATEWAY_URL = "wss://gateway.discord.gg/?v=10&encoding=json"
+
+	def __init__(self,
+		gateway_url: str = DEFAULT_GATEWAY_URL,
+		token: str = ""):
 		"""
 		Initializes the service.
+		@param gateway_url The URL of the gateway to connect to.
+		@param token The bot token used to identify with the gateway.
 		"""
 		self._events = DiscordEvents()
+		self._gateway_url = gateway_url
+		self._token = token
+
+		# Sequence number of the most recently received dispatch, sent with
+		#   each heartbeat.
+		self._sequence: Optional[int] = None
+
+		# IDs of servers that were listed as unavailable in the READY event.
+		# Discord sends a GUILD_CREATE event for each of these servers once
+		#   they become available. The bot may have joined the server while
+		#   it was offline, so the server is announced as added and its
+		#   members are then listed so that the server's tree is brought up to
+		#   date.
+		self._pending_servers: Set[int] = set()
+
+		# IDs of servers whose members should be requested from the gateway.
+		# Requests are sent by `_run()` since dispatches are processed
+		#   synchronously.
+		self._member_requests: List[int] = []
+
+		# Members received so far for each server whose members were requested.
+		self._member_chunks: Dict[int, List[IUser]] = {}
+
+		# Maps dispatch event types to the functions that process them.
+		self._dispatch_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {
+			"READY": self._on_ready,
+			"GUILD_CREATE": self._on_guild_create,
+			"GUILD_DELETE": self._on_guild_delete,
+			"INVITE_CREATE": self._on_invite_create,
+			"GUILD_MEMBER_ADD": self._on_guild_member_add,
+			"GUILD_MEMBER_REMOVE": self._on_guild_member_remove,
+			"GUILD_MEMBER_UPDATE": self._on_guild_member_update,
+			"GUILD_MEMBERS_CHUNK": self._on_guild_members_chunk
+		}
 
 
 	@property
@@ -18,3 +127,341 @@ class ApiDiscordEventsService(IDiscordEventsService):
 		Events that can be triggered by Discord's API.
 		"""
 		return self._events
+
+
+	def run(self) -> None:
+		"""
+		Connects to the gateway and emits events until the connection closes.
+		"""
+		asyncio.run(self._run())
+
+
+	def dispatch(self, event_type: str, data: Dict[str, Any]) -> None:
+		"""
+		Decodes the payload of a dispatch and emits the matching event.
+		Dispatches that the bot does not use are ignored. Exceptions raised by
+		  event handlers are logged and do not stop the service.
+		@param event_type The type of the dispatch, e.g. `GUILD_CREATE`.
+		@param data The data of the dispatch.
+		"""
+		handler = self._dispatch_handlers.get(event_type)
+		if not handler:
+			return
+
+		try:
+			handler(data)
+		except Exception:
+			logger.exception(f"Failed to handle {event_type} dispatch.")
+
+
+	async def _run(self) -> None:
+		"""
+		Connects to the gateway and processes messages until the connection
+		  closes.
+		"""
+		heartbeat_task: Optional[asyncio.Task[None]] = None
+		loop = asyncio.get_running_loop()
+		executor = ThreadPoolExecutor(
+			max_workers=1,
+			thread_name_prefix="gateway-dispatch"
+		)
+		async with aiohttp.ClientSession() as session:
+			async with session.ws_connect(
+				self._gateway_url,
+				max_msg_size=0) as ws:
+				logger.info(f"Connected to gateway at '{self._gateway_url}'.")
+				try:
+					async for message in ws:
+						if message.type != aiohttp.WSMsgType.TEXT:
+							continue
+
+						payload = json.loads(message.data)
+						op = payload["op"]
+						if op == GatewayOpcode.DISPATCH:
+							# Dispatches are numbered in the order they were sent,
+							#   so any dispatch that is not newer than the last one
+							#   has already been processed
+							sequence = payload["s"]
+							if self._sequence is not None and sequence is not None \
+								and sequence <= self._sequence:
+								logger.debug(f"Dropped repeated dispatch {sequence}.")
+								continue
+							self._sequence = sequence
+							await loop.run_in_executor(
+								executor,
+								self.dispatch,
+								payload["t"],
+								payload["d"]
+							)
+							await self._send_member_requests(ws)
+						elif op == GatewayOpcode.HEARTBEAT:
+							await self._send_heartbeat(ws)
+						elif op == GatewayOpcode.HELLO:
+							interval = payload["d"]["heartbeat_interval"] / 1000
+							heartbeat_task = asyncio.create_task(
+								self._heartbeat(ws, interval)
+							)
+							await self._identify(ws)
+						elif op in (
+							GatewayOpcode.RECONNECT,
+							GatewayOpcode.INVALID_SESSION):
+							logger.warning(
+								f"Gateway requested a reconnect (op {op}), which "
+								"is not supported."
+							)
+							break
+				finally:
+					if heartbeat_task:
+						heartbeat_task.cancel()
+					executor.shutdown()
+				logger.info(f"Disconnected from gateway (code {ws.close_code}).")
+
+
+	async def _identify(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+		"""
+		Sends the IDENTIFY payload to start a new session.
+		@param ws The gateway connection.
+		"""
+		# Sequence numbers start over for each session
+		self._sequence = None
+		await ws.send_str(json.dumps({
+			"op": GatewayOpcode.IDENTIFY,
+			"d": {
+				"token": self._token,
+				"intents": GatewayIntents.REQUIRED,
+				"properties": {
+					"os": "linux",
+					"browser": "family-tree-bot",
+					"device": "family-tree-bot"
+				}
+			}
+		}))
+
+
+	async def _heartbeat(self,
+		ws: aiohttp.ClientWebSocketResponse,
+		interval: float) -> None:
+		"""
+		Sends heartbeats until cancelled.
+		@param ws The gateway connection.
+		@param interval The number of seconds between heartbeats.
+		"""
+		while not ws.closed:
+			await asyncio.sleep(interval)
+			await self._send_heartbeat(ws)
+
+
+	async def _send_heartbeat(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+		"""
+		Sends a single heartbeat.
+		@param ws The gateway connection.
+		"""
+		await ws.send_str(json.dumps({
+			"op": GatewayOpcode.HEARTBEAT,
+			"d": self._sequence
+		}))
+
+
+	async def _send_member_requests(self,
+		ws: aiohttp.ClientWebSocketResponse) -> None:
+		"""
+		Requests the full member list of each server queued by a dispatch.
+		@param ws The gateway connection.
+		"""
+		while self._member_requests:
+			server_id = self._member_requests.pop(0)
+			await ws.send_str(json.dumps({
+				"op": GatewayOpcode.REQUEST_GUILD_MEMBERS,
+				"d": {
+					"guild_id": str(server_id),
+					"query": "",
+					"limit": 0
+				}
+			}))
+
+
+	def _on_ready(self, data: Dict[str, Any]) -> None:
+		"""
+		Processes the READY dispatch.
+		@param data The data of the dispatch.
+		"""
+		self._pending_servers = {int(guild["id"]) for guild in data["guilds"]}
+		logger.info(
+			f"Gateway session is ready with {len(self._pending_servers)} "
+			"servers."
+		)
+
+
+	def _on_guild_create(self, data: Dict[str, Any]) -> None:
+		"""
+		Processes the GUILD_CREATE dispatch.
+		@param data The data of the dispatch.
+		"""
+		server_id = int(data["id"])
+		owner_id = int(data["owner_id"])
+		owner = next(
+			(m for m in data.get("members", []) if int(m["user"]["id"]) == owner_id),
+			None
+		)
+		if owner:
+			user = owner["user"]
+			username = user["username"]
+			discriminator = int(user["discriminator"])
+			nickname = ApiDiscordEventsService._get_display_name(owner)
+		else:
+			# Large servers only include a subset of members in the dispatch
+			logger.warning(
+				f"Owner of server {server_id} is missing from GUILD_CREATE."
+			)
+			username = str(owner_id)
+			discriminator = 0
+			nickname = username
+
+		# Servers listed in the READY event are announced too since the bot
+		#   may have been added to them while it was offline. Handlers must
+		#   ignore servers that they already know about.
+		self._events.on_server_added(
+			server_id,
+			owner_id,
+			username,
+			discriminator,
+			nickname
+		)
+
+		if server_id in self._pending_servers:
+			# The server's tree may be out of date if events were missed while
+			#   the bot was offline. Large servers only include a subset of
+			#   members in the dispatch, so the rest must be requested.
+			self._pending_servers.discard(server_id)
+			members = data.get("members", [])
+			if len(members) >= data.get("member_count", 0):
+				self._events.on_server_members_listed(
+					server_id,
+					[ApiDiscordEventsService._make_user(m) for m in members]
+				)
+			else:
+				self._member_chunks[server_id] = []
+				self._member_requests.append(server_id)
+
+
+	def _on_guild_delete(self, data: Dict[str, Any]) -> None:
+		"""
+		Processes the GUILD_DELETE dispatch.
+		@param data The data of the dispatch.
+		"""
+		# Servers that are unavailable due to an outage have not removed the bot
+		if data.get("unavailable"):
+			return
+
+		self._events.on_server_removed(int(data["id"]))
+
+
+	def _on_invite_create(self, data: Dict[str, Any]) -> None:
+		"""
+		Processes the INVITE_CREATE dispatch.
+		@param data The data of the dispatch.
+		"""
+		# Invites created through server settings (e.g. vanity URLs) do not
+		#   have an inviter
+		inviter = data.get("inviter")
+		if not inviter:
+			return
+
+		create_time = datetime.fromisoformat(data["created_at"])
+		max_age = data.get("max_age", 0)
+		expire_time = create_time + timedelta(seconds=max_age) if max_age \
+			else datetime.max.replace(tzinfo=create_time.tzinfo)
+		self._events.on_invite_created(
+			int(data["guild_id"]),
+			int(inviter["id"]),
+			data["code"],
+			create_time,
+			expire_time
+		)
+
+
+	def _on_guild_member_add(self, data: Dict[str, Any]) -> None:
+		"""
+		Processes the GUILD_MEMBER_ADD dispatch.
+		@param data The data of the dispatch.
+		"""
+		user = data["user"]
+		self._events.on_user_joined(
+			int(data["guild_id"]),
+			int(user["id"]),
+			user["username"],
+			int(user["discriminator"])
+		)
+
+
+	def _on_guild_member_remove(self, data: Dict[str, Any]) -> None:
+		"""
+		Processes the GUILD_MEMBER_REMOVE dispatch.
+		@param data The data of the dispatch.
+		"""
+		self._events.on_user_left(
+			int(data["guild_id"]),
+			int(data["user"]["id"])
+		)
+
+
+	def _on_guild_member_update(self, data: Dict[str, Any]) -> None:
+		"""
+		Processes the GUILD_MEMBER_UPDATE dispatch.
+		Discord does not say which member fields changed, so the nickname
+		  changed event is emitted for every update.
+		@param data The data of the dispatch.
+		"""
+		self._events.on_user_nickname_changed(
+			int(data["guild_id"]),
+			int(data["user"]["id"]),
+			ApiDiscordEventsService._get_display_name(data)
+		)
+
+
+	def _on_guild_members_chunk(self, data: Dict[str, Any]) -> None:
+		"""
+		Processes the GUILD_MEMBERS_CHUNK dispatch.
+		Once the last chunk for a server has been received, the server's full
+		  member list is emitted.
+		@param data The data of the dispatch.
+		"""
+		server_id = int(data["guild_id"])
+		users = self._member_chunks.get(server_id)
+		if users is None:
+			return
+
+		users.extend(
+			ApiDiscordEventsService._make_user(m) for m in data["members"]
+		)
+		if data["chunk_index"] + 1 >= data["chunk_count"]:
+			del self._member_chunks[server_id]
+			self._events.on_server_members_listed(server_id, users)
+
+
+	@staticmethod
+	def _make_user(member: Dict[str, Any]) -> IUser:
+		"""
+		Converts a member object to a user.
+		@param member The member object to convert.
+		@returns The user for the member.
+		"""
+		user = member["user"]
+		return LocalUser(
+			int(user["id"]),
+			user["username"],
+			int(user["discriminator"]),
+			ApiDiscordEventsService._get_display_name(member)
+		)
+
+
+	@staticmethod
+	def _get_display_name(member: Dict[str, Any]) -> str:
+		"""
+		Gets the name that a server member is displayed with.
+		@param member The member object to get the name of.
+		@returns The member's server nickname if set, otherwise the member's
+		  global display name if set, otherwise the member's username.
+		"""
+		user = member["user"]
+		return member.get("nick") or user.get("global_name") or user["username"]
@@ -0,0 +1,338 @@
+from bot.bot_events.discord_events import DiscordEvents
+from bot.models.user import IUser
+from bot.services.discord.discord_events_service import IDiscordEventsService
+from bot.services.metrics.metrics_service import IMetricsService
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class CoalescingDiscordEventsService(IDiscordEventsService):
+	"""
+	Discord events service that combines nickname changes into batches.
+	Events are received from another Discord events service and re-emitted,
+	  except for `on_user_nickname_changed`. Nickname changes are held for up
+	  to `window` seconds after the first pending change of each server, and
+	  only the latest nickname of each user is kept. Once the window ends, the
+	  server's pending changes are emitted as a single
+	  `on_user_nicknames_changed` event so that users who change their
+	  nickname many times a minute cost one tree update and save per window.
+	Pending changes are emitted early if a server has `max_pending` users
+	  with pending changes. Pending changes are discarded when the user leaves
+	  the server, when the bot is removed from the server, and when the
+	  server's member list is received, since the list is newer than any
+	  pending change.
+	Batches are emitted from a background thread. Re-emitted events and
+	  batches are emitted while holding the same lock, so handlers never run
+	  concurrently with each other. Exceptions raised by handlers of batches
+	  are logged and do not stop the service.
+	"""
+	# Default number of seconds that nickname changes are held for.
+	DEFAULT_WINDOW = 5.0
+
+	# Default maximum number of users per server with pending changes.
+	DEFAULT_MAX_PENDING = 1024
+
+	# Counter incremented each time a pending nickname change is replaced by
+	#   a newer change for the same user.
+	COALESCED_METRIC = "bot_nickname_changes_coalesced_total"
+
+	# Histogram of the number of users in each emitted batch.
+	BATCH_SIZE_METRIC = "bot_nickname_batch_size"
+
+	def __init__(self,
+		source: IDiscordEventsService,
+		metrics_service: IMetricsService,
+		window: float = DEFAULT_WINDOW,
+		max_pending: int = DEFAULT_MAX_PENDING):
+		"""
+		Initializes a new instance of the class.
+		`start()` must be called for batches to be emitted once their window
+		  ends.
+		@param source The service to receive events from.
+		@param metrics_service The service to record batch metrics to.
+		@param window The number of seconds that nickname changes are held for.
+		@param max_pending The maximum number of users per server with pending
+		  changes.
+		"""
+		self._events = DiscordEvents()
+		self._metrics_service = metrics_service
+		self._window = window
+		self._max_pending = max_pending
+
+		# Held while emitting events. Must be acquired before the condition if
+		#   both are held.
+		self._emit_lock = threading.RLock()
+
+		# Guards all of the fields below. Notified whenever a server's first
+		#   pending change is received or the service is stopped.
+		self._condition = threading.Condition()
+
+		# Latest pending nickname of each user, indexed by server ID and then
+		#   by user ID.
+		self._pending: Dict[int, Dict[int, str]] = {}
+
+		# Time at which each server's pending changes are emitted, ordered from
+		#   earliest to latest. Every server has the same window, so servers
+		#   are ordered by when their first pending change was received.
+		self._deadlines: OrderedDict[int, float] = OrderedDict()
+
+		# Whether `stop()` has been called.
+		self._stopping = False
+
+		# Thread that emits batches. Created by `start()`.
+		self._thread: Optional[threading.Thread] = None
+
+		source.events.on_server_added += self._on_server_added # type: ignore
+		source.events.on_server_removed += self._on_server_removed # type: ignore
+		source.events.on_invite_created += self._on_invite_created # type: ignore
+		source.events.on_user_joined += self._on_user_joined # type: ignore
+		source.events.on_user_left += self._on_user_left # type: ignore
+		source.events.on_user_nickname_changed += \
+			self._on_user_nickname_changed # type: ignore
+		source.events.on_user_nicknames_changed += \
+			self._on_user_nicknames_changed # type: ignore
+		source.events.on_server_members_listed += \
+			self._on_server_members_listed # type: ignore
+
+
+	@property
+	def events(self) -> DiscordEvents:
+		"""
+		Events that can be triggered by Discord's API. Nickname changes are
+		  emitted as `on_user_nicknames_changed` events.
+		"""
+		return self._events
+
+
+	@property
+	def pending_count(self) -> int:
+		"""
+		Gets the number of users with pending changes across all servers.
+		"""
+		with self._condition:
+			return sum(len(pending) for pending in self._pending.values())
+
+
+	def start(self) -> None:
+		"""
+		Starts the thread that emits batches.
+		"""
+		self._thread = threading.Thread(
+			target=self._run,
+			name="nickname-coalescer",
+			daemon=True
+		)
+		self._thread.start()
+
+
+	def stop(self) -> None:
+		"""
+		Emits all pending changes and then stops the background thread.
+		Blocks until the thread has stopped.
+		"""
+		with self._condition:
+			self._stopping = True
+			self._condition.notify_all()
+		if self._thread:
+			self._thread.join()
+		else:
+			self._flush_all()
+
+
+	def _on_server_added(self,
+		server_id: int,
+		owner_id: int,
+		owner_username: str,
+		owner_discriminator: int,
+		owner_nickname: str) -> None:
+		"""
+		Re-emits `on_server_added`.
+		"""
+		with self._emit_lock:
+			self._events.on_server_added(
+				server_id,
+				owner_id,
+				owner_username,
+				owner_discriminator,
+				owner_nickname
+			)
+
+
+	def _on_server_removed(self, server_id: int) -> None:
+		"""
+		Discards the server's pending changes and re-emits `on_server_removed`.
+		"""
+		with self._emit_lock:
+			with self._condition:
+				self._take_pending(server_id)
+			self._events.on_server_removed(server_id)
+
+
+	def _on_invite_created(self,
+		server_id: int,
+		inviter_id: int,
+		invite_code: str,
+		create_time: datetime,
+		expire_time: datetime) -> None:
+		"""
+		Re-emits `on_invite_created`.
+		"""
+		with self._emit_lock:
+			self._events.on_invite_created(
+				server_id,
+				inviter_id,
+				invite_code,
+				create_time,
+				expire_time
+			)
+
+
+	def _on_user_joined(self,
+		server_id: int,
+		user_id: int,
+		username: str,
+		discriminator: int) -> None:
+		"""
+		Re-emits `on_user_joined`.
+		"""
+		with self._emit_lock:
+			self._events.on_user_joined(
+				server_id,
+				user_id,
+				username,
+				discriminator
+			)
+
+
+	def _on_user_left(self, server_id: int, user_id: int) -> None:
+		"""
+		Discards the user's pending change and re-emits `on_user_left`.
+		"""
+		with self._emit_lock:
+			with self._condition:
+				pending = self._pending.get(server_id)
+				if pending is not None:
+					pending.pop(user_id, None)
+			self._events.on_user_left(server_id, user_id)
+
+
+	def _on_user_nickname_changed(self,
+		server_id: int,
+		user_id: int,
+		new_nickname: str) -> None:
+		"""
+		Records a nickname change, replacing the user's pending change.
+		"""
+		with self._condition:
+			pending = self._pending.get(server_id)
+			if pending is None:
+				pending = {}
+				self._pending[server_id] = pending
+				self._deadlines[server_id] = time.monotonic() + self._window
+				self._condition.notify_all()
+			elif user_id in pending:
+				self._metrics_service.increment(
+					CoalescingDiscordEventsService.COALESCED_METRIC,
+					{}
+				)
+			pending[user_id] = new_nickname
+			full = len(pending) >= self._max_pending
+
+		if full:
+			self._flush(server_id)
+
+
+	def _on_user_nicknames_changed(self,
+		server_id: int,
+		nicknames: Dict[int, str]) -> None:
+		"""
+		Records several nickname changes, replacing the users' pending changes.
+		"""
+		for user_id, nickname in nicknames.items():
+			self._on_user_nickname_changed(server_id, user_id, nickname)
+
+
+	def _on_server_members_listed(self,
+		server_id: int,
+		users: List[IUser]) -> None:
+		"""
+		Discards the server's pending changes and re-emits
+		  `on_server_members_listed`.
+		"""
+		with self._emit_lock:
+			with self._condition:
+				self._take_pending(server_id)
+			self._events.on_server_members_listed(server_id, users)
+
+
+	def _run(self) -> None:
+		"""
+		Emits batches as their windows end until the service is stopped.
+		"""
+		while True:
+			with self._condition:
+				while not self._stopping:
+					if self._deadlines:
+						server_id, deadline = next(iter(self._deadlines.items()))
+						timeout = deadline - time.monotonic()
+						if timeout <= 0:
+							break
+						self._condition.wait(timeout)
+					else:
+						self._condition.wait()
+				if self._stopping:
+					break
+
+			self._flush(server_id)
+
+		self._flush_all()
+
+
+	def _flush(self, server_id: int) -> None:
+		"""
+		Emits a server's pending changes, if it has any.
+		@param server_id The ID of the server.
+		"""
+		with self._emit_lock:
+			with self._condition:
+				nicknames = self._take_pending(server_id)
+			if not nicknames:
+				return
+
+			self._metrics_service.observe(
+				CoalescingDiscordEventsService.BATCH_SIZE_METRIC,
+				{},
+				len(nicknames)
+			)
+			try:
+				self._events.on_user_nicknames_changed(server_id, nicknames)
+			except Exception:
+				logger.exception(
+					f"Failed to handle nickname changes for server {server_id}."
+				)
+
+
+	def _flush_all(self) -> None:
+		"""
+		Emits the pending changes of every server.
+		"""
+		with self._condition:
+			server_ids = list(self._deadlines)
+		for server_id in server_ids:
+			self._flush(server_id)
+
+
+	def _take_pending(self, server_id: int) -> Dict[int, str]:
+		"""
+		Removes a server's pending changes. Must be called while holding the
+		  condition.
+		@param server_id The ID of the server.
+		@returns The latest pending nickname of each user, indexed by user ID.
+		"""
+		self._deadlines.pop(server_id, None)
+		return self._pending.pop(server_id, {})
@@ -0,0 +1,274 @@
+from bot.bot_events.discord_events import DiscordEvents
+from bot.models.user import IUser
+from bot.services.discord.discord_events_service import IDiscordEventsService
+from bot.services.metrics.metrics_service import IMetricsService
+from collections import OrderedDict
+from datetime import datetime
+import logging
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Last known state of a member: whether the member is in the server and the
+#   member's nickname, if known.
+MemberState = Tuple[bool, Optional[str]]
+
+class DedupDiscordEventsService(IDiscordEventsService):
+	"""
+	Discord events service that drops events that would not change anything.
+	Events are received from another Discord events service and re-emitted
+	  unless they repeat the last event seen for the same server or member,
+	  e.g. a user joining a server that the user was last seen joining. Such
+	  events are sent again by Discord after gateway resumes and by retries,
+	  and would otherwise make the family tree raise errors for each replay.
+	The last state of each member is remembered for the most recent
+	  `window_size` members of each of the `server_window` servers whose
+	  members were most recently updated, so each event is checked in O(1)
+	  time and at most `server_window * window_size` members are remembered.
+	  Members that are not remembered are always re-emitted, and a server's
+	  members are forgotten once the bot is removed from it. State is only
+	  updated once all handlers of an event have returned without raising,
+	  so events whose handling failed may be retried. Since only the last
+	  state is known, replays that arrive after a later event for the same
+	  member (e.g. a join replayed after the member left) are not detected.
+	"""
+	# Default number of members per server whose state is remembered.
+	DEFAULT_WINDOW_SIZE = 1 << 16
+
+	# Default number of servers whose members' state is remembered. Kept
+	#   small since each server may remember `window_size` members.
+	DEFAULT_SERVER_WINDOW = 16
+
+	# Counter incremented each time an event is dropped.
+	DROPPED_METRIC = "bot_events_deduplicated_total"
+
+	def __init__(self,
+		source: IDiscordEventsService,
+		metrics_service: IMetricsService,
+		window_size: int = DEFAULT_WINDOW_SIZE,
+		server_window: int = DEFAULT_SERVER_WINDOW):
+		"""
+		Initializes a new instance of the class.
+		@param source The service to receive events from.
+		@param metrics_service The service to record dropped events to.
+		@param window_size The number of members per server whose state is
+		  remembered, and the number of servers whose own state (whether the
+		  bot is in the server) is remembered.
+		@param server_window The number of servers whose members' state is
+		  remembered.
+		"""
+		self._events = DiscordEvents()
+		self._metrics_service = metrics_service
+		self._window_size = window_size
+		self._server_window = server_window
+
+		# Whether the bot was last seen being added to (True) or removed from
+		#   (False) each server, ordered from least to most recently updated.
+		self._servers: OrderedDict[int, bool] = OrderedDict()
+
+		# State of each server's members, indexed by server ID and then by
+		#   user ID. Servers and each server's members are ordered from least
+		#   to most recently updated.
+		self._members: OrderedDict[int, OrderedDict[int, MemberState]] = \
+			OrderedDict()
+
+		source.events.on_server_added += self._on_server_added # type: ignore
+		source.events.on_server_removed += self._on_server_removed # type: ignore
+		source.events.on_invite_created += self._on_invite_created # type: ignore
+		source.events.on_user_joined += self._on_user_joined # type: ignore
+		source.events.on_user_left += self._on_user_left # type: ignore
+		source.events.on_user_nickname_changed += \
+			self._on_user_nickname_changed # type: ignore
+		source.events.on_server_members_listed += \
+			self._on_server_members_listed # type: ignore
+
+
+	@property
+	def events(self) -> DiscordEvents:
+		"""
+		Events that can be triggered by Discord's API, excluding replays.
+		"""
+		return self._events
+
+
+	def _on_server_added(self,
+		server_id: int,
+		owner_id: int,
+		owner_username: str,
+		owner_discriminator: int,
+		owner_nickname: str) -> None:
+		"""
+		Re-emits `on_server_added` unless the bot was last added to the server.
+		"""
+		if self._servers.get(server_id) is True:
+			self._drop("on_server_added", server_id)
+			return
+
+		self._events.on_server_added(
+			server_id,
+			owner_id,
+			owner_username,
+			owner_discriminator,
+			owner_nickname
+		)
+		self._set_server(server_id, True)
+
+
+	def _on_server_removed(self, server_id: int) -> None:
+		"""
+		Re-emits `on_server_removed` unless the bot was last removed from the
+		  server.
+		"""
+		if self._servers.get(server_id) is False:
+			self._drop("on_server_removed", server_id)
+			return
+
+		self._events.on_server_removed(server_id)
+		self._set_server(server_id, False)
+		self._members.pop(server_id, None)
+
+
+	def _on_invite_created(self,
+		server_id: int,
+		inviter_id: int,
+		invite_code: str,
+		create_time: datetime,
+		expire_time: datetime) -> None:
+		"""
+		Re-emits `on_invite_created`. Recording an invite again has no effect,
+		  so invites are never dropped.
+		"""
+		self._events.on_invite_created(
+			server_id,
+			inviter_id,
+			invite_code,
+			create_time,
+			expire_time
+		)
+
+
+	def _on_user_joined(self,
+		server_id: int,
+		user_id: int,
+		username: str,
+		discriminator: int) -> None:
+		"""
+		Re-emits `on_user_joined` unless the user was last seen joining.
+		"""
+		state = self._get_member(server_id, user_id)
+		if state is not None and state[0]:
+			self._drop("on_user_joined", server_id)
+			return
+
+		self._events.on_user_joined(server_id, user_id, username, discriminator)
+
+		# New nodes use the username as the nickname
+		self._set_member(server_id, user_id, (True, username))
+
+
+	def _on_user_left(self, server_id: int, user_id: int) -> None:
+		"""
+		Re-emits `on_user_left` unless the user was last seen leaving.
+		"""
+		state = self._get_member(server_id, user_id)
+		if state is not None and not state[0]:
+			self._drop("on_user_left", server_id)
+			return
+
+		self._events.on_user_left(server_id, user_id)
+		self._set_member(server_id, user_id, (False, None))
+
+
+	def _on_user_nickname_changed(self,
+		server_id: int,
+		user_id: int,
+		new_nickname: str) -> None:
+		"""
+		Re-emits `on_user_nickname_changed` unless the user already has the
+		  nickname.
+		"""
+		if self._get_member(server_id, user_id) == (True, new_nickname):
+			self._drop("on_user_nickname_changed", server_id)
+			return
+
+		self._events.on_user_nickname_changed(server_id, user_id, new_nickname)
+		self._set_member(server_id, user_id, (True, new_nickname))
+
+
+	def _on_server_members_listed(self,
+		server_id: int,
+		users: List[IUser]) -> None:
+		"""
+		Re-emits `on_server_members_listed`.
+		Handlers bring the server's tree in sync with the member list, which
+		  may contradict the remembered state of the server's members, so the
+		  server's state is forgotten.
+		"""
+		self._events.on_server_members_listed(server_id, users)
+		self._members.pop(server_id, None)
+
+
+	def _get_member(self, server_id: int, user_id: int) -> Optional[MemberState]:
+		"""
+		Gets the last known state of a member.
+		@param server_id The ID of the server.
+		@param user_id The ID of the member's user.
+		@returns The state of the member, or None if it is not remembered.
+		"""
+		members = self._members.get(server_id)
+		return members.get(user_id) if members is not None else None
+
+
+	def _set_member(self,
+		server_id: int,
+		user_id: int,
+		state: MemberState) -> None:
+		"""
+		Remembers the state of a member, forgetting the least recently updated
+		  member of the server and the least recently updated server if either
+		  window is full. Does nothing if the bot was removed from the server,
+		  since the server's members were forgotten when it was removed.
+		@param server_id The ID of the server.
+		@param user_id The ID of the member's user.
+		@param state The new state of the member.
+		"""
+		if self._servers.get(server_id) is False:
+			return
+
+		members = self._members.get(server_id)
+		if members is None:
+			members = OrderedDict()
+			self._members[server_id] = members
+			if len(self._members) > self._server_window:
+				self._members.popitem(last=False)
+		self._members.move_to_end(server_id)
+		members[user_id] = state
+		members.move_to_end(user_id)
+		if len(members) > self._window_size:
+			members.popitem(last=False)
+
+
+	def _set_server(self, server_id: int, added: bool) -> None:
+		"""
+		Remembers whether the bot is in a server, forgetting the least recently
+		  updated server if the window is full.
+		@param server_id The ID of the server.
+		@param added Whether the bot was added to the server.
+		"""
+		self._servers[server_id] = added
+		self._servers.move_to_end(server_id)
+		if len(self._servers) > self._window_size:
+			self._servers.popitem(last=False)
+
+
+	def _drop(self, event_name: str, server_id: int) -> None:
+		"""
+		Records that an event was dropped.
+		@param event_name The name of the dropped event.
+		@param server_id The ID of the server the event was for.
+		"""
+		logger.debug(f"Dropped repeated {event_name} event for server {server_id}.")
+		self._metrics_service.increment(
+			DedupDiscordEventsService.DROPPED_METRIC,
+			{"event": event_name}
+		)
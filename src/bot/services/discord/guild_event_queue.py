@@ -0,0 +1,153 @@
+from bot.services.discord.queue_discord_events_service import EventMessage
+from collections import OrderedDict, deque
+from typing import Deque, Optional
+
+class CosmeticShedPolicy:
+	"""
+	Defines which cosmetic event is dropped when a guild's queue of cosmetic
+	  events is full.
+	"""
+	# The new event is dropped, so earlier changes are applied.
+	DROP_NEWEST = "drop_newest"
+
+	# The oldest queued event is dropped to make room for the new event.
+	DROP_OLDEST = "drop_oldest"
+
+	# All supported policies.
+	ALL = (DROP_NEWEST, DROP_OLDEST)
+
+
+class GuildEventQueue:
+	"""
+	Bounded queue of the events for a single guild.
+	Structural events (e.g. joins and leaves) change the shape of the guild's
+	  tree and are kept in order; callers must wait for space when the queue
+	  is full. Cosmetic events (nickname changes) are only kept for their most
+	  recent value per user, so a user that changes their nickname several
+	  times while the queue is busy costs a single update. Structural events
+	  are always taken before cosmetic events. Not thread safe.
+	"""
+	# Outcome of `put_cosmetic()` when the event was added to the queue.
+	QUEUED = "queued"
+
+	# Outcome of `put_cosmetic()` when the event replaced a queued event for
+	#   the same user.
+	COALESCED = "coalesced"
+
+	# Outcome of `put_cosmetic()` when the event was added and the oldest
+	#   queued cosmetic event was dropped.
+	SHED = "shed"
+
+	# Outcome of `put_cosmetic()` when the event was dropped since the queue
+	#   was full.
+	DROPPED = "dropped"
+
+	def __init__(self,
+		capacity: int,
+		cosmetic_capacity: int,
+		shed_policy: str):
+		"""
+		Initializes a new instance of the class.
+		@param capacity The maximum number of structural events.
+		@param cosmetic_capacity The maximum number of cosmetic events.
+		@param shed_policy The event dropped when the queue of cosmetic events
+		  is full. Must be one of `CosmeticShedPolicy.ALL`.
+		"""
+		self._capacity = capacity
+		self._cosmetic_capacity = cosmetic_capacity
+		self._shed_policy = shed_policy
+
+		# Structural events in the order they were received.
+		self._structural: Deque[EventMessage] = deque()
+
+		# Latest cosmetic event of each user, indexed by user ID and ordered by
+		#   when the user's first pending event was received.
+		self._cosmetic: OrderedDict[int, EventMessage] = OrderedDict()
+
+		# Whether the guild is waiting to have an event taken from its queue.
+		# Managed by the owner of the queue.
+		self.scheduled = False
+
+
+	def __len__(self) -> int:
+		"""
+		Gets the number of queued events.
+		"""
+		return len(self._structural) + len(self._cosmetic)
+
+
+	@property
+	def structural_count(self) -> int:
+		"""
+		Gets the number of queued structural events.
+		"""
+		return len(self._structural)
+
+
+	@property
+	def cosmetic_count(self) -> int:
+		"""
+		Gets the number of queued cosmetic events.
+		"""
+		return len(self._cosmetic)
+
+
+	@property
+	def is_full(self) -> bool:
+		"""
+		Whether no more structural events may be added.
+		"""
+		return len(self._structural) >= self._capacity
+
+
+	def put_structural(self, message: EventMessage) -> None:
+		"""
+		Adds a structural event to the queue.
+		The caller must check that the queue is not full.
+		@param message The event to add.
+		"""
+		self._structural.append(message)
+
+
+	def put_cosmetic(self, user_id: int, message: EventMessage) -> str:
+		"""
+		Adds a cosmetic event to the queue.
+		@param user_id The ID of the user the event is for.
+		@param message The event to add.
+		@returns The outcome of adding the event: `QUEUED`, `COALESCED`,
+		  `SHED`, or `DROPPED`.
+		"""
+		if user_id in self._cosmetic:
+			self._cosmetic[user_id] = message
+			return GuildEventQueue.COALESCED
+
+		outcome = GuildEventQueue.QUEUED
+		if len(self._cosmetic) >= self._cosmetic_capacity:
+			if self._shed_policy == CosmeticShedPolicy.DROP_NEWEST:
+				return GuildEventQueue.DROPPED
+			self._cosmetic.popitem(last=False)
+			outcome = GuildEventQueue.SHED
+		self._cosmetic[user_id] = message
+		return outcome
+
+
+	def discard_cosmetic(self, user_id: int) -> bool:
+		"""
+		Removes the queued cosmetic event of a user, e.g. because the user left.
+		@param user_id The ID of the user.
+		@returns True if an event was removed.
+		"""
+		return self._cosmetic.pop(user_id, None) is not None
+
+
+	def pop(self) -> Optional[EventMessage]:
+		"""
+		Takes the next event from the queue.
+		@returns The oldest structural event if there is one, otherwise the
+		  oldest cosmetic event, or None if the queue is empty.
+		"""
+		if self._structural:
+			return self._structural.popleft()
+		if self._cosmetic:
+			return self._cosmetic.popitem(last=False)[1]
+		return None
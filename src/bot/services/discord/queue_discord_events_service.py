@@ -0,0 +1,58 @@
+from bot.bot_events.discord_events import DiscordEvents
+from bot.services.discord.discord_events_service import IDiscordEventsService
+import logging
+from typing import Any, Optional, Protocol, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Message sent over the queue for each event: (event name, event arguments).
+EventMessage = Tuple[str, Tuple[Any, ...]]
+
+class EventQueue(Protocol):
+	"""
+	Queue that events are received from.
+	Satisfied by `queue.Queue` and `multiprocessing.Queue`.
+	"""
+	def get(self) -> Optional[EventMessage]: ...
+
+
+class QueueDiscordEventsService(IDiscordEventsService):
+	"""
+	Service that emits events received from a queue.
+	Used by shard worker processes to receive the events routed to them by the
+	  shard supervisor.
+	"""
+	def __init__(self, queue: EventQueue):
+		"""
+		Initializes the service.
+		@param queue The queue to receive events from. Each item must be an
+		  `EventMessage`. A `None` item stops the service.
+		"""
+		self._events = DiscordEvents()
+		self._queue = queue
+
+
+	@property
+	def events(self) -> DiscordEvents:
+		"""
+		Events that can be triggered by Discord's API.
+		"""
+		return self._events
+
+
+	def run(self) -> None:
+		"""
+		Emits events received from the queue until a `None` item is received.
+		Exceptions raised by event handlers are logged and do not stop the
+		  service.
+		"""
+		while True:
+			message = self._queue.get()
+			if message is None:
+				return
+
+			event_name, args = message
+			try:
+				getattr(self._events, event_name)(*args)
+			except Exception:
+				logger.exception(f"Failed to handle {event_name} event.")
@@ -0,0 +1,302 @@
+from bot.bot_events.discord_events import DiscordEvents
+from bot.services.discord.discord_events_service import IDiscordEventsService
+from bot.services.discord.guild_event_queue import CosmeticShedPolicy, GuildEventQueue
+from bot.services.discord.queue_discord_events_service import EventMessage
+from bot.services.metrics.metrics_service import IMetricsService
+from collections import deque
+import logging
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class QueuedDiscordEventsService(IDiscordEventsService):
+	"""
+	Discord events service that buffers events from another service in
+	  bounded per-guild queues and emits them from a background thread.
+	Buffering lets the source keep receiving events while a slow handler
+	  (e.g. one that saves a large tree) runs. Each guild has its own
+	  `GuildEventQueue`, and guilds with queued events take turns, so a busy
+	  guild cannot delay events for other guilds by more than one event at a
+	  time. Within a guild, structural events are emitted before nickname
+	  changes, which are coalesced per user and dropped according to the shed
+	  policy when the guild's queue of nickname changes is full.
+	If a guild's queue of structural events is full, the source is blocked
+	  until the background thread makes room, which slows the source down to
+	  the rate that events can be handled. Sources must therefore not emit
+	  events from an event loop that has other work to do (e.g. sending
+	  heartbeats); `ApiDiscordEventsService` emits events from its own
+	  thread for this reason. The time spent blocked is recorded as a
+	  metric, along with the number of queued events.
+	Events are emitted by a single thread, so handlers never run concurrently
+	  with each other. Exceptions raised by handlers are logged and do not
+	  stop the service.
+	"""
+	# Default maximum number of structural events queued per guild.
+	DEFAULT_CAPACITY = 1024
+
+	# Default maximum number of nickname changes queued per guild.
+	DEFAULT_COSMETIC_CAPACITY = 256
+
+	# Events that only change how the tree is displayed. All other events are
+	#   structural.
+	COSMETIC_EVENTS = ("on_user_nickname_changed",)
+
+	# Gauge of the number of events queued across all guilds.
+	DEPTH_METRIC = "bot_event_queue_depth"
+
+	# Counter incremented for each event received, labelled by what happened
+	#   to the event (e.g. queued or coalesced).
+	EVENTS_METRIC = "bot_event_queue_events_total"
+
+	# Histogram of the time the source was blocked by a full queue.
+	BLOCKED_METRIC = "bot_event_queue_blocked_seconds"
+
+	def __init__(self,
+		source: IDiscordEventsService,
+		metrics_service: IMetricsService,
+		capacity: int = DEFAULT_CAPACITY,
+		cosmetic_capacity: int = DEFAULT_COSMETIC_CAPACITY,
+		shed_policy: str = CosmeticShedPolicy.DROP_OLDEST):
+		"""
+		Initializes a new instance of the class.
+		`start()` must be called before the source emits any events.
+		@param source The service to receive events from.
+		@param metrics_service The service to record queue metrics to.
+		@param capacity The maximum number of structural events queued for
+		  each guild.
+		@param cosmetic_capacity The maximum number of nickname changes queued
+		  for each guild.
+		@param shed_policy The nickname change dropped when a guild's queue of
+		  nickname changes is full. Must be one of `CosmeticShedPolicy.ALL`.
+		"""
+		self._events = DiscordEvents()
+		self._metrics_service = metrics_service
+		self._capacity = capacity
+		self._cosmetic_capacity = cosmetic_capacity
+		self._shed_policy = shed_policy
+
+		# Guards all of the fields below. Notified whenever an event is queued
+		#   or taken from a queue.
+		self._condition = threading.Condition()
+
+		# Queue of each guild that has queued events, indexed by server ID.
+		self._queues: Dict[int, GuildEventQueue] = {}
+
+		# IDs of the guilds whose turn is next, in order.
+		self._ready: Deque[int] = deque()
+
+		# Number of structural and cosmetic events queued across all guilds.
+		self._structural_count = 0
+		self._cosmetic_count = 0
+
+		# Whether `stop()` has been called.
+		self._stopping = False
+
+		# Thread that emits queued events. Created by `start()`.
+		self._thread: Optional[threading.Thread] = None
+
+		for event_name in DiscordEvents.__events__:
+			slot = getattr(source.events, event_name)
+			slot += self._make_router(event_name)
+
+
+	@property
+	def events(self) -> DiscordEvents:
+		"""
+		Events that can be triggered by Discord's API.
+		Emitted from the service's background thread.
+		"""
+		return self._events
+
+
+	@property
+	def queued_count(self) -> int:
+		"""
+		Gets the number of events queued across all guilds.
+		"""
+		with self._condition:
+			return self._structural_count + self._cosmetic_count
+
+
+	def start(self) -> None:
+		"""
+		Starts the thread that emits queued events.
+		"""
+		self._thread = threading.Thread(
+			target=self._run,
+			name="event-queue",
+			daemon=True
+		)
+		self._thread.start()
+
+
+	def stop(self) -> None:
+		"""
+		Emits all queued events and then stops the background thread.
+		Blocks until the thread has stopped.
+		"""
+		with self._condition:
+			self._stopping = True
+			self._condition.notify_all()
+		if self._thread:
+			self._thread.join()
+
+
+	def _make_router(self, event_name: str) -> Callable[..., None]:
+		"""
+		Creates the handler that queues an event.
+		@param event_name The name of the event to queue.
+		@returns The handler for the event.
+		"""
+		cosmetic = event_name in QueuedDiscordEventsService.COSMETIC_EVENTS
+
+		def route(server_id: int, *args: Any) -> None:
+			message = (event_name, (server_id,) + args)
+			with self._condition:
+				queue = self._queues.get(server_id)
+				if queue is None:
+					queue = GuildEventQueue(
+						self._capacity,
+						self._cosmetic_capacity,
+						self._shed_policy
+					)
+					self._queues[server_id] = queue
+
+				if cosmetic:
+					outcome = self._put_cosmetic(queue, args[0], message)
+				else:
+					queue = self._put_structural(queue, server_id, message)
+					outcome = GuildEventQueue.QUEUED
+					if event_name == "on_user_left" \
+						and queue.discard_cosmetic(args[0]):
+						# The user's node will no longer exist
+						self._cosmetic_count -= 1
+						self._record_event(True, GuildEventQueue.DROPPED)
+
+				self._record_event(cosmetic, outcome)
+				if queue and not queue.scheduled:
+					queue.scheduled = True
+					self._ready.append(server_id)
+				self._record_depth()
+				self._condition.notify_all()
+
+		return route
+
+
+	def _put_structural(self,
+		queue: GuildEventQueue,
+		server_id: int,
+		message: EventMessage) -> GuildEventQueue:
+		"""
+		Adds a structural event to a guild's queue, waiting for space if the
+		  queue is full. Must be called while holding the condition.
+		@param queue The queue of the guild.
+		@param server_id The ID of the guild.
+		@param message The event to add.
+		@returns The queue the event was added to. This differs from the given
+		  queue if the given queue was emptied and removed while waiting.
+		"""
+		if queue.is_full and not self._stopping:
+			logger.debug(f"Event queue for server {server_id} is full.")
+			start = time.perf_counter()
+			while queue.is_full and not self._stopping:
+				self._condition.wait()
+			self._metrics_service.observe(
+				QueuedDiscordEventsService.BLOCKED_METRIC,
+				{},
+				time.perf_counter() - start
+			)
+			queue = self._queues.setdefault(server_id, queue)
+		queue.put_structural(message)
+		self._structural_count += 1
+		return queue
+
+
+	def _put_cosmetic(self,
+		queue: GuildEventQueue,
+		user_id: int,
+		message: EventMessage) -> str:
+		"""
+		Adds a cosmetic event to a guild's queue. Must be called while holding
+		  the condition.
+		@param queue The queue of the guild.
+		@param user_id The ID of the user the event is for.
+		@param message The event to add.
+		@returns The outcome of adding the event.
+		"""
+		outcome = queue.put_cosmetic(user_id, message)
+		if outcome == GuildEventQueue.QUEUED:
+			self._cosmetic_count += 1
+		return outcome
+
+
+	def _run(self) -> None:
+		"""
+		Emits queued events until the service is stopped and all queues are
+		  empty.
+		"""
+		while True:
+			with self._condition:
+				while not self._ready and not self._stopping:
+					self._condition.wait()
+				if not self._ready:
+					return
+
+				server_id = self._ready.popleft()
+				queue = self._queues[server_id]
+				structural = queue.structural_count > 0
+				message = queue.pop()
+				assert message
+				if structural:
+					self._structural_count -= 1
+				else:
+					self._cosmetic_count -= 1
+
+				# Guilds go to the back of the line after each event
+				if queue:
+					self._ready.append(server_id)
+				else:
+					queue.scheduled = False
+					del self._queues[server_id]
+				self._record_depth()
+				self._condition.notify_all()
+
+			event_name, args = message
+			try:
+				getattr(self._events, event_name)(*args)
+			except Exception:
+				logger.exception(f"Failed to handle {event_name} event.")
+
+
+	def _record_event(self, cosmetic: bool, outcome: str) -> None:
+		"""
+		Records what happened to a received event.
+		@param cosmetic Whether the event is cosmetic.
+		@param outcome What happened to the event.
+		"""
+		self._metrics_service.increment(
+			QueuedDiscordEventsService.EVENTS_METRIC,
+			{
+				"kind": "cosmetic" if cosmetic else "structural",
+				"outcome": outcome
+			}
+		)
+
+
+	def _record_depth(self) -> None:
+		"""
+		Records the number of queued events. Must be called while holding the
+		  condition.
+		"""
+		self._metrics_service.set_gauge(
+			QueuedDiscordEventsService.DEPTH_METRIC,
+			{"kind": "structural"},
+			self._structural_count
+		)
+		self._metrics_service.set_gauge(
+			QueuedDiscordEventsService.DEPTH_METRIC,
+			{"kind": "cosmetic"},
+			self._cosmetic_count
+		)
@@ -1,24 +1,58 @@
 from bot.bot_events.family_tree_service_events import FamilyTreeServiceEvents
 from bot.models.dict_family_tree import DictFamilyTree
 from bot.models.family_tree import IFamilyTree
+from bot.models.locked_family_tree import LockedFamilyTree
 from bot.models.tree_node import TreeNode
 from bot.services.family_tree.family_tree_service import IFamilyTreeService
-from typing import Dict
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
 
 class DictFamilyTreeService(IFamilyTreeService):
 	"""
 	Family tree service that stores family trees in a dictionary.
 	"""
-	def __init__(self):
+	def __init__(self, thread_safe: bool = False):
 		"""
 		Initializes a new instance of the service.
+		@param thread_safe If true, each family tree is wrapped in a
+		  `LockedFamilyTree` so that trees may be accessed from multiple
+		  threads. Each tree has its own lock, so threads working on different
+		  servers never wait for each other.
 		"""
+		# Whether family trees are wrapped in per-tree locks.
+		self._thread_safe = thread_safe
+
+		# Guards the dictionary of family trees and the hydration state.
+		# This is only held while trees are looked up, added, or removed; each
+		#   tree's own lock guards everything else.
+		self._lock = threading.Lock()
+
 		# Dictionary of all family trees, indexed by discord server ID.
 		self._family_trees: Dict[int, IFamilyTree] = {}
 
 		# Events object used to broadcast to event listeners
 		self._events = FamilyTreeServiceEvents()
 
+		# Whether previously saved family trees are being loaded and have not
+		#   yet been merged into the dictionary of family trees.
+		self._hydration_pending = False
+
+		# Thread used to load previously saved family trees in the background.
+		self._hydration_thread: Optional[threading.Thread] = None
+
+		# Family trees loaded by the hydration thread.
+		self._hydrated_trees: Dict[int, IFamilyTree] = {}
+
+		# Exception raised by the hydration thread, if any. Once set, it is
+		#   never cleared and hydration never finishes, so the service cannot
+		#   create new trees that would overwrite the trees that failed to
+		#   load when they are saved.
+		self._hydration_error: Optional[BaseException] = None
+
 
 	@property
 	def events(self) -> FamilyTreeServiceEvents:
@@ -28,6 +62,61 @@ class DictFamilyTreeService(IFamilyTreeService):
 		return self._events
 
 
+	def load_family_trees(self,
+		loader: Callable[[], Dict[int, IFamilyTree]],
+		background: bool = True) -> None:
+		"""
+		Loads previously saved family trees into the service.
+		@param loader Function that loads all saved family trees, indexed by
+		  discord server ID.
+		@param background If true, the trees are loaded on a background thread
+		  so that the caller does not have to wait for them. Any method that
+		  accesses family trees will block until loading has finished. If
+		  loading fails, every later call to such a method raises the
+		  exception that loading raised.
+		@throws RuntimeError If trees are already being loaded.
+		"""
+		def hydrate() -> None:
+			start = time.perf_counter()
+			try:
+				self._hydrated_trees = loader()
+				logger.info(
+					f"Loaded {len(self._hydrated_trees)} family trees in "
+					f"{(time.perf_counter() - start) * 1000:.1f}ms."
+				)
+				for server_id, tree in self._hydrated_trees.items():
+					self._events.on_family_tree_loaded(server_id, tree)
+			except BaseException as e:
+				self._hydration_error = e
+
+		with self._lock:
+			if self._hydration_pending:
+				raise RuntimeError("Family trees are already being loaded.")
+
+			self._hydration_pending = True
+			if background:
+				self._hydration_thread = threading.Thread(
+					target=hydrate,
+					name="family-tree-hydration",
+					daemon=True
+				)
+				self._hydration_thread.start()
+			else:
+				hydrate()
+				self._wait_for_hydration()
+
+
+	def wait_for_family_trees(self) -> None:
+		"""
+		Blocks until family trees passed to `load_family_trees()` have been
+		  loaded.
+		Does nothing if trees are not being loaded.
+		@throws Exception Any exception raised while loading the trees.
+		"""
+		with self._lock:
+			self._wait_for_hydration()
+
+
 	def register_discord_server(self,
 		server_id: int,
 		root_node: TreeNode) -> None:
@@ -37,15 +126,14 @@ class DictFamilyTreeService(IFamilyTreeService):
 		@param root_node The root node for the server's family tree instance.
 		@throws ValueError If a tree for the given server already exists.
 		"""
-		if server_id in self._family_trees:
-			raise ValueError(
-				f"Family tree for server {server_id} already exists."
-			)
+		with self._lock:
+			self._wait_for_hydration()
+			if server_id in self._family_trees:
+				raise ValueError(
+					f"Family tree for server {server_id} already exists."
+				)
 
-		tree = DictFamilyTree(root_node)
-		tree.events.on_modified += lambda t: self._events.on_family_tree_modified(server_id, t) # type: ignore
-
-		self._family_trees[server_id] = tree
+			tree = self._add_family_tree(server_id, DictFamilyTree(root_node))
 		self._events.on_family_tree_created(server_id, tree)
 
 
@@ -55,14 +143,15 @@ class DictFamilyTreeService(IFamilyTreeService):
 		@param server_id The unique ID of the discord server.
 		@throws KeyError If a tree for the given server does not exist.
 		"""
-		if server_id not in self._family_trees:
-			raise KeyError(
-				f"Family tree for server {server_id} does not exist."
-			)
+		with self._lock:
+			self._wait_for_hydration()
+			if server_id not in self._family_trees:
+				raise KeyError(
+					f"Family tree for server {server_id} does not exist."
+				)
 
-		tree = self._family_trees[server_id]
-		del self._family_trees[server_id]
-		self._events.on_family_tree_deleted(server_id, tree)
+			del self._family_trees[server_id]
+		self._events.on_family_tree_removed(server_id)
 
 
 	def get_family_tree(self, server_id: int) -> IFamilyTree:
@@ -72,9 +161,51 @@ class DictFamilyTreeService(IFamilyTreeService):
 		@throws KeyError If a tree for the given server does not exist.
 		@returns The family tree instance for the given server.
 		"""
-		if server_id not in self._family_trees:
-			raise KeyError(
-				f"Family tree for server {server_id} does not exist."
-			)
+		with self._lock:
+			self._wait_for_hydration()
+			if server_id not in self._family_trees:
+				raise KeyError(
+					f"Family tree for server {server_id} does not exist."
+				)
+
+			return self._family_trees[server_id]
+
+
+	def _add_family_tree(self,
+		server_id: int,
+		tree: IFamilyTree) -> IFamilyTree:
+		"""
+		Adds a family tree to the service without emitting any events.
+		Must be called while holding the service's lock.
+		@param server_id The unique ID of the discord server.
+		@param tree The family tree for the server.
+		@returns The tree that was added. If the service is thread safe, this
+		  is the locked wrapper around the given tree.
+		"""
+		if self._thread_safe:
+			tree = LockedFamilyTree(tree)
+		tree.events.on_modified += lambda t: self._events.on_family_tree_modified(server_id, t) # type: ignore
+		self._family_trees[server_id] = tree
+		return tree
+
+
+	def _wait_for_hydration(self) -> None:
+		"""
+		Blocks until previously saved family trees have been loaded.
+		Must be called while holding the service's lock.
+		Does nothing if trees are not being loaded.
+		@throws Exception Any exception raised while loading the trees.
+		"""
+		if not self._hydration_pending:
+			return
+
+		if self._hydration_thread:
+			self._hydration_thread.join()
+			self._hydration_thread = None
+		if self._hydration_error:
+			raise self._hydration_error
 
-		return self._family_trees[server_id]
+		self._hydration_pending = False
+		for server_id, tree in self._hydrated_trees.items():
+			self._add_family_tree(server_id, tree)
+		self._hydrated_trees = {}
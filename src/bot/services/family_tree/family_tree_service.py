@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 from bot.bot_events.family_tree_service_events import FamilyTreeServiceEvents
 from bot.models.family_tree import IFamilyTree
 from bot.models.tree_node import TreeNode
+from typing import Callable, Dict
 
 class IFamilyTreeService(ABC):
 	"""
@@ -16,6 +17,35 @@ class IFamilyTreeService(ABC):
 		raise NotImplementedError()
 
 
+	@abstractmethod
+	def load_family_trees(self,
+		loader: Callable[[], Dict[int, IFamilyTree]],
+		background: bool = True) -> None:
+		"""
+		Loads previously saved family trees into the service.
+		@param loader Function that loads all saved family trees, indexed by
+		  discord server ID.
+		@param background If true, the trees are loaded on a background thread
+		  so that the caller does not have to wait for them. Any method that
+		  accesses family trees will block until loading has finished. If
+		  loading fails, every later call to such a method raises the
+		  exception that loading raised.
+		@throws RuntimeError If trees are already being loaded.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def wait_for_family_trees(self) -> None:
+		"""
+		Blocks until family trees passed to `load_family_trees()` have been
+		  loaded.
+		Does nothing if trees are not being loaded.
+		@throws Exception Any exception raised while loading the trees.
+		"""
+		raise NotImplementedError()
+
+
 	@abstractmethod
 	def register_discord_server(self,
 		server_id: int,
@@ -0,0 +1,372 @@
+from bisect import bisect_right
+from bot.models.dict_family_tree import DictFamilyTree
+from bot.models.family_tree import IFamilyTree
+from bot.models.tree_node import TreeNode
+import json
+import os
+from pathlib import Path
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+class GuildHistoryLog:
+	"""
+	Append-only history of the changes made to a single guild's family tree.
+	The history is stored in its own directory using three kinds of files:
+	  - `log.jsonl`: One record per change, each stored as a compact JSON
+	    array on its own line.
+	  - `checkpoint-<n>.jsonl`: The full state of the tree at a point in time,
+	    stored as one add record per node in the order the nodes joined.
+	  - `checkpoints.jsonl`: One line per checkpoint containing the
+	    checkpoint's timestamp, the size of the log when the checkpoint was
+	    written, and the checkpoint's file name.
+	To reconstruct the tree at a point in time, the latest checkpoint written
+	  at or before that time is loaded and only the records written after the
+	  checkpoint are replayed.
+	Changes must be recorded by one thread at a time, but `tree_at()` may be
+	  called from any thread.
+	"""
+	# Record type for nodes added to the tree.
+	# Format: [type, timestamp, user_id, username, discriminator, nickname,
+	#   background_color, inviter_id]
+	ADD_RECORD = "a"
+
+	# Record type for nodes removed from the tree.
+	# Format: [type, timestamp, user_id]
+	REMOVE_RECORD = "r"
+
+	# Record type for nickname changes.
+	# Format: [type, timestamp, user_id, nickname]
+	RENAME_RECORD = "n"
+
+	# Record type for background color changes.
+	# Format: [type, timestamp, user_id, background_color]
+	COLOR_RECORD = "c"
+
+	# Minimum number of records written between checkpoints.
+	# Otherwise, a checkpoint is written once the number of records since the
+	#   last checkpoint reaches the size of the tree. This keeps the cost of
+	#   writing checkpoints at O(1) per record and means that replaying the
+	#   records after a checkpoint never takes much longer than loading it.
+	MIN_CHECKPOINT_INTERVAL = 1000
+
+	# Size of the blocks read when searching for the end of the last record.
+	REPAIR_BLOCK_SIZE = 4096
+
+	def __init__(self, directory: Path):
+		"""
+		Initializes a new instance of the class.
+		@param directory The directory that the guild's history is stored in.
+		  Does not need to exist yet.
+		"""
+		self._directory = directory
+		self._log_path = directory / "log.jsonl"
+		self._index_path = directory / "checkpoints.jsonl"
+
+		# Timestamp, log size, and file name of each checkpoint, ordered by
+		#   timestamp. Loaded from disk the first time it is needed.
+		self._checkpoints: Optional[List[Tuple[float, int, str]]] = None
+
+		# Number of records written since the last checkpoint.
+		self._records_since_checkpoint = 0
+
+		# Whether the next change should write a checkpoint instead of a record.
+		self._needs_checkpoint = True
+
+		# Timestamp of the most recent record or checkpoint. Used to keep
+		#   timestamps from decreasing if the system clock is adjusted.
+		self._last_timestamp = 0.0
+
+
+	def begin(self, tree: IFamilyTree) -> None:
+		"""
+		Prepares the log to record changes made to a newly tracked tree.
+		Records only describe how a tree changed, so the first change after
+		  tracking starts (e.g. after the bot restarts) writes a checkpoint of
+		  the tree instead of a record. If the guild does not have any history
+		  yet, the checkpoint is written right away so that the history starts
+		  when tracking starts. Otherwise it is deferred until the tree is
+		  first modified, since most trees loaded at startup are not modified
+		  before the bot restarts again.
+		@param tree The tree whose changes will be recorded.
+		"""
+		self._needs_checkpoint = True
+		if not self._get_checkpoints():
+			self.write_checkpoint(tree)
+
+
+	def record_node_added(self, tree: IFamilyTree, node: TreeNode) -> None:
+		"""
+		Records that a node was added to the tree.
+		@param tree The tree that was modified.
+		@param node The node that was added.
+		"""
+		assert node.inviter
+		self._append(
+			tree,
+			GuildHistoryLog.ADD_RECORD,
+			node.discord_id,
+			node.discord_username,
+			node.discord_discriminator,
+			node.user_nickname,
+			node.background_color,
+			node.inviter.discord_id
+		)
+
+
+	def record_node_removed(self, tree: IFamilyTree, node: TreeNode) -> None:
+		"""
+		Records that a node was removed from the tree.
+		@param tree The tree that was modified.
+		@param node The node that was removed.
+		"""
+		self._append(tree, GuildHistoryLog.REMOVE_RECORD, node.discord_id)
+
+
+	def record_nickname_changed(self,
+		tree: IFamilyTree,
+		node: TreeNode) -> None:
+		"""
+		Records that the nickname of a node in the tree changed.
+		@param tree The tree that was modified.
+		@param node The node whose nickname changed.
+		"""
+		self._append(
+			tree,
+			GuildHistoryLog.RENAME_RECORD,
+			node.discord_id,
+			node.user_nickname
+		)
+
+
+	def record_background_color_changed(self,
+		tree: IFamilyTree,
+		node: TreeNode) -> None:
+		"""
+		Records that the background color of a node in the tree changed.
+		@param tree The tree that was modified.
+		@param node The node whose background color changed.
+		"""
+		self._append(
+			tree,
+			GuildHistoryLog.COLOR_RECORD,
+			node.discord_id,
+			node.background_color
+		)
+
+
+	def write_checkpoint(self, tree: IFamilyTree) -> None:
+		"""
+		Writes the current state of the tree to a new checkpoint.
+		@param tree The tree to write.
+		"""
+		snapshot = tree.snapshot()
+		timestamp = self._next_timestamp()
+		checkpoints = self._get_checkpoints()
+		self._directory.mkdir(parents=True, exist_ok=True)
+		offset = self._repair_log()
+
+		# The checkpoint is written to a temporary file first so that a
+		#   partially written checkpoint is never listed in the index
+		name = f"checkpoint-{len(checkpoints)}.jsonl"
+		temp_path = self._directory / f"{name}.tmp"
+		with temp_path.open("w", encoding="utf-8") as f:
+			for node in snapshot:
+				f.write(GuildHistoryLog._encode([
+					GuildHistoryLog.ADD_RECORD,
+					timestamp,
+					node.discord_id,
+					node.discord_username,
+					node.discord_discriminator,
+					node.user_nickname,
+					node.background_color,
+					node.inviter_id
+				]))
+		os.replace(temp_path, self._directory / name)
+
+		with self._index_path.open("a", encoding="utf-8") as f:
+			f.write(GuildHistoryLog._encode([timestamp, offset, name]))
+		checkpoints.append((timestamp, offset, name))
+		self._records_since_checkpoint = 0
+		self._needs_checkpoint = False
+
+
+	def tree_at(self, timestamp: float) -> IFamilyTree:
+		"""
+		Reconstructs the tree as it was at a point in time.
+		@param timestamp The point in time, in seconds since the Unix epoch.
+		@throws ValueError If the history starts after the timestamp.
+		@returns A new tree containing the nodes that were in the tree at the
+		  given time.
+		"""
+		checkpoints = self._get_checkpoints()
+		i = bisect_right([c[0] for c in checkpoints], timestamp)
+		if i == 0:
+			raise ValueError(f"History does not extend back to {timestamp}.")
+		_, offset, name = checkpoints[i - 1]
+
+		# Nodes are looked up by ID while replaying records. The tree's own
+		#   lookup methods are not used since they are not O(1).
+		nodes: Dict[int, TreeNode] = {}
+		tree: Optional[DictFamilyTree] = None
+		with (self._directory / name).open("r", encoding="utf-8") as f:
+			for line in f:
+				tree = GuildHistoryLog._apply(tree, nodes, json.loads(line))
+		assert tree
+
+		if not self._log_path.exists():
+			return tree
+		with self._log_path.open("rb") as f:
+			f.seek(offset)
+			for line in f:
+				# Stop at a record that is still being written
+				if not line.endswith(b"\n"):
+					break
+				record = json.loads(line)
+				if record[1] > timestamp:
+					break
+				GuildHistoryLog._apply(tree, nodes, record)
+		return tree
+
+
+	def _append(self, tree: IFamilyTree, record_type: str, *fields: Any) -> None:
+		"""
+		Appends a record to the log.
+		@param tree The tree that was modified. The change must have already
+		  been applied to the tree.
+		@param record_type The type of the record.
+		@param fields The fields of the record after its timestamp.
+		"""
+		if self._needs_checkpoint:
+			self.write_checkpoint(tree)
+			return
+
+		record = [record_type, self._next_timestamp(), *fields]
+		with self._log_path.open("a", encoding="utf-8") as f:
+			f.write(GuildHistoryLog._encode(record))
+
+		self._records_since_checkpoint += 1
+		interval = max(GuildHistoryLog.MIN_CHECKPOINT_INTERVAL, len(tree))
+		if self._records_since_checkpoint >= interval:
+			self.write_checkpoint(tree)
+
+
+	def _get_checkpoints(self) -> List[Tuple[float, int, str]]:
+		"""
+		Gets the list of checkpoints, loading it from disk if necessary.
+		@returns The timestamp, log size, and file name of each checkpoint,
+		  ordered by timestamp.
+		"""
+		if self._checkpoints is None:
+			checkpoints: List[Tuple[float, int, str]] = []
+			if self._index_path.exists():
+				with self._index_path.open("r", encoding="utf-8") as f:
+					for line in f:
+						# Skip an entry that was only partially written
+						if not line.endswith("\n"):
+							break
+						timestamp, offset, name = json.loads(line)
+						checkpoints.append((timestamp, offset, name))
+			if checkpoints:
+				self._last_timestamp = max(
+					self._last_timestamp,
+					checkpoints[-1][0]
+				)
+			self._checkpoints = checkpoints
+		return self._checkpoints
+
+
+	def _repair_log(self) -> int:
+		"""
+		Removes a partially written record from the end of the log.
+		A partial record is left behind if the bot stops while writing one.
+		@returns The size of the log in bytes.
+		"""
+		if not self._log_path.exists():
+			return 0
+
+		with self._log_path.open("rb+") as f:
+			size = f.seek(0, os.SEEK_END)
+			end = 0
+			position = size
+			while position > 0:
+				start = max(0, position - GuildHistoryLog.REPAIR_BLOCK_SIZE)
+				f.seek(start)
+				i = f.read(position - start).rfind(b"\n")
+				if i >= 0:
+					end = start + i + 1
+					break
+				position = start
+			if end != size:
+				f.truncate(end)
+		return end
+
+
+	def _next_timestamp(self) -> float:
+		"""
+		Gets the timestamp to use for a new record or checkpoint.
+		@returns The current time, or the previous timestamp if the system
+		  clock has moved backwards.
+		"""
+		self._last_timestamp = max(time.time(), self._last_timestamp)
+		return self._last_timestamp
+
+
+	@staticmethod
+	def _apply(
+		tree: Optional[DictFamilyTree],
+		nodes: Dict[int, TreeNode],
+		record: List[Any]) -> DictFamilyTree:
+		"""
+		Applies a record to a tree being reconstructed.
+		@param tree The tree to modify, or None if the record is the first
+		  record of a checkpoint.
+		@param nodes Every node in the tree, indexed by discord ID. Will be
+		  updated to match the tree.
+		@param record The record to apply.
+		@throws ValueError If the record's type is not recognized.
+		@returns The modified tree. If no tree was given, this is a new tree
+		  whose root node is the record's node.
+		"""
+		record_type = record[0]
+		if record_type == GuildHistoryLog.ADD_RECORD:
+			_, _, user_id, username, discriminator, nickname, color, \
+				inviter_id = record
+			node = TreeNode(
+				user_id,
+				username,
+				discriminator,
+				nickname,
+				color,
+				nodes[inviter_id] if inviter_id is not None else None
+			)
+			nodes[user_id] = node
+			if tree is None:
+				return DictFamilyTree(node)
+			tree.add_node(node)
+		elif record_type == GuildHistoryLog.REMOVE_RECORD:
+			assert tree
+			# Nodes removed together are recorded once all of them have been
+			#   removed, so a checkpoint written between their records does
+			#   not contain the nodes whose records come after it
+			node = nodes.pop(record[2], None)
+			if node is not None:
+				tree.remove_node(node)
+		elif record_type == GuildHistoryLog.RENAME_RECORD:
+			assert tree
+			tree.update_nickname(nodes[record[2]], record[3])
+		elif record_type == GuildHistoryLog.COLOR_RECORD:
+			assert tree
+			tree.update_background_colors([(nodes[record[2]], record[3])])
+		else:
+			raise ValueError(f"Unknown history record type '{record_type}'.")
+		return tree
+
+
+	@staticmethod
+	def _encode(record: List[Any]) -> str:
+		"""
+		Encodes a record as a line of compact JSON.
+		@param record The record to encode.
+		@returns The encoded record, including the trailing newline.
+		"""
+		return json.dumps(record, separators=(",", ":")) + "\n"
@@ -0,0 +1,33 @@
+from abc import ABC, abstractmethod
+from bot.models.family_tree import IFamilyTree
+
+class IHistoryService(ABC):
+	"""
+	Service that records every change made to family trees so that earlier
+	  versions of each tree can be reconstructed.
+	"""
+	@abstractmethod
+	def track_tree(self, server_id: int, tree: IFamilyTree) -> None:
+		"""
+		Starts recording changes made to a family tree.
+		If the server's tree was tracked before, the existing history is
+		  continued and the new tree replaces the previously tracked tree.
+		@param server_id The ID of the discord server that the tree belongs to.
+		@param tree The family tree to track.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def tree_at(self, server_id: int, timestamp: float) -> IFamilyTree:
+		"""
+		Reconstructs a family tree as it was at a point in time.
+		@param server_id The ID of the discord server that the tree belongs to.
+		@param timestamp The point in time, in seconds since the Unix epoch.
+		@throws KeyError If no history exists for the server.
+		@throws ValueError If the server's history starts after the timestamp.
+		@returns A new tree containing the nodes that were in the server's tree
+		  at the given time. Changes made to the returned tree are not
+		  recorded.
+		"""
+		raise NotImplementedError()
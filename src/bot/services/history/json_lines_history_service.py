@@ -0,0 +1,75 @@
+from bot.models.family_tree import IFamilyTree
+from bot.services.history.guild_history_log import GuildHistoryLog
+from bot.services.history.history_service import IHistoryService
+from pathlib import Path
+import threading
+from typing import Dict
+
+class JsonLinesHistoryService(IHistoryService):
+	"""
+	History service that stores each guild's history in JSON lines files.
+	Each guild's history is kept in its own directory, so shards may share the
+	  same history directory.
+	"""
+	def __init__(self, history_dir: Path):
+		"""
+		Initializes a new instance of the class.
+		@param history_dir The directory to store the history of each guild in.
+		"""
+		self._history_dir = history_dir
+
+		# Guards the dictionary of logs.
+		self._lock = threading.Lock()
+
+		# Log of each tracked tree, indexed by discord server ID.
+		self._logs: Dict[int, GuildHistoryLog] = {}
+
+
+	def track_tree(self, server_id: int, tree: IFamilyTree) -> None:
+		"""
+		Starts recording changes made to a family tree.
+		If the server's tree was tracked before, the existing history is
+		  continued and the new tree replaces the previously tracked tree.
+		@param server_id The ID of the discord server that the tree belongs to.
+		@param tree The family tree to track.
+		"""
+		log = GuildHistoryLog(self._get_directory(server_id))
+		log.begin(tree)
+		tree.events.on_node_added += log.record_node_added # type: ignore
+		tree.events.on_node_removed += log.record_node_removed # type: ignore
+		tree.events.on_nickname_changed += log.record_nickname_changed # type: ignore
+		tree.events.on_background_color_changed += \
+			log.record_background_color_changed # type: ignore
+		with self._lock:
+			self._logs[server_id] = log
+
+
+	def tree_at(self, server_id: int, timestamp: float) -> IFamilyTree:
+		"""
+		Reconstructs a family tree as it was at a point in time.
+		@param server_id The ID of the discord server that the tree belongs to.
+		@param timestamp The point in time, in seconds since the Unix epoch.
+		@throws KeyError If no history exists for the server.
+		@throws ValueError If the server's history starts after the timestamp.
+		@returns A new tree containing the nodes that were in the server's tree
+		  at the given time. Changes made to the returned tree are not
+		  recorded.
+		"""
+		with self._lock:
+			log = self._logs.get(server_id)
+		if log is None:
+			# Servers that are no longer tracked may still have a history
+			directory = self._get_directory(server_id)
+			if not directory.exists():
+				raise KeyError(f"No history exists for server {server_id}.")
+			log = GuildHistoryLog(directory)
+		return log.tree_at(timestamp)
+
+
+	def _get_directory(self, server_id: int) -> Path:
+		"""
+		Gets the directory that a server's history is stored in.
+		@param server_id The ID of the discord server.
+		@returns The path to the server's history directory.
+		"""
+		return self._history_dir / str(server_id)
@@ -0,0 +1,99 @@
+from bot.services.family_tree.family_tree_service import IFamilyTreeService
+from bot.services.metrics.guild_tier import GuildTier
+from bot.services.metrics.metrics_service import IMetricsService
+import time
+from typing import Any, Callable
+
+class EventInstrumentation:
+	"""
+	Wraps event handlers so that each dispatch is counted and timed.
+	Every event handled by the bot takes the server ID as its first argument,
+	  which is used to label the recorded metrics with the guild's tier.
+	"""
+	# Counter incremented each time an event is handled.
+	EVENTS_METRIC = "bot_events_total"
+
+	# Counter incremented each time an event handler raises an exception.
+	ERRORS_METRIC = "bot_event_errors_total"
+
+	# Histogram of the time taken to handle each event.
+	LATENCY_METRIC = "bot_event_latency_seconds"
+
+	def __init__(self,
+		metrics_service: IMetricsService,
+		family_tree_service: IFamilyTreeService):
+		"""
+		Initializes a new instance of the class.
+		@param metrics_service The service to record metrics to.
+		@param family_tree_service The service used to look up the size of each
+		  guild's family tree.
+		"""
+		self._metrics_service = metrics_service
+		self._family_tree_service = family_tree_service
+
+
+	def wrap(self,
+		source: str,
+		event_name: str,
+		handler: Callable[..., Any]) -> Callable[..., None]:
+		"""
+		Wraps an event handler so that each call is counted and timed.
+		@param source The name of the object that emits the event, e.g.
+		  `discord` for Discord events.
+		@param event_name The name of the event being handled.
+		@param handler The event handler to wrap.
+		@returns A new event handler that records metrics and then forwards
+		  all arguments to the wrapped handler.
+		"""
+		def instrumented(server_id: int, *args: Any) -> None:
+			# Removal events delete the guild's tree, so the tier must be
+			#   looked up before the handler runs. Creation events only have a
+			#   tree after the handler runs.
+			tier = self.get_tier(server_id)
+			start = time.perf_counter()
+			failed = False
+			try:
+				handler(server_id, *args)
+			except BaseException:
+				failed = True
+				raise
+			finally:
+				elapsed = time.perf_counter() - start
+				if tier == GuildTier.UNKNOWN:
+					tier = self.get_tier(server_id)
+				labels = {
+					"source": source,
+					"event": event_name,
+					"tier": tier
+				}
+				self._metrics_service.increment(
+					EventInstrumentation.EVENTS_METRIC,
+					labels
+				)
+				self._metrics_service.observe(
+					EventInstrumentation.LATENCY_METRIC,
+					labels,
+					elapsed
+				)
+				if failed:
+					self._metrics_service.increment(
+						EventInstrumentation.ERRORS_METRIC,
+						labels
+					)
+
+		return instrumented
+
+
+	def get_tier(self, server_id: int) -> str:
+		"""
+		Gets the tier of a guild.
+		@param server_id The unique ID of the discord server.
+		@returns The tier of the guild, or `GuildTier.UNKNOWN` if the guild
+		  does not have a family tree.
+		"""
+		try:
+			return GuildTier.get_tier(
+				len(self._family_tree_service.get_family_tree(server_id))
+			)
+		except KeyError:
+			return GuildTier.UNKNOWN
@@ -0,0 +1,31 @@
+class GuildTier:
+	"""
+	Buckets guilds by the size of their family tree.
+	Metrics are labeled by tier instead of by guild ID so that the number of
+	  time series stays bounded no matter how many guilds the bot is in.
+	"""
+	# Tier used when the guild's family tree could not be found.
+	UNKNOWN = "unknown"
+
+	# Tiers, in ascending order of size, and the exclusive upper bound on the
+	#   number of nodes for guilds in that tier.
+	TIERS = (
+		("small", 1_000),
+		("medium", 10_000),
+		("large", 100_000)
+	)
+
+	# Tier used for guilds larger than all other tiers.
+	HUGE = "huge"
+
+	@staticmethod
+	def get_tier(node_count: int) -> str:
+		"""
+		Gets the tier for a guild.
+		@param node_count The number of nodes in the guild's family tree.
+		@returns The name of the tier the guild belongs to.
+		"""
+		for tier, limit in GuildTier.TIERS:
+			if node_count < limit:
+				return tier
+		return GuildTier.HUGE
@@ -0,0 +1,183 @@
+from bot.services.metrics.latency_histogram import LatencyHistogram
+from bot.services.metrics.metrics_service import IMetricsService
+import math
+import threading
+from typing import Dict, List, Tuple
+
+# Type used to identify a single time series of a metric.
+LabelSet = Tuple[Tuple[str, str], ...]
+
+class InMemoryMetricsService(IMetricsService):
+	"""
+	Metrics service that keeps all metrics in memory.
+	Metrics are never reset, so counters and histograms accumulate for the
+	  lifetime of the process, matching Prometheus semantics.
+	"""
+	def __init__(self):
+		"""
+		Initializes a new instance of the class.
+		"""
+		# Counters, indexed by metric name and then by label set.
+		self._counters: Dict[str, Dict[LabelSet, int]] = {}
+
+		# Latency histograms, indexed by metric name and then by label set.
+		self._histograms: Dict[str, Dict[LabelSet, LatencyHistogram]] = {}
+
+		# Gauges, indexed by metric name and then by label set.
+		self._gauges: Dict[str, Dict[LabelSet, float]] = {}
+
+		# Metrics may be rendered from a different thread than the one that
+		#   records them (e.g. the metrics HTTP server).
+		self._lock = threading.Lock()
+
+
+	def increment(self,
+		name: str,
+		labels: Dict[str, str],
+		amount: int = 1) -> None:
+		"""
+		Increments a counter.
+		@param name The name of the counter.
+		@param labels The labels that identify the counter's time series.
+		@param amount The amount to increment the counter by.
+		"""
+		key = tuple(labels.items())
+		with self._lock:
+			series = self._counters.setdefault(name, {})
+			series[key] = series.get(key, 0) + amount
+
+
+	def observe(self,
+		name: str,
+		labels: Dict[str, str],
+		seconds: float) -> None:
+		"""
+		Records a latency observation.
+		@param name The name of the latency histogram.
+		@param labels The labels that identify the histogram's time series.
+		@param seconds The observed latency, in seconds.
+		"""
+		key = tuple(labels.items())
+		with self._lock:
+			series = self._histograms.setdefault(name, {})
+			histogram = series.get(key)
+			if histogram is None:
+				histogram = LatencyHistogram()
+				series[key] = histogram
+			histogram.observe(seconds)
+
+
+	def set_gauge(self,
+		name: str,
+		labels: Dict[str, str],
+		value: float) -> None:
+		"""
+		Sets the current value of a gauge.
+		@param name The name of the gauge.
+		@param labels The labels that identify the gauge's time series.
+		@param value The new value of the gauge.
+		"""
+		key = tuple(labels.items())
+		with self._lock:
+			self._gauges.setdefault(name, {})[key] = value
+
+
+	def render_prometheus(self) -> str:
+		"""
+		Renders all recorded metrics.
+		@returns All metrics, formatted using the Prometheus text exposition
+		  format.
+		"""
+		lines: List[str] = []
+		with self._lock:
+			for name, counters in sorted(self._counters.items()):
+				lines.append(f"# TYPE {name} counter")
+				for labels, value in counters.items():
+					lines.append(
+						f"{name}{InMemoryMetricsService._format_labels(labels)} {value}"
+					)
+
+			for name, gauges in sorted(self._gauges.items()):
+				lines.append(f"# TYPE {name} gauge")
+				for labels, gauge in gauges.items():
+					lines.append(
+						f"{name}{InMemoryMetricsService._format_labels(labels)} {gauge!r}"
+					)
+
+			for name, histograms in sorted(self._histograms.items()):
+				lines.append(f"# TYPE {name} histogram")
+				for labels, histogram in histograms.items():
+					for bound, count in histogram.get_cumulative_buckets():
+						le = "+Inf" if math.isinf(bound) else repr(bound)
+						bucket_labels = labels + (("le", le),)
+						lines.append(
+							f"{name}_bucket"
+							f"{InMemoryMetricsService._format_labels(bucket_labels)} "
+							f"{count}"
+						)
+					formatted = InMemoryMetricsService._format_labels(labels)
+					lines.append(f"{name}_sum{formatted} {histogram.sum!r}")
+					lines.append(f"{name}_count{formatted} {histogram.count}")
+
+		return "\n".join(lines) + "\n"
+
+
+	def render_summary(self) -> str:
+		"""
+		Renders a human-readable summary of all recorded metrics.
+		@returns A table containing the value of each counter and gauge and the
+		  count, mean, and estimated percentiles of each latency histogram.
+		"""
+		lines: List[str] = []
+		with self._lock:
+			for name, counters in sorted(self._counters.items()):
+				for labels, value in counters.items():
+					series = f"{name}{InMemoryMetricsService._format_labels(labels)}"
+					lines.append(f"{series} {value}")
+
+			for name, gauges in sorted(self._gauges.items()):
+				for labels, gauge in gauges.items():
+					series = f"{name}{InMemoryMetricsService._format_labels(labels)}"
+					lines.append(f"{series} {gauge:g}")
+
+			for name, histograms in sorted(self._histograms.items()):
+				for labels, histogram in histograms.items():
+					series = f"{name}{InMemoryMetricsService._format_labels(labels)}"
+					mean = histogram.sum / max(histogram.count, 1)
+					lines.append(
+						f"{series} count={histogram.count} "
+						f"mean={mean * 1000:.3f}ms "
+						f"p50<={histogram.get_quantile(0.5) * 1000:g}ms "
+						f"p99<={histogram.get_quantile(0.99) * 1000:g}ms"
+					)
+
+		return "\n".join(lines) + "\n"
+
+
+	@staticmethod
+	def _format_labels(labels: LabelSet) -> str:
+		"""
+		Formats a label set for the Prometheus text exposition format.
+		@param labels The label set to format.
+		@returns The formatted label set, including the surrounding braces. If
+		  the label set is empty, an empty string is returned.
+		"""
+		if not labels:
+			return ""
+
+		formatted = ",".join(
+			f'{key}="{InMemoryMetricsService._escape(value)}"'
+			for key, value in labels
+		)
+		return f"{{{formatted}}}"
+
+
+	@staticmethod
+	def _escape(value: str) -> str:
+		"""
+		Escapes a label value for the Prometheus text exposition format.
+		@param value The label value to escape.
+		@returns The escaped label value.
+		"""
+		return value.replace("\\", "\\\\").replace("\"", "\\\"")\
+			.replace("\n", "\\n")
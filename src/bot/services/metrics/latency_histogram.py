@@ -0,0 +1,92 @@
+from bisect import bisect_left
+from typing import List, Sequence, Tuple
+
+class LatencyHistogram:
+	"""
+	Fixed-bucket histogram used to track latencies.
+	Buckets are cumulative in the same manner as Prometheus histograms, i.e.
+	  each bucket counts all observations less than or equal to its upper
+	  bound. Internally, observations are stored per-bucket so that recording
+	  an observation only requires a binary search and a single increment.
+	"""
+	# Default bucket upper bounds, in seconds.
+	# These cover everything from a dictionary lookup to a multi-second save
+	#   of a very large tree.
+	DEFAULT_BUCKETS: Tuple[float, ...] = (
+		0.0001, 0.00025, 0.0005,
+		0.001, 0.0025, 0.005,
+		0.01, 0.025, 0.05,
+		0.1, 0.25, 0.5,
+		1.0, 2.5, 5.0, 10.0
+	)
+
+	def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+		"""
+		Initializes a new instance of the class.
+		@param buckets The upper bounds of each bucket, in seconds. Must be
+		  sorted in ascending order. An implicit `+Inf` bucket is always added.
+		"""
+		self._buckets = tuple(buckets)
+
+		# Number of observations that fell into each bucket. The last entry is
+		#   for observations larger than the largest bucket.
+		self._counts = [0] * (len(self._buckets) + 1)
+		self._sum = 0.0
+		self._count = 0
+
+
+	@property
+	def count(self) -> int:
+		"""
+		Gets the total number of observations.
+		"""
+		return self._count
+
+
+	@property
+	def sum(self) -> float:
+		"""
+		Gets the sum of all observations, in seconds.
+		"""
+		return self._sum
+
+
+	def observe(self, seconds: float) -> None:
+		"""
+		Records an observation.
+		@param seconds The observed latency, in seconds.
+		"""
+		self._counts[bisect_left(self._buckets, seconds)] += 1
+		self._sum += seconds
+		self._count += 1
+
+
+	def get_cumulative_buckets(self) -> List[Tuple[float, int]]:
+		"""
+		Gets the cumulative count for each bucket.
+		@returns A list of (upper bound, cumulative count) pairs. The final
+		  entry's upper bound is infinity.
+		"""
+		buckets: List[Tuple[float, int]] = []
+		total = 0
+		for bound, count in zip(self._buckets + (float("inf"),), self._counts):
+			total += count
+			buckets.append((bound, total))
+		return buckets
+
+
+	def get_quantile(self, quantile: float) -> float:
+		"""
+		Estimates a quantile of the observed latencies.
+		@param quantile The quantile to estimate, between 0 and 1.
+		@returns The upper bound of the bucket containing the quantile, or 0 if
+		  no observations have been recorded.
+		"""
+		if self._count == 0:
+			return 0.0
+
+		target = quantile * self._count
+		for bound, total in self.get_cumulative_buckets():
+			if total >= target:
+				return bound
+		return float("inf")
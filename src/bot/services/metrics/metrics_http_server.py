@@ -0,0 +1,88 @@
+from bot.services.metrics.metrics_service import IMetricsService
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class MetricsHttpServer:
+	"""
+	Serves metrics over HTTP using the Prometheus text exposition format.
+	The server runs on a daemon thread so that it never keeps the bot alive.
+	"""
+	# Path that metrics are served from.
+	METRICS_PATH = "/metrics"
+
+	# Content type used for the Prometheus text exposition format.
+	CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+	def __init__(self,
+		metrics_service: IMetricsService,
+		port: int,
+		host: str = "127.0.0.1"):
+		"""
+		Initializes a new instance of the class.
+		@param metrics_service The service to read metrics from.
+		@param port The port to listen on.
+		@param host The interface to listen on. Defaults to the loopback
+		  interface so that metrics are only reachable locally.
+		"""
+		self._metrics_service = metrics_service
+		self._host = host
+		self._port = port
+		self._server: Optional[ThreadingHTTPServer] = None
+		self._thread: Optional[threading.Thread] = None
+
+
+	def start(self) -> None:
+		"""
+		Starts serving metrics in the background.
+		@throws RuntimeError If the server is already running.
+		"""
+		if self._server:
+			raise RuntimeError("The metrics server is already running.")
+
+		metrics_service = self._metrics_service
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self) -> None:
+				if self.path != MetricsHttpServer.METRICS_PATH:
+					self.send_error(404)
+					return
+
+				body = metrics_service.render_prometheus().encode("utf-8")
+				self.send_response(200)
+				self.send_header("Content-Type", MetricsHttpServer.CONTENT_TYPE)
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format: str, *args: Any) -> None:
+				# Scrapes happen every few seconds and would flood the log
+				logger.debug(format % args)
+
+		self._server = ThreadingHTTPServer((self._host, self._port), Handler)
+		self._thread = threading.Thread(
+			target=self._server.serve_forever,
+			name="metrics-http-server",
+			daemon=True
+		)
+		self._thread.start()
+		logger.info(
+			f"Serving metrics on http://{self._host}:{self._port}"
+			f"{MetricsHttpServer.METRICS_PATH}"
+		)
+
+
+	def stop(self) -> None:
+		"""
+		Stops serving metrics.
+		"""
+		if not self._server:
+			return
+
+		self._server.shutdown()
+		self._server.server_close()
+		self._server = None
+		self._thread = None
@@ -0,0 +1,68 @@
+from abc import ABC, abstractmethod
+from typing import Dict
+
+class IMetricsService(ABC):
+	"""
+	Service used to record counters and latencies for bot operations.
+	Implementations must be cheap enough to call on every Discord event.
+	"""
+	@abstractmethod
+	def increment(self,
+		name: str,
+		labels: Dict[str, str],
+		amount: int = 1) -> None:
+		"""
+		Increments a counter.
+		@param name The name of the counter.
+		@param labels The labels that identify the counter's time series.
+		@param amount The amount to increment the counter by.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def observe(self,
+		name: str,
+		labels: Dict[str, str],
+		seconds: float) -> None:
+		"""
+		Records a latency observation.
+		@param name The name of the latency histogram.
+		@param labels The labels that identify the histogram's time series.
+		@param seconds The observed latency, in seconds.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def set_gauge(self,
+		name: str,
+		labels: Dict[str, str],
+		value: float) -> None:
+		"""
+		Sets the current value of a gauge.
+		@param name The name of the gauge.
+		@param labels The labels that identify the gauge's time series.
+		@param value The new value of the gauge.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def render_prometheus(self) -> str:
+		"""
+		Renders all recorded metrics.
+		@returns All metrics, formatted using the Prometheus text exposition
+		  format.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def render_summary(self) -> str:
+		"""
+		Renders a human-readable summary of all recorded metrics.
+		@returns A table containing the value of each counter and gauge and the
+		  count, mean, and estimated percentiles of each latency histogram.
+		"""
+		raise NotImplementedError()
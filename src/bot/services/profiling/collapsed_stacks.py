@@ -0,0 +1,123 @@
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+# Key used by `pstats` to identify a function: (filename, line number, name).
+FunctionKey = Tuple[str, int, str]
+
+class CollapsedStacks:
+	"""
+	Converts `cProfile` statistics to the collapsed stack format.
+	The collapsed stack format has one line per unique call stack, where each
+	  line contains the semicolon-separated frames of the stack followed by a
+	  weight. This is the input format of `flamegraph.pl` and is also accepted
+	  by tools such as speedscope.
+	`cProfile` only records caller/callee pairs rather than full stacks, so
+	  stacks are reconstructed by walking the call graph from each root and
+	  splitting each function's time between its callers in proportion to the
+	  time spent in the function when called by each caller.
+	"""
+	# Maximum depth of reconstructed stacks.
+	MAX_DEPTH = 128
+
+	# Stacks that account for less time than this, in microseconds, are
+	#   dropped to keep the output small.
+	MIN_WEIGHT_US = 1.0
+
+	@staticmethod
+	def from_stats(stats: Dict[FunctionKey, Any]) -> List[str]:
+		"""
+		Converts `cProfile` statistics to collapsed stacks.
+		@param stats The `stats` dictionary of a `pstats.Stats` instance.
+		@returns One line per reconstructed stack, with weights in
+		  microseconds.
+		"""
+		# Maps each function to the functions it calls and the cumulative time
+		#   spent in each callee when called by the function
+		children: Dict[FunctionKey, List[Tuple[FunctionKey, float]]] = {}
+		roots: List[FunctionKey] = []
+		for func, (_, _, _, _, callers) in stats.items():
+			if not callers:
+				roots.append(func)
+			for caller, caller_stats in callers.items():
+				children.setdefault(caller, []).append((func, caller_stats[3]))
+
+		weights: Dict[str, float] = {}
+		for root in roots:
+			CollapsedStacks._walk(stats, children, root, [], set(), 1.0, weights)
+
+		return [
+			f"{stack} {round(weight)}"
+			for stack, weight in weights.items()
+			if weight >= CollapsedStacks.MIN_WEIGHT_US
+		]
+
+
+	@staticmethod
+	def _walk(
+		stats: Dict[FunctionKey, Any],
+		children: Dict[FunctionKey, List[Tuple[FunctionKey, float]]],
+		func: FunctionKey,
+		stack: List[str],
+		on_stack: Set[FunctionKey],
+		scale: float,
+		weights: Dict[str, float]) -> None:
+		"""
+		Adds the time spent in a function and its callees to the stack weights.
+		@param stats The `stats` dictionary of a `pstats.Stats` instance.
+		@param children The callees of each function.
+		@param func The function to walk.
+		@param stack The frames of the stack leading up to the function.
+		@param on_stack The functions that are already on the stack. Used to
+		  break recursive cycles.
+		@param scale The fraction of the function's total time that is
+		  attributed to the current stack.
+		@param weights The weight of each stack, in microseconds. Updated in
+		  place.
+		"""
+		_, _, self_time, total_time, _ = stats[func]
+		if total_time * scale * 1e6 < CollapsedStacks.MIN_WEIGHT_US:
+			return
+		if len(stack) >= CollapsedStacks.MAX_DEPTH:
+			return
+
+		stack.append(CollapsedStacks._format_frame(func))
+		on_stack.add(func)
+
+		key = ";".join(stack)
+		weights[key] = weights.get(key, 0.0) + self_time * scale * 1e6
+
+		for child, edge_time in children.get(func, []):
+			if child in on_stack:
+				continue
+
+			child_total = stats[child][3]
+			if child_total <= 0:
+				continue
+			CollapsedStacks._walk(
+				stats,
+				children,
+				child,
+				stack,
+				on_stack,
+				edge_time * scale / child_total,
+				weights
+			)
+
+		on_stack.discard(func)
+		stack.pop()
+
+
+	@staticmethod
+	def _format_frame(func: FunctionKey) -> str:
+		"""
+		Formats a function as a single frame of a collapsed stack.
+		@param func The function to format.
+		@returns The formatted frame. Never contains semicolons or spaces.
+		"""
+		filename, line, name = func
+		if filename == "~":
+			# Built-in functions do not have a file
+			frame = name
+		else:
+			frame = f"{Path(filename).stem}:{name}:{line}"
+		return frame.replace(";", ",").replace(" ", "_")
@@ -0,0 +1,267 @@
+from __future__ import annotations
+from bot.services.profiling.collapsed_stacks import CollapsedStacks
+from bot.services.profiling.profiling_service import IProfilingService
+from datetime import datetime
+import logging
+from pathlib import Path
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Optional, TYPE_CHECKING
+
+# The profiling modules are only imported once profiling is first started, as
+#   most runs of the bot never profile anything.
+if TYPE_CHECKING:
+	import cProfile
+	import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+class ProfilerThreadState(threading.local):
+	"""
+	State of profiling on a single thread.
+	"""
+	# Number of wrapped event handlers currently on the thread's stack. Event
+	#   handlers may trigger other events, so the profiler must only be
+	#   enabled by the outermost handler.
+	depth = 0
+
+	# Profiler used by the thread, or None if the thread has not handled an
+	#   event while profiling was running.
+	profiler: Optional[cProfile.Profile] = None
+
+	# Profiling session that the thread's profiler belongs to.
+	session = 0
+
+
+class CProfileProfilingService(IProfilingService):
+	"""
+	Profiling service that uses `cProfile` and `tracemalloc`.
+	`cProfile` is only enabled while a wrapped event handler is running so that
+	  time spent waiting for events does not show up in the profile.
+	  `tracemalloc` cannot be scoped to event handling and instead tracks all
+	  allocations made while profiling is running.
+	Event handlers may run on several threads (e.g. event queue and gateway
+	  threads). A profiler only sees the thread that enabled it, so each
+	  thread is profiled by its own profiler, and the profilers' data is
+	  combined when it is dumped.
+	"""
+	# Number of frames stored for each allocation traced by `tracemalloc`.
+	# Allocations are only grouped by file, so a single frame is sufficient.
+	TRACEMALLOC_FRAMES = 1
+
+	# Number of modules to include in the memory report.
+	TOP_ALLOCATORS = 25
+
+	def __init__(self):
+		"""
+		Initializes a new instance of the class.
+		"""
+		self._running = False
+
+		# Profiling state of each thread.
+		self._thread_state = ProfilerThreadState()
+
+		# Guards the list of profilers and the session number.
+		self._lock = threading.Lock()
+
+		# Profilers of the threads that handled events during the current or
+		#   most recent profiling session.
+		self._profilers: List[cProfile.Profile] = []
+
+		# Number of the current or most recent profiling session. Profilers
+		#   created for earlier sessions are discarded.
+		self._session = 0
+
+		# Snapshot taken when profiling started, used as the baseline for the
+		#   memory report.
+		self._start_snapshot: Optional[tracemalloc.Snapshot] = None
+
+		# Snapshot taken when profiling stopped.
+		self._stop_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+	@property
+	def is_running(self) -> bool:
+		"""
+		Whether profiling is currently running.
+		"""
+		return self._running
+
+
+	def start(self) -> None:
+		"""
+		Starts profiling event handling.
+		Any data collected by a previous profiling session is discarded.
+		@throws RuntimeError If profiling is already running.
+		"""
+		if self._running:
+			raise RuntimeError("Profiling is already running.")
+
+		import tracemalloc
+		with self._lock:
+			self._profilers = []
+			self._session += 1
+		if not tracemalloc.is_tracing():
+			tracemalloc.start(CProfileProfilingService.TRACEMALLOC_FRAMES)
+		self._start_snapshot = tracemalloc.take_snapshot()
+		self._stop_snapshot = None
+		self._running = True
+		logger.info("Started profiling event handling.")
+
+
+	def stop(self) -> None:
+		"""
+		Stops profiling event handling.
+		Collected data is kept until profiling is started again so that it may
+		  still be dumped.
+		@throws RuntimeError If profiling is not running.
+		"""
+		if not self._running:
+			raise RuntimeError("Profiling is not running.")
+
+		import tracemalloc
+		self._running = False
+		self._stop_snapshot = tracemalloc.take_snapshot()
+		tracemalloc.stop()
+		logger.info("Stopped profiling event handling.")
+
+
+	def dump(self, directory: Path) -> List[Path]:
+		"""
+		Writes all data collected so far to disk.
+		The following files are written, all sharing a timestamped prefix:
+		  - `.pstats`: Raw `cProfile` data, readable by `pstats` and snakeviz.
+		  - `.collapsed`: Collapsed stacks for flame graph tools.
+		  - `.memory.txt`: Modules that allocated the most memory.
+		@param directory The directory to write files to. Will be created if it
+		  does not exist.
+		@throws RuntimeError If no profiling data has been collected.
+		@returns The paths of all files that were written.
+		"""
+		if not self._start_snapshot:
+			raise RuntimeError("No profiling data has been collected.")
+
+		import pstats
+
+		directory.mkdir(parents=True, exist_ok=True)
+		prefix = directory / datetime.now().strftime("profile-%Y%m%d-%H%M%S")
+
+		# Creating the stats object disables the profilers. If a dump is
+		#   requested while events are being handled (e.g. from a signal
+		#   handler), the rest of those events will not be profiled.
+		with self._lock:
+			profilers = list(self._profilers)
+		stats = pstats.Stats(*profilers)
+
+		pstats_path = prefix.with_suffix(".pstats")
+		stats.dump_stats(pstats_path)
+
+		collapsed_path = prefix.with_suffix(".collapsed")
+		with collapsed_path.open("w") as f:
+			for line in CollapsedStacks.from_stats(stats.stats): # type: ignore
+				f.write(line + "\n")
+
+		memory_path = prefix.with_suffix(".memory.txt")
+		with memory_path.open("w") as f:
+			f.write(self._make_memory_report())
+
+		paths = [pstats_path, collapsed_path, memory_path]
+		logger.info(
+			"Wrote profiling data to:\n" + "\n".join(f"  {p}" for p in paths)
+		)
+		return paths
+
+
+	def wrap(self, handler: Callable[..., Any]) -> Callable[..., None]:
+		"""
+		Wraps an event handler so that it is profiled while profiling is
+		  running.
+		@param handler The event handler to wrap.
+		@returns A new event handler that forwards all arguments to the wrapped
+		  handler.
+		"""
+		def profiled(*args: Any) -> None:
+			state = self._thread_state
+			if state.depth == 0:
+				if not self._running:
+					handler(*args)
+					return
+				self._get_thread_profiler().enable()
+
+			state.depth += 1
+			try:
+				handler(*args)
+			finally:
+				state.depth -= 1
+				if state.depth == 0:
+					assert state.profiler
+					state.profiler.disable()
+
+		return profiled
+
+
+	def _get_thread_profiler(self) -> cProfile.Profile:
+		"""
+		Gets the calling thread's profiler for the current profiling session,
+		  creating it if needed.
+		@returns The profiler.
+		"""
+		state = self._thread_state
+		if state.profiler is None or state.session != self._session:
+			import cProfile
+			profiler = cProfile.Profile()
+			with self._lock:
+				self._profilers.append(profiler)
+				state.session = self._session
+			state.profiler = profiler
+		return state.profiler
+
+
+	def _make_memory_report(self) -> str:
+		"""
+		Creates a report of the modules that allocated the most memory.
+		@returns The report, containing one line per module.
+		"""
+		import tracemalloc
+		assert self._start_snapshot
+		snapshot = self._stop_snapshot or tracemalloc.take_snapshot()
+		differences = snapshot.compare_to(self._start_snapshot, "filename")
+
+		# Group the per-file differences by module
+		module_names = CProfileProfilingService._get_module_names()
+		size_by_module: Dict[str, int] = {}
+		count_by_module: Dict[str, int] = {}
+		for difference in differences:
+			filename = difference.traceback[0].filename
+			module = module_names.get(filename, filename)
+			size_by_module[module] = \
+				size_by_module.get(module, 0) + difference.size_diff
+			count_by_module[module] = \
+				count_by_module.get(module, 0) + difference.count_diff
+
+		top_modules = sorted(
+			size_by_module.items(),
+			key=lambda item: item[1],
+			reverse=True
+		)[:CProfileProfilingService.TOP_ALLOCATORS]
+
+		lines = [f"{'Size (KiB)':>12} {'Blocks':>10}  Module"]
+		for module, size in top_modules:
+			lines.append(
+				f"{size / 1024:>12.1f} {count_by_module[module]:>10}  {module}"
+			)
+		return "\n".join(lines) + "\n"
+
+
+	@staticmethod
+	def _get_module_names() -> Dict[str, str]:
+		"""
+		Maps the source file of each loaded module to the module's name.
+		@returns A dictionary of module names, indexed by source file path.
+		"""
+		module_names: Dict[str, str] = {}
+		for name, module in list(sys.modules.items()):
+			filename = getattr(module, "__file__", None)
+			if filename:
+				module_names[filename] = name
+		return module_names
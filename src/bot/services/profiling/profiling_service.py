@@ -0,0 +1,63 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, List
+
+class IProfilingService(ABC):
+	"""
+	Service used to profile event handling while the bot is running.
+	Profiling may be started and stopped at any time without restarting the
+	  bot. While profiling is stopped, wrapped event handlers must add as little
+	  overhead as possible.
+	"""
+	@property
+	@abstractmethod
+	def is_running(self) -> bool:
+		"""
+		Whether profiling is currently running.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def start(self) -> None:
+		"""
+		Starts profiling event handling.
+		Any data collected by a previous profiling session is discarded.
+		@throws RuntimeError If profiling is already running.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def stop(self) -> None:
+		"""
+		Stops profiling event handling.
+		Collected data is kept until profiling is started again so that it may
+		  still be dumped.
+		@throws RuntimeError If profiling is not running.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def dump(self, directory: Path) -> List[Path]:
+		"""
+		Writes all data collected so far to disk.
+		@param directory The directory to write files to. Will be created if it
+		  does not exist.
+		@throws RuntimeError If no profiling data has been collected.
+		@returns The paths of all files that were written.
+		"""
+		raise NotImplementedError()
+
+
+	@abstractmethod
+	def wrap(self, handler: Callable[..., Any]) -> Callable[..., None]:
+		"""
+		Wraps an event handler so that it is profiled while profiling is
+		  running.
+		@param handler The event handler to wrap.
+		@returns A new event handler that forwards all arguments to the wrapped
+		  handler.
+		"""
+		raise NotImplementedError()
@@ -1,39 +1,67 @@
 from bot.models.dict_family_tree import DictFamilyTree
 from bot.models.family_tree import IFamilyTree
+from bot.models.family_tree_snapshot import FamilyTreeSnapshot
 from bot.models.tree_node import TreeNode
 from bot.services.serialization.serialization_service import ISerializationService
+from bot.util.file_compression import FileCompression
+from bot.util.json_stream_reader import JsonStreamReader
 import json
 import logging
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 class JsonSerializationService(ISerializationService):
 	"""
 	Serialization service that writes to a JSON file on disk.
+	The file may be compressed; see `FileCompression`. Compressed files are
+	  always loaded by the calling thread since they cannot be split into
+	  servers without decompressing them.
 	"""
-	def __init__(self, save_path: Path):
+	# Number of fragments produced by the JSON encoder that are joined before
+	#   each write. Writing each fragment on its own is slow for compressed
+	#   files since every write passes through the compressor's Python code.
+	WRITE_BATCH_SIZE = 4096
+
+	def __init__(self,
+		save_path: Path,
+		load_workers: int = 0,
+		compression: str = FileCompression.NONE):
 		"""
 		Initializes a new instance of the class.
 		@param save_path The path to the JSON file to save to.
+		@param load_workers The number of worker processes used to load saved
+		  trees. If this is less than 2, trees are loaded by the calling
+		  thread.
+		@param compression The format to write the file in. Must be one of
+		  `FileCompression.ALL`. Files are read in whichever format they were
+		  written in.
 		"""
 		self._save_path = save_path
+		self._load_workers = load_workers
+		self._compression = compression
 
 
 	def load_trees(self) -> Dict[int, IFamilyTree]:
 		"""
 		Loads all family trees from disk.
+		If multiple load workers were requested, the trees are decoded in
+		  parallel using `ParallelJsonLoader`. Otherwise, or if the save file
+		  cannot be split into servers (e.g. because it is compressed), the
+		  save file is parsed one node at a time and each node is converted as
+		  soon as it has been parsed, so the whole parsed document is never
+		  held in memory at once.
 		@returns A dictionary of all family trees saved on disk, indexed by
 		  Discord server ID.
 		"""
-		if not self._save_path.exists():
-			return {}
-		with self._save_path.open("r") as f:
-			return {
-				int(server_id): self._list_to_tree(nodes_list)
-				for server_id, nodes_list in json.load(f).items()
-			}
+		if self._load_workers > 1:
+			# Only imported when needed as `multiprocessing` is slow to import
+			from bot.services.serialization.parallel_json_loader import ParallelJsonLoader
+			loader = ParallelJsonLoader(self._save_path, self._load_workers)
+			if loader.can_load():
+				return loader.load_trees()
+		return self._read_trees()
 
 
 	def save_tree(self, server_id: int, tree: IFamilyTree) -> None:
@@ -42,14 +70,19 @@ class JsonSerializationService(ISerializationService):
 		@param server_id The ID of the discord server that the tree belongs to.
 		@param tree The family tree to save.
 		"""
-		trees = self.load_trees()
+		# Convert the tree from a snapshot so that the saved data is consistent
+		#   even if the tree is modified while it is being written
+		saved_nodes = JsonSerializationService._snapshot_to_list(tree.snapshot())
+		trees = self._read_trees()
 		trees[server_id] = tree
 		JsonSerializationService._write(
 			self._save_path,
 			{
-				server_id: JsonSerializationService._tree_to_list(tree)
-				for server_id, tree in trees.items()
-			}
+				sid: saved_nodes if sid == server_id \
+					else JsonSerializationService._tree_to_list(t)
+				for sid, t in trees.items()
+			},
+			self._compression
 		)
 
 
@@ -58,9 +91,62 @@ class JsonSerializationService(ISerializationService):
 		Removes a previously saved family tree from disk.
 		@param server_id The ID of the discord server that the tree belongs to.
 		"""
-		trees = self.load_trees()
+		trees = self._read_trees()
 		del trees[server_id]
-		JsonSerializationService._write(self._save_path, trees)
+		JsonSerializationService._write(
+			self._save_path,
+			{
+				server_id: JsonSerializationService._tree_to_list(tree)
+				for server_id, tree in trees.items()
+			},
+			self._compression
+		)
+
+
+	@staticmethod
+	def copy_trees(
+		source: Path,
+		destination: Path,
+		server_filter: Callable[[int], bool],
+		compression: str = FileCompression.NONE) -> int:
+		"""
+		Copies saved family trees from one file to another.
+		Trees are copied without being deserialized, so this is much faster
+		  than loading and saving each tree.
+		@param source The file to copy trees from.
+		@param destination The file to write the copied trees to. Will be
+		  overwritten if it exists.
+		@param server_filter Function that returns true for the ID of each
+		  discord server whose tree should be copied.
+		@param compression The format to write the destination file in. Must
+		  be one of `FileCompression.ALL`.
+		@returns The number of trees that were copied.
+		"""
+		with FileCompression.open_read(source) as f:
+			data: Dict[str, Any] = json.load(f)
+
+		copied = {
+			server_id: nodes_list
+			for server_id, nodes_list in data.items()
+			if server_filter(int(server_id))
+		}
+		JsonSerializationService._write(destination, copied, compression)
+		return len(copied)
+
+
+	def _read_trees(self) -> Dict[int, IFamilyTree]:
+		"""
+		Loads all family trees from disk on the calling thread.
+		@returns A dictionary of all family trees saved on disk, indexed by
+		  Discord server ID.
+		"""
+		if not self._save_path.exists():
+			return {}
+		with FileCompression.open_read(self._save_path) as f:
+			return {
+				int(server_id): self._dicts_to_tree(node_dicts)
+				for server_id, node_dicts in JsonStreamReader(f).iter_arrays()
+			}
 
 
 	@staticmethod
@@ -77,46 +163,65 @@ class JsonSerializationService(ISerializationService):
 
 
 	@staticmethod
-	def _list_to_tree(nodes: List[Dict[str, Any]]) -> IFamilyTree:
+	def _snapshot_to_list(
+		snapshot: FamilyTreeSnapshot) -> List[Dict[str, Optional[str]]]:
 		"""
-		Converts the given list to a tree.
-		@param nodes The list of dictionaries representing tree nodes.
-		@returns A tree that contains all nodes in the list.
+		Converts the given tree snapshot to a list.
+		@param snapshot The snapshot to convert.
+		@returns A list that contains all nodes in the snapshot. The first node
+		  in the list will always be the root node.
 		"""
-		if not nodes:
-			raise ValueError("Cannot convert an empty list to a tree.")
+		return [
+			{
+				"discord_id": str(node.discord_id),
+				"username": node.discord_username,
+				"discriminator": str(node.discord_discriminator),
+				"nickname": node.user_nickname,
+				"background_color": node.background_color,
+				"inviter": str(node.inviter_id) \
+					if node.inviter_id is not None else None
+			}
+			for node in snapshot
+		]
+
 
+	@staticmethod
+	def _dicts_to_tree(node_dicts: Iterable[Dict[str, Any]]) -> IFamilyTree:
+		"""
+		Converts the given node dictionaries to a tree.
+		Each dictionary is converted to a node as soon as it is reached and is
+		  not kept afterwards, so the dictionaries may be generated lazily.
+		@param node_dicts The dictionaries representing tree nodes.
+		@returns A tree that contains all nodes.
+		"""
 		# Create each node and store it in a dictionary indexed by each node's
 		#   discord ID.
 		# This is necessary because the deserialization process will not restore
 		#   the `inviter` property. Instead, that property will be set after
-		#   all nodes have been created.
-		nodes_dict: Dict[int, TreeNode] = {
-			int(node_dict["discord_id"]): \
-				JsonSerializationService._dict_to_node(node_dict)
-			for node_dict in nodes
-		}
-
-		# Iterate over each node and set its inviter property
-		for node_dict in nodes:
-			# Find the node corresponding to the current node dictionary
-			node = nodes_dict[int(node_dict["discord_id"])]
-
-			# If the node has an inviter, find the corresponding node and set
-			#   the inviter property
+		#   all nodes have been created using the inviter ID of each node.
+		nodes_dict: Dict[int, TreeNode] = {}
+		inviter_ids: List[Tuple[TreeNode, int]] = []
+		for node_dict in node_dicts:
+			node = JsonSerializationService._dict_to_node(node_dict)
+			nodes_dict[node.discord_id] = node
 			if node_dict["inviter"]:
-				node.inviter = nodes_dict[int(node_dict["inviter"])]
+				inviter_ids.append((node, int(node_dict["inviter"])))
+		if not nodes_dict:
+			raise ValueError("Cannot convert an empty list to a tree.")
+
+		# Set the inviter property of each node that has an inviter
+		for node, inviter_id in inviter_ids:
+			node.inviter = nodes_dict[inviter_id]
+		del inviter_ids
 
 		# Find the root node
 		root_node = next(iter(
 			[n for n in nodes_dict.values() if n.inviter == None]
 		))
 
-		tree = DictFamilyTree(root_node)
-		for node in nodes_dict.values():
-			if node != root_node:
-				tree.add_node(node)
-		return tree
+		return DictFamilyTree.from_nodes(
+			[root_node] + [n for n in nodes_dict.values() if n != root_node]
+		)
 
 
 	@staticmethod
@@ -163,12 +268,22 @@ class JsonSerializationService(ISerializationService):
 
 
 	@staticmethod
-	def _write(file: Path, data: Dict[Any, Any]) -> None:
+	def _write(
+		file: Path,
+		data: Dict[Any, Any],
+		compression: str = FileCompression.NONE) -> None:
 		"""
 		Writes the given data to the given file.
 		@param file The file to write to.
 		@param data The data to write to the file.
+		@param compression The format to write the file in.
 		"""
 		logger.info(f"Saving family tree data to '{file}'.")
-		with file.open("w") as f:
-			json.dump(data, f, indent=2)
+		with FileCompression.open_write(file, compression) as f:
+			fragments: List[str] = []
+			for fragment in json.JSONEncoder(indent=2).iterencode(data):
+				fragments.append(fragment)
+				if len(fragments) >= JsonSerializationService.WRITE_BATCH_SIZE:
+					f.write("".join(fragments))
+					fragments.clear()
+			f.write("".join(fragments))
@@ -0,0 +1,269 @@
+from bot.models.family_tree import IFamilyTree
+from bot.models.mapped_family_tree import MappedFamilyTree
+from bot.services.serialization.serialization_service import ISerializationService
+import logging
+import mmap
+import os
+from pathlib import Path
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class MappedSerializationService(ISerializationService):
+	"""
+	Serialization service that keeps a memory-mapped snapshot of the trees
+	  saved by another serialization service.
+	The snapshot stores each tree in the layout read by `MappedFamilyTree`,
+	  so loading trees from an up to date snapshot only maps the file into
+	  memory and reads its directory; each tree is read from the file as it is
+	  queried and converted to a mutable tree the first time it is modified.
+	The wrapped service's save file is still the source of truth. The
+	  snapshot records the size and modification time of the save file it was
+	  written for, and is ignored and rewritten if the save file was changed
+	  by anything other than this service. Each save rewrites the snapshot by
+	  copying the other trees' blocks and encoding only the saved tree.
+	Snapshots use the platform's native byte order and are rewritten if they
+	  were created on a platform with a different byte order.
+	"""
+	# Identifies snapshot files and their version.
+	MAGIC = b"FTSNAP02"
+
+	# Value written in native byte order to detect files from platforms with
+	#   a different byte order.
+	BYTE_ORDER_MARK = 0x01020304
+
+	# Format of the file header: magic, byte order mark, number of trees, and
+	#   the modification time (ns) and size of the save file.
+	HEADER = struct.Struct("=8sIIqq")
+
+	# Format of each directory entry: server ID and the offset and size of
+	#   the server's encoded tree.
+	ENTRY = struct.Struct("=qQQ")
+
+	def __init__(self,
+		serialization_service: ISerializationService,
+		save_path: Path,
+		snapshot_path: Path):
+		"""
+		Initializes a new instance of the class.
+		@param serialization_service The service that trees are saved with.
+		@param save_path The path of the file that the wrapped service saves
+		  trees to.
+		@param snapshot_path The path to write the snapshot to.
+		"""
+		self._serialization_service = serialization_service
+		self._save_path = save_path
+		self._snapshot_path = snapshot_path
+
+		# Currently mapped snapshot. Trees loaded from the snapshot read from
+		#   this map, so it is kept open even after the snapshot is replaced;
+		#   the replaced file's data stays available until it is unmapped.
+		self._mapped: Optional[mmap.mmap] = None
+
+		# Directory of the snapshot, indexed by server ID. Contains the offset
+		#   and size of each server's block. None if the snapshot is not in
+		#   sync with the save file.
+		self._directory: Optional[Dict[int, Tuple[int, int]]] = None
+
+
+	def load_trees(self) -> Dict[int, IFamilyTree]:
+		"""
+		Loads all family trees from disk.
+		Trees are read from the snapshot if it is up to date. Otherwise, they
+		  are loaded by the wrapped service and the snapshot is rewritten.
+		@returns A dictionary of all family trees saved on disk, indexed by
+		  Discord server ID.
+		"""
+		start = time.perf_counter()
+		mapped = self._map_snapshot()
+		if mapped is not None:
+			self._mapped, self._directory = mapped
+			logger.info(
+				f"Mapped {len(self._directory)} family trees from "
+				f"'{self._snapshot_path}' in "
+				f"{(time.perf_counter() - start) * 1000:.1f}ms."
+			)
+			return {
+				server_id: MappedFamilyTree(self._mapped, offset)
+				for server_id, (offset, _) in self._directory.items()
+			}
+
+		trees = self._serialization_service.load_trees()
+		self._write_snapshot({
+			server_id: MappedFamilyTree.encode(list(tree.get_view()))
+			for server_id, tree in trees.items()
+		})
+		return trees
+
+
+	def save_tree(self, server_id: int, tree: IFamilyTree) -> None:
+		"""
+		Saves the given family tree to disk.
+		@param server_id The ID of the discord server that the tree belongs to.
+		@param tree The family tree to save.
+		"""
+		blocks = self._get_blocks()
+		self._serialization_service.save_tree(server_id, tree)
+		if blocks is not None:
+			blocks[server_id] = MappedFamilyTree.encode(list(tree.get_view()))
+			self._write_snapshot(blocks)
+
+
+	def remove_tree(self, server_id: int) -> None:
+		"""
+		Removes a previously saved family tree from disk.
+		@param server_id The ID of the discord server that the tree belongs to.
+		"""
+		blocks = self._get_blocks()
+		self._serialization_service.remove_tree(server_id)
+		if blocks is not None:
+			blocks.pop(server_id, None)
+			self._write_snapshot(blocks)
+
+
+	def _get_blocks(self) -> Optional[Dict[int, bytes]]:
+		"""
+		Copies the encoded trees of the current snapshot.
+		@returns The encoded tree of each server, indexed by server ID, or None
+		  if the snapshot is not in sync with the save file. In that case, the
+		  snapshot is rewritten the next time trees are loaded.
+		"""
+		if self._mapped is None or self._directory is None \
+			or self._read_header(self._mapped) != self._get_save_stat():
+			self._directory = None
+			return None
+		return {
+			server_id: self._mapped[offset:offset + size]
+			for server_id, (offset, size) in self._directory.items()
+		}
+
+
+	def _map_snapshot(self) -> Optional[
+		Tuple[mmap.mmap, Dict[int, Tuple[int, int]]]]:
+		"""
+		Maps the snapshot into memory if it is in sync with the save file.
+		@returns The mapped snapshot and its directory, or None if the snapshot
+		  does not exist or is out of date.
+		"""
+		if not self._snapshot_path.exists():
+			return None
+		with self._snapshot_path.open("rb") as f:
+			if f.seek(0, os.SEEK_END) < MappedSerializationService.HEADER.size:
+				return None
+			mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+		stat = self._get_save_stat()
+		if stat is None or self._read_header(mapped) != stat:
+			mapped.close()
+			logger.info(
+				f"Snapshot '{self._snapshot_path}' is out of date and will be "
+				"rewritten."
+			)
+			return None
+
+		count = MappedSerializationService.HEADER.unpack_from(mapped)[2]
+		directory: Dict[int, Tuple[int, int]] = {}
+		for i in range(count):
+			server_id, offset, size = MappedSerializationService.ENTRY.unpack_from(
+				mapped,
+				MappedSerializationService.HEADER.size +
+					i * MappedSerializationService.ENTRY.size
+			)
+			directory[server_id] = (offset, size)
+		return mapped, directory
+
+
+	def _write_snapshot(self, blocks: Dict[int, bytes]) -> None:
+		"""
+		Replaces the snapshot and maps the new snapshot into memory.
+		The new snapshot is written to a temporary file first so that the
+		  snapshot on disk is always complete.
+		@param blocks The encoded tree of each server, indexed by server ID.
+		"""
+		stat = self._get_save_stat()
+		if stat is None:
+			return
+
+		directory: Dict[int, Tuple[int, int]] = {}
+		entries: List[bytes] = []
+		offset = MappedSerializationService._align(
+			MappedSerializationService.HEADER.size +
+				len(blocks) * MappedSerializationService.ENTRY.size
+		)
+		for server_id, block in blocks.items():
+			directory[server_id] = (offset, len(block))
+			entries.append(MappedSerializationService.ENTRY.pack(
+				server_id,
+				offset,
+				len(block)
+			))
+			offset = MappedSerializationService._align(offset + len(block))
+
+		temp_path = self._snapshot_path.with_name(
+			self._snapshot_path.name + ".tmp"
+		)
+		with temp_path.open("wb") as f:
+			f.write(MappedSerializationService.HEADER.pack(
+				MappedSerializationService.MAGIC,
+				MappedSerializationService.BYTE_ORDER_MARK,
+				len(blocks),
+				*stat
+			))
+			f.writelines(entries)
+			for server_id, block in blocks.items():
+				f.seek(directory[server_id][0])
+				f.write(block)
+			f.truncate(offset)
+		os.replace(temp_path, self._snapshot_path)
+
+		# Trees loaded from the previous map may still read from it, so it is
+		#   left open and closed once it is garbage collected
+		mapped = self._map_snapshot()
+		if mapped is None:
+			self._mapped, self._directory = None, None
+		else:
+			self._mapped, self._directory = mapped
+
+
+	def _get_save_stat(self) -> Optional[Tuple[int, int]]:
+		"""
+		Gets the modification time and size of the save file.
+		@returns The modification time in nanoseconds and the size in bytes,
+		  or None if the save file does not exist.
+		"""
+		try:
+			stat = self._save_path.stat()
+		except FileNotFoundError:
+			return None
+		return stat.st_mtime_ns, stat.st_size
+
+
+	@staticmethod
+	def _read_header(mapped: mmap.mmap) -> Optional[Tuple[int, int]]:
+		"""
+		Reads the save file information recorded in a snapshot.
+		@param mapped The mapped snapshot.
+		@returns The modification time and size of the save file that the
+		  snapshot was written for, or None if the file is not a snapshot that
+		  can be read on this platform.
+		"""
+		magic, mark, _, mtime, size = MappedSerializationService.HEADER.unpack_from(
+			mapped
+		)
+		if magic != MappedSerializationService.MAGIC \
+			or mark != MappedSerializationService.BYTE_ORDER_MARK:
+			return None
+		return mtime, size
+
+
+	@staticmethod
+	def _align(offset: int) -> int:
+		"""
+		Rounds an offset up to the alignment required by `MappedFamilyTree`.
+		@param offset The offset to round.
+		@returns The rounded offset.
+		"""
+		alignment = MappedFamilyTree.ALIGNMENT
+		return (offset + alignment - 1) // alignment * alignment
@@ -0,0 +1,83 @@
+from bot.models.family_tree import IFamilyTree
+from bot.services.metrics.guild_tier import GuildTier
+from bot.services.metrics.metrics_service import IMetricsService
+from bot.services.serialization.serialization_service import ISerializationService
+import time
+from typing import Dict
+
+class MetricsSerializationService(ISerializationService):
+	"""
+	Serialization service that records metrics for another serialization
+	  service.
+	All calls are forwarded to the wrapped service.
+	"""
+	# Counter incremented each time a serialization operation is performed.
+	OPERATIONS_METRIC = "bot_serialization_operations_total"
+
+	# Histogram of the time taken by each serialization operation.
+	LATENCY_METRIC = "bot_serialization_latency_seconds"
+
+	def __init__(self,
+		serialization_service: ISerializationService,
+		metrics_service: IMetricsService):
+		"""
+		Initializes a new instance of the class.
+		@param serialization_service The service to forward all calls to.
+		@param metrics_service The service to record metrics to.
+		"""
+		self._serialization_service = serialization_service
+		self._metrics_service = metrics_service
+
+
+	def load_trees(self) -> Dict[int, IFamilyTree]:
+		"""
+		Loads all family trees from disk.
+		@returns A dictionary of all family trees saved on disk, indexed by
+		  Discord server ID.
+		"""
+		start = time.perf_counter()
+		trees = self._serialization_service.load_trees()
+		self._record("load_trees", GuildTier.UNKNOWN, start)
+		return trees
+
+
+	def save_tree(self, server_id: int, tree: IFamilyTree) -> None:
+		"""
+		Saves the given family tree to disk.
+		@param server_id The ID of the discord server that the tree belongs to.
+		@param tree The family tree to save.
+		"""
+		start = time.perf_counter()
+		self._serialization_service.save_tree(server_id, tree)
+		self._record("save_tree", GuildTier.get_tier(len(tree)), start)
+
+
+	def remove_tree(self, server_id: int) -> None:
+		"""
+		Removes a previously saved family tree from disk.
+		@param server_id The ID of the discord server that the tree belongs to.
+		"""
+		start = time.perf_counter()
+		self._serialization_service.remove_tree(server_id)
+		self._record("remove_tree", GuildTier.UNKNOWN, start)
+
+
+	def _record(self, operation: str, tier: str, start: float) -> None:
+		"""
+		Records the metrics for a completed operation.
+		@param operation The name of the operation that was performed.
+		@param tier The tier of the guild the operation was performed for.
+		@param start The value of `time.perf_counter()` when the operation
+		  started.
+		"""
+		elapsed = time.perf_counter() - start
+		labels = {"operation": operation, "tier": tier}
+		self._metrics_service.increment(
+			MetricsSerializationService.OPERATIONS_METRIC,
+			labels
+		)
+		self._metrics_service.observe(
+			MetricsSerializationService.LATENCY_METRIC,
+			labels,
+			elapsed
+		)
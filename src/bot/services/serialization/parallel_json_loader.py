@@ -0,0 +1,290 @@
+from bot.models.dict_family_tree import DictFamilyTree
+from bot.models.family_tree import IFamilyTree
+from bot.models.tree_node import TreeNode
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import mmap
+import multiprocessing
+from pathlib import Path
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Columns of a decoded tree: the ID, username, discriminator, nickname,
+#   background color, and index of the inviter of each node, in join order.
+#   The root node's inviter index is -1.
+CompactTree = Tuple[
+	List[int],
+	List[str],
+	List[int],
+	List[str],
+	List[str],
+	List[int]
+]
+
+class ParallelJsonLoader:
+	"""
+	Loads the family trees in a JSON save file using a pool of processes.
+	The save file is split into one span of bytes per server without parsing
+	  it, and the spans are decoded concurrently by worker processes. Workers
+	  return each tree as a set of flat lists, which are much cheaper to send
+	  between processes than nodes, and the trees are built from the lists by
+	  the calling process.
+	Splitting relies on the layout that `JsonSerializationService` writes
+	  files in (2 space indents), in which each server's key is the only line
+	  that starts with exactly 2 spaces followed by a quote. Files in any other
+	  layout cannot be split and must be loaded sequentially.
+	"""
+	# Matches the line that starts each server's array in the save file.
+	SERVER_PATTERN = re.compile(rb'^  "(\d+)": \[', re.MULTILINE)
+
+	# Minimum number of bytes of save data sent to a worker at a time.
+	# Small servers are grouped so that the cost of sending a task to a
+	#   worker does not outweigh the cost of decoding the servers.
+	MIN_BATCH_SIZE = 1 << 20
+
+	# Number of servers whose load time is logged once all trees are loaded.
+	SLOWEST_SERVER_COUNT = 5
+
+	def __init__(self, save_path: Path, workers: int):
+		"""
+		Initializes a new instance of the class.
+		@param save_path The path to the JSON file to load.
+		@param workers The number of worker processes to decode servers with.
+		"""
+		self._save_path = save_path
+		self._workers = workers
+
+		# Number of seconds taken to load each server's tree during the last
+		#   call to `load_trees()`, indexed by discord server ID. Includes the
+		#   time taken to decode the server's data and to build its tree.
+		self._load_times: Dict[int, float] = {}
+
+
+	@property
+	def load_times(self) -> Dict[int, float]:
+		"""
+		Gets the number of seconds taken to load each server's tree during the
+		  last call to `load_trees()`, indexed by discord server ID.
+		"""
+		return self._load_times
+
+
+	def can_load(self) -> bool:
+		"""
+		Checks whether the save file can be split into spans for each server.
+		@returns True if the file exists and uses the expected layout.
+		"""
+		if not self._save_path.exists():
+			return False
+		with self._save_path.open("rb") as f:
+			start = f.read(5)
+		return start.startswith(b"{}") or start == b'{\n  "'
+
+
+	def load_trees(self) -> Dict[int, IFamilyTree]:
+		"""
+		Loads all family trees from the save file.
+		@throws ValueError If the save file cannot be split; see `can_load()`.
+		@returns A dictionary of all family trees in the save file, indexed by
+		  Discord server ID.
+		"""
+		if not self.can_load():
+			raise ValueError(
+				f"Save file '{self._save_path}' cannot be loaded in parallel."
+			)
+
+		start = time.perf_counter()
+		spans = self._find_spans()
+		batches = self._make_batches(spans)
+		self._load_times = {}
+		trees: Dict[int, IFamilyTree] = {}
+		if batches:
+			# Workers are spawned rather than forked since trees are usually
+			#   loaded on a background thread
+			with ProcessPoolExecutor(
+				max_workers=min(self._workers, len(batches)),
+				mp_context=multiprocessing.get_context("spawn")) as executor:
+				futures = [
+					executor.submit(
+						ParallelJsonLoader._decode_batch,
+						str(self._save_path),
+						batch
+					)
+					for batch in batches
+				]
+				for future in futures:
+					for server_id, columns, seconds in future.result():
+						build_start = time.perf_counter()
+						trees[server_id] = ParallelJsonLoader._build_tree(columns)
+						self._load_times[server_id] = seconds + \
+							time.perf_counter() - build_start
+
+			# Keep the order of the save file so that saving the trees again does
+			#   not reorder it
+			trees = {server_id: trees[server_id] for server_id, _, _ in spans}
+
+		slowest = sorted(
+			self._load_times.items(),
+			key=lambda item: item[1],
+			reverse=True
+		)[:ParallelJsonLoader.SLOWEST_SERVER_COUNT]
+		logger.info(
+			f"Loaded {len(trees)} family trees using {self._workers} workers in "
+			f"{(time.perf_counter() - start) * 1000:.1f}ms. Slowest servers: " +
+			", ".join(f"{sid} ({secs * 1000:.1f}ms)" for sid, secs in slowest)
+		)
+		return trees
+
+
+	def _find_spans(self) -> List[Tuple[int, int, int]]:
+		"""
+		Finds the bytes that contain each server's array of nodes.
+		@returns The ID of each server and the offsets of the first and last
+		  bytes of its array, in the order the servers appear in the file.
+		"""
+		with self._save_path.open("rb") as f:
+			if f.seek(0, 2) == 0:
+				return []
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+				matches = [
+					(int(match.group(1)), match.start(), match.end() - 1)
+					for match in ParallelJsonLoader.SERVER_PATTERN.finditer(data)
+				]
+				end = data.rfind(b"}")
+
+		# Each array ends before the next server's key. The comma and
+		#   whitespace that separate the servers are stripped by the workers.
+		spans: List[Tuple[int, int, int]] = []
+		for i, (server_id, _, start) in enumerate(matches):
+			next_key = matches[i + 1][1] if i + 1 < len(matches) else end
+			spans.append((server_id, start, next_key))
+		return spans
+
+
+	def _make_batches(self,
+		spans: List[Tuple[int, int, int]]) -> List[List[Tuple[int, int, int]]]:
+		"""
+		Groups spans into the batches sent to workers.
+		@param spans The spans of each server.
+		@returns The batches of spans, with the largest servers first so that
+		  workers do not finish at very different times.
+		"""
+		spans = sorted(spans, key=lambda span: span[2] - span[1], reverse=True)
+		batches: List[List[Tuple[int, int, int]]] = []
+		batch: List[Tuple[int, int, int]] = []
+		batch_size = 0
+		for span in spans:
+			batch.append(span)
+			batch_size += span[2] - span[1]
+			if batch_size >= ParallelJsonLoader.MIN_BATCH_SIZE:
+				batches.append(batch)
+				batch = []
+				batch_size = 0
+		if batch:
+			batches.append(batch)
+		return batches
+
+
+	@staticmethod
+	def _decode_batch(
+		save_path: str,
+		spans: List[Tuple[int, int, int]]
+		) -> List[Tuple[int, CompactTree, float]]:
+		"""
+		Decodes the trees of a batch of servers. Runs in a worker process.
+		@param save_path The path to the JSON file to load.
+		@param spans The ID of each server in the batch and the offsets of the
+		  bytes that contain its array of nodes.
+		@returns The ID, decoded tree, and number of seconds taken to decode
+		  the tree of each server in the batch.
+		"""
+		results: List[Tuple[int, CompactTree, float]] = []
+		with open(save_path, "rb") as f:
+			for server_id, start, end in spans:
+				decode_start = time.perf_counter()
+				f.seek(start)
+				data = f.read(end - start).rstrip()
+				if data.endswith(b","):
+					data = data[:-1]
+				results.append((
+					server_id,
+					ParallelJsonLoader._decode_tree(json.loads(data)),
+					time.perf_counter() - decode_start
+				))
+		return results
+
+
+	@staticmethod
+	def _decode_tree(node_dicts: List[Dict[str, Optional[str]]]) -> CompactTree:
+		"""
+		Converts the dictionaries of a tree's nodes to columns.
+		@param node_dicts The dictionaries representing the tree's nodes.
+		@throws ValueError If the tree has no nodes or no root node.
+		@throws ValueError If a node's inviter is not in the tree.
+		@returns The columns of the tree. The root node is moved to the front
+		  if needed; all other nodes keep their order.
+		"""
+		ids: List[int] = []
+		usernames: List[str] = []
+		discriminators: List[int] = []
+		nicknames: List[str] = []
+		colors: List[str] = []
+		inviter_ids: List[Optional[int]] = []
+		for node_dict in node_dicts:
+			ids.append(int(node_dict["discord_id"])) # type: ignore
+			usernames.append(node_dict["username"]) # type: ignore
+			discriminators.append(int(node_dict["discriminator"])) # type: ignore
+			nicknames.append(node_dict["nickname"]) # type: ignore
+			colors.append(node_dict["background_color"]) # type: ignore
+			inviter = node_dict["inviter"]
+			inviter_ids.append(int(inviter) if inviter else None)
+		if not ids:
+			raise ValueError("Cannot convert an empty list to a tree.")
+
+		# Trees are expected to list the root node first, but the root node may
+		#   be anywhere in the list
+		root = inviter_ids.index(None)
+		if root:
+			for column in (ids, usernames, discriminators, nicknames, colors,
+				inviter_ids):
+				column.insert(0, column.pop(root)) # type: ignore
+
+		indices = {user_id: i for i, user_id in enumerate(ids)}
+		inviters: List[int] = []
+		for i, inviter_id in enumerate(inviter_ids):
+			if inviter_id is None:
+				inviters.append(-1)
+				continue
+			inviter = indices.get(inviter_id, i)
+			if inviter >= i:
+				raise ValueError(
+					f"Inviter for user {usernames[i]} does not exist."
+				)
+			inviters.append(inviter)
+		return ids, usernames, discriminators, nicknames, colors, inviters
+
+
+	@staticmethod
+	def _build_tree(columns: CompactTree) -> IFamilyTree:
+		"""
+		Builds a tree from its columns.
+		@param columns The columns of the tree.
+		@returns The tree.
+		"""
+		ids, usernames, discriminators, nicknames, colors, inviters = columns
+		nodes: List[TreeNode] = []
+		for i in range(len(ids)):
+			inviter = inviters[i]
+			nodes.append(TreeNode(
+				ids[i],
+				usernames[i],
+				discriminators[i],
+				nicknames[i],
+				colors[i],
+				nodes[inviter] if inviter >= 0 else None
+			))
+		return DictFamilyTree.from_nodes(nodes)
@@ -1,10 +1,19 @@
 from abc import ABC, abstractmethod
-from bot.services.cli_service import CliService
 from bot.services.discord.discord_events_service import IDiscordEventsService
 from bot.services.family_tree.family_tree_service import IFamilyTreeService
+from bot.services.history.history_service import IHistoryService
 from bot.services.invite.invite_service import IInviteService
+from bot.services.metrics.metrics_service import IMetricsService
+from bot.services.profiling.profiling_service import IProfilingService
 from bot.services.serialization.serialization_service import ISerializationService
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
+
+# The CLI service and optional event services are only imported for type
+#   checking so that the bot does not load them unless they are used.
+if TYPE_CHECKING:
+	from bot.services.cli_service import CliService
+	from bot.services.discord.coalescing_discord_events_service import CoalescingDiscordEventsService
+	from bot.services.discord.queued_discord_events_service import QueuedDiscordEventsService
 
 class IServiceCollection(ABC):
 	"""
@@ -12,7 +21,7 @@ class IServiceCollection(ABC):
 	"""
 	@property
 	@abstractmethod
-	def cli_service(self) -> Optional[CliService]:
+	def cli_service(self) -> Optional["CliService"]:
 		"""
 		The service used to test the bot using the command line.
 		This service is only available when the bot is running in local testing
@@ -30,6 +39,26 @@ class IServiceCollection(ABC):
 		raise NotImplementedError()
 
 
+	@property
+	@abstractmethod
+	def event_queue_service(self) -> Optional["QueuedDiscordEventsService"]:
+		"""
+		The service that buffers Discord events before they are handled.
+		This service is only available if an event queue capacity was given.
+		"""
+		raise NotImplementedError()
+
+
+	@property
+	@abstractmethod
+	def nickname_service(self) -> Optional["CoalescingDiscordEventsService"]:
+		"""
+		The service that combines nickname changes into batches.
+		This service is only available if a nickname window was given.
+		"""
+		raise NotImplementedError()
+
+
 	@property
 	@abstractmethod
 	def family_tree_service(self) -> IFamilyTreeService:
@@ -39,6 +68,16 @@ class IServiceCollection(ABC):
 		raise NotImplementedError()
 
 
+	@property
+	@abstractmethod
+	def history_service(self) -> Optional[IHistoryService]:
+		"""
+		The service used to record the history of each family tree.
+		This service is only available if a history directory was given.
+		"""
+		raise NotImplementedError()
+
+
 	@property
 	@abstractmethod
 	def invite_service(self) -> IInviteService:
@@ -48,6 +87,24 @@ class IServiceCollection(ABC):
 		raise NotImplementedError()
 
 
+	@property
+	@abstractmethod
+	def metrics_service(self) -> IMetricsService:
+		"""
+		The service used to record counters and latencies for bot operations.
+		"""
+		raise NotImplementedError()
+
+
+	@property
+	@abstractmethod
+	def profiling_service(self) -> IProfilingService:
+		"""
+		The service used to profile event handling.
+		"""
+		raise NotImplementedError()
+
+
 	@property
 	@abstractmethod
 	def serialization_service(self) -> ISerializationService:
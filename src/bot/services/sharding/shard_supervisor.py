@@ -0,0 +1,158 @@
+from bot.bot_events.discord_events import DiscordEvents
+from bot.services.discord.discord_events_service import IDiscordEventsService
+import logging
+import multiprocessing
+from pathlib import Path
+from typing import Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+class ShardSupervisor:
+	"""
+	Distributes Discord servers across worker processes.
+	Each worker process owns every server where `server_id % shard_count` is
+	  equal to the worker's shard ID, mirroring how Discord's gateway assigns
+	  servers to shards. Every event emitted by the Discord events service is
+	  forwarded to the worker that owns the event's server, so events for a
+	  single server are always handled by the same process in the order they
+	  were emitted.
+	"""
+	# Number of seconds to wait for a worker to exit before terminating it.
+	STOP_TIMEOUT = 10.0
+
+	def __init__(self,
+		discord_service: IDiscordEventsService,
+		shard_count: int,
+		worker_main: Callable[..., None],
+		*worker_args: Any):
+		"""
+		Initializes a new instance of the class.
+		@param discord_service The service whose events are routed to workers.
+		@param shard_count The number of worker processes to run.
+		@param worker_main The entry point of each worker process. Must be a
+		  module level function. Will be called with the worker's shard ID,
+		  the shard count, the queue that events are sent over, and then
+		  `worker_args`. Each item sent over the queue is either an
+		  `EventMessage` or `None` if the worker should exit.
+		@param worker_args Additional arguments for `worker_main`. Must be
+		  picklable.
+		@throws ValueError If the shard count is less than 1.
+		"""
+		if shard_count < 1:
+			raise ValueError(f"Invalid shard count: {shard_count}")
+
+		self._discord_service = discord_service
+		self._shard_count = shard_count
+		self._worker_main = worker_main
+		self._worker_args = worker_args
+
+		# Workers are spawned instead of forked as the supervisor may already
+		#   be running other threads (e.g. the metrics HTTP server).
+		self._context = multiprocessing.get_context("spawn")
+
+		# Worker process and event queue of each shard, indexed by shard ID.
+		self._workers: List[multiprocessing.process.BaseProcess] = []
+		self._queues: List[Any] = []
+
+
+	@property
+	def shard_count(self) -> int:
+		"""
+		The number of worker processes.
+		"""
+		return self._shard_count
+
+
+	@staticmethod
+	def get_shard_id(server_id: int, shard_count: int) -> int:
+		"""
+		Gets the shard that owns a server.
+		@param server_id The unique ID of the discord server.
+		@param shard_count The total number of shards.
+		@returns The ID of the shard that owns the server.
+		"""
+		return server_id % shard_count
+
+
+	@staticmethod
+	def get_shard_save_path(
+		save_path: Path,
+		shard_id: int,
+		shard_count: int) -> Path:
+		"""
+		Gets the path that a shard saves its family trees to.
+		The shard count is included in the path so that files written with a
+		  different number of shards are never mixed up.
+		@param save_path The path that family trees are saved to when sharding
+		  is not used.
+		@param shard_id The ID of the shard.
+		@param shard_count The total number of shards.
+		@returns The path of the shard's save file.
+		"""
+		return save_path.with_name(
+			f"{save_path.stem}.shard-{shard_id}-of-{shard_count}{save_path.suffix}"
+		)
+
+
+	def start(self) -> None:
+		"""
+		Starts all worker processes and begins routing events to them.
+		@throws RuntimeError If the workers have already been started.
+		"""
+		if self._workers:
+			raise RuntimeError("Shard workers have already been started.")
+
+		for shard_id in range(self._shard_count):
+			queue = self._context.Queue()
+			worker = self._context.Process(
+				target=self._worker_main,
+				args=(shard_id, self._shard_count, queue, *self._worker_args),
+				name=f"shard-{shard_id}"
+			)
+			worker.start()
+			self._queues.append(queue)
+			self._workers.append(worker)
+		logger.info(f"Started {self._shard_count} shard workers.")
+
+		for event_name in DiscordEvents.__events__:
+			slot = getattr(self._discord_service.events, event_name)
+			slot += self._make_router(event_name)
+
+
+	def stop(self) -> None:
+		"""
+		Stops all worker processes.
+		Workers handle all events that have already been routed to them before
+		  exiting. Workers that do not exit within `STOP_TIMEOUT` seconds are
+		  terminated.
+		"""
+		for queue in self._queues:
+			queue.put(None)
+		for worker in self._workers:
+			worker.join(ShardSupervisor.STOP_TIMEOUT)
+			if worker.is_alive():
+				logger.warning(f"Terminating unresponsive worker {worker.name}.")
+				worker.terminate()
+				worker.join()
+		logger.info(f"Stopped {len(self._workers)} shard workers.")
+
+
+	def _make_router(self, event_name: str) -> Callable[..., None]:
+		"""
+		Creates an event handler that forwards an event to the owning worker.
+		@param event_name The name of the event to forward.
+		@returns An event handler for the event. The first argument of every
+		  Discord event must be the server ID.
+		"""
+		def route(server_id: int, *args: Any) -> None:
+			shard_id = ShardSupervisor.get_shard_id(server_id, self._shard_count)
+			worker = self._workers[shard_id]
+			if not worker.is_alive():
+				logger.error(
+					f"Dropping {event_name} event for server {server_id}: "
+					f"worker {worker.name} exited with code {worker.exitcode}."
+				)
+				return
+			self._queues[shard_id].put((event_name, (server_id, *args)))
+
+		return route
@@ -1,20 +1,34 @@
-from bot.services.cli_service import CliService
 from bot.services.discord.discord_events_service import IDiscordEventsService
 from bot.services.family_tree.family_tree_service import IFamilyTreeService
+from bot.services.history.history_service import IHistoryService
 from bot.services.invite.invite_service import IInviteService
+from bot.services.metrics.metrics_service import IMetricsService
+from bot.services.profiling.profiling_service import IProfilingService
 from bot.services.serialization.serialization_service import ISerializationService
 from bot.services.service_collection import IServiceCollection
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
+
+# The CLI service and optional event services are only imported for type
+#   checking so that the bot does not load them unless they are used.
+if TYPE_CHECKING:
+	from bot.services.cli_service import CliService
+	from bot.services.discord.coalescing_discord_events_service import CoalescingDiscordEventsService
+	from bot.services.discord.queued_discord_events_service import QueuedDiscordEventsService
 
 class StructServiceCollection(IServiceCollection):
 	"""
 	Struct-like implementation of the IServiceCollection interface.
 	"""
 	def __init__(self,
-		cli_service: Optional[CliService],
+		cli_service: Optional["CliService"],
 		discord_service: IDiscordEventsService,
+		event_queue_service: Optional["QueuedDiscordEventsService"],
+		nickname_service: Optional["CoalescingDiscordEventsService"],
 		family_tree_service: IFamilyTreeService,
+		history_service: Optional[IHistoryService],
 		invite_service: IInviteService,
+		metrics_service: IMetricsService,
+		profiling_service: IProfilingService,
 		serialization_service: ISerializationService):
 		"""
 		Initializes a new instance of the class.
@@ -22,21 +36,35 @@ class StructServiceCollection(IServiceCollection):
 		  line.
 		@param discord_service The service used to emit events in response to
 		  Discord API events.
+		@param event_queue_service The service that buffers Discord events
+		  before they are handled.
+		@param nickname_service The service that combines nickname changes into
+		  batches.
 		@param family_tree_service The service used to manage family trees.
+		@param history_service The service used to record the history of each
+		  family tree.
 		@param invite_service The service used to determine who invited a user
 		  to a server.
+		@param metrics_service The service used to record counters and
+		  latencies for bot operations.
+		@param profiling_service The service used to profile event handling.
 		@param serialization_service The service used to save and load data from
 		  disk.
 		"""
 		self._cli_service = cli_service
 		self._discord_service = discord_service
+		self._event_queue_service = event_queue_service
+		self._nickname_service = nickname_service
 		self._family_tree_service = family_tree_service
+		self._history_service = history_service
 		self._invite_service = invite_service
+		self._metrics_service = metrics_service
+		self._profiling_service = profiling_service
 		self._serialization_service = serialization_service
 
 
 	@property
-	def cli_service(self) -> Optional[CliService]:
+	def cli_service(self) -> Optional["CliService"]:
 		"""
 		The service used to test the bot using the command line.
 		This service is only available when the bot is running in local testing
@@ -53,6 +81,24 @@ class StructServiceCollection(IServiceCollection):
 		return self._discord_service
 
 
+	@property
+	def event_queue_service(self) -> Optional["QueuedDiscordEventsService"]:
+		"""
+		The service that buffers Discord events before they are handled.
+		This service is only available if an event queue capacity was given.
+		"""
+		return self._event_queue_service
+
+
+	@property
+	def nickname_service(self) -> Optional["CoalescingDiscordEventsService"]:
+		"""
+		The service that combines nickname changes into batches.
+		This service is only available if a nickname window was given.
+		"""
+		return self._nickname_service
+
+
 	@property
 	def family_tree_service(self) -> IFamilyTreeService:
 		"""
@@ -61,6 +107,15 @@ class StructServiceCollection(IServiceCollection):
 		return self._family_tree_service
 
 
+	@property
+	def history_service(self) -> Optional[IHistoryService]:
+		"""
+		The service used to record the history of each family tree.
+		This service is only available if a history directory was given.
+		"""
+		return self._history_service
+
+
 	@property
 	def invite_service(self) -> IInviteService:
 		"""
@@ -69,6 +124,22 @@ class StructServiceCollection(IServiceCollection):
 		return self._invite_service
 
 
+	@property
+	def metrics_service(self) -> IMetricsService:
+		"""
+		The service used to record counters and latencies for bot operations.
+		"""
+		return self._metrics_service
+
+
+	@property
+	def profiling_service(self) -> IProfilingService:
+		"""
+		The service used to profile event handling.
+		"""
+		return self._profiling_service
+
+
 	@property
 	def serialization_service(self) -> ISerializationService:
 		"""
@@ -0,0 +1,160 @@
+import gzip
+import io
+from pathlib import Path
+from typing import TextIO
+
+class FileCompression:
+	"""
+	Defines the compression formats that save files may be written with.
+	Files are compressed and decompressed as they are streamed, so the
+	  uncompressed data is never held in memory at once. The format of a file
+	  being read is detected from its first bytes, so files may always be read
+	  regardless of the format that new files are written with.
+	zstd requires Python 3.14 or the `zstandard` package.
+	"""
+	# Files are written without compression.
+	NONE = "none"
+
+	# Files are compressed using gzip.
+	GZIP = "gzip"
+
+	# Files are compressed using Zstandard.
+	ZSTD = "zstd"
+
+	# All supported formats.
+	ALL = (NONE, GZIP, ZSTD)
+
+	# Compression level used for gzip. Lower than gzip's default of 9 since
+	#   save files are rewritten on every save.
+	GZIP_LEVEL = 6
+
+	# Compression level used for zstd.
+	ZSTD_LEVEL = 3
+
+	# Bytes that files in each compressed format start with.
+	GZIP_MAGIC = b"\x1f\x8b"
+	ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+	@staticmethod
+	def is_available(compression: str) -> bool:
+		"""
+		Checks whether files can be compressed with a format.
+		@param compression The format to check. Must be one of `ALL`.
+		@returns True if the modules required by the format are installed.
+		"""
+		if compression != FileCompression.ZSTD:
+			return True
+		try:
+			FileCompression._import_zstd()
+		except ValueError:
+			return False
+		return True
+
+
+	@staticmethod
+	def detect(path: Path) -> str:
+		"""
+		Detects the format of an existing file.
+		@param path The path of the file.
+		@returns The format that the file was written with.
+		"""
+		with path.open("rb") as f:
+			start = f.read(len(FileCompression.ZSTD_MAGIC))
+		if start.startswith(FileCompression.GZIP_MAGIC):
+			return FileCompression.GZIP
+		if start.startswith(FileCompression.ZSTD_MAGIC):
+			return FileCompression.ZSTD
+		return FileCompression.NONE
+
+
+	@staticmethod
+	def open_read(path: Path) -> TextIO:
+		"""
+		Opens a file for reading text, decompressing it if needed.
+		@param path The path of the file.
+		@throws ValueError If the file is compressed with zstd and zstd is not
+		  available.
+		@returns The opened file.
+		"""
+		compression = FileCompression.detect(path)
+		if compression == FileCompression.GZIP:
+			return gzip.open(path, "rt", encoding="utf-8") # type: ignore
+		if compression == FileCompression.ZSTD:
+			return FileCompression._open_zstd(path, "r")
+		return path.open("r", encoding="utf-8")
+
+
+	@staticmethod
+	def open_write(path: Path, compression: str) -> TextIO:
+		"""
+		Opens a file for writing text, compressing it as it is written.
+		@param path The path of the file. Will be overwritten if it exists.
+		@param compression The format to write the file in. Must be one of
+		  `ALL`.
+		@throws ValueError If the format is not supported or not available.
+		@returns The opened file.
+		"""
+		if compression == FileCompression.NONE:
+			return path.open("w", encoding="utf-8")
+		if compression == FileCompression.GZIP:
+			return gzip.open( # type: ignore
+				path,
+				"wt",
+				compresslevel=FileCompression.GZIP_LEVEL,
+				encoding="utf-8"
+			)
+		if compression == FileCompression.ZSTD:
+			return FileCompression._open_zstd(path, "w")
+		raise ValueError(f"Unknown compression format '{compression}'.")
+
+
+	@staticmethod
+	def _open_zstd(path: Path, mode: str) -> TextIO:
+		"""
+		Opens a zstd compressed file.
+		@param path The path of the file.
+		@param mode Either "r" or "w".
+		@throws ValueError If zstd is not available.
+		@returns The opened file.
+		"""
+		zstd = FileCompression._import_zstd()
+		if zstd.__name__ == "compression.zstd":
+			return zstd.open( # type: ignore
+				path,
+				mode + "t",
+				level=FileCompression.ZSTD_LEVEL if mode == "w" else None,
+				encoding="utf-8"
+			)
+
+		if mode == "w":
+			stream = zstd.open(
+				path,
+				"wb",
+				cctx=zstd.ZstdCompressor(level=FileCompression.ZSTD_LEVEL)
+			)
+		else:
+			stream = zstd.open(path, "rb")
+		return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+	@staticmethod
+	def _import_zstd():
+		"""
+		Imports the module used to read and write zstd files.
+		@throws ValueError If neither module is installed.
+		@returns Either the standard library's `compression.zstd` module
+		  (Python 3.14+) or the `zstandard` package.
+		"""
+		try:
+			from compression import zstd # type: ignore
+			return zstd
+		except ImportError:
+			pass
+		try:
+			import zstandard # type: ignore
+			return zstandard
+		except ImportError:
+			raise ValueError(
+				"zstd compression requires Python 3.14 or the 'zstandard' "
+				"package."
+			)
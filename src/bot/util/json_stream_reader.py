@@ -0,0 +1,181 @@
+import json
+import re
+from typing import Any, Iterator, TextIO, Tuple
+
+class JsonStreamReader:
+	"""
+	Incrementally parses a JSON document whose top level value is an object
+	  of arrays, e.g. `{"a": [1, 2], "b": [3]}`.
+	Each array element is decoded on its own as it is reached, so only a
+	  small part of the document is held in memory at a time regardless of
+	  the document's size. Elements are decoded using the standard library's
+	  JSON decoder and may be any JSON value.
+	"""
+	# Number of characters read from the file at a time.
+	CHUNK_SIZE = 1 << 16
+
+	# Characters that may appear between tokens.
+	WHITESPACE = " \t\n\r"
+
+	# Characters that may follow a complete number or literal.
+	DELIMITERS = tuple(WHITESPACE + ",]}")
+
+	# Matches any amount of whitespace.
+	WHITESPACE_PATTERN = re.compile(f"[{WHITESPACE}]*")
+
+	def __init__(self, f: TextIO, chunk_size: int = CHUNK_SIZE):
+		"""
+		Initializes a new instance of the class.
+		@param f The file to read from. Must be positioned at the start of the
+		  document.
+		@param chunk_size The number of characters to read at a time.
+		"""
+		self._file = f
+		self._chunk_size = chunk_size
+		self._decoder = json.JSONDecoder()
+
+		# Characters read from the file that have not been fully parsed yet.
+		self._buffer = ""
+
+		# Position of the next character to parse in the buffer.
+		self._position = 0
+
+		# Whether the end of the file has been reached.
+		self._eof = False
+
+
+	def iter_arrays(self) -> Iterator[Tuple[str, Iterator[Any]]]:
+		"""
+		Iterates over the members of the top level object.
+		The elements of each member's array are only decoded as the array's
+		  iterator is advanced. Any elements that were not consumed before
+		  moving to the next member are skipped.
+		@throws ValueError If the document is not an object of arrays or is
+		  not valid JSON.
+		@returns An iterator that returns the key and an iterator over the
+		  elements of the array of each member, in the order they appear in
+		  the document.
+		"""
+		self._expect("{")
+		if self._peek() == "}":
+			self._position += 1
+			return
+
+		while True:
+			key = self._decode()
+			if not isinstance(key, str):
+				raise ValueError("Expected an object key.")
+			self._expect(":")
+
+			elements = self._iter_elements()
+			yield key, elements
+			for _ in elements:
+				pass
+
+			if self._consume_separator("}"):
+				return
+
+
+	def _iter_elements(self) -> Iterator[Any]:
+		"""
+		Iterates over the elements of the array at the current position.
+		@throws ValueError If the value at the current position is not a
+		  valid array.
+		@returns An iterator that decodes each element of the array.
+		"""
+		self._expect("[")
+		if self._peek() == "]":
+			self._position += 1
+			return
+
+		while True:
+			yield self._decode()
+			if self._consume_separator("]"):
+				return
+
+
+	def _consume_separator(self, closing: str) -> bool:
+		"""
+		Consumes the comma or closing bracket after a member or element.
+		@param closing The character that closes the current object or array.
+		@throws ValueError If the next character is neither.
+		@returns True if the closing character was consumed.
+		"""
+		c = self._peek()
+		if c not in (",", closing):
+			raise ValueError(
+				f"Expected ',' or '{closing}' but found '{c or 'EOF'}'."
+			)
+		self._position += 1
+		return c == closing
+
+
+	def _expect(self, expected: str) -> None:
+		"""
+		Consumes the next non-whitespace character.
+		@param expected The character that must come next.
+		@throws ValueError If a different character comes next.
+		"""
+		c = self._peek()
+		if c != expected:
+			raise ValueError(f"Expected '{expected}' but found '{c or 'EOF'}'.")
+		self._position += 1
+
+
+	def _peek(self) -> str:
+		"""
+		Skips whitespace and gets the next character without consuming it.
+		@returns The next character, or an empty string at the end of the file.
+		"""
+		while True:
+			self._position = JsonStreamReader.WHITESPACE_PATTERN.match(
+				self._buffer,
+				self._position
+			).end() # type: ignore
+			if self._position < len(self._buffer):
+				return self._buffer[self._position]
+			if not self._fill():
+				return ""
+
+
+	def _decode(self) -> Any:
+		"""
+		Decodes the JSON value at the current position.
+		@throws ValueError If the value is not valid JSON.
+		@returns The decoded value.
+		"""
+		self._peek()
+		while True:
+			try:
+				value, end = self._decoder.raw_decode(self._buffer, self._position)
+			except json.JSONDecodeError:
+				# The value may continue past the end of the buffer
+				if not self._fill():
+					raise
+				continue
+
+			# Numbers at the end of the buffer may have been cut off, in which
+			#   case they are not followed by a delimiter (e.g. `1.` of `1.5`)
+			if not isinstance(value, (str, list, dict)) \
+				and self._buffer[end:end + 1] not in JsonStreamReader.DELIMITERS \
+				and self._fill():
+				continue
+			self._position = end
+			return value
+
+
+	def _fill(self) -> bool:
+		"""
+		Reads the next chunk of the file into the buffer.
+		Characters that have already been parsed are discarded.
+		@returns False if the end of the file has been reached.
+		"""
+		if self._eof:
+			return False
+		chunk = self._file.read(self._chunk_size)
+		if not chunk:
+			self._eof = True
+			return False
+		self._buffer = self._buffer[self._position:] + chunk
+		self._position = 0
+		return True
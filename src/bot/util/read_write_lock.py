@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+import threading
+from typing import Iterator
+
+class ReadWriteLock:
+	"""
+	Lock that allows any number of readers or a single writer.
+	Writers are preferred: once a writer is waiting, new readers wait until the
+	  writer has released the lock, so a steady stream of readers cannot
+	  starve writers. The lock is not reentrant; a thread that holds the lock
+	  must not try to acquire it again.
+	"""
+	def __init__(self):
+		"""
+		Initializes a new instance of the class.
+		"""
+		# Condition used to wait for the lock to become available.
+		self._condition = threading.Condition(threading.Lock())
+
+		# Number of threads that currently hold the lock for reading.
+		self._readers = 0
+
+		# Number of threads waiting to acquire the lock for writing.
+		self._waiting_writers = 0
+
+		# Whether a thread currently holds the lock for writing.
+		self._writing = False
+
+
+	@contextmanager
+	def read(self) -> Iterator[None]:
+		"""
+		Holds the lock for reading while the context is active.
+		"""
+		self.acquire_read()
+		try:
+			yield
+		finally:
+			self.release_read()
+
+
+	@contextmanager
+	def write(self) -> Iterator[None]:
+		"""
+		Holds the lock for writing while the context is active.
+		"""
+		self.acquire_write()
+		try:
+			yield
+		finally:
+			self.release_write()
+
+
+	def acquire_read(self) -> None:
+		"""
+		Blocks until the lock can be held for reading.
+		"""
+		with self._condition:
+			while self._writing or self._waiting_writers:
+				self._condition.wait()
+			self._readers += 1
+
+
+	def release_read(self) -> None:
+		"""
+		Releases the lock after reading.
+		@throws RuntimeError If the lock is not held for reading.
+		"""
+		with self._condition:
+			if self._readers <= 0:
+				raise RuntimeError("Lock is not held for reading.")
+			self._readers -= 1
+			if not self._readers:
+				self._condition.notify_all()
+
+
+	def acquire_write(self) -> None:
+		"""
+		Blocks until the lock can be held for writing.
+		"""
+		with self._condition:
+			self._waiting_writers += 1
+			try:
+				while self._writing or self._readers:
+					self._condition.wait()
+			finally:
+				self._waiting_writers -= 1
+			self._writing = True
+
+
+	def release_write(self) -> None:
+		"""
+		Releases the lock after writing.
+		@throws RuntimeError If the lock is not held for writing.
+		"""
+		with self._condition:
+			if not self._writing:
+				raise RuntimeError("Lock is not held for writing.")
+			self._writing = False
+			self._condition.notify_all()
@@ -0,0 +1,43 @@
+import time
+from typing import List, Tuple
+
+class StartupTimer:
+	"""
+	Records how long each phase of the bot's startup takes.
+	"""
+	def __init__(self, start: float):
+		"""
+		Initializes a new instance of the class.
+		@param start The value of `time.perf_counter()` when startup began.
+		"""
+		self._start = start
+		self._last = start
+
+		# Name and duration of each completed phase, in seconds.
+		self._phases: List[Tuple[str, float]] = []
+
+
+	def mark(self, phase: str) -> None:
+		"""
+		Marks the end of a startup phase.
+		The phase is considered to have started when the previous phase ended.
+		@param phase The name of the phase that just ended.
+		"""
+		now = time.perf_counter()
+		self._phases.append((phase, now - self._last))
+		self._last = now
+
+
+	def format_report(self) -> str:
+		"""
+		Formats the duration of each phase as a table.
+		@returns The duration of each phase followed by the total duration.
+		"""
+		width = max([len(phase) for phase, _ in self._phases] + [len("total")])
+		lines = ["Startup timing breakdown:"]
+		for phase, seconds in self._phases:
+			lines.append(f"  {phase:<{width}} {seconds * 1000:>8.1f}ms")
+		lines.append(
+			f"  {'total':<{width}} {(self._last - self._start) * 1000:>8.1f}ms"
+		)
+		return "\n".join(lines)